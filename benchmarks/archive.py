@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+样本归档基准：向归档写入大量已完成样本，观察常驻内存（RSS）变化、按ID查询延迟与顺序扫描速度
+
+用法：
+    python -m benchmarks.archive
+    python -m benchmarks.archive --samples 200000 --lookups 20000
+"""
+
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+from core.archive import SampleArchive
+
+
+def rss_mib():
+    """当前进程常驻内存（MiB）"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _sample(index):
+    """构建一个已完成样本"""
+    return {
+        'sample_id': f"ARCH{index:09d}",
+        'tests': ['TEST001', 'TEST002', 'TEST003'],
+        'patient_info': {'patient_id': f"P{index}", 'last_name': 'Doe', 'first_name': 'Jane'},
+        'received_time': 1.7e9 + index,
+        'status': 'completed',
+        'results': {
+            'TEST001': {'value': 5.5, 'unit': 'mmol/L', 'flags': ''},
+            'TEST002': {'value': 42, 'unit': 'mg/dL', 'flags': ''},
+            'TEST003': {'value': 7.25, 'unit': 'mmol/L', 'flags': 'H'},
+        },
+        'completed_time': 1.7e9 + index + 1800,
+    }
+
+
+def _percentile(values, q):
+    """最近秩百分位"""
+    return values[min(len(values) - 1, max(0, int(len(values) * q + 0.5) - 1))]
+
+
+def run(samples, lookups, directory=None):
+    """执行基准并打印结果
+
+    Args:
+        samples: 归档样本数
+        lookups: 随机查询次数
+        directory: 归档目录（默认临时目录，结束后删除）
+    """
+    root = directory or tempfile.mkdtemp(prefix='atellica-archive-')
+    try:
+        archive = SampleArchive(root)
+        base_rss = rss_mib()
+        print(f"{'archived':>10}{'seconds':>10}{'samples/s':>12}{'RSS MiB':>10}")
+        step = max(1, samples // 5)
+        start = time.perf_counter()
+        for index in range(samples):
+            archive.add(_sample(index))
+            if (index + 1) % step == 0:
+                elapsed = time.perf_counter() - start
+                print(f"{index + 1:>10}{elapsed:>10.2f}{(index + 1) / elapsed:>12.0f}{rss_mib():>10.1f}")
+        archive.flush()
+        print(f"RSS growth while archiving: {rss_mib() - base_rss:.1f} MiB")
+
+        keys = [f"ARCH{random.randrange(samples):09d}" for _ in range(lookups)]
+        latencies = []
+        for key in keys:
+            begin = time.perf_counter()
+            archive.get(key)
+            latencies.append(time.perf_counter() - begin)
+        latencies.sort()
+        print(f"get_sample lookups: p50 {_percentile(latencies, 0.5) * 1e6:.1f}us, "
+              f"p99 {_percentile(latencies, 0.99) * 1e6:.1f}us, max {latencies[-1] * 1e6:.1f}us")
+
+        start = time.perf_counter()
+        scanned = sum(1 for _ in archive.scan())
+        elapsed = time.perf_counter() - start
+        print(f"Sequential scan: {scanned} samples in {elapsed:.2f}s ({scanned / elapsed:.0f} samples/s)")
+        archive.close()
+    finally:
+        if directory is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.archive',
+                                     description='Sample archive memory, lookup latency and scan throughput')
+    parser.add_argument('--samples', type=int, default=1000000, help='Completed samples to archive')
+    parser.add_argument('--lookups', type=int, default=100000, help='Random lookups by sample ID')
+    parser.add_argument('--dir', type=str, default=None, help='Keep the archive in this directory')
+    args = parser.parse_args(argv)
+    run(args.samples, args.lookups, args.dir)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+载架队列基准：数千个在队载架时 Add/Skip/Clear Queue 的耗时，与按列表线性查找跳过的实现对比
+
+用法：
+    python -m benchmarks.carriers
+    python -m benchmarks.carriers --carriers 1000 5000 20000 --skips 0.5
+"""
+
+import argparse
+import random
+import time
+
+from core.carriers import OCCUPANCY_CAPPED, Carrier, CarrierQueue
+
+
+class ListQueue:
+    """对照实现：载架存于列表，跳过时线性查找并删除"""
+
+    def __init__(self):
+        self.entries = []
+
+    def add(self, carrier):
+        self.entries.append(carrier)
+
+    def skip(self, occupancy, sample_id):
+        for index, carrier in enumerate(self.entries):
+            if carrier.occupancy == occupancy and carrier.sample_id == sample_id:
+                return self.entries.pop(index)
+        return None
+
+    def clear(self):
+        cleared = len(self.entries)
+        self.entries = []
+        return cleared
+
+
+def _measure(queue_class, carriers, skip_ids):
+    """依次加入全部载架、按ID跳过一部分、清空队列
+
+    Returns:
+        tuple: (加入秒数, 跳过秒数, 清空秒数)
+    """
+    queue = queue_class()
+    start = time.perf_counter()
+    for carrier in carriers:
+        queue.add(carrier)
+    added = time.perf_counter()
+    for sample_id in skip_ids:
+        queue.skip(OCCUPANCY_CAPPED, sample_id)
+    skipped = time.perf_counter()
+    queue.clear()
+    cleared = time.perf_counter()
+    return added - start, skipped - added, cleared - skipped
+
+
+def run(sizes, skip_fraction, seed=1):
+    """执行基准并打印结果
+
+    Args:
+        sizes: 在队载架数列表
+        skip_fraction: 按随机顺序跳过的载架比例
+        seed: 随机种子
+    """
+    rng = random.Random(seed)
+    print(f"{'carriers':>10}{'queue':>8}{'add us/op':>12}{'skip us/op':>12}{'clear ms':>10}")
+    for size in sizes:
+        sample_ids = [f"TUBE{index:07d}" for index in range(size)]
+        skip_ids = rng.sample(sample_ids, int(size * skip_fraction))
+        for name, queue_class in (('indexed', CarrierQueue), ('list', ListQueue)):
+            carriers = [Carrier(OCCUPANCY_CAPPED, sample_id, added_time=0.0) for sample_id in sample_ids]
+            add, skip, clear = _measure(queue_class, carriers, skip_ids)
+            print(f"{size:>10}{name:>8}{add / size * 1e6:>12.2f}"
+                  f"{skip / max(1, len(skip_ids)) * 1e6:>12.2f}{clear * 1e3:>10.2f}")
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.carriers',
+                                     description='Carrier queue add/skip/clear cost with thousands of queued carriers')
+    parser.add_argument('--carriers', type=int, nargs='+', default=[1000, 5000, 20000],
+                        help='Queued carriers per run')
+    parser.add_argument('--skips', type=float, default=0.5, help='Fraction of carriers skipped by sample ID')
+    args = parser.parse_args(argv)
+    run(args.carriers, args.skips)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
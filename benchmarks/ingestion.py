@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+样本接收并发基准：对比不同分片数下，样本接收吞吐随LIS连接数的变化
+
+用法：
+    python -m benchmarks.ingestion
+    python -m benchmarks.ingestion --shards 1 16 --connections 1 2 4 8 16 --samples 2000
+    python -m benchmarks.ingestion --mode direct
+"""
+
+import argparse
+import socket
+import threading
+import time
+
+from config import ConfigManager
+from core import AtellicaCore
+from lis import LISServer
+
+
+class QuietLogger:
+    """基准测试用日志器：丢弃所有日志，避免磁盘IO掩盖锁竞争"""
+
+    def _discard(self, message, *args, **kwargs):
+        pass
+
+    debug = info = warning = error = critical = log_las = log_lis = _discard
+
+
+def _build_order(sample_id):
+    """构建一条ASTM订单消息"""
+    records = ['H|\\^&|||LIS', 'P|1', f"O|{sample_id}|TEST001~TEST002", 'L|1|N']
+    return ('\r'.join(records) + '\r').encode('ascii')
+
+
+def _make_core(config_file, shards):
+    """创建使用指定分片数的核心实例"""
+    config_manager = ConfigManager(config_file)
+    config_manager.config['core']['sample_shards'] = shards
+    config_manager.config['core']['lock_instrumentation'] = False
+    config_manager.config['lis']['port'] = 0
+    config_manager.config['lis']['result_delay'] = 24 * 3600
+    config_manager.config['lis']['max_connections'] = 1024
+    logger = QuietLogger()
+    return config_manager, logger, AtellicaCore(config_manager, logger)
+
+
+def _run_clients(port, connections, per_connection, run_id):
+    """启动多个LIS客户端并发下单，每条订单等待ACK后再发下一条"""
+    barrier = threading.Barrier(connections + 1)
+    errors = []
+
+    def client(index):
+        try:
+            with socket.create_connection(('127.0.0.1', port)) as conn:
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                barrier.wait()
+                for i in range(per_connection):
+                    conn.sendall(_build_order(f"B{run_id}-{index}-{i}"))
+                    if conn.recv(1) != b'\x06':
+                        raise RuntimeError('missing ACK')
+        except Exception as e:
+            errors.append(e)
+            barrier.abort()
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(connections)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    return elapsed
+
+
+def _run_direct(core, connections, per_connection, run_id):
+    """不经网络，多个线程直接调用 receive_sample"""
+    barrier = threading.Barrier(connections + 1)
+
+    def worker(index):
+        barrier.wait()
+        for i in range(per_connection):
+            core.receive_sample(f"D{run_id}-{index}-{i}", ['TEST001', 'TEST002'], {})
+            core.get_sample_info(f"D{run_id}-{index}-{i // 2}")
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(connections)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def run(config_file, shard_counts, connection_counts, samples, mode):
+    """执行基准并打印结果表
+
+    Args:
+        config_file: 配置文件路径
+        shard_counts: 待比较的分片数列表
+        connection_counts: 并发连接数列表
+        samples: 每轮总样本数
+        mode: 'socket'（经LIS服务器）或 'direct'（直接调用核心）
+
+    Returns:
+        list: [(分片数, 连接数, 样本数, 秒, 样本/秒)]
+    """
+    rows = []
+    print(f"{'shards':>8}{'conns':>8}{'samples':>10}{'seconds':>10}{'samples/s':>12}{'scaling':>10}")
+    for shards in shard_counts:
+        config_manager, logger, core = _make_core(config_file, shards)
+        server = None
+        if mode == 'socket':
+            server = LISServer(config_manager, logger, core)
+            server.start()
+            port = server.server_socket.getsockname()[1]
+        baseline = None
+        try:
+            for connections in connection_counts:
+                per_connection = max(1, samples // connections)
+                run_id = f"{shards}x{connections}"
+                if mode == 'socket':
+                    elapsed = _run_clients(port, connections, per_connection, run_id)
+                else:
+                    elapsed = _run_direct(core, connections, per_connection, run_id)
+                total = per_connection * connections
+                rate = total / elapsed if elapsed > 0 else float('inf')
+                baseline = baseline or rate
+                rows.append((shards, connections, total, elapsed, rate))
+                print(f"{shards:>8}{connections:>8}{total:>10}{elapsed:>10.3f}{rate:>12.0f}{rate / baseline:>9.2f}x")
+        finally:
+            if server:
+                server.stop()
+    return rows
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.ingestion',
+                                     description='Sample ingestion throughput vs. LIS connections and store shards')
+    parser.add_argument('--config', type=str, default='config.json', help='Configuration file path')
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 16], help='Shard counts to compare')
+    parser.add_argument('--connections', type=int, nargs='+', default=[1, 2, 4, 8, 16],
+                        help='Concurrent LIS connections')
+    parser.add_argument('--samples', type=int, default=4000, help='Samples per run')
+    parser.add_argument('--mode', choices=['socket', 'direct'], default='socket',
+                        help='socket: orders through LISServer; direct: threads call receive_sample')
+    args = parser.parse_args(argv)
+    run(args.config, args.shards, args.connections, args.samples, args.mode)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
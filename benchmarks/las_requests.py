@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LAS请求往返基准：逐条发送 Instrument Health 请求，对比写缓冲合并与 TCP_NODELAY 开关下
+每个请求的往返延迟与仪器一侧的写系统调用数（每个请求产生 ACK 与响应两帧）
+
+用法：
+    python -m benchmarks.las_requests
+    python -m benchmarks.las_requests --requests 5000
+"""
+
+import argparse
+import socket
+import time
+
+from config import ConfigManager
+from core import AtellicaCore
+from las import LASServer
+from las.client import LASClient
+
+
+class QuietLogger:
+    """基准测试用日志器：丢弃所有日志，避免磁盘IO掩盖发送耗时"""
+
+    def _discard(self, message, *args, **kwargs):
+        pass
+
+    debug = info = warning = error = critical = log_las = log_lis = _discard
+
+
+# (写缓冲合并, TCP_NODELAY)
+MODES = ((False, False), (False, True), (True, False), (True, True))
+
+
+def _measure(config_file, write_batching, tcp_nodelay, requests):
+    """握手后逐条发送 Health 请求，每条等到响应后再发下一条
+
+    Returns:
+        tuple: (排序后的往返秒数列表, 写系统调用数)
+    """
+    config_manager = ConfigManager(config_file)
+    config_manager.config['core']['lock_instrumentation'] = False
+    config_manager.config['las'].update({'port': 0, 'write_batching': write_batching, 'tcp_nodelay': tcp_nodelay,
+                                         'keep_alive_interval': 3600, 'inactivity_timeout': 3600,
+                                         'init_timeout': 3600})
+    logger = QuietLogger()
+    core = AtellicaCore(config_manager, logger)
+    server = LASServer(config_manager, logger, core)
+    server.start()
+    durations = []
+    try:
+        conn = socket.create_connection(('127.0.0.1', server.server_socket.getsockname()[1]), timeout=30)
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = LASClient(conn)
+        client.handshake()
+        syscalls = server.metric_write_syscalls.value()
+        for _ in range(requests):
+            start = time.perf_counter()
+            return_code, response = client.request(server.MSG_TYPE_INSTRUMENT_HEALTH_REQUEST)
+            durations.append(time.perf_counter() - start)
+            if return_code != 0x00 or response is None:
+                raise RuntimeError(f"health request failed: return code {return_code}")
+        syscalls = server.metric_write_syscalls.value() - syscalls
+        client.close()
+    finally:
+        server.stop()
+        core.close()
+    return sorted(durations), syscalls
+
+
+def run(config_file, requests):
+    """执行基准并打印结果表
+
+    Args:
+        config_file: 配置文件路径
+        requests: 每种模式的请求数
+
+    Returns:
+        list: [(写缓冲合并, TCP_NODELAY, 平均秒, p50秒, p99秒, 每请求写系统调用数)]
+    """
+    rows = []
+    print(f"{'batching':>9}{'nodelay':>9}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}{'writes/req':>12}")
+    for write_batching, tcp_nodelay in MODES:
+        durations, syscalls = _measure(config_file, write_batching, tcp_nodelay, requests)
+        mean = sum(durations) / len(durations)
+        p50 = durations[len(durations) // 2]
+        p99 = durations[min(len(durations) - 1, int(len(durations) * 0.99))]
+        rows.append((write_batching, tcp_nodelay, mean, p50, p99, syscalls / requests))
+        print(f"{str(write_batching):>9}{str(tcp_nodelay):>9}{mean * 1e6:>10.0f}{p50 * 1e6:>10.0f}"
+              f"{p99 * 1e6:>10.0f}{syscalls / requests:>12.2f}")
+    return rows
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.las_requests',
+                                     description='LAS request round trip with and without batched writes')
+    parser.add_argument('--config', type=str, default='config.json', help='Configuration file path')
+    parser.add_argument('--requests', type=int, default=2000, help='Health requests per mode')
+    args = parser.parse_args(argv)
+    run(args.config, args.requests)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LAS重连风暴基准：数百个LAS客户端同时断开并重新连接、握手、初始化，
+统计重新完成初始化的耗时分布与风暴期间的线程数、文件描述符与常驻内存
+
+客户端与服务器在同一进程中运行，线程数与文件描述符包含客户端自身（每个客户端一个线程、一个 socket）。
+
+用法：
+    python -m benchmarks.reconnect_storm
+    python -m benchmarks.reconnect_storm --clients 100 300 --rounds 3 --backlog 128 1024
+"""
+
+import argparse
+import os
+import resource
+import socket
+import threading
+import time
+
+from config import ConfigManager
+from core import AtellicaCore
+from las import LASServer
+from las.client import LASClient
+
+
+class QuietLogger:
+    """基准测试用日志器：丢弃所有日志，避免磁盘IO掩盖连接处理的耗时"""
+
+    def _discard(self, message, *args, **kwargs):
+        pass
+
+    debug = info = warning = error = critical = log_las = log_lis = _discard
+
+
+def _make_server(config_file, backlog):
+    """创建监听随机端口的LAS服务器"""
+    config_manager = ConfigManager(config_file)
+    config_manager.config['core']['lock_instrumentation'] = False
+    config_manager.config['las'].update({'port': 0, 'listen_backlog': backlog, 'keep_alive_interval': 3600,
+                                         'inactivity_timeout': 3600, 'init_timeout': 120})
+    logger = QuietLogger()
+    core = AtellicaCore(config_manager, logger)
+    server = LASServer(config_manager, logger, core)
+    server.start()
+    return core, server
+
+
+def _open_fds():
+    """当前进程打开的文件描述符数（没有 /proc 时返回 0）"""
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return 0
+
+
+def _percentile(values, fraction):
+    """已排序列表的百分位数"""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class _Sampler:
+    """后台采样线程数与文件描述符的峰值"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.threads = 0
+        self.fds = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.threads = max(self.threads, threading.active_count())
+            self.fds = max(self.fds, _open_fds())
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+
+def _storm(port, clients, interface_positions, sockets):
+    """全部客户端同时连接、握手并完成初始化
+
+    Args:
+        port: LAS服务器端口
+        clients: 客户端数
+        interface_positions: 接口位置数（每个位置一次 Transfer Status 请求）
+        sockets: 上一轮的连接，开始时同时关闭
+
+    Returns:
+        tuple: (每个客户端从连接到收到 Initialization Sequence Complete 的秒数列表, 本轮的连接列表, 错误列表)
+    """
+    barrier = threading.Barrier(clients + 1)
+    durations = []
+    connected = []
+    errors = []
+    lock = threading.Lock()
+
+    def client(index):
+        try:
+            barrier.wait()
+            if index < len(sockets):
+                sockets[index].close()
+            start = time.perf_counter()
+            conn = socket.create_connection(('127.0.0.1', port), timeout=60)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            las_client = LASClient(conn)
+            las_client.handshake(serial=f"LAS{index}".encode('ascii'))
+            las_client.initialize(interface_positions)
+            elapsed = time.perf_counter() - start
+            with lock:
+                durations.append(elapsed)
+                connected.append(las_client)
+        except Exception as e:
+            with lock:
+                errors.append(e)
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    return sorted(durations), connected, errors
+
+
+def run(config_file, client_counts, rounds, backlogs):
+    """执行基准并打印结果表
+
+    Args:
+        config_file: 配置文件路径
+        client_counts: 同时重连的客户端数列表
+        rounds: 每种配置的重连轮数（之前的首次连接不计入统计）
+        backlogs: 待比较的监听队列长度列表
+
+    Returns:
+        list: [(监听队列长度, 客户端数, p50秒, p99秒, 最大秒, 峰值线程数, 峰值文件描述符, maxrss KB, 失败数)]
+    """
+    rows = []
+    print(f"{'backlog':>8}{'clients':>9}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+          f"{'threads':>9}{'fds':>7}{'rss MB':>8}{'errors':>8}")
+    for backlog in backlogs:
+        for clients in client_counts:
+            core, server = _make_server(config_file, backlog)
+            port = server.server_socket.getsockname()[1]
+            try:
+                # 首次连接只建立基线，之后每轮全部连接同时断开并重连
+                _, connected, errors = _storm(port, clients, core.interface_positions, [])
+                durations = []
+                with _Sampler() as sampler:
+                    for _ in range(rounds):
+                        sockets = [las_client.sock for las_client in connected]
+                        round_durations, connected, round_errors = _storm(port, clients, core.interface_positions,
+                                                                          sockets)
+                        durations.extend(round_durations)
+                        errors.extend(round_errors)
+                for las_client in connected:
+                    las_client.close()
+            finally:
+                server.stop()
+                core.close()
+            durations.sort()
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            if durations:
+                p50, p99, worst = _percentile(durations, 0.5), _percentile(durations, 0.99), durations[-1]
+            else:
+                p50 = p99 = worst = float('nan')
+            rows.append((backlog, clients, p50, p99, worst, sampler.threads, sampler.fds, maxrss, len(errors)))
+            print(f"{backlog:>8}{clients:>9}{p50 * 1000:>9.1f}{p99 * 1000:>9.1f}{worst * 1000:>9.1f}"
+                  f"{sampler.threads:>9}{sampler.fds:>7}{maxrss / 1024:>8.1f}{len(errors):>8}")
+    return rows
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.reconnect_storm',
+                                     description='Time to re-initialize when hundreds of LAS clients reconnect at once')
+    parser.add_argument('--config', type=str, default='config.json', help='Configuration file path')
+    parser.add_argument('--clients', type=int, nargs='+', default=[100, 300], help='Clients reconnecting at once')
+    parser.add_argument('--rounds', type=int, default=3, help='Reconnect storms per configuration')
+    parser.add_argument('--backlog', type=int, nargs='+', default=[128], help='Listen backlogs to compare')
+    args = parser.parse_args(argv)
+    run(args.config, args.clients, args.rounds, args.backlog)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
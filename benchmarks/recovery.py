@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+状态恢复基准：生成指定条数的预写日志，测量重放耗时、压缩快照后的启动耗时，以及两种刷盘策略下的写入吞吐
+
+用法：
+    python -m benchmarks.recovery
+    python -m benchmarks.recovery --entries 200000 --writers 8 --writes 20000
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from core.journal import (
+    FSYNC_BATCH,
+    FSYNC_INTERVAL,
+    OP_HEALTH,
+    OP_SAMPLE,
+    StateJournal,
+    encode_entry,
+    segment_path,
+)
+from core.sample_store import ShardedSampleStore
+from metrics import MetricsRegistry
+
+from .ingestion import QuietLogger
+
+
+def _sample(sample_id, received_time, results=None):
+    """构建样本记录（与核心登记的结构相同）"""
+    return {
+        'sample_id': sample_id,
+        'tests': ['TEST001', 'TEST002'],
+        'patient_info': {},
+        'received_time': received_time,
+        'status': 'completed' if results else 'received',
+        'results': results,
+        'completed_time': received_time + 1800 if results else None,
+    }
+
+
+def write_log(data_dir, entries):
+    """直接生成一个包含 entries 条记录的日志分段：每个样本一条接收、一条完成，每100条一次健康状态
+
+    Args:
+        data_dir: 数据目录
+        entries: 记录条数
+
+    Returns:
+        int: 日志字节数
+    """
+    results = {'TEST001': {'value': 5.5, 'unit': 'mmol/L', 'flags': ''},
+               'TEST002': {'value': 42, 'unit': 'mg/dL', 'flags': ''}}
+    health = {'on_board_tube_count': 0, 'completed_tube_count': 0}
+    now = time.time()
+    path = segment_path(data_dir, 1)
+    with open(path, 'wb') as f:
+        chunk = []
+        for i in range(entries):
+            sample_index = i // 2
+            if i % 100 == 99:
+                health['completed_tube_count'] = sample_index
+                chunk.append(encode_entry(OP_HEALTH, health))
+            elif i % 2 == 0:
+                chunk.append(encode_entry(OP_SAMPLE, _sample(f"R{sample_index}", now)))
+            else:
+                chunk.append(encode_entry(OP_SAMPLE, _sample(f"R{sample_index}", now, results)))
+            if len(chunk) >= 10000:
+                f.write(b''.join(chunk))
+                chunk = []
+        f.write(b''.join(chunk))
+    return os.path.getsize(path)
+
+
+def measure_recovery(data_dir, shards):
+    """恢复状态并载入样本存储
+
+    Returns:
+        tuple: (恢复信息, 重放秒数, 载入秒数)
+    """
+    journal = StateJournal(data_dir, MetricsRegistry(), QuietLogger())
+    start = time.perf_counter()
+    state = journal.recover()
+    replay = time.perf_counter() - start
+    start = time.perf_counter()
+    ShardedSampleStore(shards).load(state['samples'].values(), 1800)
+    load = time.perf_counter() - start
+    return journal, state, replay, load
+
+
+def measure_writes(data_dir, fsync, writers, writes):
+    """多个线程并发写日志，每次写入后按核心的方式提交
+
+    Returns:
+        tuple: (秒数, 平均每批条数)
+    """
+    registry = MetricsRegistry()
+    journal = StateJournal(data_dir, registry, QuietLogger(), fsync, fsync_interval=0.05, snapshot_every=10 ** 9)
+    journal.recover()
+    journal.start(lambda: None)
+    per_writer = max(1, writes // writers)
+    barrier = threading.Barrier(writers + 1)
+    record = _sample('W', time.time())
+
+    def writer():
+        barrier.wait()
+        for _ in range(per_writer):
+            journal.append(OP_SAMPLE, record)
+            journal.commit()
+
+    threads = [threading.Thread(target=writer, daemon=True) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    journal.close(compact=False)
+    elapsed = time.perf_counter() - start
+    _, total, count = journal.metric_batch_entries.labels().snapshot()
+    return per_writer * writers, elapsed, total / count if count else 0.0
+
+
+def run(entries, shards, writers, writes, data_dir=None):
+    """执行基准并打印结果
+
+    Args:
+        entries: 恢复基准的日志条数
+        shards: 样本存储分片数
+        writers: 写入基准的并发线程数
+        writes: 写入基准的总条数
+        data_dir: 数据目录（默认临时目录，结束后删除）
+    """
+    root = data_dir or tempfile.mkdtemp(prefix='atellica-recovery-')
+    try:
+        log_dir = os.path.join(root, 'log')
+        os.makedirs(log_dir, exist_ok=True)
+        start = time.perf_counter()
+        size = write_log(log_dir, entries)
+        print(f"Generated {entries} entries ({size / 1024 / 1024:.1f} MiB) in {time.perf_counter() - start:.2f}s")
+
+        print(f"{'phase':<28}{'entries':>10}{'samples':>10}{'seconds':>10}{'entries/s':>12}")
+        journal, state, replay, load = measure_recovery(log_dir, shards)
+        samples = len(state['samples'])
+        print(f"{'replay log':<28}{entries:>10}{samples:>10}{replay:>10.2f}{entries / replay:>12.0f}")
+        print(f"{'load sample store':<28}{'':>10}{samples:>10}{load:>10.2f}{'':>12}")
+
+        # 压缩：写快照后删除日志，再次启动只需加载快照
+        start = time.perf_counter()
+        journal.write_snapshot(state, journal.segment)
+        for name in os.listdir(log_dir):
+            if name.endswith('.log'):
+                os.remove(os.path.join(log_dir, name))
+        compact = time.perf_counter() - start
+        print(f"{'write snapshot':<28}{'':>10}{samples:>10}{compact:>10.2f}{'':>12}")
+        _, state, replay, load = measure_recovery(log_dir, shards)
+        print(f"{'restart from snapshot':<28}{0:>10}{len(state['samples']):>10}{replay + load:>10.2f}{'':>12}")
+
+        print()
+        print(f"{'fsync':<12}{'writers':>8}{'writes':>10}{'seconds':>10}{'writes/s':>12}{'avg batch':>11}")
+        for fsync in (FSYNC_BATCH, FSYNC_INTERVAL):
+            write_dir = os.path.join(root, f"write-{fsync}")
+            total, elapsed, batch = measure_writes(write_dir, fsync, writers, writes)
+            print(f"{fsync:<12}{writers:>8}{total:>10}{elapsed:>10.2f}{total / elapsed:>12.0f}{batch:>11.1f}")
+    finally:
+        if data_dir is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.recovery',
+                                     description='Write-ahead log recovery time and write throughput')
+    parser.add_argument('--entries', type=int, default=1000000, help='Log entries to replay')
+    parser.add_argument('--shards', type=int, default=16, help='Sample store shards')
+    parser.add_argument('--writers', type=int, default=8, help='Concurrent writer threads')
+    parser.add_argument('--writes', type=int, default=20000, help='Total entries written per fsync policy')
+    parser.add_argument('--data-dir', type=str, default=None, help='Keep benchmark files in this directory')
+    args = parser.parse_args(argv)
+    run(args.entries, args.shards, args.writers, args.writes, args.data_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
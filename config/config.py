@@ -34,7 +34,13 @@ class ConfigManager:
                 'file_output': True,
                 'log_dir': 'logs',
                 'max_bytes': 10*1024*1024,  # 10MB
-                'backup_count': 5
+                'backup_count': 5,
+                'index_enabled': True,
+                'index_bucket_seconds': 60,
+                'archive_enabled': True,
+                'compression': 'auto',  # auto: 有zstandard时用zstd，否则gzip
+                'retention_max_bytes': 512*1024*1024,  # 512MB
+                'retention_max_age_days': 30
             },
             'las': {
                 'host': '0.0.0.0',
@@ -45,8 +51,18 @@ class ConfigManager:
                 'software_version': '0x0100',
                 'instrument_id': '0xFF',
                 'instrument_serial': 'ATELLICA',
-                'keep_alive_interval': 30,  # 秒
-                'ack_timeout': 20,  # 秒
+                'keep_alive_interval': 30,  # 秒，发送方向空闲多久后发送 Keep Alive
+                'inactivity_timeout': 60,  # 秒，接收方向空闲多久后认为对方失联并重置连接
+                'ack_timeout': 1,  # 秒，未收到ACK/NACK时重发
+                'max_retries': 5,  # ACK超时重发次数上限，超过后重置连接
+                'max_nacks': 3,  # 同一消息收到 Message Not Understood 的次数上限，达到后重置连接
+                'init_timeout': 30,  # 秒，握手确认后多久内未完成初始化则重置连接
+                'listen_wait': 15,  # 秒，重置连接后等待多久再接受新连接
+                'listen_backlog': 128,  # 监听队列长度，重连风暴时暂存未接受的连接
+                'health_push_window': 0.2,  # 秒，状态变化后多久主动推送 Instrument Health，窗口内的变化合并为一条
+                'write_batching': True,  # 一次接收的消息产生的所有帧合并为一次 sendmsg 写出
+                'tcp_nodelay': True,  # 接受的连接关闭 Nagle 算法
+                'send_timeout': 10,  # 秒，写缓冲持续写不出去（对方不读取）多久后重置该连接
                 'response_timeout': 20  # 秒
             },
             'lis': {
@@ -55,6 +71,68 @@ class ConfigManager:
                 'result_delay': 1800,  # 30分钟，单位秒
                 'max_connections': 10
             },
+            'metrics': {
+                'enabled': True,
+                'host': '127.0.0.1',  # 仅本机访问
+                'port': 9108
+            },
+            'tracing': {
+                'enabled': True,
+                'capacity': 100000,  # 环形缓冲区事件数
+                'export_path': 'logs/sample_trace.json'  # 退出时导出Chrome trace
+            },
+            'profiling': {
+                'enabled': True,
+                'host': '127.0.0.1',  # 控制端口仅本机访问
+                'port': 9109,
+                'signal': 'SIGUSR1',  # 收到该信号时执行一次完整采集
+                'default_seconds': 10,
+                'sample_interval': 0.005,
+                'output_dir': 'logs/profiles'
+            },
+            'persistence': {
+                'enabled': False,
+                'data_dir': 'data/state',
+                'fsync': 'batch',  # batch: 每批写入后fsync并等待落盘；interval: 按间隔fsync
+                'fsync_interval': 1.0,  # 秒
+                'snapshot_every': 100000  # 每写入多少条日志生成一次压缩快照
+            },
+            'assays': {
+                # 检测项目目录：结果分布（normal: mean/sd，lognormal: median/sigma，uniform: low/high）、
+                # 小数位、参考范围与危急值（超出时标记 L/H 与 LL/HH）、运行时间（秒）；
+                # 默认分布以参考范围为中心，约 95% 的结果落在参考范围内
+                'TEST001': {
+                    'name': 'Glucose', 'unit': 'mmol/L', 'decimals': 1,
+                    'distribution': {'type': 'normal', 'mean': 5.0, 'sd': 0.55},
+                    'reference_range': [3.9, 6.1], 'critical_range': [2.2, 22.2], 'run_time': 600
+                },
+                'TEST002': {
+                    'name': 'Potassium', 'unit': 'mmol/L', 'decimals': 1,
+                    'distribution': {'type': 'normal', 'mean': 4.3, 'sd': 0.4},
+                    'reference_range': [3.5, 5.1], 'critical_range': [2.5, 6.5], 'run_time': 900
+                },
+                'TEST003': {
+                    'name': 'TSH', 'unit': 'mIU/L', 'decimals': 2,
+                    'distribution': {'type': 'lognormal', 'median': 1.26, 'sigma': 0.58},
+                    'reference_range': [0.4, 4.0], 'critical_range': None, 'run_time': 1080
+                },
+                'TEST004': {
+                    'name': 'Troponin I', 'unit': 'ng/L', 'decimals': 0,
+                    'distribution': {'type': 'lognormal', 'median': 8, 'sigma': 0.9},
+                    'reference_range': [None, 47], 'critical_range': [None, 1000], 'run_time': 1800
+                }
+            },
+            'capacity': {
+                'enabled': False,  # 启用后健康状态中的积压、获取延迟、在线试管数与处理状态由样本负载推算
+                'modules': [
+                    {'id': 'MODULE001', 'tests_per_hour': 440}  # 可选 assays：该模块能执行的检测项目
+                ],
+                'onboard_capacity': 300,  # 在线试管上限，达到后拒收样本并上报Red
+                'default_run_time': 600,  # 吸样后到出结果的秒数（检测项目目录未配置 run_time 的项目）
+                'yellow_onboard_ratio': 0.8,  # 在线试管达到上限的该比例时上报Yellow
+                'yellow_delay': 900,  # 样本获取延迟（秒）达到该值时上报Yellow
+                'red_delay': 1800  # 样本获取延迟（秒）达到该值时上报Red
+            },
             'core': {
                 'automation_interface_status': 1,  # 1: Green, 3: Red
                 'instrument_process_status': 1,  # 1: Green, 2: Yellow, 3: Red
@@ -65,10 +143,22 @@ class ConfigManager:
                 'processing_backlog': 0,
                 'sample_acquisition_delay': 0,
                 'on_board_tube_count': 0,
-                'completed_tube_count': 0
+                'completed_tube_count': 0,
+                'transfer_time': 5.0,  # Load_Unload 取放耗时（秒），机械臂离开轨道后才发送响应
+                'sample_shards': 16,  # 样本存储分片数
+                'event_queue_size': 1000,  # 事件订阅者默认队列容量
+                'changelog_capacity': 10000,  # 样本变更日志保留条数
+                'turnaround_window': 10000,  # 每个优先级保留的最近周转时间数（用于百分位统计）
+                'result_seed': None,  # 结果种子：设置后每个样本的结果由种子和样本ID决定，可复现
+                'archive_enabled': False,  # 已完成样本转入磁盘归档，长时间运行时内存不随样本数增长
+                'archive_dir': 'data/archive',
+                'archive_after': 300,  # 样本完成多少秒后转入归档
+                'lock_instrumentation': False,  # 统计核心锁等待/持有时间（有额外开销）
+                'lock_order_check': True  # 启用锁统计时同时检查加锁顺序
             },
             'test_inventory': {
                 'threshold': 10,
+                'report_step': 10,  # 余量每变化 report_step 个测试上报一次
                 'tests': [
                     {'name': 'TEST001', 'count': 100, 'status': 1},  # 1: Green, 2: Yellow, 3: Red
                     {'name': 'TEST002', 'count': 50, 'status': 1},
@@ -77,17 +167,18 @@ class ConfigManager:
                 ]
             },
             'consumable_inventory': {
+                'threshold': 100,  # 带 count 的耗材余量低于阈值为 Yellow，用完为 Red
                 'modules': [
                     {
                         'id': 'MODULE001',
                         'consumables': [
                             {'id': 1, 'status': 1},  # CH Cleaner
                             {'id': 2, 'status': 1},  # CH Conditioner
-                            {'id': 3, 'status': 1},  # CH Wash
+                            {'id': 3, 'status': 1, 'count': 2000, 'per_test': 1},  # CH Wash
                             {'id': 4, 'status': 1},  # CH Diluent
                             {'id': 5, 'status': 2},  # Pretreatment
-                            {'id': 25, 'status': 1},  # Tips
-                            {'id': 26, 'status': 1},  # Cuvettes
+                            {'id': 25, 'status': 1, 'count': 5000, 'per_test': 1, 'threshold': 500},  # Tips
+                            {'id': 26, 'status': 1, 'count': 5000, 'per_test': 1, 'threshold': 500},  # Cuvettes
                             {'id': 27, 'status': 1}   # Water
                         ]
                     }
@@ -211,6 +302,54 @@ class ConfigManager:
         """
         return self.config.get('lis', {})
     
+    def get_metrics_config(self):
+        """获取指标服务配置
+        
+        Returns:
+            dict: 指标服务配置
+        """
+        return self.config.get('metrics', {})
+    
+    def get_tracing_config(self):
+        """获取样本追踪配置
+        
+        Returns:
+            dict: 样本追踪配置
+        """
+        return self.config.get('tracing', {})
+    
+    def get_profiling_config(self):
+        """获取运行时剖析配置
+        
+        Returns:
+            dict: 运行时剖析配置
+        """
+        return self.config.get('profiling', {})
+    
+    def get_persistence_config(self):
+        """获取状态持久化配置
+        
+        Returns:
+            dict: 状态持久化配置
+        """
+        return self.config.get('persistence', {})
+    
+    def get_assay_config(self):
+        """获取检测项目目录配置
+        
+        Returns:
+            dict: 检测项目代码 -> 定义
+        """
+        return self.config.get('assays', {})
+    
+    def get_capacity_config(self):
+        """获取处理能力模型配置
+        
+        Returns:
+            dict: 处理能力模型配置
+        """
+        return self.config.get('capacity', {})
+    
     def get_core_config(self):
         """获取核心配置
         
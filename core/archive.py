@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Archive模块 - 已完成样本的内存映射归档（定长记录 + 溢出区 + 磁盘哈希索引）
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+
+from .capacity import PRIORITY_ROUTINE
+from .snapshots import freeze
+
+
+# 定长记录：样本ID(前32字节)、ID长度、状态、测试数、接收时间、完成时间、溢出区偏移、溢出区长度
+RECORD = struct.Struct('<32sBBHddQI')
+# 文件头：魔数、版本、记录数
+RECORDS_HEADER = struct.Struct('<4sHxxQ')
+RECORDS_MAGIC = b'ATSA'
+# 索引文件头：魔数、版本、槽位数、已用槽位数；槽位：ID哈希（0表示空槽）、记录号
+INDEX_HEADER = struct.Struct('<4sHxxQQ')
+INDEX_MAGIC = b'ATSI'
+INDEX_SLOT = struct.Struct('<QQ')
+VERSION = 1
+
+ID_FIELD_SIZE = 32
+STATUS_CODES = {'received': 1, 'completed': 2}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+GROW_RECORDS = 65536          # 记录文件每次扩展的记录数
+INITIAL_INDEX_SLOTS = 131072  # 初始索引槽位数（2的幂）
+MAX_LOAD_FACTOR = 0.7         # 索引装载率超过该值时加倍重建
+
+RECORDS_FILE = 'samples.dat'
+OVERFLOW_FILE = 'samples.ovf'
+INDEX_FILE = 'samples.idx'
+
+
+def _id_hash(key):
+    """样本ID的64位哈希（非0，0表示空槽）"""
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') or 1
+
+
+def _map(fd, size):
+    """把文件扩展到 size 字节并整体映射"""
+    if os.fstat(fd).st_size < size:
+        os.ftruncate(fd, size)
+    return mmap.mmap(fd, size)
+
+
+class SampleArchive:
+    """已完成样本归档
+
+    样本的定长字段写入内存映射的记录文件，测试项目、患者信息、结果等变长字段以JSON写入溢出文件，
+    样本ID到记录号的映射保存在内存映射的开放寻址哈希索引中。数据由操作系统按页缓存，
+    进程只持有映射，归档样本数增长时常驻内存基本不变。
+
+    只有一个写者（调用方串行调用 add），读者不加锁：写者先写记录、再写索引槽位、最后更新记录数，
+    扩容时新建映射后整体替换引用并关闭旧映射，读者读到已关闭的旧映射时改读新映射重试。
+    """
+
+    def __init__(self, directory):
+        """打开或创建归档
+
+        Args:
+            directory: 归档目录
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+
+        self.records_fd = os.open(os.path.join(directory, RECORDS_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        self.overflow_fd = os.open(os.path.join(directory, OVERFLOW_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self.index_fd = os.open(self.index_path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        self._open_records()
+        self._open_index()
+        self.overflow_size = os.fstat(self.overflow_fd).st_size
+
+    def _open_records(self):
+        """映射记录文件，新文件写入文件头"""
+        size = os.fstat(self.records_fd).st_size
+        if size < RECORDS_HEADER.size:
+            self.records_map = _map(self.records_fd, RECORDS_HEADER.size + GROW_RECORDS * RECORD.size)
+            RECORDS_HEADER.pack_into(self.records_map, 0, RECORDS_MAGIC, VERSION, 0)
+            self.count = 0
+        else:
+            self.records_map = _map(self.records_fd, size)
+            magic, version, self.count = RECORDS_HEADER.unpack_from(self.records_map, 0)
+            if magic != RECORDS_MAGIC or version != VERSION:
+                raise ValueError(f"{RECORDS_FILE} in {self.directory} is not a sample archive")
+        self.record_capacity = (len(self.records_map) - RECORDS_HEADER.size) // RECORD.size
+
+    def _open_index(self):
+        """映射索引文件，新文件初始化为空表"""
+        size = os.fstat(self.index_fd).st_size
+        if size < INDEX_HEADER.size:
+            self.index_map = _map(self.index_fd, INDEX_HEADER.size + INITIAL_INDEX_SLOTS * INDEX_SLOT.size)
+            INDEX_HEADER.pack_into(self.index_map, 0, INDEX_MAGIC, VERSION, INITIAL_INDEX_SLOTS, 0)
+            self.index_slots = INITIAL_INDEX_SLOTS
+            self.index_used = 0
+        else:
+            self.index_map = _map(self.index_fd, size)
+            magic, version, self.index_slots, self.index_used = INDEX_HEADER.unpack_from(self.index_map, 0)
+            if magic != INDEX_MAGIC or version != VERSION:
+                raise ValueError(f"{INDEX_FILE} in {self.directory} is not a sample archive index")
+        self.index = (self.index_map, self.index_slots)
+
+    def __len__(self):
+        return self.count
+
+    def _find(self, key, key_hash, index):
+        """在索引中查找样本
+
+        Args:
+            key: 样本ID（字节）
+            key_hash: 样本ID哈希
+            index: (索引映射, 槽位数)，两者作为一个元组整体替换，保证读者看到一致的一对
+
+        Returns:
+            tuple: (记录号或None, 探测结束的槽位号)
+        """
+        index_map, slots = index
+        mask = slots - 1
+        slot = key_hash & mask
+        while True:
+            slot_hash, record_no = INDEX_SLOT.unpack_from(index_map, INDEX_HEADER.size + slot * INDEX_SLOT.size)
+            if slot_hash == 0:
+                return None, slot
+            if slot_hash == key_hash and self._record_key(record_no) == key:
+                return record_no, slot
+            slot = (slot + 1) & mask
+
+    def _lookup(self, key, key_hash):
+        """不加锁查找样本：索引扩容时旧映射可能刚被关闭，此时用新索引重新查找"""
+        while True:
+            index = self.index
+            try:
+                return self._find(key, key_hash, index)
+            except ValueError:
+                if index is self.index:
+                    raise
+
+    def _read_record(self, record_no):
+        """读取记录的定长字段：记录文件扩容时旧映射可能刚被关闭，此时改读新映射"""
+        offset = RECORDS_HEADER.size + record_no * RECORD.size
+        while True:
+            records_map = self.records_map
+            try:
+                return RECORD.unpack_from(records_map, offset)
+            except ValueError:
+                if records_map is self.records_map:
+                    raise
+
+    def _record_key(self, record_no):
+        """读取记录的完整样本ID（字节）"""
+        fields = self._read_record(record_no)
+        id_len = fields[1]
+        if id_len <= ID_FIELD_SIZE:
+            return fields[0][:id_len]
+        return self._read_overflow(fields[6], fields[7])['sample_id'].encode('utf-8')
+
+    def _read_overflow(self, offset, length):
+        """读取溢出区中的变长字段"""
+        return json.loads(os.pread(self.overflow_fd, length, offset))
+
+    def __contains__(self, sample_id):
+        key = sample_id.encode('utf-8')
+        return self._lookup(key, _id_hash(key))[0] is not None
+
+    def add(self, sample):
+        """归档一个样本（单写者）
+
+        Args:
+            sample: 样本记录
+
+        Returns:
+            bool: 是否新增（样本已归档时返回False）
+        """
+        sample_id = sample['sample_id']
+        key = sample_id.encode('utf-8')
+        key_hash = _id_hash(key)
+        with self.lock:
+            record_no, slot = self._find(key, key_hash, self.index)
+            if record_no is not None:
+                return False
+
+            overflow = {
+                'tests': sample['tests'],
+                'patient_info': sample['patient_info'],
+                'priority': sample.get('priority', PRIORITY_ROUTINE),
+                'results': sample['results'],
+            }
+            if len(key) > ID_FIELD_SIZE:
+                overflow['sample_id'] = sample_id
+            payload = json.dumps(overflow, separators=(',', ':'), ensure_ascii=False,
+                                 default=dict).encode('utf-8')
+            offset = self.overflow_size
+            os.pwrite(self.overflow_fd, payload, offset)
+            self.overflow_size += len(payload)
+
+            if self.count >= self.record_capacity:
+                self._grow_records()
+            record_no = self.count
+            RECORD.pack_into(self.records_map, RECORDS_HEADER.size + record_no * RECORD.size,
+                             key[:ID_FIELD_SIZE], min(len(key), 255), STATUS_CODES.get(sample['status'], 0),
+                             len(sample['tests']), sample['received_time'], sample['completed_time'] or 0.0,
+                             offset, len(payload))
+
+            INDEX_SLOT.pack_into(self.index_map, INDEX_HEADER.size + slot * INDEX_SLOT.size, key_hash, record_no)
+            self.index_used += 1
+            INDEX_HEADER.pack_into(self.index_map, 0, INDEX_MAGIC, VERSION, self.index_slots, self.index_used)
+            self.count += 1
+            RECORDS_HEADER.pack_into(self.records_map, 0, RECORDS_MAGIC, VERSION, self.count)
+
+            if self.index_used > self.index_slots * MAX_LOAD_FACTOR:
+                self._grow_index()
+            return True
+
+    def _grow_records(self):
+        """扩展记录文件，替换映射后关闭旧映射"""
+        old_map = self.records_map
+        size = len(old_map) + GROW_RECORDS * RECORD.size
+        self.records_map = _map(self.records_fd, size)
+        self.record_capacity = (size - RECORDS_HEADER.size) // RECORD.size
+        old_map.close()
+
+    def _grow_index(self):
+        """以两倍槽位重建索引：写入临时文件后原子替换"""
+        slots = self.index_slots * 2
+        tmp_path = self.index_path + '.tmp'
+        tmp_fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        index_map = _map(tmp_fd, INDEX_HEADER.size + slots * INDEX_SLOT.size)
+        mask = slots - 1
+        old_map = self.index_map
+        for slot in range(self.index_slots):
+            slot_hash, record_no = INDEX_SLOT.unpack_from(old_map, INDEX_HEADER.size + slot * INDEX_SLOT.size)
+            if slot_hash == 0:
+                continue
+            new_slot = slot_hash & mask
+            while INDEX_SLOT.unpack_from(index_map, INDEX_HEADER.size + new_slot * INDEX_SLOT.size)[0]:
+                new_slot = (new_slot + 1) & mask
+            INDEX_SLOT.pack_into(index_map, INDEX_HEADER.size + new_slot * INDEX_SLOT.size, slot_hash, record_no)
+        INDEX_HEADER.pack_into(index_map, 0, INDEX_MAGIC, VERSION, slots, self.index_used)
+        index_map.flush()
+        os.replace(tmp_path, self.index_path)
+
+        old_fd = self.index_fd
+        self.index_map, self.index_slots, self.index_fd = index_map, slots, tmp_fd
+        self.index = (index_map, slots)
+        old_map.close()
+        os.close(old_fd)
+
+    def get(self, sample_id):
+        """按样本ID查询归档样本（不加锁）
+
+        Args:
+            sample_id: 样本ID
+
+        Returns:
+            Mapping: 不可变样本记录，未归档时返回None
+        """
+        key = sample_id.encode('utf-8')
+        record_no, _ = self._lookup(key, _id_hash(key))
+        if record_no is None:
+            return None
+        return self._load(record_no)
+
+    def _load(self, record_no):
+        """读取一条记录并还原为不可变样本记录"""
+        key, id_len, status, _, received_time, completed_time, offset, length = self._read_record(record_no)
+        overflow = self._read_overflow(offset, length)
+        return freeze({
+            'sample_id': overflow.get('sample_id') or key[:id_len].decode('utf-8'),
+            'tests': overflow['tests'],
+            'patient_info': overflow['patient_info'],
+            'priority': overflow.get('priority', PRIORITY_ROUTINE),
+            'received_time': received_time,
+            'status': STATUS_NAMES.get(status, 'completed'),
+            'results': overflow['results'],
+            'completed_time': completed_time or None,
+        })
+
+    def scan(self, start=0):
+        """按归档顺序顺序读取样本（用于导出）
+
+        Args:
+            start: 起始记录号
+
+        Yields:
+            Mapping: 不可变样本记录
+        """
+        for record_no in range(start, self.count):
+            yield self._load(record_no)
+
+    def export_jsonl(self, path):
+        """把全部归档样本导出为JSON Lines文件
+
+        Args:
+            path: 输出路径
+
+        Returns:
+            int: 导出的样本数
+        """
+        count = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for sample in self.scan():
+                f.write(json.dumps(sample, ensure_ascii=False, default=dict))
+                f.write('\n')
+                count += 1
+        return count
+
+    def flush(self):
+        """把映射中的修改写回磁盘"""
+        with self.lock:
+            os.fsync(self.overflow_fd)
+            self.records_map.flush()
+            self.index_map.flush()
+
+    def close(self):
+        """写回并关闭归档（映射与文件）"""
+        self.flush()
+        with self.lock:
+            self.records_map.close()
+            self.index_map.close()
+            for fd in (self.records_fd, self.overflow_fd, self.index_fd):
+                os.close(fd)
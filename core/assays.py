@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Assays模块 - 检测项目目录：单位、结果分布、参考范围与危急值，启动时预编译为查找表
+"""
+
+import hashlib
+import math
+import random
+from bisect import bisect_left, bisect_right
+from operator import methodcaller
+
+
+FLAG_NORMAL = ''
+FLAG_LOW = 'L'
+FLAG_HIGH = 'H'
+FLAG_CRITICAL_LOW = 'LL'
+FLAG_CRITICAL_HIGH = 'HH'
+
+# 目录中没有的检测项目使用的默认定义
+DEFAULT_ASSAY = {
+    'unit': 'U/L',
+    'decimals': 2,
+    'distribution': {'type': 'uniform', 'low': 0.0, 'high': 100.0},
+}
+
+
+def _compile_distribution(distribution):
+    """把分布定义编译为以随机数生成器为参数的取值函数
+
+    Args:
+        distribution: {'type': 'normal', 'mean', 'sd'} / {'type': 'lognormal', 'median', 'sigma'} /
+                      {'type': 'uniform', 'low', 'high'}
+
+    Returns:
+        callable: draw(rng) -> float
+    """
+    kind = distribution.get('type', 'normal')
+    if kind == 'normal':
+        return methodcaller('gauss', float(distribution['mean']), float(distribution['sd']))
+    if kind == 'lognormal':
+        return methodcaller('lognormvariate', math.log(float(distribution['median'])), float(distribution['sigma']))
+    if kind == 'uniform':
+        return methodcaller('uniform', float(distribution['low']), float(distribution['high']))
+    raise ValueError(f"Unknown result distribution type: {kind}")
+
+
+def sample_rng(seed, sample_id):
+    """样本专属的随机数流
+
+    由种子和样本ID的哈希派生，同一种子下同一样本的结果与生成顺序、线程或进程无关；
+    各样本的流互不共享状态，并行生成时不争用全局 random 模块。
+
+    Args:
+        seed: 结果种子（None 表示不可复现，每次使用系统熵）
+        sample_id: 样本ID
+
+    Returns:
+        random.Random: 随机数生成器
+    """
+    if seed is None:
+        return random.Random()
+    digest = hashlib.blake2b(f"{seed}:{sample_id}".encode('utf-8'), digest_size=8).digest()
+    return random.Random(int.from_bytes(digest, 'big'))
+
+
+class Assay:
+    """单个检测项目的预编译定义"""
+
+    __slots__ = ('code', 'name', 'unit', 'decimals', 'draw', 'minimum', 'lower_bounds', 'upper_bounds',
+                 'reference_range', 'run_time')
+
+    # 按下限分段：低于危急下限、低于参考下限、正常；按上限分段：正常、高于参考上限、高于危急上限
+    LOWER_FLAGS = (FLAG_CRITICAL_LOW, FLAG_LOW, FLAG_NORMAL)
+    UPPER_FLAGS = (FLAG_NORMAL, FLAG_HIGH, FLAG_CRITICAL_HIGH)
+
+    def __init__(self, code, definition):
+        """编译检测项目定义
+
+        Args:
+            code: 检测项目代码
+            definition: 目录中的定义（unit、decimals、distribution、reference_range、critical_range、run_time）
+        """
+        self.code = code
+        self.name = definition.get('name', code)
+        self.unit = definition.get('unit', '')
+        self.decimals = int(definition.get('decimals', 2))
+        self.draw = _compile_distribution(definition.get('distribution') or DEFAULT_ASSAY['distribution'])
+        self.minimum = float(definition.get('minimum', 0.0))
+        self.run_time = definition.get('run_time')
+
+        reference_low, reference_high = definition.get('reference_range') or (None, None)
+        critical_low, critical_high = definition.get('critical_range') or (None, None)
+        # 未配置的界限用无穷大代替，查表时不需要分支
+        self.lower_bounds = (-math.inf if critical_low is None else float(critical_low),
+                             -math.inf if reference_low is None else float(reference_low))
+        self.upper_bounds = (math.inf if reference_high is None else float(reference_high),
+                             math.inf if critical_high is None else float(critical_high))
+        # ASTM结果记录中的参考范围文本
+        if reference_low is None and reference_high is None:
+            self.reference_range = ''
+        elif reference_low is None:
+            self.reference_range = f"<{reference_high}"
+        elif reference_high is None:
+            self.reference_range = f">{reference_low}"
+        else:
+            self.reference_range = f"{reference_low} to {reference_high}"
+
+    def flag(self, value):
+        """按参考范围与危急值判定结果标志
+
+        Args:
+            value: 结果值
+
+        Returns:
+            str: '' / 'L' / 'H' / 'LL' / 'HH'
+        """
+        lower = self.LOWER_FLAGS[bisect_right(self.lower_bounds, value)]
+        if lower:
+            return lower
+        return self.UPPER_FLAGS[bisect_left(self.upper_bounds, value)]
+
+    def generate(self, rng=random):
+        """生成一个结果
+
+        Args:
+            rng: 随机数生成器（random.Random 实例或 random 模块）
+
+        Returns:
+            dict: {'value', 'unit', 'flags', 'reference_range'}
+        """
+        value = round(max(self.minimum, self.draw(rng)), self.decimals)
+        if self.decimals <= 0:
+            value = int(value)
+        return {
+            'value': value,
+            'unit': self.unit,
+            'flags': self.flag(value),
+            'reference_range': self.reference_range,
+        }
+
+
+class AssayCatalog:
+    """检测项目目录（启动时构建一次，之后只读）"""
+
+    def __init__(self, config, seed=None):
+        """构建目录
+
+        Args:
+            config: 检测项目配置（assays 配置段：检测项目代码 -> 定义）
+            seed: 结果种子（core.result_seed，None 表示不可复现）
+        """
+        self.assays = {code: Assay(code, definition) for code, definition in (config or {}).items()}
+        # 目录外的检测项目共用同一个预编译的默认定义
+        self.default_assay = Assay('', DEFAULT_ASSAY)
+        self.seed = seed
+
+    def get(self, test_code):
+        """获取检测项目定义，目录中没有的项目返回默认定义
+
+        Args:
+            test_code: 检测项目代码
+
+        Returns:
+            Assay: 检测项目定义
+        """
+        return self.assays.get(test_code, self.default_assay)
+
+    def generate(self, tests, rng=random):
+        """为样本的全部测试生成结果
+
+        Args:
+            tests: 测试项目列表
+            rng: 随机数生成器
+
+        Returns:
+            dict: 测试项目 -> 结果
+        """
+        return {test_code: self.get(test_code).generate(rng) for test_code in tests}
+
+    def generate_sample(self, sample_id, tests):
+        """用样本专属的随机数流生成样本结果（配置了种子时可复现）
+
+        Args:
+            sample_id: 样本ID
+            tests: 测试项目列表
+
+        Returns:
+            dict: 测试项目 -> 结果
+        """
+        return self.generate(tests, sample_rng(self.seed, sample_id))
+
+    def run_times(self):
+        """目录中配置了运行时间的检测项目
+
+        Returns:
+            dict: 检测项目代码 -> 运行时间（秒）
+        """
+        return {code: float(assay.run_time) for code, assay in self.assays.items() if assay.run_time is not None}
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Capacity模块 - 仪器处理能力模型：按模块通量、检测项目运行时间与样本优先级排程，推算积压、样本获取延迟与就绪状态
+"""
+
+import heapq
+import itertools
+import math
+
+
+PROCESS_GREEN = 1
+PROCESS_YELLOW = 2
+PROCESS_RED = 3
+
+# 样本优先级（按先后顺序调度，STAT 排在所有常规样本之前）
+PRIORITY_STAT = 'stat'
+PRIORITY_ROUTINE = 'routine'
+PRIORITIES = (PRIORITY_STAT, PRIORITY_ROUTINE)
+PRIORITY_RANK = {priority: rank for rank, priority in enumerate(PRIORITIES)}
+
+HEALTH_FIELD_MAX = 0xFFFF  # 健康状态消息中积压、延迟、试管数均为2字节
+
+
+class CapacityLoad:
+    """处理能力模型的不可变聚合量，用于在不推进模型的情况下推算之后任意时刻的负载字段
+
+    每个模块从空闲时刻起连续吸样，每个测试占用固定秒数，因此由（空闲时刻, 排队测试数, 每测试秒数）
+    即可算出任意更晚时刻已开始吸样的测试数与新到常规样本的等待时间，与先 advance 到该时刻再读取的结果相同。
+    发布后不再修改，读者无需加锁。
+    """
+
+    __slots__ = ('modules', 'onboard', 'onboard_capacity', 'yellow_onboard_ratio', 'yellow_delay', 'red_delay')
+
+    def __init__(self, model):
+        """初始化
+
+        Args:
+            model: CapacityModel（调用方持有保护模型的锁）
+        """
+        self.modules = tuple((model.free_at[module], len(queue), model.test_seconds[module])
+                             for module, queue in enumerate(model.queues))
+        self.onboard = model.onboard
+        self.onboard_capacity = model.onboard_capacity
+        self.yellow_onboard_ratio = model.yellow_onboard_ratio
+        self.yellow_delay = model.yellow_delay
+        self.red_delay = model.red_delay
+
+    def project(self, now):
+        """推算 now 时刻的积压与常规样本获取延迟
+
+        Args:
+            now: 当前时间（不早于生成聚合量时模型推进到的时间）
+
+        Returns:
+            tuple: (尚未吸样的测试数, 新到常规样本开始吸样前的等待秒数)
+        """
+        backlog = 0
+        delay = None
+        for free_at, queued, seconds in self.modules:
+            if queued and now >= free_at:
+                started = min(queued, int((now - free_at) // seconds) + 1)
+                free_at += started * seconds
+                queued -= started
+            backlog += queued
+            wait = max(0.0, free_at - now) + queued * seconds
+            delay = wait if delay is None else min(delay, wait)
+        return backlog, delay
+
+    def process_status(self, delay):
+        """按在线试管数与获取延迟推算的仪器处理状态
+
+        Returns:
+            int: 1 Green / 2 Yellow（在线试管或等待时间接近上限）/ 3 Red（在线试管已满或等待过长）
+        """
+        if self.onboard >= self.onboard_capacity or delay >= self.red_delay:
+            return PROCESS_RED
+        if self.onboard >= self.onboard_capacity * self.yellow_onboard_ratio or delay >= self.yellow_delay:
+            return PROCESS_YELLOW
+        return PROCESS_GREEN
+
+    def health_fields(self, now):
+        """now 时刻负载对应的健康状态字段
+
+        Args:
+            now: 当前时间
+
+        Returns:
+            dict: processing_backlog、sample_acquisition_delay（常规样本，秒）、on_board_tube_count 与负载处理状态
+        """
+        backlog, delay = self.project(now)
+        return {
+            'processing_backlog': min(HEALTH_FIELD_MAX, backlog),
+            'sample_acquisition_delay': min(HEALTH_FIELD_MAX, int(math.ceil(delay))),
+            'on_board_tube_count': min(HEALTH_FIELD_MAX, self.onboard),
+            'load_process_status': self.process_status(delay),
+        }
+
+
+class CapacityModel:
+    """仪器处理能力模型
+
+    每个分析模块按 tests_per_hour 串行吸样，每个测试占用模块 3600 / tests_per_hour 秒，
+    吸样后再经过该检测项目的运行时间（孵育、测量）出结果。每个模块有一个按（优先级, 到达顺序）
+    排序的待吸样队列，模块空闲时先取 STAT 测试；已开始吸样的测试不会被抢占。
+    样本的最后一个测试开始吸样时才能确定其结果时间。
+
+    健康状态只依赖增量聚合量：每个模块的空闲时刻、各优先级排队的测试秒数、排队测试总数与在线试管数，
+    入队、出队、完成时各更新一次，积压、获取延迟与就绪状态由这些聚合量直接算出，不遍历样本。
+
+    模型按事件时间推进（advance），调用频率不影响排程结果，只决定结果时间何时可见。
+    模型本身不加锁，调用方在同一把锁（核心的 status_lock）内调用所有方法；load() 返回的聚合量副本可在锁外读取。
+    """
+
+    def __init__(self, config, run_times=None):
+        """初始化
+
+        Args:
+            config: 处理能力配置（capacity 配置段）
+            run_times: 检测项目目录中的运行时间（检测项目 -> 秒），被 capacity.assay_run_times 覆盖
+        """
+        self.onboard_capacity = max(1, int(config.get('onboard_capacity', 300)))
+        self.default_run_time = float(config.get('default_run_time', 600))
+        self.assay_run_times = {**(run_times or {}), **config.get('assay_run_times', {})}
+        self.yellow_onboard_ratio = float(config.get('yellow_onboard_ratio', 0.8))
+        self.yellow_delay = float(config.get('yellow_delay', 900))
+        self.red_delay = float(config.get('red_delay', 1800))
+
+        modules = config.get('modules') or [{'id': 'MODULE001', 'tests_per_hour': 440}]
+        self.module_ids = tuple(module['id'] for module in modules)
+        # 每个测试占用模块的秒数
+        self.test_seconds = tuple(3600.0 / max(1e-9, float(module.get('tests_per_hour', 440)))
+                                  for module in modules)
+        # 检测项目 -> 可执行该项目的模块下标（未配置 assays 的模块可执行所有项目）
+        self.any_module = tuple(i for i, module in enumerate(modules) if not module.get('assays'))
+        self.assay_modules = {}
+        for i, module in enumerate(modules):
+            for assay in module.get('assays') or ():
+                self.assay_modules.setdefault(assay, []).append(i)
+        for assay, indexes in self.assay_modules.items():
+            self.assay_modules[assay] = tuple(sorted(set(indexes) | set(self.any_module)))
+
+        # 待吸样队列：每个模块一个堆，元素为 (优先级序号, 到达序号, 样本ID, 检测项目)
+        self.queues = [[] for _ in modules]
+        self.arrivals = itertools.count()
+        # 样本ID -> [未开始吸样的测试数, 已开始测试中最晚的出结果时间]
+        self.scheduling = {}
+
+        # 增量聚合量
+        self.free_at = [0.0] * len(modules)
+        self.queued_seconds = [[0.0] * len(PRIORITIES) for _ in modules]
+        self.queued_tests = 0
+        self.onboard = 0
+
+    def run_time(self, test_code):
+        """检测项目运行时间（秒）"""
+        return float(self.assay_run_times.get(test_code, self.default_run_time))
+
+    def _modules_for(self, test_code):
+        """可执行检测项目的模块下标"""
+        return self.assay_modules.get(test_code) or self.any_module or tuple(range(len(self.free_at)))
+
+    def _wait(self, module, rank, now):
+        """优先级为 rank 的新测试在模块上开始吸样前的等待秒数"""
+        return max(0.0, self.free_at[module] - now) + sum(self.queued_seconds[module][:rank + 1])
+
+    def is_full(self):
+        """在线试管数是否已达上限"""
+        return self.onboard >= self.onboard_capacity
+
+    def admit(self, sample_id, tests, now, priority=PRIORITY_ROUTINE):
+        """样本上机：先推进到 now，再把各测试排入预计等待最短的可用模块
+
+        Args:
+            sample_id: 样本ID
+            tests: 测试项目列表
+            now: 当前时间
+            priority: 样本优先级（PRIORITY_STAT / PRIORITY_ROUTINE）
+
+        Returns:
+            list: 推进后所有测试都已开始吸样的样本 [(样本ID, 结果到期时间)]，可能包含本样本
+        """
+        ready = self.advance(now)
+        rank = PRIORITY_RANK.get(priority, PRIORITY_RANK[PRIORITY_ROUTINE])
+        for test_code in tests:
+            module = min(self._modules_for(test_code), key=lambda m: self._wait(m, rank, now))
+            if not self.queues[module] and self.free_at[module] < now:
+                self.free_at[module] = now  # 模块空闲，从现在开始计时
+            heapq.heappush(self.queues[module], (rank, next(self.arrivals), sample_id, test_code))
+            self.queued_seconds[module][rank] += self.test_seconds[module]
+            self.queued_tests += 1
+        self.onboard += 1
+        if not tests:
+            return ready + [(sample_id, now)]
+        self.scheduling[sample_id] = [len(tests), now]
+        return ready + self.advance(now)
+
+    def advance(self, now):
+        """按事件时间推进到 now：各模块空闲时按优先级取出测试开始吸样
+
+        Args:
+            now: 当前时间
+
+        Returns:
+            list: 本次推进中所有测试都已开始吸样的样本 [(样本ID, 结果到期时间)]
+        """
+        ready = []
+        for module, queue in enumerate(self.queues):
+            seconds = self.test_seconds[module]
+            while queue and self.free_at[module] <= now:
+                rank, _, sample_id, test_code = heapq.heappop(queue)
+                start = self.free_at[module]
+                self.free_at[module] = start + seconds
+                self.queued_seconds[module][rank] = max(0.0, self.queued_seconds[module][rank] - seconds)
+                self.queued_tests -= 1
+                state = self.scheduling.get(sample_id)
+                if state is None:
+                    continue
+                state[0] -= 1
+                state[1] = max(state[1], start + seconds + self.run_time(test_code))
+                if state[0] <= 0:
+                    del self.scheduling[sample_id]
+                    ready.append((sample_id, state[1]))
+        return ready
+
+    def release(self):
+        """样本完成下机"""
+        if self.onboard > 0:
+            self.onboard -= 1
+
+    def acquisition_delay(self, now, priority=PRIORITY_ROUTINE):
+        """新到样本开始吸样前需要等待的秒数（预计等待最短的模块）"""
+        rank = PRIORITY_RANK.get(priority, PRIORITY_RANK[PRIORITY_ROUTINE])
+        return min(self._wait(module, rank, now) for module in range(len(self.free_at)))
+
+    def backlog(self):
+        """尚未吸样的测试数"""
+        return self.queued_tests
+
+    def process_status(self, now):
+        """按负载推算的仪器处理状态
+
+        Returns:
+            int: 1 Green / 2 Yellow（在线试管或等待时间接近上限）/ 3 Red（在线试管已满或等待过长）
+        """
+        return self.load().process_status(self.acquisition_delay(now))
+
+    def load(self):
+        """当前聚合量的不可变副本
+
+        Returns:
+            CapacityLoad: 可在不加锁、不推进模型的情况下推算负载字段
+        """
+        return CapacityLoad(self)
+
+    def health_fields(self, now):
+        """now 时刻负载对应的健康状态字段（由当前聚合量推算，不推进模型）
+
+        Args:
+            now: 当前时间
+
+        Returns:
+            dict: processing_backlog、sample_acquisition_delay（常规样本，秒）、on_board_tube_count 与负载处理状态
+        """
+        return self.load().health_fields(now)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Carriers模块 - 接口位置的载架队列：按分流顺序先进先出，按样本ID O(1) 跳过，清空时保留已锁定的载架
+"""
+
+import time
+from collections import deque
+
+
+# 载架占用类型（Add/Skip Queue 报文）
+OCCUPANCY_EMPTY = 0x01
+OCCUPANCY_UNCAPPED = 0x02
+OCCUPANCY_CAPPED = 0x03
+OCCUPANCIES = (OCCUPANCY_EMPTY, OCCUPANCY_UNCAPPED, OCCUPANCY_CAPPED)
+
+# Add Queue 报文中的样本优先级
+CARRIER_PRIORITY_UNDEFINED = 0x00
+CARRIER_PRIORITY_ROUTINE = 0x01
+CARRIER_PRIORITY_STAT = 0x02
+
+# 试管直径 0x52（8.2 mm）为 Greiner MiniCollect Complete 试管
+MINICOLLECT_DIAMETER = 0x52
+
+
+class Carrier:
+    """队列中的一个载架"""
+
+    __slots__ = ('occupancy', 'sample_id', 'priority', 'tube_height', 'tube_diameter', 'added_time', 'skipped')
+
+    def __init__(self, occupancy, sample_id, priority=CARRIER_PRIORITY_UNDEFINED, tube_height=0, tube_diameter=0,
+                 added_time=None):
+        self.occupancy = occupancy
+        self.sample_id = sample_id
+        self.priority = priority
+        self.tube_height = tube_height
+        self.tube_diameter = tube_diameter
+        self.added_time = time.time() if added_time is None else added_time
+        self.skipped = False
+
+    def to_dict(self):
+        """转换为界面与接口使用的字典"""
+        return {
+            'occupancy': self.occupancy,
+            'sample_id': self.sample_id,
+            'priority': self.priority,
+            'tube_height': self.tube_height,
+            'tube_diameter': self.tube_diameter,
+            'minicollect': self.tube_diameter == MINICOLLECT_DIAMETER,
+            'added_time': self.added_time,
+        }
+
+
+class CarrierQueue:
+    """单个接口位置的载架队列
+
+    载架按 Add Queue 的顺序存于 deque，另按 (占用类型, 样本ID) 建立索引，索引值是同一键的载架按加入顺序排列的 deque，
+    重复样本ID时跳过最早加入的一个。跳过只把载架标记为已跳过并从索引中取出（O(1)），
+    已跳过的载架在到达队首时丢弃；已跳过的载架多于在队载架时整体压缩一次，均摊仍为 O(1)。
+
+    Load_Unload 锁定的载架从队列移到 locked，清空队列只替换 deque 与索引，不触及已锁定的载架。
+    队列本身不加锁，调用方在核心的 carrier_lock 内调用所有方法。
+    """
+
+    COMPACT_MIN = 64  # 已跳过载架少于该数时不压缩
+
+    def __init__(self):
+        self.entries = deque()
+        self.index = {}
+        self.size = 0
+        self.locked = []
+
+    def __len__(self):
+        return self.size
+
+    def add(self, carrier):
+        """载架加入队尾
+
+        Args:
+            carrier: Carrier
+        """
+        self.entries.append(carrier)
+        self.index.setdefault((carrier.occupancy, carrier.sample_id), deque()).append(carrier)
+        self.size += 1
+
+    def skip(self, occupancy, sample_id):
+        """跳过最早加入的匹配载架
+
+        Args:
+            occupancy: 占用类型
+            sample_id: 样本ID（空载架为空字符串）
+
+        Returns:
+            Carrier: 被跳过的载架，没有匹配的载架时为 None
+        """
+        key = (occupancy, sample_id)
+        matches = self.index.get(key)
+        if not matches:
+            return None
+        carrier = matches.popleft()
+        if not matches:
+            del self.index[key]
+        carrier.skipped = True
+        self.size -= 1
+        self._discard_skipped()
+        return carrier
+
+    def head(self):
+        """队首的在队载架（没有时为 None）"""
+        self._discard_skipped()
+        return self.entries[0] if self.entries else None
+
+    def lock_head(self):
+        """锁定队首载架准备转移：移出队列，清空队列时保留
+
+        Returns:
+            Carrier: 被锁定的载架，队列为空时为 None
+        """
+        carrier = self.head()
+        if carrier is None:
+            return None
+        self.entries.popleft()
+        key = (carrier.occupancy, carrier.sample_id)
+        matches = self.index[key]
+        matches.popleft()
+        if not matches:
+            del self.index[key]
+        self.size -= 1
+        self.locked.append(carrier)
+        return carrier
+
+    def unlock(self, carrier):
+        """转移完成，释放已锁定的载架
+
+        Returns:
+            bool: 载架是否处于锁定状态
+        """
+        try:
+            self.locked.remove(carrier)
+        except ValueError:
+            return False
+        return True
+
+    def clear(self):
+        """清空未锁定的载架
+
+        Returns:
+            int: 清除的载架数
+        """
+        cleared = self.size
+        self.entries = deque()
+        self.index = {}
+        self.size = 0
+        return cleared
+
+    def carriers(self):
+        """按队列顺序列出在队载架"""
+        return [carrier for carrier in self.entries if not carrier.skipped]
+
+    def _discard_skipped(self):
+        """丢弃队首的已跳过载架，已跳过的载架过多时整体压缩"""
+        entries = self.entries
+        while entries and entries[0].skipped:
+            entries.popleft()
+        skipped = len(entries) - self.size
+        if skipped > self.COMPACT_MIN and skipped > self.size:
+            self.entries = deque(carrier for carrier in entries if not carrier.skipped)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ChangeLog模块 - 样本状态变化的序号化变更日志（CDC）
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+
+# 样本状态变化类型
+CHANGE_RECEIVED = 'received'
+CHANGE_COMPLETED = 'completed'
+
+
+class SampleChange:
+    """一条样本状态变化"""
+
+    __slots__ = ('seq', 'sample_id', 'kind', 'record', 'timestamp')
+
+    def __init__(self, seq, sample_id, kind, record):
+        """
+        Args:
+            seq: 序号（从1开始单调递增）
+            sample_id: 样本ID
+            kind: 变化类型（CHANGE_RECEIVED / CHANGE_COMPLETED）
+            record: 变化后的不可变样本记录
+        """
+        self.seq = seq
+        self.sample_id = sample_id
+        self.kind = kind
+        self.record = record
+        self.timestamp = time.time()
+
+    def __repr__(self):
+        return f"SampleChange(seq={self.seq}, sample_id={self.sample_id!r}, kind={self.kind!r})"
+
+
+class ChangeLogTruncated(Exception):
+    """请求的序号已被环形缓冲区覆盖，消费者需要从全量快照重新同步"""
+
+    def __init__(self, since, first_seq):
+        super().__init__(f"Change log no longer holds changes after {since} (oldest retained: {first_seq})")
+        self.since = since
+        self.first_seq = first_seq
+
+
+class ChangeLog:
+    """样本变更日志
+
+    变化按序号追加到有界环形缓冲区，消费者记住最后处理的序号，之后只读取增量；
+    落后超过缓冲区容量时读取会抛出 ChangeLogTruncated，由消费者重新同步。
+    """
+
+    def __init__(self, capacity=10000):
+        """初始化变更日志
+
+        Args:
+            capacity: 保留的变化条数
+        """
+        self.capacity = max(1, int(capacity))
+        self.buffer = deque(maxlen=self.capacity)
+        self.last_seq = 0
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.async_waiters = []
+
+    @property
+    def first_seq(self):
+        """缓冲区中最旧变化的序号（为空时为 last_seq + 1）"""
+        return self.last_seq - len(self.buffer) + 1
+
+    def append(self, sample_id, kind, record):
+        """追加一条变化（样本存储在分片锁内调用，保证同一样本的变化顺序）
+
+        Args:
+            sample_id: 样本ID
+            kind: 变化类型
+            record: 变化后的不可变样本记录
+
+        Returns:
+            int: 变化序号
+        """
+        with self.lock:
+            self.last_seq += 1
+            self.buffer.append(SampleChange(self.last_seq, sample_id, kind, record))
+            self.condition.notify_all()
+            waiters, self.async_waiters = self.async_waiters, []
+            seq = self.last_seq
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+        return seq
+
+    def read(self, since=0, limit=None):
+        """读取序号大于 since 的变化
+
+        Args:
+            since: 已处理的最后序号
+            limit: 最多返回条数（可选）
+
+        Returns:
+            list: SampleChange 列表，按序号升序
+
+        Raises:
+            ChangeLogTruncated: since 之后的部分变化已被覆盖
+        """
+        with self.lock:
+            if since < self.first_seq - 1:
+                raise ChangeLogTruncated(since, self.first_seq)
+            # 消费者通常只落后少量变化，从尾部向前收集
+            changes = []
+            for change in reversed(self.buffer):
+                if change.seq <= since:
+                    break
+                changes.append(change)
+        changes.reverse()
+        if limit is not None:
+            changes = changes[:limit]
+        return changes
+
+    def wait(self, since, timeout=None):
+        """等待出现序号大于 since 的变化
+
+        Args:
+            since: 已处理的最后序号
+            timeout: 超时时间（秒，None表示一直等待）
+
+        Returns:
+            bool: 是否有新变化
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: self.last_seq > since, timeout)
+
+    def follow(self, since=None, timeout=None):
+        """同步迭代变化，没有新变化时阻塞等待
+
+        Args:
+            since: 从该序号之后开始（None表示只迭代之后的新变化）
+            timeout: 等待新变化的超时（秒），超时后迭代结束；None表示一直等待
+
+        Yields:
+            SampleChange: 变化
+
+        Raises:
+            ChangeLogTruncated: 消费者落后超过缓冲区容量
+        """
+        position = self.last_seq if since is None else since
+        while True:
+            changes = self.read(position)
+            if not changes:
+                if not self.wait(position, timeout):
+                    return
+                continue
+            for change in changes:
+                position = change.seq
+                yield change
+
+    async def afollow(self, since=None):
+        """asyncio 异步迭代变化，没有新变化时挂起（不占用线程）
+
+        Args:
+            since: 从该序号之后开始（None表示只迭代之后的新变化）
+
+        Yields:
+            SampleChange: 变化
+
+        Raises:
+            ChangeLogTruncated: 消费者落后超过缓冲区容量
+        """
+        loop = asyncio.get_running_loop()
+        position = self.last_seq if since is None else since
+        while True:
+            changes = self.read(position)
+            if changes:
+                for change in changes:
+                    position = change.seq
+                    yield change
+                continue
+
+            future = loop.create_future()
+            waiter = (loop, future)
+            with self.lock:
+                if self.last_seq > position:
+                    continue
+                self.async_waiters.append(waiter)
+            try:
+                await future
+            finally:
+                with self.lock:
+                    if waiter in self.async_waiters:
+                        self.async_waiters.remove(waiter)
+
+    def cursor(self, since=None):
+        """创建可续读的游标
+
+        Args:
+            since: 起始序号（None表示从当前位置开始）
+
+        Returns:
+            ChangeCursor: 游标
+        """
+        return ChangeCursor(self, self.last_seq if since is None else since)
+
+
+def _wake(future):
+    """在事件循环线程中唤醒等待者"""
+    if not future.done():
+        future.set_result(None)
+
+
+class ChangeCursor:
+    """变更日志游标：记住已处理的序号，每次只取增量"""
+
+    __slots__ = ('changelog', 'position')
+
+    def __init__(self, changelog, position):
+        self.changelog = changelog
+        self.position = position
+
+    def poll(self, limit=None):
+        """取出新变化并前移游标
+
+        Args:
+            limit: 最多返回条数（可选）
+
+        Returns:
+            list: SampleChange 列表
+
+        Raises:
+            ChangeLogTruncated: 游标落后超过缓冲区容量，需调用 seek 重新定位
+        """
+        changes = self.changelog.read(self.position, limit)
+        if changes:
+            self.position = changes[-1].seq
+        return changes
+
+    def seek(self, position):
+        """重新定位游标（通常在从全量快照重新同步之后）
+
+        Args:
+            position: 已处理的最后序号
+        """
+        self.position = position
@@ -4,21 +4,52 @@
 Core模块 - 核心模拟逻辑
 """
 
+import copy
+import math
 import threading
 import time
-import random
-from collections import defaultdict
+from collections import defaultdict, deque
+from types import MappingProxyType
+
+from metrics import MetricsRegistry
+from profiling.profiler import CHECKPOINT_INTERVAL, profile_checkpoint
+from tracing import Tracer
+
+from .archive import SampleArchive
+from .assays import AssayCatalog
+from .capacity import PRIORITIES, PRIORITY_ROUTINE, CapacityModel
+from .carriers import Carrier, CarrierQueue
+from .changelog import ChangeLog
+from .events import EventBus, InventoryChanged, ResultReady, SampleReceived, StatusChanged, TransferStatusChanged
+from .inventory import ReagentTracker, inventory_status
+from .journal import OP_CONSUMABLE_INVENTORY, OP_HEALTH, OP_SAMPLE, OP_TEST_INVENTORY, StateJournal
+from .locks import LockMonitor
+from .sample_store import ShardedSampleStore
+from .snapshots import VersionedSnapshot
+from .transfer import LOCKED_BY_INSTRUMENT, NOT_LOCKED_BY_INSTRUMENT, TransferEngine
+from tracing.tracing import (
+    STAGE_RECEIVE_SAMPLE,
+    STAGE_RESULT_BACKLOG,
+    STAGE_RESULT_GENERATION,
+    STAGE_RESULT_WAIT,
+)
 
 
 class AtellicaCore:
     """Atellica核心模拟逻辑"""
     
-    def __init__(self, config_manager, logger):
+    # 启用处理能力模型时由负载推算的健康状态字段
+    CAPACITY_HEALTH_FIELDS = ('instrument_process_status', 'processing_backlog',
+                              'sample_acquisition_delay', 'on_board_tube_count')
+    
+    def __init__(self, config_manager, logger, metrics=None, tracer=None):
         """初始化核心模拟逻辑
         
         Args:
             config_manager: 配置管理器实例
             logger: 日志管理器实例
+            metrics: 指标注册表（可选，默认新建）
+            tracer: 样本生命周期追踪器（可选，默认新建）
         """
         self.config_manager = config_manager
         self.logger = logger
@@ -35,20 +66,114 @@ class AtellicaCore:
         self.on_board_tube_count = config_manager.get_core_config().get('on_board_tube_count', 0)
         self.completed_tube_count = config_manager.get_core_config().get('completed_tube_count', 0)
         
-        # 测试项目 inventory
-        self.test_inventory = config_manager.get_test_inventory_config().copy()
+        # 测试项目 inventory（深拷贝，修改不影响配置）
+        self.test_inventory = copy.deepcopy(config_manager.get_test_inventory_config())
         
         # 耗材 inventory
-        self.consumable_inventory = config_manager.get_consumable_inventory_config().copy()
+        self.consumable_inventory = copy.deepcopy(config_manager.get_consumable_inventory_config())
+        
+        # 运行指标（LAS/LIS服务器共用同一注册表）
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        
+        # 检测项目目录：结果分布、单位、参考范围与危急值（启动时预编译）
+        self.assays = AssayCatalog(config_manager.get_assay_config(),
+                                   config_manager.get_core_config().get('result_seed'))
+        
+        # 处理能力模型：启用后积压、样本获取延迟、在线试管数与处理状态由当前样本负载推算，不再取配置的固定值
+        self.capacity = None
+        capacity_config = config_manager.get_capacity_config()
+        if capacity_config.get('enabled', False):
+            self.capacity = CapacityModel(capacity_config, self.assays.run_times())
+        
+        # 状态持久化：启动时从压缩快照与预写日志恢复样本、健康状态和库存
+        self.journal = None
+        recovered = None
+        persistence_config = config_manager.get_persistence_config()
+        if persistence_config.get('enabled', False):
+            self.journal = StateJournal(persistence_config.get('data_dir', 'data/state'), self.metrics, logger,
+                                        persistence_config.get('fsync', 'batch'),
+                                        persistence_config.get('fsync_interval', 1.0),
+                                        persistence_config.get('snapshot_every', 100000))
+            recovered = self.journal.recover()
+            self._restore_state(recovered)
+        
+        # 试剂与耗材消耗计数（索引恢复后的库存条目，每个完成的测试原地扣减）
+        self.reagents = ReagentTracker(self.test_inventory, self.consumable_inventory)
+        
+        # 线程锁（可选统计竞争情况与加锁顺序）
+        self.lock_monitor = None
+        if config_manager.get_core_config().get('lock_instrumentation', False):
+            self.lock_monitor = LockMonitor(self.metrics, logger,
+                                            config_manager.get_core_config().get('lock_order_check', True))
+        self.status_lock = self._create_lock('status_lock')
+        self.inventory_lock = self._create_lock('inventory_lock')
+        self.turnaround_lock = self._create_lock('turnaround_lock')
+        self.carrier_lock = self._create_lock('carrier_lock')
+        
+        # 每个接口位置的载架队列（Add/Skip/Clear Queue），按分流顺序先进先出
+        self.carrier_queues = [CarrierQueue() for _ in range(self.interface_positions)]
+        
+        # Load_Unload 取放引擎：各接口位置的取放状态与待返回LAS的试管
+        self.transfer_lock = self._create_lock('transfer_lock')
+        self.transfer_time = config_manager.get_core_config().get('transfer_time', 5.0)
+        self.transfer = TransferEngine(self.interface_positions)
+        
+        # 按优先级保留最近完成样本的周转时间（秒），用于计算百分位数
+        turnaround_window = config_manager.get_core_config().get('turnaround_window', 10000)
+        self.turnarounds = {priority: deque(maxlen=turnaround_window) for priority in PRIORITIES}
+        
+        # 对外发布的不可变快照：写者在锁内修改后原子替换，读者不加锁、不复制
+        self.health_snapshot = VersionedSnapshot(self._build_health())
+        # 启用处理能力模型时与健康状态快照一起发布的 (健康状态快照, 聚合量, 设定的处理状态)，
+        # 读取健康状态时按当前时间推算负载字段，不推进模型、不加锁
+        self.capacity_load = None
+        self._publish_capacity_load(self.health_snapshot.get())
+        self.test_inventory_snapshot = VersionedSnapshot(self.test_inventory)
+        self.consumable_inventory_snapshot = VersionedSnapshot(self.consumable_inventory)
+        
+        # 样本状态变更日志（有界环形缓冲区），消费者按序号读取增量
+        self.changelog = ChangeLog(config_manager.get_core_config().get('changelog_capacity', 10000))
+        
+        # 样本管理（按样本ID分片加锁）
+        self.sample_store = ShardedSampleStore(config_manager.get_core_config().get('sample_shards', 16),
+                                               self._create_lock, self._on_sample_change)
+        if recovered is not None:
+            self.sample_store.load(recovered['samples'].values(),
+                                   config_manager.get_lis_config().get('result_delay', 1800))
+            if self.capacity is not None:
+                self._readmit_pending(recovered['samples'])
+            # 已完成但尚未返回LAS的试管（完成试管数之内最近完成的样本）重新排队
+            completed = sorted((sample['completed_time'], sample_id)
+                               for sample_id, sample in recovered['samples'].items()
+                               if sample['status'] == 'completed')
+            for _, sample_id in completed[max(0, len(completed) - self.completed_tube_count):]:
+                self.transfer.mark_ready(sample_id)
+        # 最近一次发布的各接口位置 Transfer Status，变化时发布 TransferStatusChanged
+        self.transfer_status = self.transfer.status(self.health_snapshot.get(), self._onboard_full())
+        
+        # 已完成样本归档：完成超过 archive_after 秒的样本转入内存映射归档并从内存中移除
+        self.archive = None
+        self.archive_after = config_manager.get_core_config().get('archive_after', 300)
+        self.archive_queue = deque()  # (完成时间, 样本ID)，按完成顺序
+        if config_manager.get_core_config().get('archive_enabled', False):
+            self.archive = SampleArchive(config_manager.get_core_config().get('archive_dir', 'data/archive'))
+            if recovered is not None:
+                completed = sorted((sample['completed_time'], sample_id)
+                                   for sample_id, sample in recovered['samples'].items()
+                                   if sample['status'] == 'completed')
+                self.archive_queue.extend(completed)
+        
+        self._init_metrics()
         
-        # 样本管理
-        self.samples = {}
-        self.pending_results = {}
+        # 事件总线：结果、样本、状态与库存变化的订阅者各自有独立队列和分发线程
+        self.events = EventBus(self.metrics, logger)
+        self.event_queue_size = config_manager.get_core_config().get('event_queue_size', 1000)
         
-        # 线程锁
-        self.status_lock = threading.Lock()
-        self.sample_lock = threading.Lock()
-        self.inventory_lock = threading.Lock()
+        # 样本生命周期追踪（LAS/LIS服务器共用）
+        self.tracer = tracer if tracer is not None else Tracer()
+        
+        if self.journal is not None:
+            self.journal.start(self._persistent_state)
         
         # 结果生成线程
         self.result_thread = threading.Thread(target=self._generate_results_loop, daemon=True)
@@ -56,22 +181,198 @@ class AtellicaCore:
         
         self.logger.info("AtellicaCore initialized successfully")
     
+    def _restore_state(self, state):
+        """应用恢复的健康状态与库存（初始化阶段，发布快照之前调用）
+        
+        Args:
+            state: StateJournal.recover 返回的状态
+        """
+        health = state.get(OP_HEALTH)
+        if health:
+            fields = self._build_health()
+            for key, value in health.items():
+                # 启用处理能力模型时负载字段由恢复的样本重新推算
+                if key in fields and not (self.capacity is not None and key in self.CAPACITY_HEALTH_FIELDS):
+                    setattr(self, key, value)
+        if state.get(OP_TEST_INVENTORY):
+            self.test_inventory = state[OP_TEST_INVENTORY]
+        if state.get(OP_CONSUMABLE_INVENTORY):
+            self.consumable_inventory = state[OP_CONSUMABLE_INVENTORY]
+    
+    def _readmit_pending(self, samples):
+        """把恢复的未完成样本按接收顺序重新排入处理能力模型，并按模型重新计算结果时间（初始化阶段调用）
+        
+        Args:
+            samples: 恢复的样本记录（样本ID -> 样本记录）
+        """
+        now = time.time()
+        pending = sorted((sample for sample in samples.values() if sample['status'] != 'completed'),
+                         key=lambda sample: sample['received_time'])
+        for sample in pending:
+            self.sample_store.set_result_time(sample['sample_id'], float('inf'))
+            self._schedule_results(self.capacity.admit(sample['sample_id'], sample['tests'], now,
+                                                       sample.get('priority', PRIORITY_ROUTINE)))
+        self.health_snapshot.publish(self._build_health())
+        self._publish_capacity_load(self.health_snapshot.get())
+    
+    def _schedule_results(self, ready):
+        """为所有测试都已开始吸样的样本设置结果到期时间
+        
+        Args:
+            ready: CapacityModel.admit / advance 返回的 [(样本ID, 结果到期时间)]
+        """
+        for sample_id, result_time in ready:
+            self.sample_store.set_result_time(sample_id, result_time)
+    
+    def _persistent_state(self):
+        """当前完整状态，用于生成压缩快照（只读取已发布的不可变快照，不加锁）
+        
+        Returns:
+            dict: 与 StateJournal.recover 返回值结构相同的状态
+        """
+        state = {
+            'samples': self.sample_store.all_samples(),
+            OP_HEALTH: self.health_snapshot.get(),
+            OP_TEST_INVENTORY: self.test_inventory_snapshot.get(),
+            OP_CONSUMABLE_INVENTORY: self.consumable_inventory_snapshot.get(),
+        }
+        # 已移出内存的样本只存在于归档中，旧日志分段删除前先把归档写回磁盘
+        if self.archive is not None:
+            self.archive.flush()
+        return state
+    
+    def _on_sample_change(self, sample_id, kind, record):
+        """样本状态变化（样本存储在分片锁内调用）：记入变更日志和预写日志"""
+        self.changelog.append(sample_id, kind, record)
+        if self.journal is not None:
+            self.journal.append(OP_SAMPLE, record)
+    
+    def _commit(self):
+        """等待本线程的状态变化落盘（fsync=batch 时），调用方不能持有核心锁"""
+        if self.journal is not None:
+            self.journal.commit()
+    
+    def close(self):
+        """关闭核心：处理完已发布的事件并停止订阅者线程，写出剩余状态日志并生成压缩快照，写回样本归档"""
+        self.events.close()
+        if self.journal is not None:
+            self.journal.close()
+        if self.archive is not None:
+            self.archive.close()
+    
+    def _create_lock(self, name):
+        """创建核心锁，启用锁统计时返回InstrumentedLock
+        
+        Args:
+            name: 锁名
+            
+        Returns:
+            锁实例
+        """
+        if self.lock_monitor is not None:
+            return self.lock_monitor.lock(name)
+        return threading.Lock()
+    
+    def get_lock_report(self, top=10):
+        """获取核心锁竞争报告
+        
+        Args:
+            top: 列出的调用点数
+            
+        Returns:
+            str: 报告文本，未启用锁统计时返回提示
+        """
+        if self.lock_monitor is None:
+            return "Lock instrumentation is disabled (set core.lock_instrumentation to true)\n"
+        return self.lock_monitor.report(top)
+    
+    def _init_metrics(self):
+        """注册核心模块指标"""
+        self.metric_samples_received = self.metrics.counter(
+            'atellica_samples_received_total', 'Samples accepted by the instrument')
+        self.metric_samples_rejected = self.metrics.counter(
+            'atellica_samples_rejected_total', 'Samples rejected by the instrument', ['reason'])
+        self.metric_results_generated = self.metrics.counter(
+            'atellica_results_generated_total', 'Sample results generated')
+        self.metric_result_generation_seconds = self.metrics.histogram(
+            'atellica_result_generation_seconds', 'Time spent generating and publishing one sample result')
+        self.metric_turnaround_seconds = self.metrics.histogram(
+            'atellica_sample_turnaround_seconds', 'Time from sample receipt to result', ['priority'],
+            buckets=(60, 300, 600, 900, 1200, 1800, 2700, 3600, 7200, 14400))
+        self.metrics.gauge(
+            'atellica_pending_results', 'Samples waiting for result generation'
+        ).set_function(self.sample_store.pending_count)
+        self.metrics.gauge(
+            'atellica_samples', 'Samples held by the simulator'
+        ).set_function(self.sample_store.sample_count)
+        self.metrics.gauge(
+            'atellica_archived_samples', 'Completed samples moved to the on-disk archive'
+        ).set_function(lambda: len(self.archive) if self.archive is not None else 0)
+        self.metrics.gauge(
+            'atellica_processing_backlog', 'Tests waiting to be aspirated reported to the LAS'
+        ).set_function(lambda: self.get_instrument_health()['processing_backlog'])
+        self.metrics.gauge(
+            'atellica_sample_acquisition_delay_seconds', 'Sample acquisition delay reported to the LAS'
+        ).set_function(lambda: self.get_instrument_health()['sample_acquisition_delay'])
+        self.metrics.gauge(
+            'atellica_on_board_tube_count', 'On board tube count reported to the LAS'
+        ).set_function(lambda: self.health_snapshot.get()['on_board_tube_count'])
+        self.metrics.gauge(
+            'atellica_completed_tube_count', 'Completed tube count reported to the LAS'
+        ).set_function(lambda: self.health_snapshot.get()['completed_tube_count'])
+        carrier_queue_length = self.metrics.gauge(
+            'atellica_carrier_queue_length', 'Carriers queued at each interface position', ['ip'])
+        for ip_index, queue in enumerate(self.carrier_queues):
+            carrier_queue_length.labels(ip=str(ip_index)).set_function(queue.__len__)
+    
     def _generate_results_loop(self):
         """结果生成循环，定期检查并生成样本结果"""
         while True:
-            time.sleep(60)  # 每分钟检查一次
+            # 每分钟检查一次，等待期间定期经过剖析检查点
+            waited = 0.0
+            while waited < 60:
+                time.sleep(CHECKPOINT_INTERVAL)
+                waited += CHECKPOINT_INTERVAL
+                profile_checkpoint()
+            # 处理能力模型推进到当前时间，已开始吸样的样本得到结果时间
+            if self.capacity is not None:
+                self._refresh_capacity()
+            
             current_time = time.time()
             
-            with self.sample_lock:
-                # 检查所有待生成结果的样本
-                samples_to_process = []
-                for sample_id, result_info in self.pending_results.items():
-                    if current_time >= result_info['result_time']:
-                        samples_to_process.append(sample_id)
-                
-                # 生成结果
-                for sample_id in samples_to_process:
-                    self._generate_sample_result(sample_id)
+            # 检查所有待生成结果的样本（逐分片加锁）
+            samples_to_process = self.sample_store.due(current_time)
+            
+            # 生成结果（_generate_sample_result 自行加锁，不能在持锁时调用）
+            for sample_id in samples_to_process:
+                self._generate_sample_result(sample_id)
+            
+            self._archive_completed(time.time())
+    
+    def _archive_completed(self, now):
+        """把完成时间早于 now - archive_after 的样本转入归档并从内存中移除（结果生成线程调用）
+        
+        Args:
+            now: 当前时间
+            
+        Returns:
+            int: 归档的样本数
+        """
+        if self.archive is None:
+            return 0
+        cutoff = now - self.archive_after
+        archived = []
+        while self.archive_queue and self.archive_queue[0][0] <= cutoff:
+            _, sample_id = self.archive_queue.popleft()
+            sample = self.sample_store.get(sample_id)
+            if sample is not None and sample['status'] == 'completed':
+                self.archive.add(sample)
+                archived.append(sample_id)
+        if archived:
+            self.archive.flush()
+            self.sample_store.evict(archived)
+            self.logger.debug(f"Archived {len(archived)} completed samples")
+        return len(archived)
     
     def _generate_sample_result(self, sample_id):
         """生成样本结果
@@ -79,129 +380,175 @@ class AtellicaCore:
         Args:
             sample_id: 样本ID
         """
-        with self.sample_lock:
-            if sample_id not in self.pending_results:
-                return
-            
-            sample_info = self.pending_results.pop(sample_id)
-            sample = self.samples.get(sample_id)
-            
-            if not sample:
-                return
+        sample_info, sample = self.sample_store.pop_pending(sample_id)
+        if not sample:
+            return
+        
+        start_time = time.perf_counter()
+        generation_start = time.time()
+        self.tracer.record(sample_id, STAGE_RESULT_WAIT, sample['received_time'], sample_info['result_time'])
+        self.tracer.record(sample_id, STAGE_RESULT_BACKLOG, sample_info['result_time'], generation_start)
             
-        # 生成随机结果
-        results = {}
-        for test_code in sample['tests']:
-            # 根据测试项目生成不同范围的随机结果
-            if test_code.startswith('TEST'):
-                # 模拟不同类型的测试结果
-                if int(test_code[4:]) % 2 == 0:
-                    # 整数结果
-                    results[test_code] = {
-                        'value': random.randint(10, 100),
-                        'unit': 'mg/dL',
-                        'flags': ''
-                    }
-                else:
-                    # 小数结果
-                    results[test_code] = {
-                        'value': round(random.uniform(1.0, 10.0), 2),
-                        'unit': 'mmol/L',
-                        'flags': ''
-                    }
-            else:
-                # 默认结果
-                results[test_code] = {
-                    'value': round(random.uniform(0.0, 100.0), 2),
-                    'unit': 'U/L',
-                    'flags': ''
-                }
+        # 按检测项目目录生成结果并判定标志（每个样本独立的随机数流，配置种子后可复现）
+        results = self.assays.generate_sample(sample_id, sample['tests'])
+        
+        # 扣减试剂与耗材，跨越阈值时发布库存
+        inventory_events = self._consume_inventory(sample['tests'])
         
         # 更新样本状态
-        with self.sample_lock:
-            sample['status'] = 'completed'
-            sample['results'] = results
-            sample['completed_time'] = time.time()
-            
-            # 更新完成试管数量
-            with self.status_lock:
-                self.completed_tube_count += 1
+        sample = self.sample_store.complete(sample_id, results, time.time())
+        if self.archive is not None:
+            self.archive_queue.append((sample['completed_time'], sample_id))
+        with self.transfer_lock:
+            self.transfer.mark_ready(sample_id)
+        
+        # 更新完成试管数量
+        with self.status_lock:
+            if self.capacity is not None:
+                self.capacity.release()
+            self.completed_tube_count += 1
+            health = self._publish_health()
         
         self.logger.info(f"Generated results for sample {sample_id}: {results}")
         
-        # 通知LIS模块发送结果
-        # 通过回调机制实现，由LIS模块注册回调函数
-        if hasattr(self, 'result_callback') and callable(self.result_callback):
-            try:
-                self.result_callback(sample_id, results)
-            except Exception as e:
-                self.logger.error(f"Error calling result callback: {str(e)}")
+        # 结果落盘后再发布结果事件，由LIS等订阅者在各自的分发线程中处理
+        self._commit()
+        self.events.publish(ResultReady(sample_id, sample['results'], sample))
+        self.events.publish(StatusChanged('completed_tube_count', health['completed_tube_count'], health))
+        for event in inventory_events:
+            self.events.publish(event)
+        self._publish_transfer_status()
+        
+        self.tracer.record(sample_id, STAGE_RESULT_GENERATION, generation_start, time.time())
+        self.metric_results_generated.inc()
+        self.metric_result_generation_seconds.observe(time.perf_counter() - start_time)
+        priority = sample.get('priority', PRIORITY_ROUTINE)
+        turnaround = sample['completed_time'] - sample['received_time']
+        self.metric_turnaround_seconds.labels(priority=priority).observe(turnaround)
+        with self.turnaround_lock:
+            self.turnarounds[priority].append(turnaround)
+    
+    def subscribe(self, handler, event_types=None, name=None, queue_size=None, overflow='block'):
+        """订阅核心事件
+        
+        Args:
+            handler: 事件处理函数，参数为事件（在订阅者自己的分发线程中调用）
+            event_types: 关心的事件类列表，如 [ResultReady]（None表示全部）
+            name: 订阅者名称（用于线程名和指标标签）
+            queue_size: 队列容量（默认 core.event_queue_size）
+            overflow: 队列满时的策略（'block' / 'drop_oldest' / 'drop_new'）
+            
+        Returns:
+            Subscription: 订阅对象，可用于 unsubscribe
+        """
+        if queue_size is None:
+            queue_size = self.event_queue_size
+        return self.events.subscribe(handler, event_types, name, queue_size, overflow)
+    
+    def unsubscribe(self, subscription):
+        """取消订阅核心事件
+        
+        Args:
+            subscription: subscribe 返回的订阅对象
+        """
+        self.events.unsubscribe(subscription)
     
     def register_result_callback(self, callback):
-        """注册结果生成回调函数
+        """注册结果生成回调函数（兼容旧接口，等价于订阅 ResultReady 事件）
         
         Args:
             callback: 回调函数，接受sample_id和results作为参数
+            
+        Returns:
+            Subscription: 订阅对象
         """
-        self.result_callback = callback
+        return self.subscribe(lambda event: callback(event.sample_id, event.results), [ResultReady],
+                              getattr(callback, '__qualname__', 'result_callback'))
     
-    def receive_sample(self, sample_id, tests, patient_info=None):
+    def receive_sample(self, sample_id, tests, patient_info=None, priority=PRIORITY_ROUTINE):
         """接收样本
         
         Args:
             sample_id: 样本ID
             tests: 测试项目列表
             patient_info: 患者信息（可选）
+            priority: 样本优先级（'stat' / 'routine'），启用处理能力模型时STAT样本优先吸样
             
         Returns:
             bool: 是否成功接收
         """
-        with self.sample_lock:
-            if sample_id in self.samples:
-                self.logger.warning(f"Sample {sample_id} already exists")
-                return False
-            
-            # 检查测试项目是否存在
-            with self.inventory_lock:
-                valid_tests = []
-                for test_code in tests:
-                    test_exists = any(test['name'] == test_code for test in self.test_inventory['tests'])
-                    if test_exists:
-                        valid_tests.append(test_code)
-                    else:
-                        self.logger.warning(f"Test {test_code} not found in inventory")
-            
-            if not valid_tests:
-                self.logger.error(f"No valid tests for sample {sample_id}")
-                return False
-            
-            # 创建样本记录
-            sample = {
-                'sample_id': sample_id,
-                'tests': valid_tests,
-                'patient_info': patient_info or {},
-                'received_time': time.time(),
-                'status': 'received',
-                'results': None,
-                'completed_time': None
-            }
-            
-            self.samples[sample_id] = sample
-            
-            # 更新在线试管数量
-            with self.status_lock:
-                self.on_board_tube_count += 1
-            
-            # 计算结果生成时间（30分钟后）
-            result_delay = self.config_manager.get_lis_config().get('result_delay', 1800)
-            result_time = time.time() + result_delay
-            
-            self.pending_results[sample_id] = {
-                'result_time': result_time,
-                'sample_info': sample
-            }
-            
-        self.logger.info(f"Received sample {sample_id} with tests {valid_tests}, results will be available at {time.ctime(result_time)}")
+        start_time = time.time()
+        
+        if sample_id in self.sample_store or (self.archive is not None and sample_id in self.archive):
+            self.logger.warning(f"Sample {sample_id} already exists")
+            self.metric_samples_rejected.labels(reason='duplicate').inc()
+            return False
+        
+        # 在线试管已满时不再接收（不加锁读取，并发接收时可能略超上限）
+        if self.capacity is not None and self.capacity.is_full():
+            self.logger.warning(f"Sample {sample_id} rejected: on board tube capacity reached")
+            self.metric_samples_rejected.labels(reason='onboard_full').inc()
+            return False
+        
+        # 检查测试项目是否存在（读取库存快照，不加锁）
+        test_inventory = self.test_inventory_snapshot.get()
+        valid_tests = []
+        for test_code in tests:
+            test_exists = any(test['name'] == test_code for test in test_inventory['tests'])
+            if test_exists:
+                valid_tests.append(test_code)
+            else:
+                self.logger.warning(f"Test {test_code} not found in inventory")
+        
+        if not valid_tests:
+            self.logger.error(f"No valid tests for sample {sample_id}")
+            self.metric_samples_rejected.labels(reason='no_valid_tests').inc()
+            return False
+        
+        # 创建样本记录
+        sample = {
+            'sample_id': sample_id,
+            'tests': valid_tests,
+            'patient_info': patient_info or {},
+            'priority': priority if priority in PRIORITIES else PRIORITY_ROUTINE,
+            'received_time': time.time(),
+            'status': 'received',
+            'results': None,
+            'completed_time': None
+        }
+        
+        # 计算结果生成时间（30分钟后）；启用处理能力模型时登记后由模型排程
+        result_delay = self.config_manager.get_lis_config().get('result_delay', 1800)
+        result_time = time.time() + result_delay if self.capacity is None else float('inf')
+        
+        # 登记样本，并发接收同一样本时只有一个成功
+        record = self.sample_store.add(sample, result_time)
+        if record is None:
+            self.logger.warning(f"Sample {sample_id} already exists")
+            self.metric_samples_rejected.labels(reason='duplicate').inc()
+            return False
+        
+        # 更新在线试管数量
+        with self.status_lock:
+            if self.capacity is not None:
+                ready = self.capacity.admit(sample_id, valid_tests, time.time(), sample['priority'])
+            self.on_board_tube_count += 1
+            health = self._publish_health()
+        if self.capacity is not None:
+            self._schedule_results(ready)
+        
+        self._commit()
+        self.events.publish(SampleReceived(sample_id, record))
+        self.events.publish(StatusChanged('on_board_tube_count', health['on_board_tube_count'], health))
+        if self.capacity is not None:
+            self._publish_transfer_status()
+        
+        self.metric_samples_received.inc()
+        self.tracer.record(sample_id, STAGE_RECEIVE_SAMPLE, start_time, time.time(), tests=len(valid_tests))
+        if self.capacity is None:
+            self.logger.info(f"Received sample {sample_id} with tests {valid_tests}, results will be available at {time.ctime(result_time)}")
+        else:
+            self.logger.info(f"Received {sample['priority']} sample {sample_id} with tests {valid_tests}, queued for processing")
         return True
     
     def get_sample_info(self, sample_id):
@@ -211,19 +558,71 @@ class AtellicaCore:
             sample_id: 样本ID
             
         Returns:
-            dict: 样本信息，不存在则返回None
+            dict: 不可变样本信息，不存在则返回None
         """
-        with self.sample_lock:
-            return self.samples.get(sample_id)
+        sample = self.sample_store.get(sample_id)
+        if sample is None and self.archive is not None:
+            sample = self.archive.get(sample_id)
+        return sample
     
     def get_all_samples(self):
         """获取所有样本信息
         
         Returns:
-            dict: 所有样本信息
+            Mapping: 内存中所有样本的只读视图（样本记录为不可变快照）。
+                启用归档时不含已转入归档的样本，可通过 archive.scan() 顺序读取
         """
-        with self.sample_lock:
-            return self.samples.copy()
+        return self.sample_store.all_samples()
+    
+    def get_samples_snapshot(self):
+        """获取全量样本视图及其对应的变更序号，用于变更日志消费者初始化或落后后重新同步
+        
+        序号在视图之前读取，之后从该序号重放变化可能重复应用视图中已包含的变化，
+        而变化记录是完整的样本快照，重复应用不影响结果。
+        
+        Returns:
+            tuple: (变更序号, 样本只读视图)
+        """
+        seq = self.changelog.last_seq
+        return seq, self.sample_store.all_samples()
+    
+    def get_sample_changes(self, since=0, limit=None):
+        """获取序号大于 since 的样本状态变化
+        
+        Args:
+            since: 已处理的最后序号
+            limit: 最多返回条数（可选）
+            
+        Returns:
+            list: SampleChange 列表
+            
+        Raises:
+            ChangeLogTruncated: since 之后的部分变化已被覆盖，需通过 get_samples_snapshot 重新同步
+        """
+        return self.changelog.read(since, limit)
+    
+    def iter_sample_changes(self, since=None, timeout=None):
+        """同步迭代样本状态变化，没有新变化时阻塞等待
+        
+        Args:
+            since: 从该序号之后开始（None表示只迭代之后的新变化）
+            timeout: 等待新变化的超时（秒），超时后迭代结束
+            
+        Returns:
+            generator: SampleChange 生成器
+        """
+        return self.changelog.follow(since, timeout)
+    
+    def aiter_sample_changes(self, since=None):
+        """asyncio 异步迭代样本状态变化
+        
+        Args:
+            since: 从该序号之后开始（None表示只迭代之后的新变化）
+            
+        Returns:
+            async generator: SampleChange 异步生成器
+        """
+        return self.changelog.afollow(since)
     
     def update_automation_interface_status(self, status):
         """更新自动化接口状态
@@ -233,17 +632,25 @@ class AtellicaCore:
         """
         with self.status_lock:
             self.automation_interface_status = status
+            health = self._publish_health()
             self.logger.info(f"Updated automation interface status to {status}")
+        self._commit()
+        self.events.publish(StatusChanged('automation_interface_status', status, health))
+        self._publish_transfer_status()
     
     def update_instrument_process_status(self, status):
-        """更新仪器处理状态
+        """更新仪器处理状态（启用处理能力模型时上报的是该值与负载状态中较差的一个）
         
         Args:
             status: 状态值（1: Green, 2: Yellow, 3: Red）
         """
         with self.status_lock:
             self.instrument_process_status = status
+            health = self._publish_health()
             self.logger.info(f"Updated instrument process status to {status}")
+        self._commit()
+        self.events.publish(StatusChanged('instrument_process_status', health['instrument_process_status'], health))
+        self._publish_transfer_status()
     
     def update_lis_connection_status(self, status):
         """更新LIS连接状态
@@ -253,7 +660,10 @@ class AtellicaCore:
         """
         with self.status_lock:
             self.lis_connection_status = status
+            health = self._publish_health()
             self.logger.info(f"Updated LIS connection status to {status}")
+        self._commit()
+        self.events.publish(StatusChanged('lis_connection_status', status, health))
     
     def update_remote_control_status(self, ip_index, status):
         """更新远程控制状态
@@ -263,9 +673,14 @@ class AtellicaCore:
             status: 状态值
         """
         with self.status_lock:
-            if 0 <= ip_index < len(self.remote_control_status):
-                self.remote_control_status[ip_index] = status
-                self.logger.info(f"Updated remote control status for IP{ip_index} to {status}")
+            if not 0 <= ip_index < len(self.remote_control_status):
+                return
+            self.remote_control_status[ip_index] = status
+            health = self._publish_health()
+            self.logger.info(f"Updated remote control status for IP{ip_index} to {status}")
+        self._commit()
+        self.events.publish(StatusChanged('remote_control_status', health['remote_control_status'], health))
+        self._publish_transfer_status()
     
     def update_lock_ownership(self, ip_index, ownership):
         """更新锁所有权
@@ -275,29 +690,99 @@ class AtellicaCore:
             ownership: 所有权值（1: Locked by Instrument, 2: Not Locked by Instrument）
         """
         with self.status_lock:
-            if 0 <= ip_index < len(self.lock_ownership):
-                self.lock_ownership[ip_index] = ownership
-                self.logger.info(f"Updated lock ownership for IP{ip_index} to {ownership}")
+            if not 0 <= ip_index < len(self.lock_ownership):
+                return
+            self.lock_ownership[ip_index] = ownership
+            health = self._publish_health()
+            self.logger.info(f"Updated lock ownership for IP{ip_index} to {ownership}")
+        self._commit()
+        self.events.publish(StatusChanged('lock_ownership', health['lock_ownership'], health))
     
-    def get_instrument_health(self):
-        """获取仪器健康状态
+    def _build_health(self):
+        """根据当前设备状态构建健康状态字典（调用方持有status_lock或处于初始化阶段）
         
         Returns:
             dict: 仪器健康状态
         """
+        health = {
+            'automation_interface_status': self.automation_interface_status,
+            'instrument_process_status': self.instrument_process_status,
+            'lis_connection_status': self.lis_connection_status,
+            'interface_positions': self.interface_positions,
+            'remote_control_status': self.remote_control_status,
+            'lock_ownership': self.lock_ownership,
+            'processing_backlog': self.processing_backlog,
+            'sample_acquisition_delay': self.sample_acquisition_delay,
+            'on_board_tube_count': self.on_board_tube_count,
+            'completed_tube_count': self.completed_tube_count
+        }
+        if self.capacity is not None:
+            fields = self.capacity.load().health_fields(time.time())
+            health['instrument_process_status'] = max(self.instrument_process_status,
+                                                      fields.pop('load_process_status'))
+            health.update(fields)
+        return health
+    
+    def _refresh_capacity(self):
+        """处理能力模型推进到当前时间，按需设置结果时间，负载字段有变化时发布新的健康状态（结果生成循环中调用）
+        
+        Returns:
+            Mapping: 当前健康状态快照
+        """
         with self.status_lock:
-            return {
-                'automation_interface_status': self.automation_interface_status,
-                'instrument_process_status': self.instrument_process_status,
-                'lis_connection_status': self.lis_connection_status,
-                'interface_positions': self.interface_positions,
-                'remote_control_status': self.remote_control_status.copy(),
-                'lock_ownership': self.lock_ownership.copy(),
-                'processing_backlog': self.processing_backlog,
-                'sample_acquisition_delay': self.sample_acquisition_delay,
-                'on_board_tube_count': self.on_board_tube_count,
-                'completed_tube_count': self.completed_tube_count
-            }
+            ready = self.capacity.advance(time.time())
+            health = self.health_snapshot.get()
+            current = self._build_health()
+            changed = [key for key in self.CAPACITY_HEALTH_FIELDS if current[key] != health[key]]
+            if changed:
+                health = self._publish_health()
+        self._schedule_results(ready)
+        if changed:
+            self._commit()
+            for key in changed:
+                self.events.publish(StatusChanged(key, health[key], health))
+        return health
+    
+    def _publish_health(self):
+        """发布新的健康状态快照（调用方持有status_lock）
+        
+        Returns:
+            Mapping: 新发布的健康状态快照
+        """
+        self.health_snapshot.publish(self._build_health())
+        health = self.health_snapshot.get()
+        self._publish_capacity_load(health)
+        if self.journal is not None:
+            self.journal.append(OP_HEALTH, health)
+        return health
+    
+    def _publish_capacity_load(self, health):
+        """发布与健康状态快照对应的处理能力聚合量（调用方持有status_lock或处于初始化阶段）
+        
+        Args:
+            health: 刚发布的健康状态快照
+        """
+        if self.capacity is not None:
+            self.capacity_load = (health, self.capacity.load(), self.instrument_process_status)
+    
+    def get_instrument_health(self):
+        """获取仪器健康状态（不加锁、不写入任何状态）
+        
+        启用处理能力模型时，积压、样本获取延迟与处理状态随时间变化，由已发布的聚合量按当前时间推算；
+        模型本身由结果生成循环推进。
+        
+        Returns:
+            Mapping: 仪器健康状态的不可变快照
+        """
+        published = self.capacity_load
+        if published is None:
+            return self.health_snapshot.get()
+        health, load, process_status = published
+        fields = load.health_fields(time.time())
+        fields['instrument_process_status'] = max(process_status, fields.pop('load_process_status'))
+        if all(health[key] == value for key, value in fields.items()):
+            return health
+        return MappingProxyType({**health, **fields})
     
     def update_test_inventory(self, test_name, count=None, status=None):
         """更新测试项目库存
@@ -310,37 +795,41 @@ class AtellicaCore:
         Returns:
             bool: 是否成功更新
         """
+        inventory = None
         with self.inventory_lock:
-            for test in self.test_inventory['tests']:
-                if test['name'] == test_name:
-                    if count is not None:
-                        test['count'] = count
-                        # 根据数量自动更新状态
-                        threshold = self.test_inventory['threshold']
-                        if count == 0:
-                            test['status'] = 3  # Red
-                        elif count < threshold:
-                            test['status'] = 2  # Yellow
-                        else:
-                            test['status'] = 1  # Green
-                    
-                    if status is not None:
-                        test['status'] = status
-                    
-                    self.logger.info(f"Updated test inventory: {test_name} - count: {test['count']}, status: {test['status']}")
-                    return True
+            test = self.reagents.tests.get(test_name)
+            if test is not None:
+                if count is not None:
+                    test['count'] = count
+                    # 根据数量自动更新状态
+                    test['status'] = inventory_status(count, self.reagents.test_threshold(test))
+                
+                if status is not None:
+                    test['status'] = status
+                
+                inventory = self._publish_test_inventory()
+                self.logger.info(f"Updated test inventory: {test_name} - count: {test['count']}, status: {test['status']}")
             
-            self.logger.error(f"Test {test_name} not found in inventory")
-            return False
+            if inventory is None:
+                self.logger.error(f"Test {test_name} not found in inventory")
+                return False
+        
+        self._commit()
+        self.events.publish(InventoryChanged('test', test_name, inventory))
+        return True
     
     def get_test_inventory(self):
         """获取测试项目库存
         
         Returns:
-            dict: 测试项目库存
+            Mapping: 测试项目库存的不可变快照
         """
-        with self.inventory_lock:
-            return self.test_inventory.copy()
+        # 消耗只标记余量已变化，读取时才重新发布，避免每个测试都复制整个库存
+        if self.reagents.tests_dirty:
+            with self.inventory_lock:
+                if self.reagents.tests_dirty:
+                    self._publish_test_inventory()
+        return self.test_inventory_snapshot.get()
     
     def update_consumable_inventory(self, module_id, consumable_id, status):
         """更新耗材库存
@@ -353,27 +842,333 @@ class AtellicaCore:
         Returns:
             bool: 是否成功更新
         """
+        inventory = None
         with self.inventory_lock:
             for module in self.consumable_inventory['modules']:
                 if module['id'] == module_id:
                     for consumable in module['consumables']:
                         if consumable['id'] == consumable_id:
                             consumable['status'] = status
+                            inventory = self._publish_consumable_inventory()
                             self.logger.info(f"Updated consumable inventory: Module {module_id}, Consumable {consumable_id} - status: {status}")
-                            return True
+                            break
                     break
             
-            self.logger.error(f"Consumable {consumable_id} not found in module {module_id}")
-            return False
+            if inventory is None:
+                self.logger.error(f"Consumable {consumable_id} not found in module {module_id}")
+                return False
+        
+        self._commit()
+        self.events.publish(InventoryChanged('consumable', (module_id, consumable_id), inventory))
+        return True
     
     def get_consumable_inventory(self):
         """获取耗材库存
         
         Returns:
-            dict: 耗材库存
+            Mapping: 耗材库存的不可变快照
+        """
+        if self.reagents.consumables_dirty:
+            with self.inventory_lock:
+                if self.reagents.consumables_dirty:
+                    self._publish_consumable_inventory()
+        return self.consumable_inventory_snapshot.get()
+    
+    def _publish_test_inventory(self):
+        """发布测试项目库存快照并写入日志（调用方持有 inventory_lock）
+        
+        Returns:
+            Mapping: 新发布的快照
         """
+        self.reagents.tests_dirty = False
+        self.test_inventory_snapshot.publish(self.test_inventory)
+        inventory = self.test_inventory_snapshot.get()
+        if self.journal is not None:
+            self.journal.append(OP_TEST_INVENTORY, inventory)
+        return inventory
+    
+    def _publish_consumable_inventory(self):
+        """发布耗材库存快照并写入日志（调用方持有 inventory_lock）
+        
+        Returns:
+            Mapping: 新发布的快照
+        """
+        self.reagents.consumables_dirty = False
+        self.consumable_inventory_snapshot.publish(self.consumable_inventory)
+        inventory = self.consumable_inventory_snapshot.get()
+        if self.journal is not None:
+            self.journal.append(OP_CONSUMABLE_INVENTORY, inventory)
+        return inventory
+    
+    def _consume_inventory(self, tests):
+        """扣减完成测试的试剂与耗材（结果生成线程调用）
+        
+        只有状态跨越阈值或检测项目余量跨越上报步长时才发布快照，其余扣减在下次读取库存时一并发布。
+        
+        Args:
+            tests: 已完成的测试项目列表
+            
+        Returns:
+            list: 待发布的 InventoryChanged 事件
+        """
+        events = []
         with self.inventory_lock:
-            return self.consumable_inventory.copy()
+            changed_tests, changed_consumables = self.reagents.consume(tests)
+            if changed_tests:
+                inventory = self._publish_test_inventory()
+                for test_name in changed_tests:
+                    test = self.reagents.tests[test_name]
+                    self.logger.info(f"Test inventory {test_name} consumed to {test['count']}, status: {test['status']}")
+                    events.append(InventoryChanged('test', test_name, inventory))
+            if changed_consumables:
+                inventory = self._publish_consumable_inventory()
+                for module_id, consumable_id in changed_consumables:
+                    self.logger.info(f"Consumable {consumable_id} on module {module_id} consumed, status changed")
+                    events.append(InventoryChanged('consumable', (module_id, consumable_id), inventory))
+        return events
+    
+    def get_turnaround_stats(self):
+        """按优先级统计最近完成样本的周转时间（接收到出结果）
+        
+        Returns:
+            dict: 优先级 -> {'count', 'p50', 'p95', 'p99', 'max'}（秒），没有完成样本的优先级不列出
+        """
+        with self.turnaround_lock:
+            windows = {priority: sorted(values) for priority, values in self.turnarounds.items() if values}
+        stats = {}
+        for priority, values in windows.items():
+            stats[priority] = {'count': len(values), 'max': values[-1]}
+            for percent in (50, 95, 99):
+                stats[priority][f"p{percent}"] = values[max(1, math.ceil(percent / 100.0 * len(values))) - 1]
+        return stats
+    
+    def get_turnaround_report(self):
+        """按优先级的周转时间报告
+        
+        Returns:
+            str: 报告文本
+        """
+        stats = self.get_turnaround_stats()
+        if not stats:
+            return "No completed samples yet\n"
+        lines = [f"{'priority':<10}{'samples':>9}{'p50(s)':>11}{'p95(s)':>11}{'p99(s)':>11}{'max(s)':>11}"]
+        for priority in (priority for priority in PRIORITIES if priority in stats):
+            row = stats[priority]
+            lines.append(f"{priority:<10}{row['count']:>9}{row['p50']:>11.1f}{row['p95']:>11.1f}"
+                         f"{row['p99']:>11.1f}{row['max']:>11.1f}")
+        return "\n".join(lines) + "\n"
+    
+    def _carrier_queue(self, ip_index):
+        """获取接口位置的载架队列，索引无效时记录错误并返回 None"""
+        if 0 <= ip_index < len(self.carrier_queues):
+            return self.carrier_queues[ip_index]
+        self.logger.error(f"Invalid interface position index: {ip_index}")
+        return None
+    
+    def add_carrier(self, ip_index, occupancy, sample_id='', priority=0, tube_height=0, tube_diameter=0):
+        """Add Queue：载架按分流顺序加入接口位置队列（允许重复样本ID）
+        
+        Args:
+            ip_index: 接口位置索引
+            occupancy: 占用类型（1: 空载架, 2: 开盖试管, 3: 带盖试管）
+            sample_id: 样本ID（空载架为空字符串）
+            priority: 样本优先级（0: 未定义, 1: 常规, 2: STAT）
+            tube_height: 试管高度（毫米）
+            tube_diameter: 试管直径（0.1毫米）
+            
+        Returns:
+            bool: 是否成功加入
+        """
+        queue = self._carrier_queue(ip_index)
+        if queue is None:
+            return False
+        with self.carrier_lock:
+            queue.add(Carrier(occupancy, sample_id, priority, tube_height, tube_diameter))
+            length = len(queue)
+        self.logger.info(f"Carrier added to IP{ip_index} queue: {sample_id or '(empty)'}, occupancy: {occupancy}, queue length: {length}")
+        return True
+    
+    def skip_carrier(self, ip_index, occupancy, sample_id=''):
+        """Skip Queue：从接口位置队列移除最早加入的匹配载架（已锁定的载架不受影响）
+        
+        Args:
+            ip_index: 接口位置索引
+            occupancy: 占用类型
+            sample_id: 样本ID（空载架为空字符串）
+            
+        Returns:
+            bool: 是否找到并移除了载架
+        """
+        queue = self._carrier_queue(ip_index)
+        if queue is None:
+            return False
+        with self.carrier_lock:
+            carrier = queue.skip(occupancy, sample_id)
+            length = len(queue)
+        if carrier is None:
+            self.logger.warning(f"Skip Queue: no carrier {sample_id or '(empty)'} with occupancy {occupancy} in IP{ip_index} queue")
+            return False
+        self.logger.info(f"Carrier skipped from IP{ip_index} queue: {sample_id or '(empty)'}, queue length: {length}")
+        return True
+    
+    def clear_carrier_queue(self, ip_index):
+        """Clear Queue：清除接口位置队列中未锁定的载架
+        
+        Args:
+            ip_index: 接口位置索引
+            
+        Returns:
+            int: 清除的载架数，接口位置无效时为 None
+        """
+        queue = self._carrier_queue(ip_index)
+        if queue is None:
+            return None
+        with self.carrier_lock:
+            cleared = queue.clear()
+            locked = len(queue.locked)
+        self.logger.info(f"IP{ip_index} carrier queue cleared: {cleared} carriers removed, {locked} locked carriers kept")
+        return cleared
+    
+    def reset_carrier_queues(self):
+        """与LAS断开连接时清除所有接口位置的队列信息（保留已锁定的载架）"""
+        for ip_index in range(len(self.carrier_queues)):
+            self.clear_carrier_queue(ip_index)
+    
+    def get_carrier_queue(self, ip_index):
+        """获取接口位置的载架队列
+        
+        Args:
+            ip_index: 接口位置索引
+            
+        Returns:
+            dict: {'queued': 按队列顺序的载架列表, 'locked': 已锁定的载架列表}，接口位置无效时为 None
+        """
+        queue = self._carrier_queue(ip_index)
+        if queue is None:
+            return None
+        with self.carrier_lock:
+            return {
+                'queued': [carrier.to_dict() for carrier in queue.carriers()],
+                'locked': [carrier.to_dict() for carrier in queue.locked],
+            }
+    
+    def _onboard_full(self):
+        """在线试管是否已满（启用处理能力模型时），不加锁读取"""
+        return self.capacity is not None and self.capacity.is_full()
+    
+    def _publish_transfer_status(self):
+        """重新计算各接口位置的 Transfer Status，只为有变化的位置发布 TransferStatusChanged"""
+        full = self._onboard_full()
+        with self.transfer_lock:
+            status = self.transfer.status(self.health_snapshot.get(), full)
+            changed = [ip_index for ip_index, current in enumerate(status) if current != self.transfer_status[ip_index]]
+            self.transfer_status = status
+        for ip_index in changed:
+            ready, return_ready = status[ip_index]
+            self.events.publish(TransferStatusChanged(ip_index, ready, return_ready))
+    
+    def get_transfer_status(self, ip_index):
+        """获取接口位置的 Transfer Status
+        
+        Args:
+            ip_index: 接口位置索引
+            
+        Returns:
+            dict: {'ready_to_load', 'return_ready_tube_count'}，接口位置无效时为 None
+        """
+        if not 0 <= ip_index < self.interface_positions:
+            self.logger.error(f"Invalid interface position index: {ip_index}")
+            return None
+        full = self._onboard_full()
+        with self.transfer_lock:
+            return {
+                'ready_to_load': self.transfer.ready_to_load(ip_index, self.health_snapshot.get(), full),
+                'return_ready_tube_count': len(self.transfer.return_queue),
+            }
+    
+    def begin_load_unload(self, ip_index, occupancy, sample_id=''):
+        """Load_Unload：锁定队首载架并开始取放，装载与卸载结果在开始时确定
+        
+        队首载架与请求不匹配（或该接口位置正在取放）时返回 Queue Mismatch，不锁定任何载架。
+        
+        Args:
+            ip_index: 接口位置索引
+            occupancy: 占用类型（1: 空载架, 2: 开盖试管, 3: 带盖试管）
+            sample_id: 样本ID（空载架为空字符串）
+            
+        Returns:
+            Transfer: 取放操作，接口位置无效时为 None
+        """
+        queue = self._carrier_queue(ip_index)
+        if queue is None:
+            return None
+        with self.transfer_lock:
+            busy = self.transfer.active[ip_index] is not None
+        carrier = None
+        if not busy:
+            with self.carrier_lock:
+                head = queue.head()
+                if head is not None and head.occupancy == occupancy and head.sample_id == sample_id:
+                    carrier = queue.lock_head()
+        has_orders = bool(sample_id) and (sample_id in self.sample_store
+                                          or (self.archive is not None and sample_id in self.archive))
+        with self.transfer_lock:
+            transfer = self.transfer.begin(ip_index, carrier, occupancy, sample_id,
+                                           self.health_snapshot.get(), has_orders)
+        if carrier is None:
+            self.logger.warning(f"Load_Unload at IP{ip_index}: carrier {sample_id or '(empty)'} does not match queue")
+            return transfer
+        
+        # 载架锁定期间仪器拥有该接口位置；卸载的试管离开仪器，没有工单的试管直接计入待返回
+        with self.status_lock:
+            self.lock_ownership[ip_index] = LOCKED_BY_INSTRUMENT
+            if transfer.loaded_without_orders:
+                self.on_board_tube_count += 1
+                self.completed_tube_count += 1
+            if transfer.unloaded:
+                self.on_board_tube_count = max(0, self.on_board_tube_count - 1)
+                self.completed_tube_count = max(0, self.completed_tube_count - 1)
+            health = self._publish_health()
+        self._commit()
+        self.events.publish(StatusChanged('lock_ownership', health['lock_ownership'], health))
+        self._publish_transfer_status()
+        self.logger.info(f"Load_Unload started at IP{ip_index}: load {transfer.load_sample_id or '(none)'} "
+                         f"status 0x{transfer.load_status:02x}, unload {transfer.unload_sample_id or '(none)'} "
+                         f"status 0x{transfer.unload_status:02x}")
+        return transfer
+    
+    def finish_load_unload(self, transfer):
+        """机械臂离开轨道：释放载架与接口位置锁
+        
+        Args:
+            transfer: begin_load_unload 返回的取放操作
+            
+        Returns:
+            dict: Load_Unload 响应中的计数与就绪状态
+                  {'on_board_tube_count', 'completed_tube_count', 'ready_to_load', 'return_ready_tube_count'}
+        """
+        ip_index = transfer.ip_index
+        with self.transfer_lock:
+            self.transfer.finish(transfer)
+        if transfer.carrier is not None:
+            with self.carrier_lock:
+                self.carrier_queues[ip_index].unlock(transfer.carrier)
+            with self.status_lock:
+                self.lock_ownership[ip_index] = NOT_LOCKED_BY_INSTRUMENT
+                health = self._publish_health()
+            self._commit()
+            self.events.publish(StatusChanged('lock_ownership', health['lock_ownership'], health))
+            self._publish_transfer_status()
+            self.logger.info(f"Load_Unload finished at IP{ip_index} after {time.time() - transfer.started:.1f}s")
+        else:
+            health = self.get_instrument_health()
+        status = self.get_transfer_status(ip_index)
+        return {
+            'on_board_tube_count': health['on_board_tube_count'],
+            'completed_tube_count': health['completed_tube_count'],
+            'ready_to_load': status['ready_to_load'],
+            'return_ready_tube_count': status['return_ready_tube_count'],
+        }
     
     def get_status_summary(self):
         """获取状态摘要
@@ -381,11 +1176,11 @@ class AtellicaCore:
         Returns:
             dict: 状态摘要
         """
-        with self.status_lock:
-            return {
-                'automation_interface_status': self.automation_interface_status,
-                'instrument_process_status': self.instrument_process_status,
-                'lis_connection_status': self.lis_connection_status,
-                'on_board_tube_count': self.on_board_tube_count,
-                'completed_tube_count': self.completed_tube_count
-            }
+        health = self.health_snapshot.get()
+        return {
+            'automation_interface_status': health['automation_interface_status'],
+            'instrument_process_status': health['instrument_process_status'],
+            'lis_connection_status': health['lis_connection_status'],
+            'on_board_tube_count': health['on_board_tube_count'],
+            'completed_tube_count': health['completed_tube_count']
+        }
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Events模块 - 核心事件类型与发布/订阅总线
+"""
+
+import queue
+import threading
+import time
+
+
+class Event:
+    """事件基类"""
+
+    __slots__ = ('timestamp',)
+
+    event_type = 'event'
+
+    def __init__(self):
+        self.timestamp = time.time()
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__ if name != 'timestamp')
+        return f"{type(self).__name__}({fields})"
+
+
+class SampleReceived(Event):
+    """样本已登记"""
+
+    __slots__ = ('sample_id', 'sample')
+
+    event_type = 'sample_received'
+
+    def __init__(self, sample_id, sample):
+        super().__init__()
+        self.sample_id = sample_id
+        self.sample = sample
+
+
+class ResultReady(Event):
+    """样本结果已生成"""
+
+    __slots__ = ('sample_id', 'results', 'sample')
+
+    event_type = 'result_ready'
+
+    def __init__(self, sample_id, results, sample):
+        super().__init__()
+        self.sample_id = sample_id
+        self.results = results
+        self.sample = sample
+
+
+class StatusChanged(Event):
+    """设备状态变化"""
+
+    __slots__ = ('field', 'value', 'health')
+
+    event_type = 'status_changed'
+
+    def __init__(self, field, value, health):
+        """
+        Args:
+            field: 变化的状态字段名
+            value: 新值
+            health: 变化后的健康状态快照
+        """
+        super().__init__()
+        self.field = field
+        self.value = value
+        self.health = health
+
+
+class InventoryChanged(Event):
+    """库存变化"""
+
+    __slots__ = ('kind', 'item', 'inventory')
+
+    event_type = 'inventory_changed'
+
+    def __init__(self, kind, item, inventory):
+        """
+        Args:
+            kind: 'test' 或 'consumable'
+            item: 变化的测试项目名或 (模块ID, 耗材ID)
+            inventory: 变化后的库存快照
+        """
+        super().__init__()
+        self.kind = kind
+        self.item = item
+        self.inventory = inventory
+
+
+class TransferStatusChanged(Event):
+    """接口位置的取放就绪状态变化（Transfer Status）"""
+
+    __slots__ = ('ip_index', 'ready_to_load', 'return_ready_tube_count')
+
+    event_type = 'transfer_status_changed'
+
+    def __init__(self, ip_index, ready_to_load, return_ready_tube_count):
+        """
+        Args:
+            ip_index: 接口位置索引
+            ready_to_load: 是否可以装载
+            return_ready_tube_count: 可返回LAS的试管数
+        """
+        super().__init__()
+        self.ip_index = ip_index
+        self.ready_to_load = ready_to_load
+        self.return_ready_tube_count = return_ready_tube_count
+
+
+# 队列满时的处理策略
+OVERFLOW_BLOCK = 'block'              # 发布者等待（背压），不丢事件
+OVERFLOW_DROP_OLDEST = 'drop_oldest'  # 丢弃最旧的事件，适合只关心最新状态的订阅者
+OVERFLOW_DROP_NEW = 'drop_new'        # 丢弃新事件
+
+_STOP = object()
+
+
+class Subscription:
+    """一个订阅者：独立的有界队列和分发线程"""
+
+    def __init__(self, bus, name, handler, event_types, queue_size, overflow):
+        """初始化订阅
+
+        Args:
+            bus: 所属EventBus
+            name: 订阅者名称（用于线程名和指标标签）
+            handler: 事件处理函数，参数为事件
+            event_types: 关心的事件类集合（None表示全部）
+            queue_size: 队列容量
+            overflow: 队列满时的策略
+        """
+        self.bus = bus
+        self.name = name
+        self.handler = handler
+        self.event_types = tuple(event_types) if event_types else None
+        self.overflow = overflow
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.active = True
+
+        self.metric_delivered = bus.metric_delivered.labels(subscriber=name)
+        self.metric_dropped = bus.metric_dropped.labels(subscriber=name)
+        self.metric_errors = bus.metric_errors.labels(subscriber=name)
+        self.metric_blocked = bus.metric_blocked_seconds.labels(subscriber=name)
+        self.metric_dispatch = bus.metric_dispatch_seconds.labels(subscriber=name)
+        bus.metric_queue_depth.labels(subscriber=name).set_function(self.queue.qsize)
+
+        self.thread = threading.Thread(target=self._dispatch_loop, name=f"EventBus-{name}", daemon=True)
+        self.thread.start()
+
+    def accepts(self, event):
+        """是否订阅该事件"""
+        return self.active and (self.event_types is None or isinstance(event, self.event_types))
+
+    def offer(self, event):
+        """按溢出策略把事件放入队列"""
+        try:
+            self.queue.put_nowait(event)
+            return
+        except queue.Full:
+            pass
+
+        if self.overflow == OVERFLOW_BLOCK:
+            start = time.perf_counter()
+            self.queue.put(event)
+            self.metric_blocked.observe(time.perf_counter() - start)
+        elif self.overflow == OVERFLOW_DROP_OLDEST:
+            while True:
+                try:
+                    self.queue.get_nowait()
+                    self.queue.task_done()
+                    self.metric_dropped.inc()
+                except queue.Empty:
+                    pass
+                try:
+                    self.queue.put_nowait(event)
+                    return
+                except queue.Full:
+                    continue
+        else:
+            self.metric_dropped.inc()
+
+    def _dispatch_loop(self):
+        """分发线程：依次调用处理函数，单个事件出错不影响后续事件"""
+        while True:
+            event = self.queue.get()
+            try:
+                if event is _STOP:
+                    return
+                start = time.perf_counter()
+                try:
+                    self.handler(event)
+                except Exception as e:
+                    self.metric_errors.inc()
+                    self.bus.logger.error(f"Error in event subscriber {self.name}: {str(e)}")
+                self.metric_dispatch.observe(time.perf_counter() - start)
+                self.metric_delivered.inc()
+            finally:
+                self.queue.task_done()
+
+    def join(self):
+        """等待队列中已有事件处理完成"""
+        self.queue.join()
+
+    def close(self, timeout=None):
+        """停止分发线程（已入队的事件先处理完）"""
+        self.active = False
+        self.queue.put(_STOP)
+        self.thread.join(timeout)
+
+
+class EventBus:
+    """事件总线
+
+    每个订阅者有自己的有界队列和分发线程，慢订阅者只会让自己的队列积压，
+    不会拖慢发布者或其他订阅者（OVERFLOW_BLOCK 策略在队列满时对发布者施加背压）。
+    """
+
+    def __init__(self, metrics, logger):
+        """初始化事件总线
+
+        Args:
+            metrics: MetricsRegistry实例
+            logger: 日志管理器实例
+        """
+        self.logger = logger
+        self.subscriptions = ()
+        self.lock = threading.Lock()
+
+        self.metric_published = metrics.counter(
+            'event_bus_published_total', 'Events published on the core event bus', ['type'])
+        self.metric_delivered = metrics.counter(
+            'event_bus_delivered_total', 'Events handled by each subscriber', ['subscriber'])
+        self.metric_dropped = metrics.counter(
+            'event_bus_dropped_total', 'Events dropped because a subscriber queue was full', ['subscriber'])
+        self.metric_errors = metrics.counter(
+            'event_bus_handler_errors_total', 'Subscriber handler exceptions', ['subscriber'])
+        self.metric_queue_depth = metrics.gauge(
+            'event_bus_queue_depth', 'Events waiting in each subscriber queue', ['subscriber'])
+        self.metric_blocked_seconds = metrics.histogram(
+            'event_bus_publish_blocked_seconds', 'Time publishers waited on a full subscriber queue', ['subscriber'])
+        self.metric_dispatch_seconds = metrics.histogram(
+            'event_bus_dispatch_seconds', 'Time spent in a subscriber handler per event', ['subscriber'])
+
+    def subscribe(self, handler, event_types=None, name=None, queue_size=1000, overflow=OVERFLOW_BLOCK):
+        """注册订阅者
+
+        Args:
+            handler: 事件处理函数，参数为事件
+            event_types: 关心的事件类列表（None表示全部）
+            name: 订阅者名称
+            queue_size: 队列容量
+            overflow: 队列满时的策略（OVERFLOW_BLOCK / OVERFLOW_DROP_OLDEST / OVERFLOW_DROP_NEW）
+
+        Returns:
+            Subscription: 订阅对象，可用于 unsubscribe
+        """
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEW):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        name = name or getattr(handler, '__qualname__', 'subscriber')
+        subscription = Subscription(self, name, handler, event_types, queue_size, overflow)
+        with self.lock:
+            self.subscriptions = self.subscriptions + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """注销订阅者
+
+        Args:
+            subscription: subscribe 返回的订阅对象
+        """
+        with self.lock:
+            self.subscriptions = tuple(s for s in self.subscriptions if s is not subscription)
+        subscription.close()
+
+    def publish(self, event):
+        """发布事件（订阅者列表为不可变元组，发布路径不加锁）
+
+        Args:
+            event: Event实例
+        """
+        self.metric_published.labels(type=event.event_type).inc()
+        for subscription in self.subscriptions:
+            if subscription.accepts(event):
+                subscription.offer(event)
+
+    def flush(self):
+        """等待所有订阅者处理完已发布的事件"""
+        for subscription in self.subscriptions:
+            subscription.join()
+
+    def close(self):
+        """停止所有订阅者"""
+        with self.lock:
+            subscriptions, self.subscriptions = self.subscriptions, ()
+        for subscription in subscriptions:
+            subscription.close()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Inventory模块 - 试剂与耗材消耗：每个完成的测试扣减检测项目余量与耗材余量，只在跨越阈值时重新判定状态
+"""
+
+
+STATUS_GREEN = 1
+STATUS_YELLOW = 2
+STATUS_RED = 3
+
+
+def inventory_status(count, threshold):
+    """按余量判定库存状态
+
+    Args:
+        count: 余量
+        threshold: 黄色阈值
+
+    Returns:
+        int: 1 Green（余量 >= 阈值）/ 2 Yellow（余量 < 阈值）/ 3 Red（余量为 0）
+    """
+    if count <= 0:
+        return STATUS_RED
+    if count < threshold:
+        return STATUS_YELLOW
+    return STATUS_GREEN
+
+
+class ReagentTracker:
+    """试剂与耗材余量计数器
+
+    直接持有核心库存结构中的条目（同一批 dict），按名称/耗材ID建立索引，扣减为 O(1)，不遍历库存。
+    状态只在余量跨越阈值（或降到 0）时重新判定，其余时间保留原状态，因此界面手动设置的状态不会被逐次扣减覆盖。
+    余量变化只标记为脏，由调用方决定何时发布快照；跨越阈值或检测项目余量跨越上报步长时返回变化条目。
+
+    计数器本身不加锁，调用方在核心的 inventory_lock 内调用所有方法（持锁时间只有几次字典查找和整数减法）。
+    """
+
+    def __init__(self, test_inventory, consumable_inventory):
+        """建立索引
+
+        Args:
+            test_inventory: 检测项目库存（threshold、report_step、tests；条目可带各自的 threshold）
+            consumable_inventory: 耗材库存（threshold、modules；带 count 的耗材才参与消耗，可带 per_test 与 threshold）
+        """
+        self.threshold = int(test_inventory.get('threshold', 10))
+        self.report_step = max(1, int(test_inventory.get('report_step', 10)))
+        self.tests = {test['name']: test for test in test_inventory.get('tests', [])}
+
+        # 耗材ID -> [(模块ID, 耗材条目)]，按配置的模块顺序；先用完第一个模块的，再用下一个模块的
+        self.consumable_threshold = int(consumable_inventory.get('threshold', 100))
+        self.consumables = {}
+        for module in consumable_inventory.get('modules', []):
+            for consumable in module.get('consumables', []):
+                if 'count' in consumable:
+                    self.consumables.setdefault(consumable['id'], []).append((module['id'], consumable))
+
+        self.tests_dirty = False
+        self.consumables_dirty = False
+
+    def test_threshold(self, test):
+        """检测项目的黄色阈值（条目自带的优先）"""
+        return int(test.get('threshold', self.threshold))
+
+    def consume(self, tests):
+        """扣减一个样本所做测试的试剂与耗材
+
+        Args:
+            tests: 已完成的测试项目列表
+
+        Returns:
+            tuple: (状态变化或跨越上报步长的检测项目名称列表, 状态变化的 (模块ID, 耗材ID) 列表)
+        """
+        changed_tests = []
+        runs = 0
+        for test_code in tests:
+            test = self.tests.get(test_code)
+            if test is None or test['count'] <= 0:
+                continue
+            threshold = self.test_threshold(test)
+            before = test['count']
+            test['count'] = after = before - 1
+            runs += 1
+            status = inventory_status(after, threshold)
+            if status != inventory_status(before, threshold):
+                test['status'] = status
+                changed_tests.append(test_code)
+            elif after % self.report_step == 0:
+                changed_tests.append(test_code)
+        if runs:
+            self.tests_dirty = True
+
+        changed_consumables = []
+        if runs and self.consumables:
+            for consumable_id, entries in self.consumables.items():
+                for module_id, consumable in entries:
+                    if consumable['count'] <= 0:
+                        continue
+                    threshold = int(consumable.get('threshold', self.consumable_threshold))
+                    before = consumable['count']
+                    consumable['count'] = after = max(0, before - runs * int(consumable.get('per_test', 1)))
+                    status = inventory_status(after, threshold)
+                    if status != inventory_status(before, threshold):
+                        consumable['status'] = status
+                        changed_consumables.append((module_id, consumable_id))
+                    self.consumables_dirty = True
+                    break
+        return changed_tests, changed_consumables
@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Journal模块 - 核心状态的预写日志（WAL）与压缩快照
+"""
+
+import json
+import os
+import threading
+import time
+import zlib
+from collections.abc import Mapping
+
+from .snapshots import gc_paused
+
+
+# 刷盘策略
+FSYNC_BATCH = 'batch'        # 每批写入后fsync，修改方法返回前等待所在批次落盘（组提交）
+FSYNC_INTERVAL = 'interval'  # 按固定间隔写入并fsync，修改方法不等待，崩溃最多丢失一个间隔
+
+# 日志操作类型，每条记录都是变化后的完整值，重放是幂等的
+OP_SAMPLE = 'sample'
+OP_HEALTH = 'health'
+OP_TEST_INVENTORY = 'test_inventory'
+OP_CONSUMABLE_INVENTORY = 'consumable_inventory'
+
+SEGMENT_PREFIX = 'wal-'
+SEGMENT_SUFFIX = '.log'
+SNAPSHOT_FILE = 'snapshot.json'
+
+# 恢复时每次合并解码的记录条数
+REPLAY_CHUNK = 10000
+
+# 每批条数直方图桶
+BATCH_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000, 10000)
+
+
+class JournalWriteError(Exception):
+    """预写日志写入失败：失败批次及之后的记录都不再落盘，等待它们的 commit 会抛出此异常"""
+
+
+def _json_default(value):
+    """JSON编码不可变快照（只读映射、frozenset）"""
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, frozenset):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_entry(op, data):
+    """编码一条日志记录：8位十六进制CRC32 + 空格 + JSON + 换行
+
+    Args:
+        op: 操作类型
+        data: 变化后的值
+
+    Returns:
+        bytes: 记录行
+    """
+    payload = json.dumps([op, data], separators=(',', ':'), ensure_ascii=False,
+                         default=_json_default).encode('utf-8')
+    return b'%08x %s\n' % (zlib.crc32(payload), payload)
+
+
+def decode_entry(line):
+    """解码一条日志记录
+
+    Args:
+        line: 记录行（含换行）
+
+    Returns:
+        list: [操作类型, 值]，记录不完整或校验失败时返回None
+    """
+    if len(line) < 10 or line[-1:] != b'\n' or line[8:9] != b' ':
+        return None
+    payload = line[9:-1]
+    try:
+        crc = int(line[:8], 16)
+    except ValueError:
+        return None
+    if zlib.crc32(payload) != crc:
+        return None
+    try:
+        return json.loads(payload)
+    except ValueError:
+        return None
+
+
+def empty_state():
+    """空的持久化状态"""
+    return {'samples': {}, OP_HEALTH: None, OP_TEST_INVENTORY: None, OP_CONSUMABLE_INVENTORY: None}
+
+
+def apply_entry(state, op, data):
+    """把一条日志记录应用到持久化状态
+
+    Args:
+        state: 持久化状态（empty_state 的结构）
+        op: 操作类型
+        data: 变化后的值
+    """
+    if op == OP_SAMPLE:
+        state['samples'][data['sample_id']] = data
+    elif op in (OP_HEALTH, OP_TEST_INVENTORY, OP_CONSUMABLE_INVENTORY):
+        state[op] = data
+
+
+def segment_path(data_dir, segment):
+    """日志分段文件路径"""
+    return os.path.join(data_dir, f"{SEGMENT_PREFIX}{segment:08d}{SEGMENT_SUFFIX}")
+
+
+def list_segments(data_dir):
+    """列出日志分段
+
+    Args:
+        data_dir: 数据目录
+
+    Returns:
+        list: [(分段号, 路径)]，按分段号升序
+    """
+    segments = []
+    try:
+        names = os.listdir(data_dir)
+    except FileNotFoundError:
+        return segments
+    for name in names:
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+            try:
+                segment = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            except ValueError:
+                continue
+            segments.append((segment, os.path.join(data_dir, name)))
+    segments.sort()
+    return segments
+
+
+def _fsync_dir(path):
+    """fsync目录，使文件创建/重命名/删除持久化"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class StateJournal:
+    """核心状态预写日志
+
+    修改者在持有对应锁时调用 append 把（不可变的）新值放入待写队列，写线程批量编码、写入并fsync。
+    日志按分段存放，累计条数达到 snapshot_every 后切换到新分段，并在后台把当前状态写成压缩快照，
+    快照落盘后删除旧分段。启动时加载快照并重放其后的分段即可恢复。
+    """
+
+    def __init__(self, data_dir, metrics, logger, fsync=FSYNC_BATCH, fsync_interval=1.0, snapshot_every=100000):
+        """初始化预写日志
+
+        Args:
+            data_dir: 数据目录
+            metrics: MetricsRegistry实例
+            logger: 日志管理器实例
+            fsync: 刷盘策略（FSYNC_BATCH / FSYNC_INTERVAL）
+            fsync_interval: FSYNC_INTERVAL 策略的刷盘间隔（秒）
+            snapshot_every: 每写入多少条记录生成一次压缩快照
+        """
+        if fsync not in (FSYNC_BATCH, FSYNC_INTERVAL):
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.data_dir = data_dir
+        self.logger = logger
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = max(1, int(snapshot_every))
+
+        self.lock = threading.Lock()
+        self.work = threading.Condition(self.lock)
+        self.durable = threading.Condition(self.lock)
+        self.local = threading.local()
+        self.pending = []
+        self.seq = 0
+        self.durable_seq = 0
+        self.closing = False
+        self.error = None
+
+        self.segment = 1
+        self.file = None
+        self.entries_since_snapshot = 0
+        self.state_provider = None
+        self.writer_thread = None
+        self.compaction_thread = None
+        self.recovery = None
+
+        self.metric_entries = metrics.counter('wal_entries_total', 'Entries written to the state write-ahead log', ['op'])
+        self.metric_bytes = metrics.counter('wal_bytes_total', 'Bytes written to the state write-ahead log')
+        self.metric_write_errors = metrics.counter('wal_write_errors_total', 'Failed write-ahead log writes')
+        self.metric_fsync_seconds = metrics.histogram('wal_fsync_seconds', 'Time spent in fsync per write-ahead log batch')
+        self.metric_batch_entries = metrics.histogram(
+            'wal_batch_entries', 'Entries written per write-ahead log batch', buckets=BATCH_BUCKETS)
+        self.metric_snapshots = metrics.counter('state_snapshots_total', 'Compacted state snapshots written')
+        self.metric_snapshot_seconds = metrics.histogram(
+            'state_snapshot_seconds', 'Time spent writing one compacted state snapshot')
+        self.metric_recovery_seconds = metrics.gauge(
+            'state_recovery_seconds', 'Time spent recovering state at startup')
+        self.metric_recovered_entries = metrics.gauge(
+            'state_recovered_entries', 'Write-ahead log entries replayed at startup')
+
+    def recover(self):
+        """加载快照并重放其后的日志分段
+
+        最后一个分段末尾不完整或校验失败的记录（崩溃时的半条写入）会被截断。
+
+        Returns:
+            dict: 恢复的状态（empty_state 的结构）
+        """
+        with gc_paused():
+            return self._recover()
+
+    def _recover(self):
+        """recover 的实现（在暂停GC期间执行）"""
+        start = time.perf_counter()
+        os.makedirs(self.data_dir, exist_ok=True)
+        state = empty_state()
+        first_segment = 0
+        snapshot_path = os.path.join(self.data_dir, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            try:
+                with open(snapshot_path, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+                state.update(snapshot['state'])
+                first_segment = snapshot['segment']
+            except Exception as e:
+                self.logger.error(f"Error loading state snapshot {snapshot_path}, replaying remaining log only: {str(e)}")
+
+        segments = [(segment, path) for segment, path in list_segments(self.data_dir) if segment >= first_segment]
+        entries = 0
+        for index, (segment, path) in enumerate(segments):
+            offset, count = self._replay_segment(path, state)
+            entries += count
+            size = os.path.getsize(path)
+            if offset < size:
+                if index == len(segments) - 1:
+                    self.logger.warning(f"Truncating incomplete write-ahead log tail in {path} at byte {offset}")
+                    with open(path, 'r+b') as f:
+                        f.truncate(offset)
+                        os.fsync(f.fileno())
+                else:
+                    self.logger.error(f"Corrupt write-ahead log entry in {path} at byte {offset}, "
+                                      f"later entries in this segment were skipped")
+
+        self.segment = max([first_segment, 1] + [segment + 1 for segment, _ in segments])
+        elapsed = time.perf_counter() - start
+        self.recovery = {
+            'snapshot': first_segment > 0,
+            'segments': len(segments),
+            'entries': entries,
+            'samples': len(state['samples']),
+            'seconds': elapsed,
+        }
+        self.metric_recovery_seconds.set(elapsed)
+        self.metric_recovered_entries.set(entries)
+        self.logger.info(f"Recovered state from {self.data_dir}: snapshot={self.recovery['snapshot']}, "
+                         f"{entries} log entries in {len(segments)} segments, "
+                         f"{len(state['samples'])} samples in {elapsed:.3f}s")
+        return state
+
+    def _replay_segment(self, path, state):
+        """重放一个日志分段，遇到不完整或校验失败的记录时停止
+
+        逐行只做CRC校验，校验通过的记录每 REPLAY_CHUNK 条拼成一个JSON数组一次解码，
+        避免逐行调用 json.loads 的开销。
+
+        Args:
+            path: 分段路径
+            state: 待更新的状态
+
+        Returns:
+            tuple: (有效记录结束的字节偏移, 记录条数)
+        """
+        offset = 0
+        count = 0
+        payloads = []
+        crc32 = zlib.crc32
+        with open(path, 'rb') as f:
+            for line in f:
+                if len(line) < 10 or line[-1:] != b'\n' or line[8:9] != b' ':
+                    break
+                payload = line[9:-1]
+                try:
+                    if crc32(payload) != int(line[:8], 16):
+                        break
+                except ValueError:
+                    break
+                payloads.append(payload)
+                offset += len(line)
+                if len(payloads) >= REPLAY_CHUNK:
+                    count += self._apply_payloads(payloads, state)
+                    payloads = []
+        count += self._apply_payloads(payloads, state)
+        return offset, count
+
+    @staticmethod
+    def _apply_payloads(payloads, state):
+        """解码并应用一组已校验的记录"""
+        if not payloads:
+            return 0
+        samples = state['samples']
+        for op, data in json.loads(b'[' + b','.join(payloads) + b']'):
+            if op == OP_SAMPLE:
+                samples[data['sample_id']] = data
+            else:
+                apply_entry(state, op, data)
+        return len(payloads)
+
+    def start(self, state_provider):
+        """打开新的日志分段并启动写线程
+
+        Args:
+            state_provider: 返回当前完整状态（empty_state 的结构）的函数，用于生成压缩快照
+        """
+        self.state_provider = state_provider
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.file = open(segment_path(self.data_dir, self.segment), 'ab')
+        _fsync_dir(self.data_dir)
+        self.writer_thread = threading.Thread(target=self._writer_loop, name='StateJournal', daemon=True)
+        self.writer_thread.start()
+        self.logger.info(f"State journal started: {segment_path(self.data_dir, self.segment)}, fsync={self.fsync}")
+
+    def append(self, op, data):
+        """记录一次状态变化（调用方持有保护该状态的锁，以保证日志顺序与修改顺序一致）
+
+        Args:
+            op: 操作类型
+            data: 变化后的不可变值（由写线程编码）
+
+        Returns:
+            int: 记录序号
+        """
+        with self.lock:
+            self.seq += 1
+            # 写入失败后日志已不完整，不再缓存新记录
+            if self.error is None:
+                self.pending.append((op, data))
+                if self.fsync == FSYNC_BATCH:
+                    self.work.notify()
+            seq = self.seq
+        self.local.seq = seq
+        return seq
+
+    def commit(self):
+        """等待当前线程最近一次记录落盘（FSYNC_BATCH 策略，调用方不持有任何核心锁）
+
+        Raises:
+            JournalWriteError: 日志写入已失败，该记录不会落盘
+        """
+        seq = getattr(self.local, 'seq', 0)
+        with self.durable:
+            if self.fsync == FSYNC_BATCH:
+                self.durable.wait_for(lambda: self.durable_seq >= seq or self.error is not None
+                                      or self.writer_thread is None)
+            if self.error is not None and self.durable_seq < seq:
+                raise JournalWriteError(f"State journal entry {seq} was not written: {str(self.error)}") from self.error
+
+    def _writer_loop(self):
+        """写线程：取出待写记录，编码写入并fsync，必要时切换分段并触发压缩"""
+        while True:
+            with self.work:
+                if self.fsync == FSYNC_BATCH:
+                    self.work.wait_for(lambda: self.pending or self.closing)
+                else:
+                    self.work.wait_for(lambda: self.closing, self.fsync_interval)
+                batch, self.pending = self.pending, []
+                last_seq = self.seq
+                closing = self.closing
+
+            if batch and not self._write_batch(batch):
+                # 失败批次之后的记录落盘也无法恢复出一致状态：标记失败，唤醒等待者并停止写入
+                with self.durable:
+                    self.pending = []
+                    self.durable.notify_all()
+                return
+            with self.durable:
+                self.durable_seq = last_seq
+                self.durable.notify_all()
+
+            self.entries_since_snapshot += len(batch)
+            if self.entries_since_snapshot >= self.snapshot_every and not closing:
+                if self.compaction_thread is None or not self.compaction_thread.is_alive():
+                    self._rotate()
+                    self.compaction_thread = threading.Thread(target=self._compact, name='StateSnapshot', daemon=True)
+                    self.compaction_thread.start()
+            if closing:
+                return
+
+    def _write_batch(self, batch):
+        """编码并写入一批记录
+
+        Args:
+            batch: [(操作类型, 值)]
+
+        Returns:
+            bool: 是否写入并fsync成功（失败时记录到 self.error）
+        """
+        try:
+            data = b''.join(encode_entry(op, value) for op, value in batch)
+            self.file.write(data)
+            self.file.flush()
+            start = time.perf_counter()
+            os.fsync(self.file.fileno())
+            self.metric_fsync_seconds.observe(time.perf_counter() - start)
+            self.metric_bytes.inc(len(data))
+            self.metric_batch_entries.observe(len(batch))
+            for op, _ in batch:
+                self.metric_entries.labels(op=op).inc()
+            return True
+        except Exception as e:
+            self.metric_write_errors.inc()
+            self.logger.error(f"Error writing state journal: {str(e)}")
+            with self.lock:
+                self.error = e
+            return False
+
+    def _rotate(self):
+        """切换到新的日志分段（写线程调用，当前分段已全部落盘）"""
+        self.file.close()
+        self.segment += 1
+        self.file = open(segment_path(self.data_dir, self.segment), 'ab')
+        _fsync_dir(self.data_dir)
+        self.entries_since_snapshot = 0
+
+    def _compact(self):
+        """写入压缩快照并删除已被快照覆盖的分段
+
+        快照在切换分段之后读取状态，因此包含旧分段的全部变化；
+        也可能包含新分段开头的部分变化，重放时重复应用不影响结果。
+        """
+        segment = self.segment
+        start = time.perf_counter()
+        try:
+            self.write_snapshot(self.state_provider(), segment)
+        except Exception as e:
+            self.logger.error(f"Error writing state snapshot: {str(e)}")
+            return
+        for old_segment, path in list_segments(self.data_dir):
+            if old_segment < segment:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    self.logger.error(f"Error removing write-ahead log segment {path}: {str(e)}")
+        _fsync_dir(self.data_dir)
+        elapsed = time.perf_counter() - start
+        self.metric_snapshots.inc()
+        self.metric_snapshot_seconds.observe(elapsed)
+        self.logger.info(f"Wrote state snapshot covering segments before {segment} in {elapsed:.3f}s")
+
+    def write_snapshot(self, state, segment):
+        """原子写入快照文件（临时文件 + fsync + 重命名）
+
+        Args:
+            state: 完整状态
+            segment: 快照之后需要重放的第一个分段号
+        """
+        path = os.path.join(self.data_dir, SNAPSHOT_FILE)
+        tmp_path = path + '.tmp'
+        # json.dumps 一次性编码走C实现，json.dump 逐块写文件会退回纯Python编码器
+        data = json.dumps({'segment': segment, 'time': time.time(), 'state': state},
+                          separators=(',', ':'), ensure_ascii=False, default=_json_default)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _fsync_dir(self.data_dir)
+
+    def close(self, compact=True):
+        """写出剩余记录并停止写线程
+
+        Args:
+            compact: 是否在退出前生成压缩快照，使下次启动无需重放日志
+        """
+        if self.writer_thread is None:
+            return
+        with self.work:
+            self.closing = True
+            self.work.notify()
+        self.writer_thread.join()
+        if self.compaction_thread is not None:
+            self.compaction_thread.join()
+        if self.error is not None:
+            self.logger.error(f"State journal failed, skipping final snapshot: {str(self.error)}")
+        elif compact and self.state_provider is not None:
+            self._rotate()
+            self._compact()
+        self.file.close()
+        with self.durable:
+            self.writer_thread = None
+            self.durable.notify_all()
+        self.logger.info("State journal closed")
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Locks模块 - 可选的锁竞争统计与加锁顺序检查
+"""
+
+import sys
+import threading
+import time
+
+
+# 锁等待/持有时间直方图桶（秒）
+LOCK_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+
+def _call_site(depth):
+    """获取调用方位置
+
+    Args:
+        depth: 相对本函数的栈深度
+
+    Returns:
+        str: 形如 "receive_sample:217" 的调用点
+    """
+    try:
+        frame = sys._getframe(depth + 1)
+    except ValueError:
+        return 'unknown'
+    return f"{frame.f_code.co_name}:{frame.f_lineno}"
+
+
+class LockOrderChecker:
+    """加锁顺序检查器
+
+    记录每个线程持锁期间再获取其他锁形成的有向边（先持有 -> 后获取），
+    新边与已有边构成环时说明存在两个线程以相反顺序加锁的可能，即潜在死锁。
+    检查在阻塞等待之前进行，因此即使真的发生死锁也能先留下记录。
+    """
+
+    def __init__(self, logger=None, on_violation=None):
+        """初始化检查器
+
+        Args:
+            logger: 日志管理器实例（可选）
+            on_violation: 发现违规时的回调，参数为违规信息字典（可选）
+        """
+        self.logger = logger
+        self.on_violation = on_violation
+        self.local = threading.local()
+        self.edges = {}  # (先持有, 后获取) -> 首次出现的调用点
+        self.graph = {}  # 锁名 -> 之后获取过的锁名集合
+        self.violations = []
+        self.reported = set()
+        self.lock = threading.Lock()
+
+    def _held(self):
+        """当前线程持有的锁栈 [(锁名, 调用点)]"""
+        try:
+            return self.local.held
+        except AttributeError:
+            self.local.held = []
+            return self.local.held
+
+    def _reaches(self, start, target):
+        """图中是否存在 start -> ... -> target 的路径"""
+        stack = [start]
+        seen = set()
+        while stack:
+            node = stack.pop()
+            if node == target:
+                return True
+            if node in seen:
+                continue
+            seen.add(node)
+            stack.extend(self.graph.get(node, ()))
+        return False
+
+    def before_acquire(self, name, site):
+        """获取锁之前检查加锁顺序
+
+        Args:
+            name: 将要获取的锁名
+            site: 调用点
+        """
+        held = self._held()
+        if not held:
+            return
+
+        for held_name, held_site in held:
+            if held_name == name:
+                self._report('reentrant', held_name, held_site, name, site)
+                continue
+            with self.lock:
+                if (held_name, name) in self.edges:
+                    continue
+                inverted = self._reaches(name, held_name)
+                self.edges[(held_name, name)] = site
+                self.graph.setdefault(held_name, set()).add(name)
+            if inverted:
+                self._report('inversion', held_name, held_site, name, site)
+
+    def acquired(self, name, site):
+        """记录当前线程已获取锁"""
+        self._held().append((name, site))
+
+    def released(self, name):
+        """记录当前线程已释放锁（允许非后进先出的释放顺序）"""
+        held = self._held()
+        for i in range(len(held) - 1, -1, -1):
+            if held[i][0] == name:
+                del held[i]
+                return
+
+    def _report(self, kind, held_name, held_site, name, site):
+        """记录并上报一次违规（同一对锁只上报一次）"""
+        key = (kind, held_name, name)
+        with self.lock:
+            if key in self.reported:
+                return
+            self.reported.add(key)
+            violation = {
+                'kind': kind,
+                'held': held_name,
+                'held_site': held_site,
+                'acquiring': name,
+                'site': site,
+                'thread': threading.current_thread().name,
+                'reverse_site': self.edges.get((name, held_name)),
+            }
+            self.violations.append(violation)
+
+        if self.logger:
+            if kind == 'reentrant':
+                self.logger.error(f"Lock order check: {name} re-acquired at {site} while already held "
+                                  f"(acquired at {held_site}) by {violation['thread']}; this will deadlock")
+            else:
+                self.logger.warning(f"Lock order check: {name} acquired at {site} while holding {held_name} "
+                                    f"(acquired at {held_site}), but the opposite order was seen at "
+                                    f"{violation['reverse_site'] or 'an indirect path'}; potential deadlock")
+        if self.on_violation:
+            self.on_violation(violation)
+
+
+class InstrumentedLock:
+    """带竞争统计的互斥锁，接口与 threading.Lock 相同
+
+    先尝试非阻塞获取，只有真正发生竞争时才计时等待，未竞争路径只多一次perf_counter调用。
+    持有时间与持有者调用点在释放时按 (锁名, 调用点) 记入直方图。
+    """
+
+    def __init__(self, name, monitor):
+        """初始化锁
+
+        Args:
+            name: 锁名
+            monitor: LockMonitor实例
+        """
+        self.name = name
+        self.monitor = monitor
+        self._lock = threading.Lock()
+        self._holder_site = None
+        self._acquired_at = 0.0
+
+    def _acquire(self, blocking, timeout, depth):
+        """获取锁并记录等待时间"""
+        site = _call_site(depth + 1)
+        checker = self.monitor.order_checker
+        if checker is not None:
+            checker.before_acquire(self.name, site)
+
+        wait = 0.0
+        acquired = self._lock.acquire(False)
+        if not acquired:
+            self.monitor.contended(self.name)
+            if not blocking:
+                return False
+            start = time.perf_counter()
+            acquired = self._lock.acquire(True, timeout)
+            wait = time.perf_counter() - start
+            if not acquired:
+                return False
+
+        self._holder_site = site
+        self._acquired_at = time.perf_counter()
+        self.monitor.acquired(self.name, site, wait)
+        if checker is not None:
+            checker.acquired(self.name, site)
+        return True
+
+    def acquire(self, blocking=True, timeout=-1):
+        """获取锁
+
+        Returns:
+            bool: 是否获取成功
+        """
+        return self._acquire(blocking, timeout, 1)
+
+    def release(self):
+        """释放锁并记录持有时间"""
+        site = self._holder_site
+        hold = time.perf_counter() - self._acquired_at
+        self._lock.release()
+        self.monitor.released(self.name, site, hold)
+        if self.monitor.order_checker is not None:
+            self.monitor.order_checker.released(self.name)
+
+    def locked(self):
+        """锁是否被持有"""
+        return self._lock.locked()
+
+    def __enter__(self):
+        self._acquire(True, -1, 1)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+        return False
+
+
+class LockMonitor:
+    """核心锁统计中心，创建InstrumentedLock并汇总竞争报告"""
+
+    def __init__(self, registry, logger=None, check_order=True):
+        """初始化
+
+        Args:
+            registry: MetricsRegistry实例
+            logger: 日志管理器实例（可选）
+            check_order: 是否启用加锁顺序检查
+        """
+        self.registry = registry
+        self.logger = logger
+        self.metric_wait_seconds = registry.histogram(
+            'core_lock_wait_seconds', 'Time spent waiting to acquire a core lock', ['lock', 'site'], LOCK_BUCKETS)
+        self.metric_hold_seconds = registry.histogram(
+            'core_lock_hold_seconds', 'Time a core lock was held, by holder call site', ['lock', 'site'], LOCK_BUCKETS)
+        self.metric_contended = registry.counter(
+            'core_lock_contended_total', 'Core lock acquisitions that found the lock already held', ['lock'])
+        self.metric_order_violations = registry.counter(
+            'core_lock_order_violations_total', 'Nested lock acquisitions that can deadlock', ['kind'])
+        self.order_checker = None
+        if check_order:
+            self.order_checker = LockOrderChecker(
+                logger, lambda violation: self.metric_order_violations.labels(kind=violation['kind']).inc())
+
+    def lock(self, name):
+        """创建一个受监控的锁
+
+        Args:
+            name: 锁名
+
+        Returns:
+            InstrumentedLock: 锁实例
+        """
+        return InstrumentedLock(name, self)
+
+    def contended(self, name):
+        self.metric_contended.labels(lock=name).inc()
+
+    def acquired(self, name, site, wait):
+        self.metric_wait_seconds.labels(lock=name, site=site).observe(wait)
+
+    def released(self, name, site, hold):
+        self.metric_hold_seconds.labels(lock=name, site=site).observe(hold)
+
+    def stats(self):
+        """汇总各锁及调用点的统计
+
+        Returns:
+            list: 每项为 {'lock', 'site', 'acquisitions', 'wait_total', 'wait_mean', 'hold_total', 'hold_mean'}，
+                  按等待总时间降序
+        """
+        holds = {key: child.snapshot() for key, child in list(self.metric_hold_seconds.children.items())}
+        rows = []
+        for key, child in list(self.metric_wait_seconds.children.items()):
+            _, wait_total, count = child.snapshot()
+            _, hold_total, hold_count = holds.get(key, ([], 0.0, 0))
+            rows.append({
+                'lock': key[0],
+                'site': key[1],
+                'acquisitions': count,
+                'wait_total': wait_total,
+                'wait_mean': wait_total / count if count else 0.0,
+                'hold_total': hold_total,
+                'hold_mean': hold_total / hold_count if hold_count else 0.0,
+            })
+        rows.sort(key=lambda row: (row['wait_total'], row['hold_total']), reverse=True)
+        return rows
+
+    def report(self, top=10):
+        """生成锁竞争报告
+
+        Args:
+            top: 列出的调用点数
+
+        Returns:
+            str: 报告文本
+        """
+        lines = ["Top contended locks:"]
+        lock_totals = {}
+        for row in self.stats():
+            total = lock_totals.setdefault(row['lock'], [0, 0.0, 0.0])
+            total[0] += row['acquisitions']
+            total[1] += row['wait_total']
+            total[2] += row['hold_total']
+        lines.append(f"{'lock':<20}{'acquisitions':>14}{'contended':>12}{'wait(ms)':>12}{'hold(ms)':>12}")
+        for name, (count, wait_total, hold_total) in sorted(lock_totals.items(), key=lambda item: -item[1][1]):
+            contended = self.metric_contended.labels(lock=name).value()
+            lines.append(f"{name:<20}{count:>14}{contended:>12}{wait_total * 1e3:>12.3f}{hold_total * 1e3:>12.3f}")
+
+        lines.append("")
+        lines.append("Top call sites by wait time:")
+        lines.append(f"{'lock':<20}{'site':<36}{'acquisitions':>14}{'wait avg(us)':>14}{'hold avg(us)':>14}")
+        for row in self.stats()[:top]:
+            lines.append(f"{row['lock']:<20}{row['site'][:35]:<36}{row['acquisitions']:>14}"
+                         f"{row['wait_mean'] * 1e6:>14.1f}{row['hold_mean'] * 1e6:>14.1f}")
+
+        if self.order_checker is not None:
+            lines.append("")
+            lines.append(f"Lock order violations: {len(self.order_checker.violations)}")
+            for violation in self.order_checker.violations:
+                lines.append(f"  [{violation['kind']}] {violation['acquiring']} at {violation['site']} while holding "
+                             f"{violation['held']} (acquired at {violation['held_site']}), "
+                             f"reverse order at {violation['reverse_site']}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SampleStore模块 - 按样本ID分片加锁的样本存储
+"""
+
+import threading
+from collections.abc import Mapping
+from math import isqrt
+from types import MappingProxyType
+
+from .changelog import CHANGE_COMPLETED, CHANGE_RECEIVED
+from .snapshots import SamplesView, freeze, gc_paused
+
+
+# 分片视图增量中表示样本已移除的标记
+_REMOVED = object()
+
+# 增量达到 max(_MIN_DELTA, √分片样本数) 条时重建基础副本，每次写入的摊还复制量为 O(√n)
+_MIN_DELTA = 32
+
+
+class _ShardView(Mapping):
+    """分片样本表某一版本的不可变视图：基础副本 + 之后写入的增量
+
+    写者每次写入后发布新视图（只复制增量），读者读取一次属性即得到一致的视图，不加锁也不复制。
+    """
+
+    __slots__ = ('base', 'delta', 'length', 'version')
+
+    def __init__(self, base, delta, length, version):
+        """初始化
+
+        Args:
+            base: 基础副本（样本ID -> 不可变样本记录），发布后不再修改
+            delta: 基础副本之后的写入（样本ID -> 不可变样本记录或 _REMOVED），发布后不再修改
+            length: 视图中的样本数
+            version: 分片版本号
+        """
+        self.base = base
+        self.delta = delta
+        self.length = length
+        self.version = version
+
+    def __getitem__(self, sample_id):
+        record = self.delta.get(sample_id)
+        if record is None:
+            return self.base[sample_id]
+        if record is _REMOVED:
+            raise KeyError(sample_id)
+        return record
+
+    def __contains__(self, sample_id):
+        record = self.delta.get(sample_id)
+        if record is None:
+            return sample_id in self.base
+        return record is not _REMOVED
+
+    def __iter__(self):
+        delta = self.delta
+        for sample_id in self.base:
+            if sample_id not in delta:
+                yield sample_id
+        for sample_id, record in delta.items():
+            if record is not _REMOVED:
+                yield sample_id
+
+    def __len__(self):
+        return self.length
+
+
+class _SampleShard:
+    """单个分片：样本表、待出结果表及各自的计数
+
+    样本表在分片锁内原地修改，样本记录本身是不可变快照，发布后不再修改。
+    单个样本的查询直接读取样本表（字典查找在GIL下是原子的），不加锁；
+    写者每次修改后在分片锁内发布新的 _ShardView 并整体替换 view 引用，全量视图只读取 view，不加锁也不复制。
+    """
+
+    __slots__ = ('lock', 'table', 'samples', 'pending', 'received', 'completed', 'version', 'view')
+
+    def __init__(self, lock):
+        self.lock = lock
+        self.table = {}
+        self.samples = MappingProxyType(self.table)  # 样本表的只读代理（实时）
+        self.pending = {}
+        # 计数只在持有本分片锁时修改，读取时无需加锁
+        self.received = 0
+        self.completed = 0
+        self.version = 0
+        self.view = _ShardView({}, {}, 0, 0)
+
+    def publish(self, sample_id, record):
+        """写入样本记录并发布新视图（调用方持有分片锁）"""
+        self.table[sample_id] = record
+        self.publish_view({sample_id: record})
+
+    def publish_view(self, changes):
+        """样本表修改后发布新视图（调用方持有分片锁）
+
+        增量加上本次修改达到阈值时以样本表的新副本为基础，否则只复制增量。
+
+        Args:
+            changes: 本次修改（样本ID -> 不可变样本记录或 _REMOVED）
+        """
+        self.version += 1
+        view = self.view
+        table = self.table
+        if len(view.delta) + len(changes) >= max(_MIN_DELTA, isqrt(len(table))):
+            self.view = _ShardView(dict(table), {}, len(table), self.version)
+            return
+        delta = dict(view.delta)
+        delta.update(changes)
+        self.view = _ShardView(view.base, delta, len(table), self.version)
+
+
+class ShardedSampleStore:
+    """分片样本存储
+
+    样本按ID哈希到N个分片，每个分片有独立的锁，写操作只锁定对应分片并原地修改分片表。
+    样本记录是不可变快照，单个样本的查询不加锁也不复制；全量视图引用写者发布的各分片视图，同样不加锁不复制。
+    """
+
+    def __init__(self, shard_count=16, lock_factory=None, on_change=None):
+        """初始化存储
+
+        Args:
+            shard_count: 分片数
+            lock_factory: 以锁名为参数创建锁的函数（默认 threading.Lock）
+            on_change: 样本状态变化回调 (样本ID, 变化类型, 新记录)，在分片锁内调用（可选）
+        """
+        self.shard_count = max(1, int(shard_count))
+        self.on_change = on_change
+        lock_factory = lock_factory or (lambda name: threading.Lock())
+        self.shards = tuple(_SampleShard(lock_factory(f"sample_lock[{i}]")) for i in range(self.shard_count))
+
+    def shard_for(self, sample_id):
+        """获取样本所在分片
+
+        Args:
+            sample_id: 样本ID
+
+        Returns:
+            _SampleShard: 分片
+        """
+        return self.shards[hash(sample_id) % self.shard_count]
+
+    def add(self, sample, result_time):
+        """登记新样本并加入待出结果表
+
+        Args:
+            sample: 样本记录（含 sample_id）
+            result_time: 结果到期时间
+
+        Returns:
+            dict: 已发布的不可变样本记录，样本已存在时返回None
+        """
+        sample_id = sample['sample_id']
+        record = freeze(sample)
+        shard = self.shard_for(sample_id)
+        with shard.lock:
+            if sample_id in shard.samples:
+                return None
+            shard.publish(sample_id, record)
+            shard.pending[sample_id] = {'result_time': result_time}
+            shard.received += 1
+            if self.on_change is not None:
+                self.on_change(sample_id, CHANGE_RECEIVED, record)
+        return record
+
+    def load(self, samples, result_delay=0):
+        """批量载入样本（状态恢复用），每个分片只发布一次，不触发 on_change
+
+        Args:
+            samples: 样本记录可迭代对象
+            result_delay: 未完成样本的结果到期时间 = 接收时间 + result_delay
+
+        Returns:
+            int: 载入的样本数
+        """
+        batches = [[] for _ in self.shards]
+        with gc_paused():
+            for sample in samples:
+                batches[hash(sample['sample_id']) % self.shard_count].append(freeze(sample))
+
+        for shard, records in zip(self.shards, batches):
+            if not records:
+                continue
+            with shard.lock:
+                table = shard.table
+                changes = {}
+                for record in records:
+                    sample_id = record['sample_id']
+                    if sample_id not in table:
+                        shard.received += 1
+                    table[sample_id] = record
+                    changes[sample_id] = record
+                    if record['status'] == 'completed':
+                        shard.pending.pop(sample_id, None)
+                        shard.completed += 1
+                    else:
+                        shard.pending[sample_id] = {'result_time': record['received_time'] + result_delay}
+                shard.publish_view(changes)
+        return sum(len(records) for records in batches)
+
+    def __contains__(self, sample_id):
+        return sample_id in self.shard_for(sample_id).samples
+
+    def get(self, sample_id):
+        """获取样本记录
+
+        Args:
+            sample_id: 样本ID
+
+        Returns:
+            dict: 不可变样本记录，不存在则返回None
+        """
+        return self.shard_for(sample_id).samples.get(sample_id)
+
+    def get_pending(self, sample_id):
+        """获取样本的待出结果信息
+
+        Args:
+            sample_id: 样本ID
+
+        Returns:
+            dict: {'result_time'}，不在待出结果表中则返回None
+        """
+        shard = self.shard_for(sample_id)
+        with shard.lock:
+            return shard.pending.get(sample_id)
+
+    def set_result_time(self, sample_id, result_time):
+        """调整样本的结果到期时间
+
+        Args:
+            sample_id: 样本ID
+            result_time: 新的到期时间
+
+        Returns:
+            bool: 样本是否仍在待出结果表中
+        """
+        shard = self.shard_for(sample_id)
+        with shard.lock:
+            pending = shard.pending.get(sample_id)
+            if pending is None:
+                return False
+            pending['result_time'] = result_time
+            return True
+
+    def all_samples(self):
+        """获取所有样本的只读视图（引用各分片最新发布的视图，不加锁不复制）
+
+        Returns:
+            SamplesView: 样本ID -> 不可变样本记录
+        """
+        parts = tuple(shard.view for shard in self.shards)
+        return SamplesView(parts, sum(part.version for part in parts))
+
+    def due(self, now):
+        """列出结果已到期的样本
+
+        Args:
+            now: 当前时间
+
+        Returns:
+            list: 样本ID列表
+        """
+        due = []
+        for shard in self.shards:
+            with shard.lock:
+                due.extend(sample_id for sample_id, pending in shard.pending.items()
+                           if now >= pending['result_time'])
+        return due
+
+    def pop_pending(self, sample_id):
+        """从待出结果表取出样本
+
+        Args:
+            sample_id: 样本ID
+
+        Returns:
+            tuple: (待出结果信息, 样本记录)，已被取走或样本不存在时返回 (None, None)
+        """
+        shard = self.shard_for(sample_id)
+        with shard.lock:
+            pending = shard.pending.pop(sample_id, None)
+            if pending is None:
+                return None, None
+            sample = shard.samples.get(sample_id)
+            if sample is None:
+                return None, None
+            return pending, sample
+
+    def complete(self, sample_id, results, completed_time):
+        """写入样本结果并标记完成
+
+        Args:
+            sample_id: 样本ID
+            results: 测试结果
+            completed_time: 完成时间
+
+        Returns:
+            dict: 新发布的不可变样本记录，不存在则返回None
+        """
+        shard = self.shard_for(sample_id)
+        with shard.lock:
+            sample = shard.samples.get(sample_id)
+            if sample is None:
+                return None
+            record = dict(sample)
+            record['status'] = 'completed'
+            record['results'] = freeze(results)
+            record['completed_time'] = completed_time
+            record = MappingProxyType(record)
+            shard.publish(sample_id, record)
+            shard.completed += 1
+            if self.on_change is not None:
+                self.on_change(sample_id, CHANGE_COMPLETED, record)
+            return record
+
+    def evict(self, sample_ids):
+        """从内存中移除样本（已转入归档的已完成样本），每个分片只发布一次
+
+        Args:
+            sample_ids: 样本ID列表
+
+        Returns:
+            int: 移除的样本数
+        """
+        batches = [[] for _ in self.shards]
+        for sample_id in sample_ids:
+            batches[hash(sample_id) % self.shard_count].append(sample_id)
+
+        evicted = 0
+        for shard, ids in zip(self.shards, batches):
+            if not ids:
+                continue
+            with shard.lock:
+                removed = {}
+                for sample_id in ids:
+                    if shard.table.pop(sample_id, None) is not None:
+                        shard.pending.pop(sample_id, None)
+                        removed[sample_id] = _REMOVED
+                shard.publish_view(removed)
+            evicted += len(removed)
+        return evicted
+
+    def sample_count(self):
+        """样本总数（各分片长度之和，无需加锁）"""
+        return sum(len(shard.samples) for shard in self.shards)
+
+    def pending_count(self):
+        """待出结果样本数（无需加锁）"""
+        return sum(len(shard.pending) for shard in self.shards)
+
+    def received_count(self):
+        """累计登记样本数（无需加锁）"""
+        return sum(shard.received for shard in self.shards)
+
+    def completed_count(self):
+        """累计完成样本数（无需加锁）"""
+        return sum(shard.completed for shard in self.shards)
+
+    def shard_sizes(self):
+        """各分片样本数，用于观察哈希分布
+
+        Returns:
+            list: 每个分片的样本数
+        """
+        return [len(shard.samples) for shard in self.shards]
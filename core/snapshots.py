@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Snapshots模块 - 写时复制的不可变版本快照
+"""
+
+import gc
+import threading
+from collections.abc import Mapping
+from contextlib import contextmanager
+from itertools import chain
+from types import MappingProxyType
+
+
+# 不需要转换的标量类型（按类型精确匹配，避免抽象基类 isinstance 的开销）
+_SCALAR_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+def freeze(value):
+    """递归转换为不可变结构：dict -> 只读映射，list/tuple -> tuple，set -> frozenset
+
+    Args:
+        value: 任意由dict/list/标量组成的结构
+
+    Returns:
+        不可变结构
+    """
+    cls = type(value)
+    if cls in _SCALAR_TYPES:
+        return value
+    if cls is dict:
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if cls is list:
+        return tuple([freeze(item) for item in value])
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(freeze(item) for item in value)
+    return value
+
+
+@contextmanager
+def gc_paused():
+    """批量创建大量长期存活的对象（如恢复数十万条样本记录）时暂停循环垃圾回收
+
+    分代GC按分配次数触发，每次老年代回收都要遍历所有存活对象，
+    批量载入期间反复触发会使耗时随对象数近似平方增长，而这些对象本身不含循环引用。
+    结束时只恢复进入前的回收器状态，不冻结对象；是否 gc.freeze() 由调用方决定。
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def thaw(value):
+    """freeze 的逆操作，得到可修改的深拷贝（只读映射 -> dict，tuple -> list）
+
+    Args:
+        value: 不可变结构
+
+    Returns:
+        可修改的结构
+    """
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    if isinstance(value, frozenset):
+        return set(thaw(item) for item in value)
+    return value
+
+
+class VersionedSnapshot:
+    """以原子引用替换发布的版本化不可变快照
+
+    (版本号, 快照) 作为一个元组整体替换，读者只做一次属性读取，
+    既不加锁也不复制；写者之间用锁保证版本号单调递增。
+    """
+
+    __slots__ = ('_current', '_lock')
+
+    def __init__(self, value):
+        """初始化
+
+        Args:
+            value: 初始值（会被冻结）
+        """
+        self._lock = threading.Lock()
+        self._current = (0, freeze(value))
+
+    def get(self):
+        """当前快照"""
+        return self._current[1]
+
+    def get_versioned(self):
+        """当前 (版本号, 快照)，两者保证来自同一次发布"""
+        return self._current
+
+    @property
+    def version(self):
+        """当前版本号"""
+        return self._current[0]
+
+    def publish(self, value):
+        """冻结并发布新快照
+
+        Args:
+            value: 新值
+
+        Returns:
+            int: 新版本号
+        """
+        frozen = freeze(value)
+        with self._lock:
+            version = self._current[0] + 1
+            self._current = (version, frozen)
+        return version
+
+
+class SamplesView(Mapping):
+    """多个分片快照的只读合并视图，创建时不复制样本"""
+
+    __slots__ = ('_parts', 'version')
+
+    def __init__(self, parts, version):
+        """初始化
+
+        Args:
+            parts: 各分片的只读样本映射
+            version: 视图版本号（各分片版本号之和）
+        """
+        self._parts = parts
+        self.version = version
+
+    def __getitem__(self, sample_id):
+        for part in self._parts:
+            if sample_id in part:
+                return part[sample_id]
+        raise KeyError(sample_id)
+
+    def __contains__(self, sample_id):
+        return any(sample_id in part for part in self._parts)
+
+    def __iter__(self):
+        return chain.from_iterable(self._parts)
+
+    def __len__(self):
+        return sum(len(part) for part in self._parts)
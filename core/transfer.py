@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Transfer模块 - Load_Unload 取放样本：接口位置锁定、试管上机与返回LAS、Transfer Status 就绪状态
+"""
+
+import time
+from collections import deque
+
+from .carriers import OCCUPANCY_EMPTY
+
+
+# Load/Unload Command Status
+COMMAND_SUCCESS = 0x01
+COMMAND_QUEUE_MISMATCH = 0x04
+COMMAND_OFFLINE = 0x05
+COMMAND_SKIPPED = 0x06
+COMMAND_INSTRUMENT_SKIPPED = 0x07
+COMMAND_UNSUPPORTED_SAMPLE_ID = 0x08
+
+# Sample Processing Status（随返回LAS的试管上报）
+PROCESSING_NO_TUBE = 0x00
+PROCESSING_SUCCESS = 0x01
+PROCESSING_NO_LIS_ORDERS = 0x14
+
+# Remote Control Status
+REMOTE_OFFLINE = 0x01
+REMOTE_EXCHANGE = 0x03
+REMOTE_LOAD_ONLY = 0x04
+REMOTE_UNLOAD_ONLY = 0x05
+
+# Lock Ownership
+LOCKED_BY_INSTRUMENT = 0x01
+NOT_LOCKED_BY_INSTRUMENT = 0x02
+
+# 自动化接口状态为 Red/Critical、处理状态为 Red 时不取放样本
+STATUS_RED = 0x03
+
+# 仪器接受的最长样本ID
+MAX_SAMPLE_ID_LENGTH = 20
+
+
+class Transfer:
+    """一次 Load_Unload 取放操作（从锁定载架到机械臂离开轨道）"""
+
+    __slots__ = ('ip_index', 'carrier', 'load_sample_id', 'load_status', 'unload_sample_id', 'unload_status',
+                 'processing_status', 'loaded_without_orders', 'started')
+
+    def __init__(self, ip_index, carrier, load_sample_id):
+        self.ip_index = ip_index
+        self.carrier = carrier
+        self.load_sample_id = load_sample_id
+        self.load_status = COMMAND_QUEUE_MISMATCH
+        self.unload_sample_id = ''
+        self.unload_status = COMMAND_QUEUE_MISMATCH
+        self.processing_status = PROCESSING_NO_TUBE
+        self.loaded_without_orders = False
+        self.started = time.time()
+
+    @property
+    def loaded(self):
+        return self.load_status == COMMAND_SUCCESS
+
+    @property
+    def unloaded(self):
+        return self.unload_status == COMMAND_SUCCESS
+
+
+class TransferEngine:
+    """取放样本状态
+
+    每个接口位置同一时间最多一次取放；待返回LAS的试管按可返回的先后排队，
+    交换模式下装载后腾空的载架（或空载架）装入队首的试管。
+    引擎本身不加锁，调用方在核心的 transfer_lock 内调用所有方法。
+    """
+
+    def __init__(self, interface_positions):
+        """初始化
+
+        Args:
+            interface_positions: 接口位置数
+        """
+        self.active = [None] * interface_positions
+        self.return_queue = deque()  # (样本ID, Sample Processing Status)
+
+    def ready_to_load(self, ip_index, health, full=False):
+        """接口位置当前是否可以装载
+
+        Args:
+            ip_index: 接口位置索引
+            health: 健康状态快照
+            full: 在线试管是否已满
+
+        Returns:
+            bool: 是否就绪
+        """
+        mode = health['remote_control_status'][ip_index]
+        return (self.active[ip_index] is None and not full
+                and mode in (REMOTE_EXCHANGE, REMOTE_LOAD_ONLY)
+                and health['automation_interface_status'] < STATUS_RED
+                and health['instrument_process_status'] < STATUS_RED)
+
+    def status(self, health, full=False):
+        """各接口位置的 Transfer Status
+
+        Returns:
+            list: [(Ready To Load, Return Ready Tube Count)]，按接口位置
+        """
+        return_ready = len(self.return_queue)
+        return [(self.ready_to_load(ip_index, health, full), return_ready) for ip_index in range(len(self.active))]
+
+    def mark_ready(self, sample_id, processing_status=PROCESSING_SUCCESS):
+        """试管可以返回LAS（结果已完成或无法处理）"""
+        self.return_queue.append((sample_id, processing_status))
+
+    def begin(self, ip_index, carrier, occupancy, sample_id, health, has_orders):
+        """开始一次取放：判定装载与卸载结果，接口位置进入取放中
+
+        Args:
+            ip_index: 接口位置索引
+            carrier: 已锁定的载架，与队列不匹配时为 None
+            occupancy: 请求中的载架占用类型
+            sample_id: 请求中的样本ID
+            health: 健康状态快照
+            has_orders: 样本是否有LIS工单
+
+        Returns:
+            Transfer: 取放操作
+        """
+        transfer = Transfer(ip_index, carrier, sample_id)
+        if carrier is None or self.active[ip_index] is not None:
+            return transfer
+        self.active[ip_index] = transfer
+
+        mode = health['remote_control_status'][ip_index]
+        blocked = (health['automation_interface_status'] >= STATUS_RED
+                   or health['instrument_process_status'] >= STATUS_RED)
+
+        # 装载：载架上的试管移入仪器
+        if occupancy == OCCUPANCY_EMPTY:
+            transfer.load_sample_id = ''
+            transfer.load_status = COMMAND_SKIPPED
+        elif mode == REMOTE_OFFLINE:
+            transfer.load_status = COMMAND_OFFLINE
+        elif mode == REMOTE_UNLOAD_ONLY:
+            transfer.load_status = COMMAND_SKIPPED
+        elif blocked:
+            transfer.load_status = COMMAND_INSTRUMENT_SKIPPED
+        elif len(sample_id) > MAX_SAMPLE_ID_LENGTH:
+            transfer.load_status = COMMAND_UNSUPPORTED_SAMPLE_ID
+        else:
+            transfer.load_status = COMMAND_SUCCESS
+
+        # 卸载：可返回的试管放入空载架
+        carrier_empty = occupancy == OCCUPANCY_EMPTY or transfer.loaded
+        if mode == REMOTE_OFFLINE:
+            transfer.unload_status = COMMAND_OFFLINE
+        elif mode == REMOTE_LOAD_ONLY or not carrier_empty or not self.return_queue:
+            transfer.unload_status = COMMAND_SKIPPED
+        elif health['automation_interface_status'] >= STATUS_RED:
+            transfer.unload_status = COMMAND_INSTRUMENT_SKIPPED
+        else:
+            transfer.unload_sample_id, transfer.processing_status = self.return_queue.popleft()
+            transfer.unload_status = COMMAND_SUCCESS
+
+        # 没有工单的试管不处理，直接排队返回
+        if transfer.loaded and not has_orders:
+            transfer.loaded_without_orders = True
+            self.return_queue.append((sample_id, PROCESSING_NO_LIS_ORDERS))
+        return transfer
+
+    def finish(self, transfer):
+        """机械臂离开轨道，接口位置可以进行下一次取放"""
+        if self.active[transfer.ip_index] is transfer:
+            self.active[transfer.ip_index] = None
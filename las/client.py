@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Client模块 - 最小的uRAP客户端（LAS一侧），用于测试与基准：握手、初始化、确认仪器消息
+"""
+
+import struct
+import time
+
+
+MSG_TYPE_ACK = 0x0000
+MSG_TYPE_HANDSHAKE = 0x0001
+MSG_TYPE_INITIALIZATION_COMPLETE = 0x020D
+
+# LAS 在连接初始化期间发送的请求（Transfer Status 每个接口位置一次）
+INITIALIZATION_REQUESTS = (0x0405, 0x0207, 0x0201, 0x0203, 0x020B)
+MSG_TYPE_TRANSFER_STATUS_REQUEST = 0x0209
+
+HEADER = struct.Struct('!cHHHH8sc')
+
+
+class LASClient:
+    """LAS客户端：按报文长度分帧，默认自动确认仪器发来的每条消息"""
+
+    def __init__(self, sock, auto_ack=True):
+        """初始化
+
+        Args:
+            sock: 已连接的 socket
+            auto_ack: 是否自动ACK收到的非ACK消息
+        """
+        self.sock = sock
+        self.auto_ack = auto_ack
+        self.sequence_id = 1
+        self.buffer = b''
+        self.unmatched = []  # 已收到但尚未被 receive 取走的 (header, body)
+
+    def send(self, message_type, body=b'', return_sequence_id=0):
+        """发送一条消息
+
+        Returns:
+            int: 消息的序列ID
+        """
+        sequence_id = self.sequence_id
+        self.sequence_id = (self.sequence_id % 0xFFFF) + 1
+        header = HEADER.pack(b'\x02', HEADER.size + len(body) + 3, sequence_id, return_sequence_id,
+                             message_type, struct.pack('!Q', int(time.time())), b'\xff')
+        checksum = f"{sum(header[1:] + body) % 256:02X}".encode('ascii')
+        self.sock.sendall(header + body + checksum + b'\x03')
+        return sequence_id
+
+    def ack(self, sequence_id, return_code=0x00):
+        """确认仪器的消息"""
+        self.send(MSG_TYPE_ACK, bytes([return_code]), sequence_id)
+
+    def _read_frames(self):
+        """读取一次数据并拆出完整消息
+
+        Returns:
+            bool: 连接是否仍然打开
+        """
+        data = self.sock.recv(65536)
+        if not data:
+            return False
+        self.buffer += data
+        while len(self.buffer) >= 3:
+            length = struct.unpack_from('!H', self.buffer, 1)[0]
+            if len(self.buffer) < length:
+                break
+            frame, self.buffer = self.buffer[:length], self.buffer[length:]
+            _, _, sequence_id, return_sequence_id, message_type, _, _ = HEADER.unpack_from(frame)
+            header = {'sequence_id': sequence_id, 'return_sequence_id': return_sequence_id,
+                      'message_type': message_type}
+            if self.auto_ack and message_type != MSG_TYPE_ACK:
+                self.ack(sequence_id)
+            self.unmatched.append((header, frame[HEADER.size:-3]))
+        return True
+
+    def receive(self, message_type=None, body=None):
+        """等待一条消息（按类型与消息体匹配，先查找已收到的消息）
+
+        Args:
+            message_type: 消息类型，None 匹配任意类型
+            body: 消息体，None 匹配任意内容
+
+        Returns:
+            tuple: (header, body)，连接关闭时返回 None
+        """
+        while True:
+            for frame in self.unmatched:
+                header, frame_body = frame
+                if message_type in (None, header['message_type']) and body in (None, frame_body):
+                    self.unmatched.remove(frame)
+                    return frame
+            if not self._read_frames():
+                return None
+
+    def request(self, message_type, body=b'', response=True):
+        """发送请求并等待对应的响应（按 Return Sequence ID 匹配）
+
+        Args:
+            message_type: 消息类型
+            body: 消息体
+            response: 是否等待响应（Keep Alive 等没有响应的消息只等待ACK）
+
+        Returns:
+            tuple: (ACK/NACK 返回码, 响应 (header, body) 或 None)
+        """
+        sequence_id = self.send(message_type, body)
+        return_code = None
+        while True:
+            for frame in self.unmatched:
+                header, frame_body = frame
+                if header['return_sequence_id'] != sequence_id:
+                    continue
+                self.unmatched.remove(frame)
+                if header['message_type'] != MSG_TYPE_ACK:
+                    return return_code, frame
+                return_code = frame_body[0]
+                if return_code != 0x00 or not response:
+                    return return_code, None
+                break
+            else:
+                if not self._read_frames():
+                    return return_code, None
+
+    def handshake(self, serial=b'LAS'):
+        """握手：发送LAS握手并等待仪器的握手响应（自动确认后连接建立）
+
+        Returns:
+            tuple: 仪器的握手响应 (header, body)
+        """
+        body = struct.pack(f'!HHHHBB{len(serial)}s', 0x0330, 0x0000, 0x0104, 0xFFFF, 0xFF, len(serial), serial)
+        return self.request(MSG_TYPE_HANDSHAKE, body)[1]
+
+    def initialize(self, interface_positions=2):
+        """完成连接初始化：发送全部初始化请求并等待 Initialization Sequence Complete
+
+        Returns:
+            dict: 消息类型（Transfer Status 为 (类型, 接口位置)）-> 响应消息体
+        """
+        responses = {}
+        for message_type in INITIALIZATION_REQUESTS:
+            body = b'\x00' if message_type == 0x0405 else b''
+            _, response = self.request(message_type, body)
+            responses[message_type] = response[1] if response else None
+        for ip_index in range(interface_positions):
+            _, response = self.request(MSG_TYPE_TRANSFER_STATUS_REQUEST, bytes([ip_index]))
+            responses[(MSG_TYPE_TRANSFER_STATUS_REQUEST, ip_index)] = response[1] if response else None
+        if self.receive(MSG_TYPE_INITIALIZATION_COMPLETE) is None:
+            raise ConnectionError('connection closed before Initialization Sequence Complete')
+        return responses
+
+    def close(self):
+        """关闭连接"""
+        self.sock.close()
@@ -4,12 +4,39 @@
 LAS模块 - uRAP协议服务端实现
 """
 
+import itertools
+import queue
+import select
 import socket
 import threading
 import struct
 import time
 import binascii
 
+from core.changelog import CHANGE_COMPLETED, ChangeLogTruncated
+from core.events import StatusChanged, TransferStatusChanged
+from core.transfer import LOCKED_BY_INSTRUMENT
+from profiling.profiler import CHECKPOINT_INTERVAL, profile_checkpoint
+from tracing.tracing import STAGE_LAS_LOAD, STAGE_LAS_ONBOARD, STAGE_LAS_UNLOAD
+from .session import (STATE_CLOSED, STATE_HANDSHAKE, STATE_INITIALIZED, STATE_INITIALIZING, STATE_LISTENING,
+                      STATES, LASSession)
+from .timers import TimingWheel
+
+
+class _OutstandingMessage:
+    """已发出、尚未收到ACK/NACK的消息"""
+    
+    __slots__ = ('message', 'message_type', 'sequence_id', 'sent_time', 'retries', 'nacks', 'timer')
+    
+    def __init__(self, message, message_type, sequence_id):
+        self.message = message
+        self.message_type = message_type
+        self.sequence_id = sequence_id
+        self.sent_time = time.perf_counter()  # 最近一次发送的时间
+        self.retries = 0
+        self.nacks = 0
+        self.timer = None
+
 
 class LASServer:
     """LAS服务器，实现uRAP协议"""
@@ -37,13 +64,53 @@ class LASServer:
         self.connections = []
         self.connection_lock = threading.Lock()
         
-        # 序列ID管理
-        self.sequence_id = 1
-        self.sequence_lock = threading.Lock()
+        # 序列ID、写缓冲与待确认消息表都在连接会话中，每个连接独立编号、各自加锁；
+        # 这里只为没有会话的 socket（直接调用处理函数时）编号
+        self.sequence_ids = itertools.count(1)
+        # 一次接收到的所有消息产生的帧（ACK与响应）先写入连接的写缓冲，处理完后用一次 sendmsg 写出
+        self.write_batching = self.config.get('write_batching', True)
+        self.tcp_nodelay = self.config.get('tcp_nodelay', True)
+        # 写出总是非阻塞的：对方停止读取、写缓冲 send_timeout 秒仍写不出去时只重置这一个连接
+        self.send_timeout = self.config.get('send_timeout', 10)
+        
+        # ACK/NACK 超时重发：发出的消息在 ack_timeout 秒内未收到ACK/NACK则原样重发，
+        # 超过 max_retries 次（或收到 max_nacks 次 Message Not Understood）后重置连接
+        self.ack_timeout = self.config.get('ack_timeout', 1)
+        self.max_retries = self.config.get('max_retries', 5)
+        self.max_nacks = self.config.get('max_nacks', 3)
+        # 共享定时器：重发、保活、空闲检测与取放响应都在同一个时间轮线程上触发，不为每条消息或连接创建线程
+        self.timers = TimingWheel(logger=logger)
+        # 取放完成（释放接口位置、提交状态、发布事件）可能等待状态持久化，时间轮只负责把它交给完成线程
+        self.completions = queue.Queue()
+        self.completion_thread = None
+        self.completion_lock = threading.Lock()
+        
+        # 保活与空闲检测：发送方向空闲 keep_alive_interval 秒后发送 Keep Alive，
+        # 接收方向空闲 inactivity_timeout 秒（对方已失联）后重置连接
+        self.keep_alive_interval = self.config.get('keep_alive_interval', 30)
+        self.inactivity_timeout = self.config.get('inactivity_timeout', 60)
+        
+        # 连接会话（连接 -> LASSession）：握手、初始化与重置的状态机
+        self.sessions = {}
+        # 握手确认后 init_timeout 秒内未完成初始化则重置连接
+        self.init_timeout = self.config.get('init_timeout', 30)
+        # 仪器检测到通信失败并重置连接后，等待 listen_wait 秒再接受新连接
+        self.listen_wait = self.config.get('listen_wait', 15)
+        self.listen_backlog = self.config.get('listen_backlog', 128)
+        self.listen_resume_time = 0.0
+        # 连接断开期间完成的取放：保持接口位置锁定，新连接建立后主动发送 Load_Unload 响应
+        self.undelivered_transfers = []
+        self.undelivered_lock = threading.Lock()
+        
+        # 状态变化时主动推送 Instrument Health：health_push_window 秒内的多次变化合并为一条，推送时读取最新状态
+        self.health_push_window = self.config.get('health_push_window', 0.2)
+        self.health_push_pending = False
+        self.health_push_lock = threading.Lock()
         
         # 消息类型常量
         self.MSG_TYPE_HANDSHAKE = 0x0001
         self.MSG_TYPE_ACK = 0x0000
+        self.MSG_TYPE_KEEP_ALIVE = 0x0005
         self.MSG_TYPE_INSTRUMENT_HEALTH_REQUEST = 0x0201
         self.MSG_TYPE_INSTRUMENT_HEALTH_RESPONSE = 0x0202
         self.MSG_TYPE_TEST_INVENTORY_REQUEST = 0x0203
@@ -51,16 +118,135 @@ class LASServer:
         self.MSG_TYPE_ONBOARD_SAMPLE_INFO_REQUEST = 0x0207
         self.MSG_TYPE_ONBOARD_SAMPLE_INFO_RESPONSE = 0x0208
         self.MSG_TYPE_CONSUMABLE_INVENTORY_REQUEST = 0x020B
+        self.MSG_TYPE_TRANSFER_STATUS_REQUEST = 0x0209
+        self.MSG_TYPE_TRANSFER_STATUS_RESPONSE = 0x020A
         self.MSG_TYPE_CONSUMABLE_INVENTORY_RESPONSE = 0x020C
         self.MSG_TYPE_INITIALIZATION_COMPLETE = 0x020D
+        self.MSG_TYPE_LOAD_UNLOAD_REQUEST = 0x0303
+        self.MSG_TYPE_LOAD_UNLOAD_RESPONSE = 0x0304
+        self.MSG_TYPE_ADD_QUEUE_REQUEST = 0x0401
+        self.MSG_TYPE_ADD_QUEUE_RESPONSE = 0x0402
+        self.MSG_TYPE_SKIP_QUEUE_REQUEST = 0x0403
+        self.MSG_TYPE_SKIP_QUEUE_RESPONSE = 0x0404
+        self.MSG_TYPE_CLEAR_QUEUE_REQUEST = 0x0405
+        self.MSG_TYPE_CLEAR_QUEUE_RESPONSE = 0x0406
+        
+        # 一次 sendmsg 最多写出的帧数（不超过系统的 IOV_MAX）
+        self.MAX_IOV = 512
+        
+        # 仪器处理的LAS消息类型，其余类型以 Message Type Not Supported 拒绝
+        self.INBOUND_MESSAGE_TYPES = frozenset((
+            self.MSG_TYPE_HANDSHAKE,
+            self.MSG_TYPE_KEEP_ALIVE,
+            self.MSG_TYPE_INSTRUMENT_HEALTH_REQUEST,
+            self.MSG_TYPE_TEST_INVENTORY_REQUEST,
+            self.MSG_TYPE_ONBOARD_SAMPLE_INFO_REQUEST,
+            self.MSG_TYPE_CONSUMABLE_INVENTORY_REQUEST,
+            self.MSG_TYPE_TRANSFER_STATUS_REQUEST,
+            self.MSG_TYPE_LOAD_UNLOAD_REQUEST,
+            self.MSG_TYPE_ADD_QUEUE_REQUEST,
+            self.MSG_TYPE_SKIP_QUEUE_REQUEST,
+            self.MSG_TYPE_CLEAR_QUEUE_REQUEST,
+        ))
+        
+        # 连接初始化请求：初始化完成后再收到以 Message Type Not Supported 拒绝
+        self.INITIALIZATION_REQUEST_TYPES = frozenset((
+            self.MSG_TYPE_INSTRUMENT_HEALTH_REQUEST,
+            self.MSG_TYPE_TEST_INVENTORY_REQUEST,
+            self.MSG_TYPE_ONBOARD_SAMPLE_INFO_REQUEST,
+            self.MSG_TYPE_CONSUMABLE_INVENTORY_REQUEST,
+            self.MSG_TYPE_TRANSFER_STATUS_REQUEST,
+        ))
+        
+        # ACK/NACK 返回码
+        self.ACK_ACCEPTED = 0x00
+        self.NACK_NOT_UNDERSTOOD = 0x01
+        self.NACK_TYPE_NOT_SUPPORTED = 0x03
+        
+        # 队列命令状态（仪器不能拒绝队列命令）
+        self.COMMAND_STATUS_SUCCESS = 0x01
         
         # 状态常量
         self.STATUS_GREEN = 1
         self.STATUS_YELLOW = 2
         self.STATUS_RED = 3
         
+        # 运行指标与样本追踪
+        self.metrics = core.metrics
+        self.tracer = core.tracer
+        self._init_metrics()
+        
+        # 在线样本集合，按样本变更日志增量维护（样本ID -> 样本记录，保持接收顺序）
+        self.onboard_samples = {}
+        self.onboard_cursor = None
+        self.onboard_lock = threading.Lock()
+        # 已通过在线样本信息上报给LAS的样本（用于记录上机与下机阶段）
+        self.onboard_reported = set()
+        
+        # 订阅取放就绪状态变化，向所有连接主动推送 Transfer Status
+        self.transfer_subscription = self.core.subscribe(self._on_transfer_status_changed, [TransferStatusChanged],
+                                                         'las_transfer_status')
+        # 推送总是读取最新的健康状态，队列满时丢弃较早的变化不影响推送内容
+        self.health_subscription = self.core.subscribe(self._on_status_changed, [StatusChanged], 'las_health_push',
+                                                       overflow='drop_oldest')
+        
         self.logger.info(f"LASServer initialized, listening on {self.host}:{self.port}")
     
+    def _init_metrics(self):
+        """注册LAS通信指标"""
+        self.metric_messages_received = self.metrics.counter(
+            'las_messages_received_total', 'uRAP messages received from the LAS', ['type'])
+        self.metric_messages_sent = self.metrics.counter(
+            'las_messages_sent_total', 'uRAP messages sent to the LAS', ['type'])
+        self.metric_acks_sent = self.metrics.counter(
+            'las_acks_sent_total', 'ACK/NACK messages sent to the LAS', ['return_code'])
+        self.metric_invalid_messages = self.metrics.counter(
+            'las_invalid_messages_total', 'uRAP messages rejected by framing, length or checksum checks')
+        self.metric_bytes_received = self.metrics.counter(
+            'las_bytes_received_total', 'Bytes received on LAS connections')
+        self.metric_bytes_sent = self.metrics.counter(
+            'las_bytes_sent_total', 'Bytes sent on LAS connections')
+        self.metric_connections_total = self.metrics.counter(
+            'las_connections_total', 'LAS connections accepted')
+        self.metric_handler_seconds = self.metrics.histogram(
+            'las_handler_seconds', 'Time spent processing one uRAP message', ['type'])
+        self.metric_acks_received = self.metrics.counter(
+            'las_acks_received_total', 'ACK/NACK messages received from the LAS', ['return_code'])
+        self.metric_ack_round_trip = self.metrics.histogram(
+            'las_ack_round_trip_seconds', 'Time from sending a uRAP message to receiving its ACK/NACK', ['type'])
+        self.metric_retransmissions = self.metrics.counter(
+            'las_retransmissions_total', 'uRAP messages re-sent after an ACK timeout or NACK', ['type', 'reason'])
+        self.metric_keep_alives_sent = self.metrics.counter(
+            'las_keep_alives_sent_total', 'Keep Alive messages sent on idle LAS connections')
+        self.metric_connection_resets = self.metrics.counter(
+            'las_connection_resets_total', 'LAS connections reset by the instrument', ['reason'])
+        self.metric_write_syscalls = self.metrics.counter(
+            'las_write_syscalls_total', 'sendall/sendmsg calls on LAS connections')
+        self.metric_frames_per_flush = self.metrics.histogram(
+            'las_frames_per_flush', 'Frames written by one batched sendmsg', buckets=(1, 2, 3, 4, 8, 16, 32, 64))
+        self.metric_flush_seconds = self.metrics.histogram(
+            'las_flush_seconds', 'Time spent in the batched sendmsg of one connection')
+        self.metric_batch_seconds = self.metrics.histogram(
+            'las_batch_seconds', 'Time from receiving data to flushing the frames it produced')
+        self.metric_status_changes = self.metrics.counter(
+            'las_status_changes_total', 'Instrument status changes seen by the unsolicited health push')
+        self.metric_health_pushes = self.metrics.counter(
+            'las_health_pushes_total', 'Unsolicited Instrument Health messages sent to initialized LAS connections')
+        self.metric_connections_refused = self.metrics.counter(
+            'las_connections_refused_total', 'LAS connections closed during the wait period after a reset')
+        self.metric_session_transitions = self.metrics.counter(
+            'las_session_transitions_total', 'LAS session state transitions', ['state'])
+        self.metric_initialization_seconds = self.metrics.histogram(
+            'las_initialization_seconds', 'Time from connection accept to Initialization Sequence Complete',
+            buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+        self.metrics.gauge('las_connections', 'Open LAS connections').set_function(lambda: len(self.connections))
+        sessions_gauge = self.metrics.gauge('las_sessions', 'LAS sessions by state', ['state'])
+        for state in STATES[:-1]:
+            sessions_gauge.labels(state=state).set_function(
+                lambda state=state: sum(1 for session in list(self.sessions.values()) if session.state == state))
+        self.metrics.gauge('las_outstanding_messages', 'uRAP messages waiting for an ACK/NACK').set_function(
+            lambda: sum(len(session.outstanding) for session in list(self.sessions.values())))
+    
     def start(self):
         """启动LAS服务器"""
         if self.is_running:
@@ -72,7 +258,7 @@ class LASServer:
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
+            self.server_socket.listen(self.listen_backlog)
             
             self.is_running = True
             self.logger.info(f"LASServer started, listening on {self.host}:{self.port}")
@@ -91,6 +277,14 @@ class LASServer:
             return
         
         self.is_running = False
+        self.timers.stop()
+        with self.completion_lock:
+            completion_thread, self.completion_thread = self.completion_thread, None
+        if completion_thread is not None and completion_thread.is_alive():
+            self.completions.put(None)
+            completion_thread.join(5)
+        with self.health_push_lock:
+            self.health_push_pending = False
         
         try:
             # 关闭所有连接
@@ -113,8 +307,25 @@ class LASServer:
         while self.is_running:
             try:
                 conn, addr = self.server_socket.accept()
+                
+                # 重置连接后的等待期内不进入监听，新连接直接关闭
+                if time.monotonic() < self.listen_resume_time:
+                    self.metric_connections_refused.inc()
+                    self.logger.log_las(f"Connection refused during reset wait period: {addr[0]}:{addr[1]}")
+                    conn.close()
+                    continue
+                
+                # 每批帧已合并为一次写出，关闭 Nagle 避免与对方的延迟确认相互等待
+                if self.tcp_nodelay:
+                    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                # 兜底：任何阻塞写最多等待 send_timeout 秒
+                seconds, fraction = divmod(self.send_timeout, 1)
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO,
+                                struct.pack('ll', int(seconds), int(fraction * 1000000)))
+                
                 with self.connection_lock:
                     self.connections.append(conn)
+                self.metric_connections_total.inc()
                 
                 self.logger.info(f"LAS connection established from {addr[0]}:{addr[1]}")
                 self.logger.log_las(f"Connection established: {addr[0]}:{addr[1]}")
@@ -141,35 +352,78 @@ class LASServer:
             conn: 连接 socket
             addr: 客户端地址
         """
-        buffer = b''
+        session = LASSession(conn, addr)
+        self.sessions[conn] = session
+        self.metric_session_transitions.labels(state=STATE_LISTENING).inc()
+        self.timers.schedule(self.keep_alive_interval, self._on_keep_alive_timer, conn, session)
+        self.timers.schedule(self.inactivity_timeout, self._on_inactivity_timer, conn, session)
         
         try:
             while self.is_running:
+                # 空闲时也定期经过剖析检查点，采集结束后及时停用本线程的Profile；
+                # 写缓冲有写不出去的帧时同时等待可写，等待时间不超过写超时的剩余时间
+                timeout = CHECKPOINT_INTERVAL
+                pending_since = session.write_pending_since
+                if pending_since is not None:
+                    timeout = min(timeout, max(0.0, pending_since + self.send_timeout - time.monotonic()))
+                readable, writable, _ = select.select([conn], [conn] if pending_since is not None else [], [],
+                                                      timeout)
+                profile_checkpoint()
+                if writable:
+                    with session.send_lock:
+                        self._write_pending(session)
+                pending_since = session.write_pending_since
+                if pending_since is not None and time.monotonic() - pending_since >= self.send_timeout:
+                    self._reset_connection(conn, 'send_timeout',
+                                           f"{len(session.write_buffer)} frames not written for {self.send_timeout}s")
+                    break
+                if not readable:
+                    continue
+                
                 # 接收数据
                 data = conn.recv(4096)
                 if not data:
                     break
                 
-                buffer += data
+                self.metric_bytes_received.inc(len(data))
+                session.last_received = time.monotonic()
+                session.bytes_received += len(data)
+                buffer = session.buffer + data
+                batch_start = time.perf_counter()
+                if self.write_batching:
+                    session.batching = True
                 
                 # 处理缓冲区中的消息
                 while True:
                     # 查找消息起始标志 STX (0x02)
                     stx_pos = buffer.find(b'\x02')
                     if stx_pos == -1:
+                        buffer = b''
                         break
                     
-                    # 查找消息结束标志 ETX (0x03)
-                    etx_pos = buffer.find(b'\x03', stx_pos)
-                    if etx_pos == -1:
+                    # 按消息头中的长度取完整消息（消息体是二进制，可能包含 0x03，不能按 ETX 查找）
+                    if len(buffer) < stx_pos + 3:
+                        break
+                    msg_len = struct.unpack_from('!H', buffer, stx_pos + 1)[0]
+                    if msg_len < 21:
+                        # 长度无效，跳过该 STX 继续查找
+                        buffer = buffer[stx_pos+1:]
+                        continue
+                    if len(buffer) < stx_pos + msg_len:
                         break
                     
                     # 提取完整消息
-                    message = buffer[stx_pos:etx_pos+1]
-                    buffer = buffer[etx_pos+1:]
+                    message = buffer[stx_pos:stx_pos+msg_len]
+                    buffer = buffer[stx_pos+msg_len:]
                     
                     # 处理消息
+                    session.messages_received += 1
                     self._process_message(conn, addr, message)
+                session.buffer = buffer
+                
+                # 本批消息产生的所有帧一次写出
+                if self._flush(session):
+                    self.metric_batch_seconds.observe(time.perf_counter() - batch_start)
                     
         except socket.error as e:
             self.logger.error(f"LAS connection error with {addr[0]}:{addr[1]}: {str(e)}")
@@ -180,13 +434,23 @@ class LASServer:
             with self.connection_lock:
                 if conn in self.connections:
                     self.connections.remove(conn)
+                last_connection = not self.connections
+            self.sessions.pop(conn, None)
+            self._set_state(session, STATE_CLOSED)
+            self._drop_outstanding(session)
+            
+            # 与LAS断开后仪器丢弃队列信息，已锁定的载架除外
+            if last_connection:
+                self.core.reset_carrier_queues()
             
             try:
                 conn.close()
             except:
                 pass
             
-            self.logger.info(f"LAS connection closed with {addr[0]}:{addr[1]}")
+            self.logger.info(f"LAS connection closed with {addr[0]}:{addr[1]}: "
+                             f"{session.messages_received} messages ({session.bytes_received} bytes) received, "
+                             f"{session.messages_sent} messages ({session.bytes_sent} bytes) sent")
             self.logger.log_las(f"Connection closed: {addr[0]}:{addr[1]}")
     
     def _process_message(self, conn, addr, message):
@@ -197,26 +461,57 @@ class LASServer:
             addr: 客户端地址
             message: uRAP消息
         """
+        start_time = time.perf_counter()
+        type_label = 'invalid'
+        
         try:
             # 解析消息
             msg_header, msg_body, msg_footer = self._parse_message(message)
             
             if not msg_header:
-                # 发送NACK
-                self._send_ack(conn, msg_header.get('sequence_id', 0), 0x01)  # 0x01 = Message Not Understood
+                # 发送NACK，报文无法解析时尽量从原始字节中取出序列ID
+                self.metric_invalid_messages.inc()
+                sequence_id = struct.unpack_from('!H', message, 3)[0] if len(message) >= 5 else 0
+                self._send_ack(conn, sequence_id, 0x01)  # 0x01 = Message Not Understood
                 return
             
+            # 根据消息类型处理
+            message_type = msg_header['message_type']
+            type_label = f"0x{message_type:04x}"
+            self.metric_messages_received.labels(type=type_label).inc()
+            
             # 记录接收到的消息
             self.logger.log_las(f"Received message from {addr[0]}:{addr[1]}: Type=0x{msg_header['message_type']:04x}, SeqID=0x{msg_header['sequence_id']:04x}")
             
-            # 发送ACK
-            self._send_ack(conn, msg_header['sequence_id'], 0x00)  # 0x00 = ACK
+            # 对方的ACK/NACK不再确认，只结束对应的待确认消息
+            if message_type == self.MSG_TYPE_ACK:
+                self._handle_ack(conn, msg_header, msg_body)
+                return
             
-            # 根据消息类型处理
-            message_type = msg_header['message_type']
+            if message_type not in self.INBOUND_MESSAGE_TYPES:
+                self.logger.warning(f"Unknown LAS message type: 0x{message_type:04x}")
+                self.logger.log_las(f"Unknown message type: 0x{message_type:04x}")
+                self._send_ack(conn, msg_header['sequence_id'], self.NACK_TYPE_NOT_SUPPORTED)
+                return
+            
+            # 握手前只接受握手；初始化完成后不再接受初始化请求
+            session = self.sessions.get(conn)
+            state = session.state if session is not None else STATE_CLOSED
+            if (message_type != self.MSG_TYPE_HANDSHAKE
+                    and (state in (STATE_LISTENING, STATE_CLOSED)
+                         or (state == STATE_INITIALIZED and message_type in self.INITIALIZATION_REQUEST_TYPES))):
+                self.logger.log_las(f"Rejected message type 0x{message_type:04x} in session state {state}")
+                self._send_ack(conn, msg_header['sequence_id'], self.NACK_TYPE_NOT_SUPPORTED)
+                return
+            
+            # 发送ACK
+            self._send_ack(conn, msg_header['sequence_id'], self.ACK_ACCEPTED)
             
             if message_type == self.MSG_TYPE_HANDSHAKE:
                 self._handle_handshake(conn, msg_header, msg_body)
+            elif message_type == self.MSG_TYPE_KEEP_ALIVE:
+                # Keep Alive 不是请求，只需确认
+                pass
             elif message_type == self.MSG_TYPE_INSTRUMENT_HEALTH_REQUEST:
                 self._handle_instrument_health_request(conn, msg_header)
             elif message_type == self.MSG_TYPE_TEST_INVENTORY_REQUEST:
@@ -225,13 +520,30 @@ class LASServer:
                 self._handle_onboard_sample_info_request(conn, msg_header)
             elif message_type == self.MSG_TYPE_CONSUMABLE_INVENTORY_REQUEST:
                 self._handle_consumable_inventory_request(conn, msg_header)
-            else:
-                self.logger.warning(f"Unknown LAS message type: 0x{message_type:04x}")
-                self.logger.log_las(f"Unknown message type: 0x{message_type:04x}")
+            elif message_type == self.MSG_TYPE_ADD_QUEUE_REQUEST:
+                self._handle_add_queue(conn, msg_header, msg_body)
+            elif message_type == self.MSG_TYPE_SKIP_QUEUE_REQUEST:
+                self._handle_skip_queue(conn, msg_header, msg_body)
+            elif message_type == self.MSG_TYPE_CLEAR_QUEUE_REQUEST:
+                self._handle_clear_queue(conn, msg_header, msg_body)
+            elif message_type == self.MSG_TYPE_LOAD_UNLOAD_REQUEST:
+                self._handle_load_unload(conn, msg_header, msg_body)
+            elif message_type == self.MSG_TYPE_TRANSFER_STATUS_REQUEST:
+                self._handle_transfer_status_request(conn, msg_header, msg_body)
+            
+            # 记录完成的初始化请求（Transfer Status 按接口位置）
+            if session.state == STATE_INITIALIZING:
+                if message_type == self.MSG_TYPE_TRANSFER_STATUS_REQUEST and msg_body:
+                    session.init_pending.discard((message_type, msg_body[0]))
+                else:
+                    session.init_pending.discard(message_type)
+                self._check_initialized(session)
                 
         except Exception as e:
             self.logger.error(f"Error processing LAS message: {str(e)}")
             self.logger.log_las(f"Error processing message: {str(e)}")
+        finally:
+            self.metric_handler_seconds.labels(type=type_label).observe(time.perf_counter() - start_time)
     
     def _parse_message(self, message):
         """解析uRAP消息
@@ -307,21 +619,24 @@ class LASServer:
         checksum = sum(data) % 256
         return f"{checksum:02X}".encode('ascii')
     
-    def _build_message(self, message_type, body, return_sequence_id=0):
+    def _build_message(self, message_type, body, return_sequence_id=0, conn=None):
         """构建uRAP消息
         
         Args:
             message_type: 消息类型
             body: 消息体
             return_sequence_id: 返回序列ID
+            conn: 发送消息的连接，序列ID取自该连接的会话（没有会话时使用服务器的编号）
             
         Returns:
             bytes: 完整的uRAP消息
         """
-        # 获取序列ID
-        with self.sequence_lock:
-            sequence_id = self.sequence_id
-            self.sequence_id = (self.sequence_id % 0xFFFF) + 1
+        # 获取序列ID（1~0xFFFF 循环）
+        session = self.sessions.get(conn) if conn is not None else None
+        if session is not None:
+            sequence_id = session.next_sequence_id()
+        else:
+            sequence_id = (next(self.sequence_ids) - 1) % 0xFFFF + 1
         
         # 构建消息头
         current_time = self._get_current_timestamp()
@@ -334,13 +649,12 @@ class LASServer:
         
         # 构建消息头
         header = struct.pack(
-            '!cH HH HH 8sc',
+            '!cH HH H 8sc',
             b'\x02',  # STX
             msg_len,
             sequence_id,
             return_sequence_id,
             message_type,
-            0x0000,  # 预留
             current_time,
             bytes([instrument_id])
         )
@@ -370,6 +684,270 @@ class LASServer:
         timestamp = struct.pack('!Q', delta)
         return timestamp
     
+    def _send(self, conn, message):
+        """发送一条完整的uRAP消息；ACK/NACK以外的消息登记到待确认表，超时未确认时重发
+        
+        Args:
+            conn: 连接 socket
+            message: 完整的uRAP消息
+        """
+        message_type = struct.unpack_from('!H', message, 7)[0]
+        session = self.sessions.get(conn)
+        if message_type != self.MSG_TYPE_ACK and session is not None:
+            # 先登记再发送，对方的ACK即使先于 sendall 返回到达也能找到记录
+            sequence_id = struct.unpack_from('!H', message, 3)[0]
+            entry = _OutstandingMessage(message, message_type, sequence_id)
+            with session.outstanding_lock:
+                previous = session.outstanding.get(sequence_id)
+                if previous is not None:
+                    previous.timer.cancel()
+                session.outstanding[sequence_id] = entry
+                entry.timer = self.timers.schedule(self.ack_timeout, self._on_ack_timeout, conn, entry)
+        self._transmit(conn, message, message_type)
+    
+    def _transmit(self, conn, message, message_type):
+        """写出一条消息并记录发送指标
+        
+        帧先加入连接的写缓冲：连接线程处理一批消息期间随本批写出，否则立即非阻塞写出，
+        写不完的部分由连接线程在 socket 可写时继续写。时间轮与事件分发线程调用时从不阻塞。
+        
+        Args:
+            conn: 连接 socket
+            message: 完整的uRAP消息
+            message_type: 消息类型
+        """
+        session = self.sessions.get(conn)
+        if session is None:
+            self.metric_write_syscalls.inc()
+            conn.sendall(message)
+        else:
+            with session.send_lock:
+                session.write_buffer.append(message)
+                session.messages_sent += 1
+                session.bytes_sent += len(message)
+                if not session.batching:
+                    self._write_pending(session)
+            session.last_sent = time.monotonic()
+        self.metric_bytes_sent.inc(len(message))
+        self.metric_messages_sent.labels(type=f"0x{message_type:04x}").inc()
+    
+    def _flush(self, session):
+        """一批消息处理完：结束批处理，用一次非阻塞 sendmsg 写出写缓冲中的帧
+        
+        Args:
+            session: 连接会话
+            
+        Returns:
+            int: 本次写出时写缓冲中的帧数
+        """
+        with session.send_lock:
+            session.batching = False
+            frames = len(session.write_buffer)
+            if not frames:
+                return 0
+            start = time.perf_counter()
+            self._write_pending(session)
+            self.metric_flush_seconds.observe(time.perf_counter() - start)
+        self.metric_frames_per_flush.observe(frames)
+        return frames
+    
+    def _write_pending(self, session):
+        """非阻塞地写出写缓冲中的帧，写不完的部分留在写缓冲（调用方持有会话的 send_lock）
+        
+        Args:
+            session: 连接会话
+            
+        Returns:
+            int: 完整写出的帧数
+        """
+        frames = session.write_buffer
+        if not frames:
+            return 0
+        self.metric_write_syscalls.inc()
+        try:
+            sent = session.conn.sendmsg(frames[:self.MAX_IOV], [], socket.MSG_DONTWAIT)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        written = 0
+        while written < len(frames) and sent >= len(frames[written]):
+            sent -= len(frames[written])
+            written += 1
+        del frames[:written]
+        if sent:
+            frames[0] = frames[0][sent:]
+        if frames:
+            if session.write_pending_since is None:
+                session.write_pending_since = time.monotonic()
+        else:
+            session.write_pending_since = None
+        return written
+    
+    def _retransmit(self, conn, entry, reason):
+        """原样重发待确认消息（序列ID不变）并重新计时（调用方持有会话的 outstanding_lock）
+        
+        Args:
+            conn: 连接 socket
+            entry: 待确认消息
+            reason: 重发原因（timeout/nack）
+        """
+        entry.sent_time = time.perf_counter()
+        entry.timer = self.timers.schedule(self.ack_timeout, self._on_ack_timeout, conn, entry)
+        self.metric_retransmissions.labels(type=f"0x{entry.message_type:04x}", reason=reason).inc()
+        self.logger.log_las(f"Re-sending SeqID=0x{entry.sequence_id:04x}, Type=0x{entry.message_type:04x} ({reason})")
+    
+    def _on_ack_timeout(self, conn, entry):
+        """ACK/NACK 超时（时间轮线程中调用）：未超过重发次数时重发，否则重置连接
+        
+        重发与其他帧一样只加入连接的写缓冲并非阻塞写出，不会阻塞时间轮。
+        
+        Args:
+            conn: 连接 socket
+            entry: 待确认消息
+        """
+        session = self.sessions.get(conn)
+        if session is None:
+            return
+        with session.outstanding_lock:
+            if session.outstanding.get(entry.sequence_id) is not entry:
+                return
+            exhausted = entry.retries >= self.max_retries
+            if exhausted:
+                del session.outstanding[entry.sequence_id]
+            else:
+                entry.retries += 1
+                self._retransmit(conn, entry, 'timeout')
+        
+        if exhausted:
+            self._reset_connection(conn, 'ack_timeout',
+                                   f"no ACK for SeqID=0x{entry.sequence_id:04x} after {self.max_retries} retries")
+            return
+        try:
+            self._transmit(conn, entry.message, entry.message_type)
+        except OSError as e:
+            self._reset_connection(conn, 'send_error', str(e))
+    
+    def _handle_ack(self, conn, header, body):
+        """处理对方的ACK/NACK：结束待确认消息，Message Not Understood 时重发
+        
+        Args:
+            conn: 连接 socket
+            header: 消息头（Return Sequence ID 为被确认消息的序列ID）
+            body: 消息体（Return Code）
+        """
+        return_code = body[0] if body else self.NACK_NOT_UNDERSTOOD
+        sequence_id = header['return_sequence_id']
+        self.metric_acks_received.labels(return_code=f"0x{return_code:02x}").inc()
+        
+        session = self.sessions.get(conn)
+        if session is None:
+            return
+        resend = False
+        with session.outstanding_lock:
+            entry = session.outstanding.get(sequence_id)
+            if entry is None:
+                self.logger.log_las(f"ACK/NACK for unknown SeqID=0x{sequence_id:04x}, ReturnCode=0x{return_code:02x}")
+                return
+            entry.timer.cancel()
+            self.metric_ack_round_trip.labels(type=f"0x{entry.message_type:04x}").observe(
+                time.perf_counter() - entry.sent_time)
+            if return_code == self.NACK_NOT_UNDERSTOOD:
+                entry.nacks += 1
+                resend = entry.nacks < self.max_nacks
+            if resend:
+                self._retransmit(conn, entry, 'nack')
+            else:
+                del session.outstanding[sequence_id]
+        
+        if return_code == self.ACK_ACCEPTED:
+            if session.state == STATE_HANDSHAKE and sequence_id == session.handshake_sequence_id:
+                self._on_connected(session)
+            elif session.state == STATE_INITIALIZING:
+                self._check_initialized(session)
+            return
+        self.logger.log_las(f"Received NACK for SeqID=0x{sequence_id:04x}, Type=0x{entry.message_type:04x}, "
+                           f"ReturnCode=0x{return_code:02x}")
+        if resend:
+            self._transmit(conn, entry.message, entry.message_type)
+        elif return_code == self.NACK_NOT_UNDERSTOOD:
+            self._reset_connection(conn, 'nack_limit',
+                                   f"{entry.nacks} NACKs for SeqID=0x{sequence_id:04x}")
+        else:
+            # 对方不支持该消息类型，重发也不会被接受
+            self.logger.warning(f"LAS does not support message type 0x{entry.message_type:04x}")
+    
+    def _on_keep_alive_timer(self, conn, session):
+        """保活定时器（时间轮线程中调用）：连接建立后发送方向空闲满 keep_alive_interval 秒时发送 Keep Alive
+        
+        消息收发只更新时间戳，不重新调度定时器；定时器到期时按剩余空闲时间重新调度自己。
+        Keep Alive 只加入连接的写缓冲并非阻塞写出，对方停止读取时由连接线程按 send_timeout 重置该连接。
+        
+        Args:
+            conn: 连接 socket
+            session: 连接会话
+        """
+        if self.sessions.get(conn) is not session:
+            return
+        idle = time.monotonic() - session.last_sent
+        if idle < self.keep_alive_interval or not session.connected:
+            delay = self.keep_alive_interval - idle if session.connected else self.keep_alive_interval
+            self.timers.schedule(max(delay, 0), self._on_keep_alive_timer, conn, session)
+            return
+        try:
+            message, sequence_id = self._build_message(self.MSG_TYPE_KEEP_ALIVE, b'', conn=conn)
+            self._send(conn, message)
+            self.metric_keep_alives_sent.inc()
+            self.logger.log_las(f"Keep alive sent, SeqID=0x{sequence_id:04x}")
+        except OSError as e:
+            self._reset_connection(conn, 'send_error', str(e))
+            return
+        self.timers.schedule(self.keep_alive_interval, self._on_keep_alive_timer, conn, session)
+    
+    def _on_inactivity_timer(self, conn, session):
+        """空闲检测定时器（时间轮线程中调用）：接收方向空闲满 inactivity_timeout 秒时重置连接
+        
+        Args:
+            conn: 连接 socket
+            session: 连接会话
+        """
+        if self.sessions.get(conn) is not session:
+            return
+        idle = time.monotonic() - session.last_received
+        if idle < self.inactivity_timeout:
+            self.timers.schedule(self.inactivity_timeout - idle, self._on_inactivity_timer, conn, session)
+            return
+        self._reset_connection(conn, 'inactivity', f"nothing received for {idle:.1f}s")
+    
+    def _drop_outstanding(self, session):
+        """丢弃连接的所有待确认消息并取消其定时器
+        
+        Args:
+            session: 连接会话
+        """
+        with session.outstanding_lock:
+            table, session.outstanding = session.outstanding, {}
+        for entry in table.values():
+            entry.timer.cancel()
+    
+    def _reset_connection(self, conn, reason, detail):
+        """通信失败时重置连接：丢弃待确认消息并关闭读写，连接线程随后清理连接
+        
+        Args:
+            conn: 连接 socket
+            reason: 重置原因（指标标签）
+            detail: 日志说明
+        """
+        self.metric_connection_resets.labels(reason=reason).inc()
+        self.listen_resume_time = time.monotonic() + self.listen_wait
+        session = self.sessions.get(conn)
+        if session is not None:
+            self._drop_outstanding(session)
+        self.logger.warning(f"Resetting LAS connection: {detail}")
+        self.logger.log_las(f"Connection reset ({reason}): {detail}")
+        try:
+            conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    
     def _send_ack(self, conn, sequence_id, return_code):
         """发送ACK/NACK消息
         
@@ -386,11 +964,13 @@ class LASServer:
             message, _ = self._build_message(
                 self.MSG_TYPE_ACK,
                 body,
-                return_sequence_id=sequence_id
+                return_sequence_id=sequence_id,
+                conn=conn
             )
             
             # 发送消息
-            conn.sendall(message)
+            self._send(conn, message)
+            self.metric_acks_sent.labels(return_code=f"0x{return_code:02x}").inc()
             
             # 记录日志
             ack_type = "ACK" if return_code == 0x00 else "NACK"
@@ -432,11 +1012,20 @@ class LASServer:
             self.logger.log_las(f"Handshake received: Protocol=0x{protocol_version:04x}, "
                                f"Type=0x{instrument_type:04x}, Serial={instrument_serial}")
             
-            # 发送握手响应
-            self._send_handshake_response(conn, header['sequence_id'])
-            
-            # 发送初始化完成消息
-            self._send_initialization_complete(conn)
+            # 发送握手响应，LAS确认后连接建立（握手可以重新开始，之前的初始化进度作废）
+            session = self.sessions.get(conn)
+            if session is None:
+                return
+            session.handshake = {
+                'protocol_version': protocol_version,
+                'instrument_type': instrument_type,
+                'capability_version': capability_version,
+                'software_version': software_version,
+                'instrument_id': instrument_id,
+                'serial': instrument_serial,
+            }
+            self._set_state(session, STATE_HANDSHAKE)
+            session.handshake_sequence_id = self._send_handshake_response(conn, header['sequence_id'])
             
         except Exception as e:
             self.logger.error(f"Error handling LAS handshake: {str(e)}")
@@ -448,6 +1037,9 @@ class LASServer:
         Args:
             conn: 连接 socket
             return_sequence_id: 返回序列ID
+            
+        Returns:
+            int: 握手响应的序列ID，发送失败时为 None
         """
         try:
             # 构建握手响应消息体
@@ -474,19 +1066,95 @@ class LASServer:
             message, sequence_id = self._build_message(
                 self.MSG_TYPE_HANDSHAKE,
                 body,
-                return_sequence_id=return_sequence_id
+                return_sequence_id=return_sequence_id,
+                conn=conn
             )
             
             # 发送消息
-            conn.sendall(message)
+            self._send(conn, message)
             
             self.logger.info(f"LAS handshake response sent, SeqID=0x{sequence_id:04x}")
             self.logger.log_las(f"Handshake response sent, SeqID=0x{sequence_id:04x}")
+            return sequence_id
             
         except Exception as e:
             self.logger.error(f"Error sending LAS handshake response: {str(e)}")
             self.logger.log_las(f"Error sending handshake response: {str(e)}")
     
+    def _set_state(self, session, state):
+        """切换会话状态并记录
+        
+        Args:
+            session: 连接会话
+            state: 新状态
+        """
+        if session.state == state and state == STATE_CLOSED:
+            return
+        previous = session.transition(state)
+        self.metric_session_transitions.labels(state=state).inc()
+        self.logger.log_las(f"Session {session.addr[0]}:{session.addr[1]}: {previous} -> {state}")
+    
+    def _on_connected(self, session):
+        """握手响应被确认，连接建立：开始初始化计时，补发断开期间完成的取放响应
+        
+        Args:
+            session: 连接会话
+        """
+        # 状态切换与取出未送达的取放在同一把锁内，与取放完成时查找已建立的连接互斥
+        with self.undelivered_lock:
+            self._set_state(session, STATE_INITIALIZING)
+            transfers, self.undelivered_transfers = self.undelivered_transfers, []
+        session.handshake_time = time.monotonic()
+        session.init_pending = set(self.INITIALIZATION_REQUEST_TYPES - {self.MSG_TYPE_TRANSFER_STATUS_REQUEST})
+        session.init_pending.add(self.MSG_TYPE_CLEAR_QUEUE_REQUEST)
+        session.init_pending.update((self.MSG_TYPE_TRANSFER_STATUS_REQUEST, ip_index)
+                                    for ip_index in range(self.core.interface_positions))
+        self.timers.schedule(self.init_timeout, self._on_init_timer, session.conn, session, session.handshake_time)
+        self.logger.info(f"LAS connection established with {session.addr[0]}:{session.addr[1]}")
+        
+        for transfer in transfers:
+            self._send_load_unload_response(session.conn, 0, transfer)
+    
+    def _check_initialized(self, session):
+        """初始化请求全部完成、没有被仪器锁定的接口位置、主动发送的取放响应都已确认时，
+        发送 Initialization Sequence Complete
+        
+        Args:
+            session: 连接会话
+        """
+        if session.state != STATE_INITIALIZING or session.init_pending:
+            return
+        if any(ownership == LOCKED_BY_INSTRUMENT for ownership in self.core.get_instrument_health()['lock_ownership']):
+            return
+        with session.outstanding_lock:
+            if any(entry.message_type == self.MSG_TYPE_LOAD_UNLOAD_RESPONSE
+                   for entry in session.outstanding.values()):
+                return
+        self._set_state(session, STATE_INITIALIZED)
+        self._send_initialization_complete(session.conn)
+        self.metric_initialization_seconds.observe(time.monotonic() - session.opened)
+        
+        # 初始化期间的状态变化不推送，完成后补发与初始化时不同的健康状态
+        body = self._build_health_body(self.core.get_instrument_health())
+        if session.health_body is not None and session.health_body != body:
+            self._send_instrument_health(session.conn, body)
+            self.metric_health_pushes.inc()
+    
+    def _on_init_timer(self, conn, session, handshake_time):
+        """初始化超时（时间轮线程中调用）：握手后 init_timeout 秒内未完成初始化则重置连接
+        
+        Args:
+            conn: 连接 socket
+            session: 连接会话
+            handshake_time: 调度时的连接建立时间（重新握手后旧定时器失效）
+        """
+        if (self.sessions.get(conn) is not session or session.handshake_time != handshake_time
+                or session.state != STATE_INITIALIZING):
+            return
+        self._reset_connection(conn, 'init_timeout',
+                               f"initialization not complete {self.init_timeout}s after handshake, "
+                               f"pending {sorted(map(str, session.init_pending))}")
+    
     def _send_initialization_complete(self, conn):
         """发送初始化完成消息
         
@@ -500,11 +1168,12 @@ class LASServer:
             # 构建完整消息
             message, sequence_id = self._build_message(
                 self.MSG_TYPE_INITIALIZATION_COMPLETE,
-                body
+                body,
+                conn=conn
             )
             
             # 发送消息
-            conn.sendall(message)
+            self._send(conn, message)
             
             self.logger.info(f"LAS initialization complete message sent, SeqID=0x{sequence_id:04x}")
             self.logger.log_las(f"Initialization complete sent, SeqID=0x{sequence_id:04x}")
@@ -521,50 +1190,98 @@ class LASServer:
             header: 消息头
         """
         try:
-            # 获取仪器健康状态
-            health_status = self.core.get_instrument_health()
-            
-            # 构建响应消息体
-            body = struct.pack(
-                '!BBB B',
-                health_status['automation_interface_status'],
-                health_status['instrument_process_status'],
-                health_status['lis_connection_status'],
-                health_status['interface_positions']
-            )
-            
-            # 添加接口位置状态
-            for i in range(health_status['interface_positions']):
-                remote_status = health_status['remote_control_status'][i] if i < len(health_status['remote_control_status']) else 1
-                lock_ownership = health_status['lock_ownership'][i] if i < len(health_status['lock_ownership']) else 2
-                body += struct.pack('!BB', remote_status, lock_ownership)
-            
-            # 添加处理积压、样本获取延迟、在线试管数量、已完成试管数量
-            body += struct.pack(
-                '!HHHH',
-                health_status['processing_backlog'],
-                health_status['sample_acquisition_delay'],
-                health_status['on_board_tube_count'],
-                health_status['completed_tube_count']
-            )
-            
-            # 构建完整消息
-            message, sequence_id = self._build_message(
-                self.MSG_TYPE_INSTRUMENT_HEALTH_RESPONSE,
-                body,
-                return_sequence_id=header['sequence_id']
-            )
-            
-            # 发送消息
-            conn.sendall(message)
-            
-            self.logger.info(f"LAS instrument health response sent, SeqID=0x{sequence_id:04x}")
-            self.logger.log_las(f"Instrument health response sent, SeqID=0x{sequence_id:04x}")
-            
+            self._send_instrument_health(conn, self._build_health_body(self.core.get_instrument_health()),
+                                         header['sequence_id'])
         except Exception as e:
             self.logger.error(f"Error handling LAS instrument health request: {str(e)}")
             self.logger.log_las(f"Error handling instrument health request: {str(e)}")
     
+    def _build_health_body(self, health_status):
+        """构建 Instrument Health 消息体
+        
+        Args:
+            health_status: 健康状态快照
+            
+        Returns:
+            bytes: 消息体
+        """
+        body = struct.pack(
+            '!BBB B',
+            health_status['automation_interface_status'],
+            health_status['instrument_process_status'],
+            health_status['lis_connection_status'],
+            health_status['interface_positions']
+        )
+        
+        # 添加接口位置状态
+        for i in range(health_status['interface_positions']):
+            remote_status = health_status['remote_control_status'][i] if i < len(health_status['remote_control_status']) else 1
+            lock_ownership = health_status['lock_ownership'][i] if i < len(health_status['lock_ownership']) else 2
+            body += struct.pack('!BB', remote_status, lock_ownership)
+        
+        # 添加处理积压、样本获取延迟、在线试管数量、已完成试管数量
+        body += struct.pack(
+            '!HHHH',
+            health_status['processing_backlog'],
+            health_status['sample_acquisition_delay'],
+            health_status['on_board_tube_count'],
+            health_status['completed_tube_count']
+        )
+        return body
+    
+    def _send_instrument_health(self, conn, body, return_sequence_id=0):
+        """发送 Instrument Health 响应（return_sequence_id 为 0 时是主动推送）
+        
+        Args:
+            conn: 连接 socket
+            body: _build_health_body 构建的消息体
+            return_sequence_id: 请求的序列ID
+        """
+        message, sequence_id = self._build_message(
+            self.MSG_TYPE_INSTRUMENT_HEALTH_RESPONSE,
+            body,
+            return_sequence_id=return_sequence_id,
+            conn=conn
+        )
+        self._send(conn, message)
+        session = self.sessions.get(conn)
+        if session is not None:
+            session.health_body = body
+        
+        self.logger.info(f"LAS instrument health response sent, SeqID=0x{sequence_id:04x}")
+        self.logger.log_las(f"Instrument health response sent, SeqID=0x{sequence_id:04x}")
+    
+    def _on_status_changed(self, event):
+        """设备状态变化（事件分发线程中调用）：没有待发送的推送时在 health_push_window 秒后推送
+        
+        Args:
+            event: StatusChanged 事件
+        """
+        self.metric_status_changes.inc()
+        with self.health_push_lock:
+            if self.health_push_pending or not self.is_running:
+                return
+            self.health_push_pending = True
+        self.timers.schedule(self.health_push_window, self._push_instrument_health)
+    
+    def _push_instrument_health(self):
+        """向所有已完成初始化的LAS连接主动推送最新的 Instrument Health（时间轮线程中调用）
+        
+        内容与上次发给该连接的健康状态相同（窗口内的变化相互抵消）时不推送。消息体只构建一次，
+        读取健康状态不加锁，各连接的推送只加入其写缓冲并非阻塞写出。
+        """
+        with self.health_push_lock:
+            self.health_push_pending = False
+        body = self._build_health_body(self.core.get_instrument_health())
+        for session in list(self.sessions.values()):
+            if session.state != STATE_INITIALIZED or session.health_body == body:
+                continue
+            try:
+                self._send_instrument_health(session.conn, body)
+                self.metric_health_pushes.inc()
+            except Exception as e:
+                self.logger.error(f"Error pushing LAS instrument health: {str(e)}")
+    
     def _handle_test_inventory_request(self, conn, header):
         """处理测试库存请求
         
@@ -594,11 +1311,12 @@ class LASServer:
             message, sequence_id = self._build_message(
                 self.MSG_TYPE_TEST_INVENTORY_RESPONSE,
                 body,
-                return_sequence_id=header['sequence_id']
+                return_sequence_id=header['sequence_id'],
+                conn=conn
             )
             
             # 发送消息
-            conn.sendall(message)
+            self._send(conn, message)
             
             self.logger.info(f"LAS test inventory response sent, SeqID=0x{sequence_id:04x}, Tests={test_count}")
             self.logger.log_las(f"Test inventory response sent, SeqID=0x{sequence_id:04x}, Tests={test_count}")
@@ -615,16 +1333,22 @@ class LASServer:
             header: 消息头
         """
         try:
-            # 获取所有样本
-            samples = self.core.get_all_samples()
-            onboard_samples = [sample for sample in samples.values() if sample['status'] != 'completed']
+            # 获取在线样本（只应用上次请求以来的样本变化）
+            with self.onboard_lock:
+                self._sync_onboard_samples()
+                onboard_samples = list(self.onboard_samples.values())
             onboard_count = len(onboard_samples)
             
             # 构建响应消息体
             body = struct.pack('!H', onboard_count)
             
             # 添加每个在线样本
+            now = time.time()
             for sample in onboard_samples:
+                if sample['sample_id'] not in self.onboard_reported:
+                    self.onboard_reported.add(sample['sample_id'])
+                    self.tracer.record(sample['sample_id'], STAGE_LAS_LOAD, sample['received_time'], now)
+                self.tracer.mark(sample['sample_id'], STAGE_LAS_ONBOARD)
                 sample_id = sample['sample_id'].encode('ascii')
                 body += struct.pack(f'!B {len(sample_id)}s',
                                   len(sample_id),
@@ -637,11 +1361,12 @@ class LASServer:
             message, sequence_id = self._build_message(
                 self.MSG_TYPE_ONBOARD_SAMPLE_INFO_RESPONSE,
                 body,
-                return_sequence_id=header['sequence_id']
+                return_sequence_id=header['sequence_id'],
+                conn=conn
             )
             
             # 发送消息
-            conn.sendall(message)
+            self._send(conn, message)
             
             self.logger.info(f"LAS onboard sample info response sent, SeqID=0x{sequence_id:04x}, Samples={onboard_count}")
             self.logger.log_las(f"Onboard sample info response sent, SeqID=0x{sequence_id:04x}, Samples={onboard_count}")
@@ -650,6 +1375,38 @@ class LASServer:
             self.logger.error(f"Error handling LAS onboard sample info request: {str(e)}")
             self.logger.log_las(f"Error handling onboard sample info request: {str(e)}")
     
+    def _sync_onboard_samples(self):
+        """按样本变更日志更新在线样本集合，首次调用或落后过多时从全量快照重建（调用方持有onboard_lock）"""
+        if self.onboard_cursor is not None:
+            try:
+                changes = self.onboard_cursor.poll()
+            except ChangeLogTruncated as e:
+                self.logger.warning(f"Onboard sample tracking fell behind ({str(e)}), resynchronizing")
+                self.onboard_cursor = None
+            else:
+                now = time.time()
+                for change in changes:
+                    if change.kind == CHANGE_COMPLETED:
+                        self.onboard_samples.pop(change.sample_id, None)
+                        if change.sample_id in self.onboard_reported:
+                            self.onboard_reported.discard(change.sample_id)
+                            self.tracer.record(change.sample_id, STAGE_LAS_UNLOAD,
+                                               change.record['completed_time'], now)
+                    else:
+                        self.onboard_samples[change.sample_id] = change.record
+                return
+        
+        seq, samples = self.core.get_samples_snapshot()
+        self.onboard_samples = {sample_id: sample for sample_id, sample in samples.items()
+                                if sample['status'] != 'completed'}
+        self.onboard_cursor = self.core.changelog.cursor(seq)
+        now = time.time()
+        for sample_id in self.onboard_reported - self.onboard_samples.keys():
+            self.onboard_reported.discard(sample_id)
+            sample = samples.get(sample_id)
+            if sample is not None and sample.get('completed_time') is not None:
+                self.tracer.record(sample_id, STAGE_LAS_UNLOAD, sample['completed_time'], now)
+    
     def _handle_consumable_inventory_request(self, conn, header):
         """处理耗材库存请求
         
@@ -687,11 +1444,12 @@ class LASServer:
             message, sequence_id = self._build_message(
                 self.MSG_TYPE_CONSUMABLE_INVENTORY_RESPONSE,
                 body,
-                return_sequence_id=header['sequence_id']
+                return_sequence_id=header['sequence_id'],
+                conn=conn
             )
             
             # 发送消息
-            conn.sendall(message)
+            self._send(conn, message)
             
             self.logger.info(f"LAS consumable inventory response sent, SeqID=0x{sequence_id:04x}, Modules={module_count}")
             self.logger.log_las(f"Consumable inventory response sent, SeqID=0x{sequence_id:04x}, Modules={module_count}")
@@ -699,3 +1457,293 @@ class LASServer:
         except Exception as e:
             self.logger.error(f"Error handling LAS consumable inventory request: {str(e)}")
             self.logger.log_las(f"Error handling consumable inventory request: {str(e)}")
+    
+    def _parse_carrier(self, body):
+        """解析 Add/Skip Queue 请求的公共部分
+        
+        格式：Interface Position Index (1) + Carrier Occupancy (1) + FL (1) + Sample ID (n) + 其余字段
+        
+        Args:
+            body: 消息体
+            
+        Returns:
+            tuple: (接口位置索引, 占用类型, 样本ID, 其余字段) 或 None 如果消息体不完整
+        """
+        if len(body) < 3:
+            return None
+        ip_index, occupancy, sample_id_len = body[0], body[1], body[2]
+        if len(body) < 3 + sample_id_len:
+            return None
+        sample_id = body[3:3+sample_id_len].decode('ascii')
+        return ip_index, occupancy, sample_id, body[3+sample_id_len:]
+    
+    def _send_queue_response(self, conn, header, message_type, ip_index, sample_id):
+        """发送 Add/Skip Queue 响应
+        
+        格式：Interface Position Index (1) + FL (1) + Sample ID (n) + Command Status (1)
+        
+        Args:
+            conn: 连接 socket
+            header: 请求消息头
+            message_type: 响应消息类型
+            ip_index: 接口位置索引
+            sample_id: 样本ID
+            
+        Returns:
+            int: 响应的序列ID
+        """
+        sample_id_bytes = sample_id.encode('ascii')
+        body = struct.pack(f'!BB {len(sample_id_bytes)}s B',
+                          ip_index,
+                          len(sample_id_bytes),
+                          sample_id_bytes,
+                          self.COMMAND_STATUS_SUCCESS)
+        message, sequence_id = self._build_message(message_type, body, return_sequence_id=header['sequence_id'],
+                                                   conn=conn)
+        self._send(conn, message)
+        return sequence_id
+    
+    def _handle_add_queue(self, conn, header, body):
+        """处理 Add Queue 命令
+        
+        Args:
+            conn: 连接 socket
+            header: 消息头
+            body: 消息体
+        """
+        try:
+            # 格式：公共部分 + Sample Priority (1) + Tube Height (1) + Tube Diameter (1)
+            carrier = self._parse_carrier(body)
+            if carrier is None:
+                self.logger.warning("Malformed LAS Add Queue command")
+                return
+            ip_index, occupancy, sample_id, rest = carrier
+            priority, tube_height, tube_diameter = (tuple(rest[:3]) + (0, 0, 0))[:3]
+            
+            self.core.add_carrier(ip_index, occupancy, sample_id, priority, tube_height, tube_diameter)
+            
+            # 仪器不能拒绝 Add Queue 命令，总是返回成功
+            sequence_id = self._send_queue_response(conn, header, self.MSG_TYPE_ADD_QUEUE_RESPONSE, ip_index, sample_id)
+            
+            self.logger.log_las(f"Add queue response sent, SeqID=0x{sequence_id:04x}, IP={ip_index}, SampleID={sample_id}")
+            
+        except Exception as e:
+            self.logger.error(f"Error handling LAS add queue command: {str(e)}")
+            self.logger.log_las(f"Error handling add queue command: {str(e)}")
+    
+    def _handle_skip_queue(self, conn, header, body):
+        """处理 Skip Queue 命令
+        
+        Args:
+            conn: 连接 socket
+            header: 消息头
+            body: 消息体
+        """
+        try:
+            # 格式：公共部分 + In Queue (1) + Tube Height (1) + Tube Diameter (1)
+            carrier = self._parse_carrier(body)
+            if carrier is None:
+                self.logger.warning("Malformed LAS Skip Queue command")
+                return
+            ip_index, occupancy, sample_id, rest = carrier
+            in_queue = rest[0] if rest else 0x00
+            
+            self.core.skip_carrier(ip_index, occupancy, sample_id)
+            
+            sequence_id = self._send_queue_response(conn, header, self.MSG_TYPE_SKIP_QUEUE_RESPONSE, ip_index, sample_id)
+            
+            self.logger.log_las(f"Skip queue response sent, SeqID=0x{sequence_id:04x}, IP={ip_index}, "
+                               f"SampleID={sample_id}, InQueue=0x{in_queue:02x}")
+            
+        except Exception as e:
+            self.logger.error(f"Error handling LAS skip queue command: {str(e)}")
+            self.logger.log_las(f"Error handling skip queue command: {str(e)}")
+    
+    def _handle_clear_queue(self, conn, header, body):
+        """处理 Clear Queue 命令
+        
+        Args:
+            conn: 连接 socket
+            header: 消息头
+            body: 消息体
+        """
+        try:
+            # 格式：Interface Position Index (1)
+            if len(body) < 1:
+                self.logger.warning("Malformed LAS Clear Queue command")
+                return
+            ip_index = body[0]
+            
+            cleared = self.core.clear_carrier_queue(ip_index)
+            
+            response = struct.pack('!BB', ip_index, self.COMMAND_STATUS_SUCCESS)
+            message, sequence_id = self._build_message(
+                self.MSG_TYPE_CLEAR_QUEUE_RESPONSE,
+                response,
+                return_sequence_id=header['sequence_id'],
+                conn=conn
+            )
+            self._send(conn, message)
+            
+            self.logger.log_las(f"Clear queue response sent, SeqID=0x{sequence_id:04x}, IP={ip_index}, Cleared={cleared}")
+            
+        except Exception as e:
+            self.logger.error(f"Error handling LAS clear queue command: {str(e)}")
+            self.logger.log_las(f"Error handling clear queue command: {str(e)}")
+    
+    def _handle_load_unload(self, conn, header, body):
+        """处理 Load_Unload 请求
+        
+        载架立即锁定，响应在取放完成（transfer_time 秒后）才发送，期间连接可以继续处理其他消息。
+        
+        Args:
+            conn: 连接 socket
+            header: 消息头
+            body: 消息体
+        """
+        try:
+            # 格式：Interface Position Index (1) + Carrier Occupancy (1) + FL (1) + Sample ID (n) +
+            #       Tube Height (1) + Tube Diameter (1) + Elapsed Time (2)
+            carrier = self._parse_carrier(body)
+            if carrier is None:
+                self.logger.warning("Malformed LAS Load_Unload request")
+                return
+            ip_index, occupancy, sample_id, _ = carrier
+            
+            transfer = self.core.begin_load_unload(ip_index, occupancy, sample_id)
+            if transfer is None:
+                return
+            
+            if transfer.carrier is None or self.core.transfer_time <= 0:
+                self._send_load_unload_response(conn, header['sequence_id'], transfer)
+            else:
+                self.timers.schedule(self.core.transfer_time, self._submit_completion,
+                                     conn, header['sequence_id'], transfer)
+            
+        except Exception as e:
+            self.logger.error(f"Error handling LAS Load_Unload request: {str(e)}")
+            self.logger.log_las(f"Error handling Load_Unload request: {str(e)}")
+    
+    def _submit_completion(self, conn, return_sequence_id, transfer):
+        """取放时间到（时间轮线程中调用）：把取放完成交给完成线程，时间轮不等待状态持久化与事件发布
+        
+        Args:
+            conn: 连接 socket
+            return_sequence_id: Load_Unload 请求的序列ID
+            transfer: core.begin_load_unload 返回的取放操作
+        """
+        self.completions.put((conn, return_sequence_id, transfer))
+        with self.completion_lock:
+            if self.completion_thread is None or not self.completion_thread.is_alive():
+                self.completion_thread = threading.Thread(target=self._completion_loop, name='LASCompletions',
+                                                          daemon=True)
+                self.completion_thread.start()
+    
+    def _completion_loop(self):
+        """完成线程：依次完成到时的取放并发送 Load_Unload 响应"""
+        while True:
+            item = self.completions.get()
+            if item is None:
+                return
+            self._send_load_unload_response(*item)
+    
+    def _send_load_unload_response(self, conn, return_sequence_id, transfer):
+        """取放完成：释放接口位置并发送 Load_Unload 响应
+        
+        格式：Interface Position Index (1) + FL (1) + Load Sample ID (n) + Load Status (1) +
+              FL (1) + Unload Sample ID (n) + Unload Status (1) + Sample Processing Status (1) +
+              On Board Tube Count (2) + Completed Tube Count (2) + Ready To Load (1) + Return Ready Tube Count (2)
+        
+        发起取放的连接已断开时改为主动发送（Return Sequence ID 为 0）给当前已建立的连接；
+        没有已建立的连接时接口位置保持锁定，下一个连接建立后再发送。
+        
+        Args:
+            conn: 连接 socket
+            return_sequence_id: Load_Unload 请求的序列ID（主动发送时为 0）
+            transfer: core.begin_load_unload 返回的取放操作
+        """
+        try:
+            with self.undelivered_lock:
+                session = self.sessions.get(conn)
+                if session is None or not session.connected:
+                    session = next((candidate for candidate in list(self.sessions.values()) if candidate.connected),
+                                   None)
+                    if session is None:
+                        self.undelivered_transfers.append(transfer)
+                        self.logger.log_las(f"Load_Unload at IP{transfer.ip_index} finished while disconnected, "
+                                           f"keeping the position locked")
+                        return
+                    conn, return_sequence_id = session.conn, 0
+            
+            counts = self.core.finish_load_unload(transfer)
+            load_id = transfer.load_sample_id.encode('ascii')
+            unload_id = transfer.unload_sample_id.encode('ascii')
+            body = struct.pack(f'!BB {len(load_id)}s B B {len(unload_id)}s BB HH BH',
+                               transfer.ip_index,
+                               len(load_id), load_id, transfer.load_status,
+                               len(unload_id), unload_id, transfer.unload_status,
+                               transfer.processing_status,
+                               min(counts['on_board_tube_count'], 0xFFFF),
+                               min(counts['completed_tube_count'], 0xFFFF),
+                               0x01 if counts['ready_to_load'] else 0x00,
+                               min(counts['return_ready_tube_count'], 0xFFFF))
+            message, sequence_id = self._build_message(self.MSG_TYPE_LOAD_UNLOAD_RESPONSE, body,
+                                                       return_sequence_id=return_sequence_id, conn=conn)
+            self._send(conn, message)
+            
+            self.logger.log_las(f"Load_Unload response sent, SeqID=0x{sequence_id:04x}, IP={transfer.ip_index}, "
+                               f"Load={transfer.load_sample_id}/0x{transfer.load_status:02x}, "
+                               f"Unload={transfer.unload_sample_id}/0x{transfer.unload_status:02x}")
+            
+        except Exception as e:
+            self.logger.error(f"Error sending LAS Load_Unload response: {str(e)}")
+            self.logger.log_las(f"Error sending Load_Unload response: {str(e)}")
+    
+    def _handle_transfer_status_request(self, conn, header, body):
+        """处理 Transfer Status 请求
+        
+        Args:
+            conn: 连接 socket
+            header: 消息头
+            body: 消息体
+        """
+        try:
+            # 格式：Interface Position Index (1)
+            if len(body) < 1:
+                self.logger.warning("Malformed LAS Transfer Status request")
+                return
+            self._send_transfer_status(conn, body[0], return_sequence_id=header['sequence_id'])
+            
+        except Exception as e:
+            self.logger.error(f"Error handling LAS transfer status request: {str(e)}")
+            self.logger.log_las(f"Error handling transfer status request: {str(e)}")
+    
+    def _send_transfer_status(self, conn, ip_index, return_sequence_id=0):
+        """发送 Transfer Status 响应（return_sequence_id 为 0 时是主动推送）
+        
+        格式：Interface Position Index (1) + Ready To Load (1) + Return Ready Tube Count (2)
+        
+        Args:
+            conn: 连接 socket
+            ip_index: 接口位置索引
+            return_sequence_id: 请求的序列ID
+        """
+        status = self.core.get_transfer_status(ip_index)
+        if status is None:
+            return
+        body = struct.pack('!BBH', ip_index, 0x01 if status['ready_to_load'] else 0x00,
+                           min(status['return_ready_tube_count'], 0xFFFF))
+        message, sequence_id = self._build_message(self.MSG_TYPE_TRANSFER_STATUS_RESPONSE, body,
+                                                   return_sequence_id=return_sequence_id, conn=conn)
+        self._send(conn, message)
+        self.logger.log_las(f"Transfer status sent, SeqID=0x{sequence_id:04x}, IP={ip_index}, "
+                           f"ReadyToLoad={status['ready_to_load']}, ReturnReady={status['return_ready_tube_count']}")
+    
+    def _on_transfer_status_changed(self, event):
+        """取放就绪状态变化时向所有已完成初始化的LAS连接主动推送 Transfer Status（事件分发线程中调用）"""
+        connections = [session.conn for session in list(self.sessions.values()) if session.state == STATE_INITIALIZED]
+        for conn in connections:
+            try:
+                self._send_transfer_status(conn, event.ip_index)
+            except Exception as e:
+                self.logger.error(f"Error pushing LAS transfer status: {str(e)}")
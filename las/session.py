@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Session模块 - LAS连接会话：连接建立、初始化与重置的状态机
+"""
+
+import itertools
+import threading
+import time
+
+
+# 会话状态
+STATE_LISTENING = 'listening'        # 已接受连接，等待LAS握手
+STATE_HANDSHAKE = 'handshake'        # 已发送握手响应，等待LAS确认（确认后连接建立）
+STATE_INITIALIZING = 'initializing'  # 连接已建立，LAS进行初始化请求
+STATE_INITIALIZED = 'initialized'    # 已发送 Initialization Sequence Complete，可以分流与取放
+STATE_CLOSED = 'closed'              # 连接已关闭或重置
+
+STATES = (STATE_LISTENING, STATE_HANDSHAKE, STATE_INITIALIZING, STATE_INITIALIZED, STATE_CLOSED)
+
+# 允许的状态转换（握手可以在任何未关闭的状态重新开始）
+TRANSITIONS = {
+    STATE_LISTENING: (STATE_HANDSHAKE, STATE_CLOSED),
+    STATE_HANDSHAKE: (STATE_HANDSHAKE, STATE_INITIALIZING, STATE_CLOSED),
+    STATE_INITIALIZING: (STATE_HANDSHAKE, STATE_INITIALIZED, STATE_CLOSED),
+    STATE_INITIALIZED: (STATE_HANDSHAKE, STATE_CLOSED),
+    STATE_CLOSED: (),
+}
+
+
+class InvalidTransition(Exception):
+    """会话状态转换不合法"""
+
+
+class LASSession:
+    """单个LAS连接的会话状态
+
+    连接建立（LAS确认握手响应）后开始保活；初始化期间记录尚未完成的初始化请求，
+    全部完成且没有被仪器锁定的接口位置后发送 Initialization Sequence Complete。
+    每个连接有自己的序列ID空间、接收缓冲、写缓冲与待确认消息表，发送路径只使用本连接的锁。
+    """
+
+    __slots__ = ('conn', 'addr', 'state', 'state_time', 'opened', 'last_received', 'last_sent',
+                 'handshake_sequence_id', 'handshake_time', 'handshake', 'init_pending', 'health_body',
+                 'sequence_ids', 'buffer', 'write_buffer', 'batching', 'write_pending_since', 'send_lock',
+                 'outstanding', 'outstanding_lock',
+                 'messages_received', 'messages_sent', 'bytes_received', 'bytes_sent')
+
+    def __init__(self, conn, addr):
+        """初始化
+
+        Args:
+            conn: 连接 socket
+            addr: 客户端地址
+        """
+        now = time.monotonic()
+        self.conn = conn
+        self.addr = addr
+        self.state = STATE_LISTENING
+        self.state_time = now
+        self.opened = now
+        self.last_received = now
+        self.last_sent = now
+        self.handshake_sequence_id = None  # 等待确认的握手响应序列ID
+        self.handshake_time = None         # 连接建立（握手响应被确认）的时间
+        self.handshake = None              # LAS握手消息中的协议版本、软件版本、序列号等
+        self.init_pending = set()          # 尚未完成的初始化请求
+        self.health_body = None            # 最近一次发给该连接的 Instrument Health 消息体
+        self.sequence_ids = itertools.count(1)
+        self.buffer = b''                  # 尚未组成完整消息的接收数据
+        self.write_buffer = []             # 尚未写出的帧（写出总是非阻塞的，写不完的部分留在这里）
+        self.batching = False              # 连接线程正在处理一批消息，帧随本批一起写出
+        self.write_pending_since = None    # 写缓冲开始写不出去（对方不读取）的时间
+        self.send_lock = threading.Lock()  # 整条消息写出或加入写缓冲
+        self.outstanding = {}              # 待确认消息：序列ID -> 已发出的消息
+        self.outstanding_lock = threading.Lock()
+        self.messages_received = 0
+        self.messages_sent = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+
+    def next_sequence_id(self):
+        """本连接的下一个序列ID（1~0xFFFF 循环）
+
+        itertools.count 的 next 在 GIL 下是原子操作，连接线程与定时器线程同时发送时无需加锁。
+        """
+        return (next(self.sequence_ids) - 1) % 0xFFFF + 1
+
+    @property
+    def connected(self):
+        """连接是否已建立（握手完成且未关闭）"""
+        return self.state in (STATE_INITIALIZING, STATE_INITIALIZED)
+
+    def transition(self, state):
+        """切换状态
+
+        Args:
+            state: 新状态
+
+        Returns:
+            str: 原状态
+
+        Raises:
+            InvalidTransition: 当前状态不允许切换到 state
+        """
+        if state not in TRANSITIONS[self.state]:
+            raise InvalidTransition(f"{self.state} -> {state}")
+        previous = self.state
+        self.state = state
+        self.state_time = time.monotonic()
+        return previous
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Timers模块 - 哈希时间轮：所有连接共用一个线程触发重发、取放响应等定时任务
+"""
+
+import math
+import threading
+import time
+
+
+class TimerHandle:
+    """已调度的定时任务"""
+
+    __slots__ = ('rounds', 'callback', 'args', 'cancelled')
+
+    def __init__(self, callback, args):
+        self.rounds = 0
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """取消任务（O(1)，任务在所在槽到期时被丢弃）"""
+        self.cancelled = True
+
+
+class TimingWheel:
+    """哈希时间轮
+
+    时间按 tick 划分，任务挂在到期 tick 对应的槽上，超过一圈的任务记录剩余圈数。
+    调度与取消都是 O(1)，每个 tick 只处理一个槽，与定时任务总数无关。
+    回调在时间轮线程上依次执行，应当很快返回（发送一条消息、修改状态），不能阻塞。
+    线程在第一次调度时启动。
+    """
+
+    def __init__(self, tick=0.05, slots=512, logger=None, name='las-timers'):
+        """初始化
+
+        Args:
+            tick: 每个槽的时间跨度（秒），即定时精度
+            slots: 槽数，tick * slots 内到期的任务不需要记录圈数
+            logger: 日志管理器实例（可选），用于记录回调异常
+            name: 线程名
+        """
+        self.tick = tick
+        self.slots = slots
+        self.logger = logger
+        self.name = name
+        self.wheel = [[] for _ in range(slots)]
+        self.ticks = 0  # 已处理的 tick 数
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def schedule(self, delay, callback, *args):
+        """delay 秒后在时间轮线程上调用 callback(*args)
+
+        Args:
+            delay: 延迟秒数（向上取整到 tick，至少一个 tick）
+            callback: 回调
+            *args: 回调参数
+
+        Returns:
+            TimerHandle: 可取消的任务
+        """
+        handle = TimerHandle(callback, args)
+        ticks = max(1, math.ceil(delay / self.tick))
+        with self.lock:
+            if self.thread is None:
+                self.stopped = threading.Event()
+                self.thread = threading.Thread(target=self._run, args=(self.stopped,), name=self.name, daemon=True)
+                self.thread.start()
+            handle.rounds = (ticks - 1) // self.slots
+            self.wheel[(self.ticks + ticks) % self.slots].append(handle)
+        return handle
+
+    def _run(self, stopped):
+        """时间轮线程：按 tick 推进，落后时连续处理直到追上当前时间
+
+        Args:
+            stopped: 本线程的停止事件
+        """
+        started = time.monotonic()
+        processed = 0
+        while not stopped.is_set():
+            delay = started + (processed + 1) * self.tick - time.monotonic()
+            if delay > 0 and stopped.wait(delay):
+                break
+            processed += 1
+            due = []
+            with self.lock:
+                if stopped.is_set():
+                    break
+                self.ticks += 1
+                index = self.ticks % self.slots
+                waiting = []
+                for handle in self.wheel[index]:
+                    if handle.cancelled:
+                        continue
+                    if handle.rounds:
+                        handle.rounds -= 1
+                        waiting.append(handle)
+                    else:
+                        due.append(handle)
+                self.wheel[index] = waiting
+            for handle in due:
+                if handle.cancelled:
+                    continue
+                try:
+                    handle.callback(*handle.args)
+                except Exception as e:
+                    if self.logger is not None:
+                        self.logger.error(f"Error in timer callback: {str(e)}")
+
+    def stop(self):
+        """停止线程并丢弃所有未到期任务（之后再次调度会重新启动线程）"""
+        with self.lock:
+            thread = self.thread
+            self.thread = None
+            self.stopped.set()
+            self.wheel = [[] for _ in range(self.slots)]
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
@@ -4,12 +4,19 @@
 LIS模块 - ASTM协议服务端实现
 """
 
+import select
 import socket
 import threading
 import time
 import random
+from collections import deque
 from datetime import datetime
 
+from core.capacity import PRIORITY_ROUTINE, PRIORITY_STAT
+from core.events import ResultReady
+from profiling.profiler import CHECKPOINT_INTERVAL, profile_checkpoint
+from tracing.tracing import STAGE_ASTM_ACK_WAIT, STAGE_ASTM_TRANSMIT, STAGE_LIS_ORDER
+
 
 class LISServer:
     """LIS服务器，实现ASTM协议"""
@@ -39,6 +46,9 @@ class LISServer:
         self.connections = []
         self.connection_lock = threading.Lock()
         
+        # 已发送结果、等待LIS确认的样本（按连接，先进先出）
+        self.awaiting_ack = {}
+        
         # ASTM协议常量
         self.RECORD_SEP = '\x0d'  # 记录分隔符（CR）
         self.FIELD_SEP = '|'       # 字段分隔符
@@ -54,11 +64,41 @@ class LISServer:
         self.RECORD_TYPE_COMMENT = 'C'
         self.RECORD_TYPE_TERMINATOR = 'L'
         
-        # 注册结果回调
-        self.core.register_result_callback(self._send_result_callback)
+        # 订单优先级（紧跟测试项目字段）：S: STAT, A: ASAP 按STAT处理，其余为常规
+        self.STAT_PRIORITY_CODES = ('S', 'A')
+        
+        # 运行指标与样本追踪
+        self.metrics = core.metrics
+        self.tracer = core.tracer
+        self._init_metrics()
+        
+        # 订阅结果事件（在独立分发线程中发送，不阻塞结果生成）
+        self.result_subscription = self.core.subscribe(self._on_result_ready, [ResultReady], 'lis_results')
         
         self.logger.info(f"LISServer initialized, listening on {self.host}:{self.port}")
     
+    def _init_metrics(self):
+        """注册LIS通信指标"""
+        self.metric_messages_received = self.metrics.counter(
+            'lis_messages_received_total', 'ASTM messages received from the LIS')
+        self.metric_records_received = self.metrics.counter(
+            'lis_records_received_total', 'ASTM records received from the LIS', ['record_type'])
+        self.metric_acks_sent = self.metrics.counter(
+            'lis_acks_sent_total', 'ACK characters sent to the LIS')
+        self.metric_results_sent = self.metrics.counter(
+            'lis_results_sent_total', 'ASTM result messages sent to LIS connections')
+        self.metric_bytes_received = self.metrics.counter(
+            'lis_bytes_received_total', 'Bytes received on LIS connections')
+        self.metric_bytes_sent = self.metrics.counter(
+            'lis_bytes_sent_total', 'Bytes sent on LIS connections')
+        self.metric_connections_total = self.metrics.counter(
+            'lis_connections_total', 'LIS connections accepted')
+        self.metric_connections_rejected = self.metrics.counter(
+            'lis_connections_rejected_total', 'LIS connections rejected because max_connections was reached')
+        self.metric_handler_seconds = self.metrics.histogram(
+            'lis_handler_seconds', 'Time spent processing one ASTM message')
+        self.metrics.gauge('lis_connections', 'Open LIS connections').set_function(lambda: len(self.connections))
+    
     def start(self):
         """启动LIS服务器"""
         if self.is_running:
@@ -114,9 +154,12 @@ class LISServer:
                 with self.connection_lock:
                     if len(self.connections) >= self.max_connections:
                         conn.close()
+                        self.metric_connections_rejected.inc()
                         self.logger.warning(f"LIS connection rejected from {addr[0]}:{addr[1]} - max connections reached")
                         continue
                     self.connections.append(conn)
+                    self.awaiting_ack[conn] = deque(maxlen=1000)
+                self.metric_connections_total.inc()
                 
                 self.logger.info(f"LIS connection established from {addr[0]}:{addr[1]}")
                 self.logger.log_lis(f"Connection established: {addr[0]}:{addr[1]}")
@@ -147,16 +190,30 @@ class LISServer:
         
         try:
             while self.is_running:
+                # 空闲时也定期经过剖析检查点，采集结束后及时停用本线程的Profile
+                readable, _, _ = select.select([conn], [], [], CHECKPOINT_INTERVAL)
+                profile_checkpoint()
+                if not readable:
+                    continue
+                
                 # 接收数据
                 data = conn.recv(4096)
                 if not data:
                     break
                 
+                self.metric_bytes_received.inc(len(data))
+                
                 # 转换为字符串
                 buffer += data.decode('ascii', errors='replace')
                 
                 # 处理缓冲区中的ASTM消息
                 while True:
+                    # 结果报文的ACK：只有位于报文之间的ACK字符才算确认，报文内容中的0x06不算（多个ACK可能合并到达）
+                    acks = buffer.lstrip('\x06')
+                    if len(acks) != len(buffer):
+                        self._handle_result_acks(conn, len(buffer) - len(acks))
+                        buffer = acks
+                    
                     # 查找完整消息（以L记录结尾）
                     msg_end = buffer.find(f"L{self.FIELD_SEP}")
                     if msg_end == -1:
@@ -186,6 +243,7 @@ class LISServer:
             with self.connection_lock:
                 if conn in self.connections:
                     self.connections.remove(conn)
+                self.awaiting_ack.pop(conn, None)
             
             try:
                 conn.close()
@@ -203,6 +261,10 @@ class LISServer:
             addr: 客户端地址
             message: ASTM消息
         """
+        start_time = time.perf_counter()
+        received_time = time.time()
+        self.metric_messages_received.inc()
+        
         try:
             # 记录接收到的消息
             self.logger.log_lis(f"Received message from {addr[0]}:{addr[1]}")
@@ -217,6 +279,7 @@ class LISServer:
             patient_info = {}
             current_sample = None
             test_orders = []
+            priority = PRIORITY_ROUTINE
             
             for record in records:
                 record = record.strip()
@@ -225,6 +288,7 @@ class LISServer:
                 
                 record_type = record[0]
                 fields = record.split(self.FIELD_SEP)
+                self.metric_records_received.labels(record_type=record_type).inc()
                 
                 if record_type == self.RECORD_TYPE_HEADER:
                     # 处理头记录
@@ -240,12 +304,14 @@ class LISServer:
                     if order_info:
                         current_sample = order_info['sample_id']
                         test_orders = order_info['tests']
+                        priority = order_info['priority']
                         
                 elif record_type == self.RECORD_TYPE_TERMINATOR:
                     # 处理终止记录
                     if current_sample and test_orders:
                         # 接收样本
-                        self._receive_sample(conn, current_sample, test_orders, patient_info)
+                        self._receive_sample(conn, current_sample, test_orders, patient_info, priority)
+                        self.tracer.record(current_sample, STAGE_LIS_ORDER, received_time, time.time())
                     
             # 发送确认消息
             self._send_ack(conn)
@@ -253,6 +319,8 @@ class LISServer:
         except Exception as e:
             self.logger.error(f"Error processing LIS message: {str(e)}")
             self.logger.log_lis(f"Error processing message: {str(e)}")
+        finally:
+            self.metric_handler_seconds.observe(time.perf_counter() - start_time)
     
     def _handle_header_record(self, fields):
         """处理ASTM头记录
@@ -308,7 +376,8 @@ class LISServer:
         """
         order_info = {
             'sample_id': '',
-            'tests': []
+            'tests': [],
+            'priority': PRIORITY_ROUTINE
         }
         
         if len(fields) >= 2:
@@ -322,10 +391,13 @@ class LISServer:
                 if test_components and test_components[0]:
                     order_info['tests'].append(test_components[0])
         
+        if len(fields) >= 4 and fields[3].strip().upper() in self.STAT_PRIORITY_CODES:
+            order_info['priority'] = PRIORITY_STAT
+        
         self.logger.log_lis(f"Parsed order record: {order_info}")
         return order_info
     
-    def _receive_sample(self, conn, sample_id, tests, patient_info):
+    def _receive_sample(self, conn, sample_id, tests, patient_info, priority=PRIORITY_ROUTINE):
         """接收样本
         
         Args:
@@ -333,17 +405,28 @@ class LISServer:
             sample_id: 样本ID
             tests: 测试项目列表
             patient_info: 患者信息
+            priority: 样本优先级
         """
         # 调用核心模块接收样本
-        success = self.core.receive_sample(sample_id, tests, patient_info)
+        success = self.core.receive_sample(sample_id, tests, patient_info, priority)
         
         if success:
-            self.logger.info(f"Sample {sample_id} received from LIS with tests {tests}")
-            self.logger.log_lis(f"Sample received: {sample_id}, Tests: {tests}")
+            self.logger.info(f"Sample {sample_id} received from LIS with tests {tests}, priority {priority}")
+            self.logger.log_lis(f"Sample received: {sample_id}, Tests: {tests}, Priority: {priority}")
         else:
             self.logger.error(f"Failed to receive sample {sample_id} from LIS")
             self.logger.log_lis(f"Failed to receive sample: {sample_id}")
     
+    def _send(self, conn, data):
+        """发送数据并记录发送字节数
+        
+        Args:
+            conn: 连接 socket
+            data: 待发送的字节串
+        """
+        conn.sendall(data)
+        self.metric_bytes_sent.inc(len(data))
+    
     def _send_ack(self, conn):
         """发送确认消息
         
@@ -352,17 +435,18 @@ class LISServer:
         """
         # ASTM确认消息（简单ACK）
         ack_msg = '\x06'  # ACK字符
-        conn.sendall(ack_msg.encode('ascii'))
+        self._send(conn, ack_msg.encode('ascii'))
+        self.metric_acks_sent.inc()
         self.logger.log_lis(f"Sent ACK to client")
     
-    def _send_result_callback(self, sample_id, results):
-        """结果回调函数，用于发送结果回LIS
+    def _on_result_ready(self, event):
+        """结果事件处理函数，用于发送结果回LIS
         
         Args:
-            sample_id: 样本ID
-            results: 测试结果
+            event: ResultReady事件
         """
-        sample_info = self.core.get_sample_info(sample_id)
+        sample_id = event.sample_id
+        sample_info = event.sample
         if not sample_info or not sample_info['results']:
             return
         
@@ -373,11 +457,31 @@ class LISServer:
         with self.connection_lock:
             for conn in self.connections:
                 try:
-                    conn.sendall(result_msg.encode('ascii'))
+                    with self.tracer.span(sample_id, STAGE_ASTM_TRANSMIT):
+                        self._send(conn, result_msg.encode('ascii'))
+                    self.awaiting_ack[conn].append((sample_id, time.time()))
+                    self.metric_results_sent.inc()
                     self.logger.log_lis(f"Sent results for sample {sample_id} to client")
                 except Exception as e:
                     self.logger.error(f"Error sending results to client: {str(e)}")
     
+    def _handle_result_acks(self, conn, ack_count):
+        """处理LIS对结果报文的确认，按发送顺序匹配等待确认的样本
+        
+        Args:
+            conn: 连接 socket
+            ack_count: 收到的ACK个数
+        """
+        now = time.time()
+        with self.connection_lock:
+            awaiting = self.awaiting_ack.get(conn)
+            for _ in range(ack_count):
+                if not awaiting:
+                    break
+                sample_id, sent_time = awaiting.popleft()
+                self.tracer.record(sample_id, STAGE_ASTM_ACK_WAIT, sent_time, now)
+                self.logger.log_lis(f"Received ACK for results of sample {sample_id}")
+    
     def _build_result_message(self, sample_info):
         """构建ASTM结果消息
         
@@ -447,7 +551,7 @@ class LISServer:
                 '',  # 结果值类型
                 str(result_info['value']),  # 结果值
                 result_info['unit'],  # 单位
-                '',  # 参考范围
+                result_info.get('reference_range', ''),  # 参考范围
                 result_info['flags'],  # 标志
                 '',  # 异常标志
                 date_str,  # 测试日期
@@ -484,7 +588,8 @@ class LISServer:
         """
         try:
             # 发送消息
-            conn.sendall(astm_message.encode('ascii'))
+            self._send(conn, astm_message.encode('ascii'))
+            self.metric_results_sent.inc()
             
             # 等待ACK
             ack = conn.recv(1)
@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+通信日志检索命令行入口：python -m logger --sample <ID>
+"""
+
+import sys
+
+from .log_index import main
+
+
+if __name__ == '__main__':
+    sys.exit(main())
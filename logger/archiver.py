@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Archiver模块 - 轮转日志分段的后台压缩与保留策略
+"""
+
+import gzip
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+from .log_index import INDEX_SUFFIX
+from .segments import (
+    GZIP_SUFFIX,
+    ZSTD_SUFFIX,
+    SEGMENT_SUFFIX_PATTERN,
+    SEGMENT_TIME_FORMAT,
+    is_compressed,
+    list_segments,
+    zstandard,
+)
+
+
+def resolve_codec(compression):
+    """确定实际使用的压缩算法
+
+    Args:
+        compression: 'auto'、'zstd'、'gzip' 或 'none'
+
+    Returns:
+        str: 'zstd'、'gzip' 或 'none'
+    """
+    compression = (compression or 'none').lower()
+    if compression == 'none':
+        return 'none'
+    if compression in ('auto', 'zstd') and zstandard is not None:
+        return 'zstd'
+    return 'gzip'
+
+
+def _remove_quietly(path):
+    """删除文件，文件不存在时忽略"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class SegmentArchiver:
+    """日志分段归档器
+
+    轮转出的分段由后台线程依次完成：补齐索引、压缩（zstd可用时优先，否则gzip）、
+    按总大小和保存时长淘汰最旧的分段。写日志的线程只做一次重命名。
+    """
+
+    def __init__(self, compression='auto', max_bytes=None, max_age=None):
+        """初始化归档器
+
+        Args:
+            compression: 压缩算法（'auto'、'zstd'、'gzip'、'none'）
+            max_bytes: 单个日志所有历史分段的总大小上限（字节，None表示不限）
+            max_age: 历史分段最长保存时间（秒，None表示不限）
+        """
+        self.codec = resolve_codec(compression)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.queue = queue.Queue()
+        self.thread = None
+        self.thread_lock = threading.Lock()
+
+    def start(self):
+        """启动后台归档线程"""
+        with self.thread_lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._archive_loop, name='LogArchiver', daemon=True)
+                self.thread.start()
+
+    def stop(self, timeout=None):
+        """处理完已提交的分段后停止后台线程
+
+        Args:
+            timeout: 等待超时时间（秒）
+        """
+        with self.thread_lock:
+            thread = self.thread
+            self.thread = None
+        if thread is not None and thread.is_alive():
+            self.queue.put(None)
+            thread.join(timeout)
+
+    def flush(self):
+        """等待已提交的分段全部处理完成"""
+        self.start()
+        self.queue.join()
+
+    def submit(self, log_path, segment=None, indexer=None):
+        """提交一个待归档分段
+
+        Args:
+            log_path: 当前日志文件路径
+            segment: 轮转出的分段路径（None表示只执行保留策略）
+            indexer: 该日志的LogIndexer（可选）
+        """
+        self.queue.put((log_path, segment, indexer))
+        self.start()
+
+    def recover(self, log_path, indexer=None):
+        """重新提交上次运行中未完成压缩的分段，并执行一次保留策略
+
+        Args:
+            log_path: 当前日志文件路径
+            indexer: 该日志的LogIndexer（可选）
+        """
+        base = os.path.basename(log_path)
+        if self.codec != 'none':
+            for segment in list_segments(log_path, include_active=False):
+                suffix = os.path.basename(segment)[len(base) + 1:]
+                if not is_compressed(segment) and SEGMENT_SUFFIX_PATTERN.match(suffix):
+                    self.submit(log_path, segment, indexer)
+        self.submit(log_path, None, indexer)
+
+    def _archive_loop(self):
+        """后台归档循环"""
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                log_path, segment, indexer = item
+                if segment is not None:
+                    self._archive_segment(segment, indexer)
+                self._apply_retention(log_path)
+            except Exception as e:
+                # 归档失败不影响日志写入，分段保持未压缩状态，下次启动时重试
+                sys.stderr.write(f"Error archiving log segment: {str(e)}\n")
+            finally:
+                self.queue.task_done()
+
+    def _archive_segment(self, segment, indexer):
+        """压缩单个分段并转移其索引
+
+        Args:
+            segment: 分段路径
+            indexer: LogIndexer实例（可选）
+        """
+        if not os.path.exists(segment):
+            return
+
+        if self.codec == 'none':
+            if indexer is not None:
+                indexer.index_file(segment)
+            return
+
+        archived = segment + (ZSTD_SUFFIX if self.codec == 'zstd' else GZIP_SUFFIX)
+        tmp_path = archived + '.tmp'
+        stat = os.stat(segment)
+        with open(segment, 'rb') as src:
+            if self.codec == 'zstd':
+                with open(tmp_path, 'wb') as dst:
+                    zstandard.ZstdCompressor(level=3).copy_stream(src, dst)
+            else:
+                with gzip.open(tmp_path, 'wb', compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+        # 保留原分段的修改时间，保证按时间淘汰与排序不受压缩时刻影响
+        os.utime(tmp_path, (stat.st_atime, stat.st_mtime))
+
+        # 先写好压缩分段的完整索引，再替换文件，检索工具始终能读到一份带索引的分段
+        if indexer is not None:
+            indexer.transfer_index(segment, archived)
+        os.replace(tmp_path, archived)
+        _remove_quietly(segment)
+        _remove_quietly(segment + INDEX_SUFFIX)
+
+    @staticmethod
+    def _segment_size(segment):
+        """计算分段及其索引占用的字节数"""
+        size = 0
+        for path in (segment, segment + INDEX_SUFFIX):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+
+    def _apply_retention(self, log_path):
+        """按总大小和保存时长淘汰最旧的历史分段
+
+        Args:
+            log_path: 当前日志文件路径
+        """
+        if self.max_bytes is None and self.max_age is None:
+            return
+
+        segments = list_segments(log_path, include_active=False)
+        sizes = [(segment, self._segment_size(segment)) for segment in segments]
+        total = sum(size for _, size in sizes)
+        now = time.time()
+
+        for segment, size in sizes:
+            try:
+                expired = self.max_age is not None and now - os.path.getmtime(segment) > self.max_age
+            except OSError:
+                expired = False
+            over_budget = self.max_bytes is not None and total > self.max_bytes
+            if not expired and not over_budget:
+                break
+            _remove_quietly(segment)
+            _remove_quietly(segment + INDEX_SUFFIX)
+            total -= size
+
+
+class ArchivingRotatingFileHandler(RotatingFileHandler):
+    """后台归档的日志轮转处理器
+
+    轮转时只把当前文件（及其索引）重命名为带时间戳的分段并交给归档器，
+    不再逐个平移 .1 ~ .N，压缩和淘汰都在后台线程完成。
+    """
+
+    def __init__(self, filename, archiver, indexer=None, maxBytes=0, encoding=None, delay=False):
+        """初始化处理器
+
+        Args:
+            filename: 日志文件路径
+            archiver: SegmentArchiver实例
+            indexer: LogIndexer实例（可选，为None时不维护索引）
+            maxBytes: 触发轮转的文件大小
+            encoding: 文件编码
+            delay: 是否延迟打开文件
+        """
+        super().__init__(filename, maxBytes=maxBytes, backupCount=0, encoding=encoding, delay=delay)
+        self.archiver = archiver
+        self.indexer = indexer
+        self.archiver.recover(self.baseFilename, self.indexer)
+
+    def _next_segment_name(self):
+        """生成带轮转时刻的分段文件名
+
+        Returns:
+            str: 分段路径
+        """
+        now = time.time()
+        stamp = time.strftime(SEGMENT_TIME_FORMAT, time.localtime(now)) + f"-{int(now % 1 * 1e6):06d}"
+        segment = f"{self.baseFilename}.{stamp}"
+        counter = 1
+        while any(os.path.exists(segment + suffix) for suffix in ('', GZIP_SUFFIX, ZSTD_SUFFIX)):
+            segment = f"{self.baseFilename}.{stamp}.{counter}"
+            counter += 1
+        return segment
+
+    def doRollover(self):
+        """执行日志轮转：重命名当前文件并交给后台归档"""
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            segment = self._next_segment_name()
+            os.replace(self.baseFilename, segment)
+            if os.path.exists(self.baseFilename + INDEX_SUFFIX):
+                os.replace(self.baseFilename + INDEX_SUFFIX, segment + INDEX_SUFFIX)
+            self.archiver.submit(self.baseFilename, segment, self.indexer)
+
+        if not self.delay:
+            self.stream = self._open()
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LogIndex模块 - 轮转通信日志的旁路索引与检索
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from logging.handlers import RotatingFileHandler
+
+from .segments import is_compressed, list_segments, open_segment
+
+
+# 索引文件后缀（与日志文件同目录、同名）
+INDEX_SUFFIX = '.idx'
+INDEX_VERSION = 1
+
+# 日志时间戳格式（与Logger中的Formatter一致）
+LOG_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+LOG_TIME_LENGTH = 19
+
+# 样本ID提取规则
+SAMPLE_PATTERNS = (
+    re.compile(r"'sample_id': '([^']+)'"),
+    re.compile(r"[Ss]ample received: ([^\s,]+),"),
+    re.compile(r"receive sample:? ([^\s,]+)"),
+    re.compile(r"for sample ([^\s,:]+)"),
+    re.compile(r"[Ss]ample ([^\s,]+) (?:received|with tests)"),
+    re.compile(r"(?:\\r|')O\|([^|\\]+)\|"),
+)
+
+# 序列ID提取规则（uRAP日志中的SeqID=0xXXXX）
+SEQUENCE_PATTERN = re.compile(r"SeqID=0x([0-9A-Fa-f]{1,4})")
+
+# 消息类型提取规则
+MESSAGE_TYPE_PATTERN = re.compile(r"Type=0x([0-9A-Fa-f]{1,4})")
+MESSAGE_TYPE_KEYWORDS = (
+    (re.compile(r"Handshake (?:received|response sent)"), '0x0001'),
+    (re.compile(r"Sent (?:ACK|NACK) for SeqID"), '0x0000'),
+    (re.compile(r"Instrument health response sent"), '0x0202'),
+    (re.compile(r"Test inventory response sent"), '0x0204'),
+    (re.compile(r"Onboard sample info response sent"), '0x0208'),
+    (re.compile(r"Consumable inventory response sent"), '0x020c'),
+    (re.compile(r"Initialization complete sent"), '0x020d'),
+    (re.compile(r"Header record"), 'ASTM-H'),
+    (re.compile(r"Parsed patient record"), 'ASTM-P'),
+    (re.compile(r"Parsed order record"), 'ASTM-O'),
+    (re.compile(r"Result message content|Sent results for sample"), 'ASTM-R'),
+    (re.compile(r"Sent ACK to client|Received ACK for result"), 'ASTM-ACK'),
+)
+
+
+def normalize_sequence_id(sequence_id):
+    """将序列ID统一为4位小写十六进制字符串
+
+    Args:
+        sequence_id: 整数或十六进制字符串（如 '0x0001'、'1a'）
+
+    Returns:
+        str: 规范化后的序列ID
+    """
+    if isinstance(sequence_id, int):
+        return f"{sequence_id:04x}"
+    text = str(sequence_id).strip().lower()
+    if text.startswith('0x'):
+        text = text[2:]
+    return f"{int(text, 16):04x}"
+
+
+def normalize_message_type(message_type):
+    """将消息类型统一为 '0xXXXX' 形式，ASTM类型保持原样
+
+    Args:
+        message_type: 整数、十六进制字符串或ASTM类型名（如 'ASTM-O'）
+
+    Returns:
+        str: 规范化后的消息类型
+    """
+    if isinstance(message_type, int):
+        return f"0x{message_type:04x}"
+    text = str(message_type).strip()
+    if text.upper().startswith('ASTM-'):
+        return text.upper()
+    if text.lower().startswith('0x'):
+        text = text[2:]
+    return f"0x{int(text, 16):04x}"
+
+
+def parse_log_time(text):
+    """解析日志行时间戳或命令行时间参数
+
+    Args:
+        text: 'YYYY-mm-dd HH:MM:SS' 格式的时间字符串
+
+    Returns:
+        float: 时间戳，解析失败返回None
+    """
+    try:
+        return time.mktime(time.strptime(text[:LOG_TIME_LENGTH], LOG_TIME_FORMAT))
+    except (ValueError, OverflowError):
+        return None
+
+
+def extract_keys(line, bucket_seconds):
+    """从单行日志中提取索引键
+
+    Args:
+        line: 日志行（str）
+        bucket_seconds: 时间桶宽度（秒）
+
+    Returns:
+        dict: {'sample': set, 'seq': set, 'type': set, 'time': str或None}
+    """
+    samples = set()
+    for pattern in SAMPLE_PATTERNS:
+        samples.update(pattern.findall(line))
+
+    sequences = {normalize_sequence_id(seq) for seq in SEQUENCE_PATTERN.findall(line)}
+
+    types = {normalize_message_type(t) for t in MESSAGE_TYPE_PATTERN.findall(line)}
+    for pattern, type_name in MESSAGE_TYPE_KEYWORDS:
+        if pattern.search(line):
+            types.add(type_name)
+
+    bucket = None
+    timestamp = parse_log_time(line)
+    if timestamp is not None:
+        bucket = str(int(timestamp // bucket_seconds))
+
+    return {'sample': samples, 'seq': sequences, 'type': types, 'time': bucket}
+
+
+class LogIndexer:
+    """轮转日志索引器
+
+    每个日志分段（含轮转、归档及压缩分段）对应一个同名 .idx 旁路索引，
+    记录样本ID、序列ID、消息类型和时间桶到行首字节偏移的映射。
+    索引按已索引字节数增量更新，检索时按偏移 seek 读取，避免全量扫描。
+    """
+
+    def __init__(self, bucket_seconds=60):
+        """初始化索引器
+
+        Args:
+            bucket_seconds: 时间桶宽度（秒）
+        """
+        self.bucket_seconds = bucket_seconds
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def index_path(log_path):
+        """获取日志文件对应的索引文件路径
+
+        Args:
+            log_path: 日志文件路径
+
+        Returns:
+            str: 索引文件路径
+        """
+        return log_path + INDEX_SUFFIX
+
+    @staticmethod
+    def _signature(log_path):
+        """计算日志文件签名（首行CRC），用于识别文件被截断或替换
+
+        Args:
+            log_path: 日志文件路径
+
+        Returns:
+            int: 签名值，空文件返回0
+        """
+        with open_segment(log_path) as f:
+            return zlib.crc32(f.readline())
+
+    def _new_index(self, signature):
+        """创建空索引
+
+        Args:
+            signature: 日志文件签名
+
+        Returns:
+            dict: 空索引结构
+        """
+        return {
+            'version': INDEX_VERSION,
+            'signature': signature,
+            'bucket_seconds': self.bucket_seconds,
+            'indexed_bytes': 0,
+            'keys': {'sample': {}, 'seq': {}, 'type': {}, 'time': {}}
+        }
+
+    def load_index(self, log_path):
+        """加载索引文件
+
+        Args:
+            log_path: 日志文件路径
+
+        Returns:
+            dict: 索引结构，不存在或损坏返回None
+        """
+        try:
+            with open(self.index_path(log_path), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('version') != INDEX_VERSION:
+                return None
+            return index
+        except (OSError, ValueError):
+            return None
+
+    def _save_index(self, log_path, index):
+        """原子写入索引文件
+
+        Args:
+            log_path: 日志文件路径
+            index: 索引结构
+        """
+        idx_path = self.index_path(log_path)
+        tmp_path = f"{idx_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(tmp_path, idx_path)
+
+    def index_file(self, log_path, rebuild=False):
+        """增量更新日志文件的索引
+
+        压缩分段内容不再变化，已有完整索引时直接返回；否则解压扫描一次。
+
+        Args:
+            log_path: 日志文件路径
+            rebuild: 是否丢弃已有索引重建
+
+        Returns:
+            dict: 最新索引结构，日志文件不存在返回None
+        """
+        if not os.path.exists(log_path):
+            return None
+
+        with self.lock:
+            compressed = is_compressed(log_path)
+            index = None if rebuild else self.load_index(log_path)
+            if compressed:
+                if index is not None and index.get('complete') \
+                        and index['bucket_seconds'] == self.bucket_seconds:
+                    return index
+                index = None
+
+            signature = self._signature(log_path)
+            size = None if compressed else os.path.getsize(log_path)
+            if (index is None
+                    or index['signature'] != signature
+                    or index['bucket_seconds'] != self.bucket_seconds
+                    or (size is not None and index['indexed_bytes'] > size)):
+                index = self._new_index(signature)
+
+            start = index['indexed_bytes']
+            if start == size:
+                return index
+
+            keys = index['keys']
+            bucket_seconds = index['bucket_seconds']
+            with open_segment(log_path) as f:
+                f.seek(start)
+                offset = start
+                for raw_line in f:
+                    # 只索引完整行，未写完的行留待下次增量
+                    if not raw_line.endswith(b'\n'):
+                        break
+                    line = raw_line.decode('utf-8', errors='replace')
+                    line_keys = extract_keys(line, bucket_seconds)
+                    for kind in ('sample', 'seq', 'type'):
+                        for key in line_keys[kind]:
+                            keys[kind].setdefault(key, []).append(offset)
+                    if line_keys['time'] is not None:
+                        keys['time'].setdefault(line_keys['time'], []).append(offset)
+                    offset += len(raw_line)
+
+            index['indexed_bytes'] = offset
+            if compressed:
+                index['complete'] = True
+            self._save_index(log_path, index)
+            return index
+
+    def transfer_index(self, log_path, archived_path):
+        """补齐分段索引并转移到其压缩文件名下，标记为完整索引
+
+        Args:
+            log_path: 未压缩的分段路径
+            archived_path: 压缩后的分段路径
+        """
+        index = self.index_file(log_path)
+        if index is None:
+            return
+        with self.lock:
+            index['complete'] = True
+            self._save_index(archived_path, index)
+
+    @staticmethod
+    def segments(log_path):
+        """列出日志文件的所有分段（含轮转与归档分段），按从旧到新排序
+
+        Args:
+            log_path: 当前日志文件路径
+
+        Returns:
+            list: 分段文件路径列表
+        """
+        return list_segments(log_path)
+
+    def _candidate_offsets(self, index, sample_id, sequence_id, message_type, start, end):
+        """按过滤条件求候选行偏移（各条件取交集）
+
+        Returns:
+            list: 排序后的行偏移
+        """
+        keys = index['keys']
+        candidates = None
+
+        def intersect(current, offsets):
+            return set(offsets) if current is None else current.intersection(offsets)
+
+        if sample_id is not None:
+            candidates = intersect(candidates, keys['sample'].get(sample_id, ()))
+        if sequence_id is not None:
+            candidates = intersect(candidates, keys['seq'].get(normalize_sequence_id(sequence_id), ()))
+        if message_type is not None:
+            candidates = intersect(candidates, keys['type'].get(normalize_message_type(message_type), ()))
+        if start is not None or end is not None:
+            bucket_seconds = index['bucket_seconds']
+            first = int(start // bucket_seconds) if start is not None else None
+            last = int(end // bucket_seconds) if end is not None else None
+            offsets = set()
+            for bucket, bucket_offsets in keys['time'].items():
+                bucket = int(bucket)
+                if (first is None or bucket >= first) and (last is None or bucket <= last):
+                    offsets.update(bucket_offsets)
+            candidates = intersect(candidates, offsets)
+
+        return sorted(candidates or ())
+
+    def query(self, log_path, sample_id=None, sequence_id=None, message_type=None, start=None, end=None):
+        """检索日志行
+
+        Args:
+            log_path: 当前日志文件路径（自动包含其轮转分段）
+            sample_id: 样本ID（可选）
+            sequence_id: 序列ID（可选，整数或十六进制字符串）
+            message_type: 消息类型（可选，如 0x0201 或 'ASTM-O'）
+            start: 起始时间戳（可选，包含）
+            end: 结束时间戳（可选，包含）
+
+        Returns:
+            list: (分段路径, 日志行) 元组列表，按时间顺序
+        """
+        if sample_id is None and sequence_id is None and message_type is None \
+                and start is None and end is None:
+            raise ValueError("At least one query filter is required")
+
+        matches = []
+        for segment in self.segments(log_path):
+            index = self.index_file(segment)
+            if index is None:
+                continue
+            offsets = self._candidate_offsets(index, sample_id, sequence_id, message_type, start, end)
+            if not offsets:
+                continue
+            with open_segment(segment) as f:
+                for offset in offsets:
+                    f.seek(offset)
+                    line = f.readline().decode('utf-8', errors='replace').rstrip('\r\n')
+                    if start is not None or end is not None:
+                        # 时间桶是粗粒度过滤，这里按行时间精确过滤
+                        timestamp = parse_log_time(line)
+                        if timestamp is None or (start is not None and timestamp < start) \
+                                or (end is not None and timestamp > end):
+                            continue
+                    matches.append((segment, line))
+        return matches
+
+
+class IndexedRotatingFileHandler(RotatingFileHandler):
+    """带索引维护的日志轮转处理器
+
+    轮转时同步平移 .idx 旁路索引，并对刚轮转出的分段补齐增量索引。
+    """
+
+    def __init__(self, filename, indexer, **kwargs):
+        """初始化处理器
+
+        Args:
+            filename: 日志文件路径
+            indexer: LogIndexer实例
+            **kwargs: 传给RotatingFileHandler的参数
+        """
+        super().__init__(filename, **kwargs)
+        self.indexer = indexer
+
+    def doRollover(self):
+        """执行日志轮转并维护索引"""
+        index_path = self.indexer.index_path
+        if self.backupCount > 0:
+            # 与日志分段相同的规则平移索引：.N-1 -> .N ... base -> .1
+            for i in range(self.backupCount - 1, 0, -1):
+                src = index_path(f"{self.baseFilename}.{i}")
+                if os.path.exists(src):
+                    os.replace(src, index_path(f"{self.baseFilename}.{i + 1}"))
+            if os.path.exists(index_path(self.baseFilename)):
+                os.replace(index_path(self.baseFilename), index_path(self.baseFilename + '.1'))
+        elif os.path.exists(index_path(self.baseFilename)):
+            os.remove(index_path(self.baseFilename))
+
+        super().doRollover()
+
+        if self.backupCount > 0:
+            try:
+                self.indexer.index_file(self.baseFilename + '.1')
+            except Exception as e:
+                # 索引失败不影响日志写入，检索时会重新增量构建
+                sys.stderr.write(f"Error indexing rotated log {self.baseFilename}.1: {str(e)}\n")
+
+
+def main(argv=None):
+    """命令行入口：检索LAS/LIS通信日志"""
+    parser = argparse.ArgumentParser(prog='python -m logger', description='Search rotated Atellica communication logs')
+    parser.add_argument('--log', choices=['las', 'lis'], default='las', help='Communication log to search')
+    parser.add_argument('--log-file', type=str, help='Search an explicit log file instead of --log')
+    parser.add_argument('--log-dir', type=str, default=None, help='Log directory (defaults to logger.log_dir in config)')
+    parser.add_argument('--config', type=str, default='config.json', help='Configuration file path')
+    parser.add_argument('--sample', type=str, help='Sample ID')
+    parser.add_argument('--seq', type=str, help='Sequence ID, e.g. 0x0001')
+    parser.add_argument('--type', type=str, help='Message type, e.g. 0x0201 or ASTM-O')
+    parser.add_argument('--since', type=str, help="Start time 'YYYY-mm-dd HH:MM:SS'")
+    parser.add_argument('--until', type=str, help="End time 'YYYY-mm-dd HH:MM:SS'")
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild indexes before searching')
+    args = parser.parse_args(argv)
+
+    if args.log_file:
+        log_path = args.log_file
+        bucket_seconds = 60
+    else:
+        from config import ConfigManager
+        logger_config = ConfigManager(args.config).get_logger_config()
+        log_dir = args.log_dir or logger_config.get('log_dir', 'logs')
+        bucket_seconds = logger_config.get('index_bucket_seconds', 60)
+        log_path = os.path.join(log_dir, f"{args.log}_communication.log")
+
+    start = parse_log_time(args.since) if args.since else None
+    end = parse_log_time(args.until) if args.until else None
+    if (args.since and start is None) or (args.until and end is None):
+        parser.error(f"Time must be formatted as '{LOG_TIME_FORMAT}'")
+
+    indexer = LogIndexer(bucket_seconds)
+    if args.rebuild:
+        for segment in indexer.segments(log_path):
+            indexer.index_file(segment, rebuild=True)
+
+    try:
+        matches = indexer.query(log_path, sample_id=args.sample, sequence_id=args.seq,
+                                message_type=args.type, start=start, end=end)
+    except ValueError as e:
+        parser.error(str(e))
+
+    for segment, line in matches:
+        print(f"{os.path.basename(segment)}: {line}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
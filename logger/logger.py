@@ -6,8 +6,13 @@ Logger模块 - 提供日志记录功能
 
 import logging
 import os
+from collections import deque
 from logging.handlers import RotatingFileHandler
 
+from .archiver import ArchivingRotatingFileHandler, SegmentArchiver
+from .log_index import LogIndexer, IndexedRotatingFileHandler
+from .segments import list_segments, open_segment
+
 
 class Logger:
     """日志管理器"""
@@ -34,6 +39,21 @@ class Logger:
         for handler in self.logger.handlers[:]:
             self.logger.removeHandler(handler)
         
+        # 通信日志索引器
+        self.indexer = None
+        if self.config.get('index_enabled', True):
+            self.indexer = LogIndexer(self.config.get('index_bucket_seconds', 60))
+        
+        # 轮转分段后台归档器（压缩与保留策略）
+        self.archiver = None
+        if self.config.get('archive_enabled', True):
+            max_age_days = self.config.get('retention_max_age_days')
+            self.archiver = SegmentArchiver(
+                compression=self.config.get('compression', 'auto'),
+                max_bytes=self.config.get('retention_max_bytes'),
+                max_age=max_age_days * 86400 if max_age_days else None
+            )
+        
         # 初始化格式器
         formatter = logging.Formatter(
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -49,11 +69,7 @@ class Logger:
         # 添加文件处理器
         if self.config.get('file_output', True):
             main_log_file = os.path.join(log_dir, 'atellica_simulator.log')
-            file_handler = RotatingFileHandler(
-                main_log_file,
-                maxBytes=self.config.get('max_bytes', 10*1024*1024),  # 10MB
-                backupCount=self.config.get('backup_count', 5)
-            )
+            file_handler = self._create_file_handler(main_log_file)
             file_handler.setFormatter(formatter)
             self.logger.addHandler(file_handler)
         
@@ -67,11 +83,7 @@ class Logger:
         
         # 添加LAS日志文件处理器
         las_log_file = os.path.join(log_dir, 'las_communication.log')
-        las_file_handler = RotatingFileHandler(
-            las_log_file,
-            maxBytes=self.config.get('max_bytes', 10*1024*1024),
-            backupCount=self.config.get('backup_count', 5)
-        )
+        las_file_handler = self._create_file_handler(las_log_file, self.indexer)
         las_file_handler.setFormatter(formatter)
         self.las_logger.addHandler(las_file_handler)
         
@@ -85,14 +97,44 @@ class Logger:
         
         # 添加LIS日志文件处理器
         lis_log_file = os.path.join(log_dir, 'lis_communication.log')
-        lis_file_handler = RotatingFileHandler(
-            lis_log_file,
-            maxBytes=self.config.get('max_bytes', 10*1024*1024),
-            backupCount=self.config.get('backup_count', 5)
-        )
+        lis_file_handler = self._create_file_handler(lis_log_file, self.indexer)
         lis_file_handler.setFormatter(formatter)
         self.lis_logger.addHandler(lis_file_handler)
     
+    def _create_file_handler(self, log_file, indexer=None):
+        """创建日志文件处理器
+        
+        Args:
+            log_file: 日志文件路径
+            indexer: LogIndexer实例（可选，通信日志使用）
+            
+        Returns:
+            RotatingFileHandler: 启用归档时为ArchivingRotatingFileHandler，
+            否则按是否索引选择IndexedRotatingFileHandler或RotatingFileHandler
+        """
+        max_bytes = self.config.get('max_bytes', 10*1024*1024)  # 10MB
+        if self.archiver:
+            return ArchivingRotatingFileHandler(
+                log_file,
+                self.archiver,
+                indexer=indexer,
+                maxBytes=max_bytes
+            )
+        backup_count = self.config.get('backup_count', 5)
+        if indexer:
+            return IndexedRotatingFileHandler(
+                log_file,
+                indexer,
+                maxBytes=max_bytes,
+                backupCount=backup_count
+            )
+        return RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count)
+    
+    def close(self):
+        """等待后台归档完成并停止归档线程"""
+        if self.archiver:
+            self.archiver.stop()
+    
     def debug(self, message):
         """记录调试信息
         
@@ -193,13 +235,35 @@ class Logger:
             return "Log file not found"
         
         try:
-            with open(log_file, 'r', encoding='utf-8') as f:
-                content = f.readlines()
-            
-            # 获取最后N行
-            if len(content) > lines:
-                content = content[-lines:]
+            # 当前文件行数不足时，从最近的历史分段（含压缩分段）向前补齐
+            content = []
+            for segment in reversed(list_segments(log_file)):
+                with open_segment(segment) as f:
+                    tail = deque(f, maxlen=lines - len(content))
+                content = [line.decode('utf-8', errors='replace') for line in tail] + content
+                if len(content) >= lines:
+                    break
             
             return ''.join(content)
         except Exception as e:
             return f"Error reading log file: {str(e)}"
+    
+    def search_comm_log(self, log='las', sample_id=None, sequence_id=None, message_type=None, start=None, end=None):
+        """按样本ID、序列ID、消息类型和时间范围检索通信日志（含轮转与压缩分段）
+        
+        Args:
+            log: 'las' 或 'lis'
+            sample_id: 样本ID（可选）
+            sequence_id: 序列ID（可选）
+            message_type: 消息类型（可选）
+            start: 起始时间戳（可选）
+            end: 结束时间戳（可选）
+            
+        Returns:
+            list: (分段路径, 日志行) 元组列表
+        """
+        log_dir = self.config.get('log_dir', 'logs')
+        log_file = os.path.join(log_dir, f"{log}_communication.log")
+        indexer = self.indexer or LogIndexer(self.config.get('index_bucket_seconds', 60))
+        return indexer.query(log_file, sample_id=sample_id, sequence_id=sequence_id,
+                             message_type=message_type, start=start, end=end)
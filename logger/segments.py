@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Segments模块 - 日志分段的发现与透明解压读取
+"""
+
+import gzip
+import io
+import os
+import re
+import time
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖，未安装时回退到gzip
+    zstandard = None
+
+
+# 压缩分段后缀
+GZIP_SUFFIX = '.gz'
+ZSTD_SUFFIX = '.zst'
+COMPRESSED_SUFFIXES = (GZIP_SUFFIX, ZSTD_SUFFIX)
+
+# 归档分段时间戳（轮转时刻），如 las_communication.log.20260101-120000-000001
+SEGMENT_TIME_FORMAT = '%Y%m%d-%H%M%S'
+SEGMENT_SUFFIX_PATTERN = re.compile(r'^(\d{8}-\d{6})-(\d{6})(?:\.\d+)?(\.gz|\.zst)?$')
+NUMBERED_SUFFIX_PATTERN = re.compile(r'^(\d+)(\.gz|\.zst)?$')
+
+
+def is_compressed(path):
+    """判断分段是否为压缩文件
+
+    Args:
+        path: 分段文件路径
+
+    Returns:
+        bool: 是否压缩
+    """
+    return path.endswith(COMPRESSED_SUFFIXES)
+
+
+def open_segment(path):
+    """以二进制只读方式打开分段，压缩分段透明解压
+
+    返回的文件对象支持 readline 和向前 seek（偏移为解压后内容的偏移）。
+
+    Args:
+        path: 分段文件路径
+
+    Returns:
+        file: 二进制文件对象
+    """
+    if path.endswith(GZIP_SUFFIX):
+        return gzip.open(path, 'rb')
+    if path.endswith(ZSTD_SUFFIX):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        raw = open(path, 'rb')
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.BufferedReader(reader)
+    return open(path, 'rb')
+
+
+def segment_sort_key(log_path, path):
+    """计算分段排序键（越旧越小）
+
+    归档分段按文件名中的轮转时刻排序，旧式编号分段（.1 ~ .N）按修改时间排序。
+
+    Args:
+        log_path: 当前日志文件路径
+        path: 分段文件路径
+
+    Returns:
+        tuple: 排序键
+    """
+    suffix = os.path.basename(path)[len(os.path.basename(log_path)) + 1:]
+    match = SEGMENT_SUFFIX_PATTERN.match(suffix)
+    if match:
+        rotated_at = time.mktime(time.strptime(match.group(1), SEGMENT_TIME_FORMAT))
+        return (rotated_at + int(match.group(2)) / 1e6, suffix)
+    try:
+        return (os.path.getmtime(path), suffix)
+    except OSError:
+        return (0.0, suffix)
+
+
+def list_segments(log_path, include_active=True):
+    """列出日志文件的所有分段，按从旧到新排序
+
+    同时识别旧式编号分段与归档分段（含压缩分段）。压缩过程中若原文件与
+    压缩文件同时存在，只返回未压缩的那一个。
+
+    Args:
+        log_path: 当前日志文件路径
+        include_active: 是否包含当前正在写入的日志文件
+
+    Returns:
+        list: 分段文件路径列表
+    """
+    directory = os.path.dirname(log_path) or '.'
+    base = os.path.basename(log_path)
+    found = set()
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if not name.startswith(base + '.'):
+                continue
+            suffix = name[len(base) + 1:]
+            if SEGMENT_SUFFIX_PATTERN.match(suffix) or NUMBERED_SUFFIX_PATTERN.match(suffix):
+                found.add(os.path.join(directory, name))
+
+    segments = []
+    for path in found:
+        if is_compressed(path) and os.path.splitext(path)[0] in found:
+            continue
+        segments.append(path)
+    segments.sort(key=lambda path: segment_sort_key(log_path, path))
+
+    if include_active and os.path.exists(log_path):
+        segments.append(log_path)
+    return segments
@@ -14,6 +14,29 @@ from lis import LISServer
 from ui import AtellicaUI
 from config import ConfigManager
 from logger import Logger
+from metrics import MetricsRegistry, MetricsServer
+from profiling import RuntimeProfiler
+from tracing import Tracer
+
+
+def export_trace(tracer, tracing_config, logger):
+    """退出时导出样本追踪并记录分阶段耗时
+    
+    Args:
+        tracer: 样本生命周期追踪器
+        tracing_config: 样本追踪配置
+        logger: 日志管理器实例
+    """
+    export_path = tracing_config.get('export_path')
+    if not tracer.enabled or not export_path:
+        return
+    try:
+        count = tracer.export_chrome_trace(export_path)
+        logger.info(f"Exported {count} trace events to {export_path}")
+        if count:
+            logger.info("Sample latency by stage:\n" + tracer.format_summary())
+    except Exception as e:
+        logger.error(f"Error exporting sample trace: {str(e)}")
 
 
 def main():
@@ -37,7 +60,11 @@ def main():
         
         # 初始化核心模拟逻辑
         logger.info("Initializing AtellicaCore...")
-        core = AtellicaCore(config_manager, logger)
+        metrics = MetricsRegistry()
+        tracing_config = config_manager.get_tracing_config()
+        tracer = Tracer(capacity=tracing_config.get('capacity', 100000),
+                        enabled=tracing_config.get('enabled', True))
+        core = AtellicaCore(config_manager, logger, metrics=metrics, tracer=tracer)
         logger.info("AtellicaCore initialized successfully")
         
         # 初始化LAS服务器
@@ -50,6 +77,20 @@ def main():
         lis_server = LISServer(config_manager, logger, core)
         logger.info("LISServer initialized successfully")
         
+        # 启动指标服务
+        metrics_server = None
+        if config_manager.get_metrics_config().get('enabled', True):
+            metrics_server = MetricsServer(config_manager, logger, metrics)
+            metrics_server.register_page('/locks', core.get_lock_report)
+            metrics_server.register_page('/turnaround', core.get_turnaround_report)
+            metrics_server.start()
+        
+        # 启动运行时剖析服务
+        profiler = None
+        if config_manager.get_profiling_config().get('enabled', True):
+            profiler = RuntimeProfiler(config_manager, logger)
+            profiler.start()
+        
         if args.no_ui:
             # 无UI模式
             logger.info("Running in headless mode")
@@ -70,12 +111,26 @@ def main():
                 logger.info("Shutting down...")
                 las_server.stop()
                 lis_server.stop()
+                if metrics_server:
+                    metrics_server.stop()
+                if profiler:
+                    profiler.stop()
+                export_trace(tracer, tracing_config, logger)
+                core.close()
                 logger.info("AtellicaSimulator stopped successfully")
+                logger.close()
         else:
             # 有UI模式
             logger.info("Running with UI")
             ui = AtellicaUI(config_manager, logger, core, las_server, lis_server)
             ui.run()
+            if metrics_server:
+                metrics_server.stop()
+            if profiler:
+                profiler.stop()
+            export_trace(tracer, tracing_config, logger)
+            core.close()
+            logger.close()
     except Exception as e:
         if logger:
             logger.error(f"Error in main: {str(e)}", exc_info=True)
@@ -0,0 +1 @@
+from .metrics import MetricsRegistry, MetricsServer
@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Metrics模块 - 轻量指标注册表与Prometheus文本格式导出
+"""
+
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# 默认直方图桶（秒），覆盖亚毫秒级处理到数秒级的网络往返
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    """格式化指标数值"""
+    if value != value:
+        return 'NaN'
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape_label(value):
+    """转义标签值"""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    """格式化标签集合
+
+    Returns:
+        str: 形如 {a="1",b="2"} 的标签串，无标签时为空串
+    """
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.extend(f'{name}="{_escape_label(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _ThreadCells:
+    """按线程累加的数值单元
+
+    每个线程只写自己的单元（无锁），采集时汇总所有单元；
+    已退出线程的单元在采集时并入退休值，避免连接线程频繁创建导致单元无限增长。
+    """
+
+    def __init__(self, width=1):
+        """初始化
+
+        Args:
+            width: 每个单元的数值个数
+        """
+        self.width = width
+        self.local = threading.local()
+        self.cells = []
+        self.retired = [0] * width
+        self.lock = threading.Lock()
+
+    def cell(self):
+        """获取当前线程的单元
+
+        Returns:
+            list: 当前线程独占的数值列表
+        """
+        try:
+            return self.local.cell
+        except AttributeError:
+            cell = [0] * self.width
+            with self.lock:
+                self.cells.append((threading.current_thread(), cell))
+            self.local.cell = cell
+            return cell
+
+    def totals(self):
+        """汇总所有线程的数值
+
+        Returns:
+            list: 各位置的合计值
+        """
+        with self.lock:
+            alive = []
+            for thread, cell in self.cells:
+                if thread.is_alive():
+                    alive.append((thread, cell))
+                else:
+                    for i in range(self.width):
+                        self.retired[i] += cell[i]
+            self.cells = alive
+            totals = list(self.retired)
+            for _, cell in alive:
+                for i in range(self.width):
+                    totals[i] += cell[i]
+        return totals
+
+
+class _Metric:
+    """指标基类，负责标签子指标管理"""
+
+    metric_type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        """初始化指标
+
+        Args:
+            name: 指标名
+            documentation: 帮助信息
+            labelnames: 标签名列表
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.children_lock = threading.Lock()
+
+    def labels(self, *labelvalues, **labelkwargs):
+        """获取指定标签值的子指标（首次访问时创建）
+
+        Returns:
+            子指标实例
+        """
+        if labelkwargs:
+            labelvalues = tuple(labelkwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in labelvalues)
+        child = self.children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"Metric {self.name} expects labels {self.labelnames}")
+            with self.children_lock:
+                child = self.children.get(key)
+                if child is None:
+                    child = self._new_child()
+                    self.children[key] = child
+        return child
+
+    def _default_child(self):
+        """无标签指标的默认子指标"""
+        if self.labelnames:
+            raise ValueError(f"Metric {self.name} requires labels {self.labelnames}")
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        """渲染为Prometheus文本格式
+
+        Returns:
+            list: 文本行列表
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for labelvalues, child in sorted(self.children.items()):
+            lines.extend(child.render(self.name, self.labelnames, labelvalues))
+        return lines
+
+
+class _CounterChild:
+    """计数器子指标"""
+
+    def __init__(self):
+        self.cells = _ThreadCells()
+
+    def inc(self, amount=1):
+        """增加计数
+
+        Args:
+            amount: 增量（非负）
+        """
+        self.cells.cell()[0] += amount
+
+    def value(self):
+        """当前计数值"""
+        return self.cells.totals()[0]
+
+    def render(self, name, labelnames, labelvalues):
+        return [f"{name}{_format_labels(labelnames, labelvalues)} {_format_value(self.value())}"]
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    metric_type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        """增加计数（无标签指标）"""
+        self._default_child().inc(amount)
+
+    def value(self):
+        """当前计数值（无标签指标）"""
+        return self._default_child().value()
+
+
+class _GaugeChild:
+    """仪表子指标"""
+
+    def __init__(self):
+        self.cells = _ThreadCells()
+        self.base = 0
+        self.function = None
+
+    def set(self, value):
+        """设置当前值"""
+        self.base = value - self.cells.totals()[0]
+
+    def inc(self, amount=1):
+        """增加当前值"""
+        self.cells.cell()[0] += amount
+
+    def dec(self, amount=1):
+        """减少当前值"""
+        self.cells.cell()[0] -= amount
+
+    def set_function(self, function):
+        """采集时调用函数取值（适用于队列长度、连接数等可直接读取的量）
+
+        Args:
+            function: 无参函数，返回当前值
+        """
+        self.function = function
+
+    def value(self):
+        """当前值"""
+        if self.function is not None:
+            return self.function()
+        return self.base + self.cells.totals()[0]
+
+    def render(self, name, labelnames, labelvalues):
+        try:
+            value = self.value()
+        except Exception:
+            value = float('nan')
+        return [f"{name}{_format_labels(labelnames, labelvalues)} {_format_value(value)}"]
+
+
+class Gauge(_Metric):
+    """可增可减的仪表"""
+
+    metric_type = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        """设置当前值（无标签指标）"""
+        self._default_child().set(value)
+
+    def inc(self, amount=1):
+        """增加当前值（无标签指标）"""
+        self._default_child().inc(amount)
+
+    def dec(self, amount=1):
+        """减少当前值（无标签指标）"""
+        self._default_child().dec(amount)
+
+    def set_function(self, function):
+        """采集时调用函数取值（无标签指标）"""
+        self._default_child().set_function(function)
+
+    def value(self):
+        """当前值（无标签指标）"""
+        return self._default_child().value()
+
+
+class _Timer:
+    """直方图计时上下文"""
+
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _HistogramChild:
+    """直方图子指标"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # 单元布局：[各桶计数..., +Inf桶计数, 总和]
+        self.cells = _ThreadCells(len(buckets) + 2)
+
+    def observe(self, value):
+        """记录一个观测值
+
+        Args:
+            value: 观测值
+        """
+        cell = self.cells.cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def time(self):
+        """返回计时上下文，退出时记录耗时（秒）"""
+        return _Timer(self)
+
+    def snapshot(self):
+        """获取累计桶计数
+
+        Returns:
+            tuple: (累计计数列表（含+Inf）, 总和, 总数)
+        """
+        totals = self.cells.totals()
+        cumulative = []
+        running = 0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-1], running
+
+    def render(self, name, labelnames, labelvalues):
+        cumulative, total_sum, count = self.snapshot()
+        lines = []
+        for bound, value in zip(self.buckets + (float('inf'),), cumulative):
+            labels = _format_labels(labelnames, labelvalues, [('le', _format_value(float(bound)))])
+            lines.append(f"{name}_bucket{labels} {value}")
+        labels = _format_labels(labelnames, labelvalues)
+        lines.append(f"{name}_sum{labels} {_format_value(total_sum)}")
+        lines.append(f"{name}_count{labels} {count}")
+        return lines
+
+
+class Histogram(_Metric):
+    """固定桶直方图"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """初始化直方图
+
+        Args:
+            name: 指标名
+            documentation: 帮助信息
+            labelnames: 标签名列表
+            buckets: 桶上界（升序）
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        """记录一个观测值（无标签指标）"""
+        self._default_child().observe(value)
+
+    def time(self):
+        """返回计时上下文（无标签指标）"""
+        return self._default_child().time()
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        """初始化注册表"""
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        """按名称获取已注册指标，不存在时创建
+
+        Returns:
+            指标实例
+        """
+        metric = self.metrics.get(name)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.get(name)
+                if metric is None:
+                    metric = cls(name, documentation, labelnames, **kwargs)
+                    self.metrics[name] = metric
+        if not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} already registered as {metric.metric_type}")
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """获取或创建计数器"""
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        """获取或创建仪表"""
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """获取或创建直方图"""
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """渲染全部指标为Prometheus文本格式
+
+        Returns:
+            str: 文本内容
+        """
+        lines = []
+        for name in sorted(self.metrics):
+            lines.extend(self.metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """本地HTTP指标服务，以Prometheus文本格式输出 /metrics"""
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, config_manager, logger, registry):
+        """初始化指标服务
+
+        Args:
+            config_manager: 配置管理器实例
+            logger: 日志管理器实例
+            registry: MetricsRegistry实例
+        """
+        self.config_manager = config_manager
+        self.logger = logger
+        self.registry = registry
+
+        # 配置信息
+        self.config = config_manager.get_metrics_config()
+        self.host = self.config.get('host', '127.0.0.1')
+        self.port = self.config.get('port', 9108)
+
+        # 附加文本页面（路径 -> 无参渲染函数）
+        self.pages = {}
+
+        # 服务状态
+        self.http_server = None
+        self.server_thread = None
+        self.is_running = False
+
+    def register_page(self, path, render):
+        """注册附加的纯文本页面（如锁竞争报告）
+
+        Args:
+            path: URL路径，如 '/locks'
+            render: 无参函数，返回页面文本
+        """
+        self.pages[path] = render
+
+    def _make_handler(self):
+        """创建绑定注册表的请求处理类"""
+        registry = self.registry
+        pages = self.pages
+        content_type = self.CONTENT_TYPE
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path in ('/', '/metrics'):
+                    text = registry.render()
+                elif path in pages:
+                    text = pages[path]()
+                else:
+                    self.send_error(404)
+                    return
+                body = text.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # 抓取请求频繁，不写入日志
+                pass
+
+        return MetricsRequestHandler
+
+    def start(self):
+        """启动指标服务"""
+        if self.is_running:
+            self.logger.warning("MetricsServer is already running")
+            return
+
+        try:
+            self.http_server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+            self.http_server.daemon_threads = True
+            self.server_thread = threading.Thread(target=self.http_server.serve_forever, daemon=True)
+            self.server_thread.start()
+            self.is_running = True
+            self.logger.info(f"MetricsServer started, serving http://{self.host}:{self.port}/metrics")
+        except Exception as e:
+            self.logger.error(f"Failed to start MetricsServer: {str(e)}")
+            self.http_server = None
+            self.is_running = False
+
+    def stop(self):
+        """停止指标服务"""
+        if not self.is_running:
+            return
+
+        self.is_running = False
+        try:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+            self.http_server = None
+            self.logger.info("MetricsServer stopped")
+        except Exception as e:
+            self.logger.error(f"Error stopping MetricsServer: {str(e)}")
@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行时剖析命令行入口：python -m profiling profile 10
+"""
+
+import sys
+
+from .profiler import main
+
+
+if __name__ == '__main__':
+    sys.exit(main())
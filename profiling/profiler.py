@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Profiling模块 - 运行时按需性能剖析（cProfile、线程栈采样、线程CPU时间）
+"""
+
+import argparse
+import cProfile
+import io
+import os
+import pstats
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import Counter
+
+
+# cProfile 在 3.12 起基于 sys.monitoring 实现，对所有线程生效；更早版本只作用于启用它的线程，
+# 需要工作线程通过 profile_checkpoint() 配合
+CPROFILE_ALL_THREADS = sys.version_info >= (3, 12)
+
+# 阻塞等待（recv、定时休眠）的工作线程至少每隔这么久经过一次 profile_checkpoint()，
+# 保证空闲线程也能加入采集，并在采集结束后及时停用自己的Profile（秒）
+CHECKPOINT_INTERVAL = 1.0
+
+# 单次剖析最长时间（秒），防止误操作长时间拖慢服务
+MAX_PROFILE_SECONDS = 300
+
+
+def _thread_names():
+    """线程ID到线程名的映射"""
+    return {thread.ident: thread.name for thread in threading.enumerate()}
+
+
+def collapse_stack(frame, thread_name):
+    """把线程栈折叠为flamegraph.pl / speedscope可读的一行
+
+    Args:
+        frame: 栈顶帧
+        thread_name: 线程名（作为根节点）
+
+    Returns:
+        str: 形如 "thread;module:func;module:func" 的折叠栈（根在前）
+    """
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        parts.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    parts.append(thread_name.replace(';', '_').replace(' ', '_'))
+    parts.reverse()
+    return ';'.join(parts)
+
+
+def sample_stacks(duration, interval=0.005, stop_event=None):
+    """定时采样所有线程的调用栈
+
+    Args:
+        duration: 采样时长（秒）
+        interval: 采样间隔（秒）
+        stop_event: 可提前结束采样的threading.Event（可选）
+
+    Returns:
+        tuple: (折叠栈计数Counter, 采样次数)
+    """
+    counts = Counter()
+    own_ident = threading.get_ident()
+    deadline = time.perf_counter() + duration
+    rounds = 0
+    names = _thread_names()
+
+    while time.perf_counter() < deadline:
+        if stop_event is not None and stop_event.is_set():
+            break
+        frames = sys._current_frames()
+        for ident, frame in frames.items():
+            if ident == own_ident:
+                continue
+            name = names.get(ident)
+            if name is None:
+                names = _thread_names()
+                name = names.get(ident, f"thread-{ident}")
+            counts[collapse_stack(frame, name)] += 1
+        rounds += 1
+        time.sleep(interval)
+    return counts, rounds
+
+
+def write_collapsed(counts, path):
+    """写出折叠栈文件
+
+    Args:
+        counts: 折叠栈计数
+        path: 输出路径
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in counts.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+def _proc_thread_cpu(native_id):
+    """从 /proc 读取线程CPU时间（pthread_getcpuclockid不可用时的回退）"""
+    try:
+        with open(f"/proc/self/task/{native_id}/stat", 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        ticks = os.sysconf('SC_CLK_TCK')
+        # 去掉pid和comm后，utime、stime位于第12、13个字段
+        return (int(fields[11]) + int(fields[12])) / ticks
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def thread_cpu_times():
+    """获取每个线程的累计CPU时间
+
+    Returns:
+        list: [(线程名, 线程ID, 原生线程ID, CPU秒数或None)]，按CPU时间降序
+    """
+    rows = []
+    for thread in threading.enumerate():
+        cpu = None
+        if hasattr(time, 'pthread_getcpuclockid'):
+            try:
+                cpu = time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+            except (OSError, TypeError, OverflowError):
+                cpu = None
+        if cpu is None and thread.native_id is not None:
+            cpu = _proc_thread_cpu(thread.native_id)
+        rows.append((thread.name, thread.ident, thread.native_id, cpu))
+    rows.sort(key=lambda row: -1 if row[3] is None else row[3], reverse=True)
+    return rows
+
+
+def format_thread_cpu(rows):
+    """格式化线程CPU时间表
+
+    Args:
+        rows: thread_cpu_times 的返回值
+
+    Returns:
+        str: 表格文本
+    """
+    lines = [f"{'thread':<32}{'native_id':>12}{'cpu(s)':>12}"]
+    for name, _, native_id, cpu in rows:
+        cpu_text = 'n/a' if cpu is None else f"{cpu:.3f}"
+        lines.append(f"{name[:31]:<32}{str(native_id):>12}{cpu_text:>12}")
+    lines.append(f"{'process':<32}{os.getpid():>12}{time.process_time():>12.3f}")
+    return '\n'.join(lines)
+
+
+class _ProfileSession:
+    """一次 cProfile 采集会话（Python 3.12 之前使用）
+
+    3.12 之前 cProfile 只能由线程自己启用和停用，这里由各工作线程在循环中调用
+    profile_checkpoint() 加入当前会话；会话结束时递增停止代数，各线程在下一次检查点发现代数变化后停用自己的Profile。
+    阻塞等待的线程按 CHECKPOINT_INTERVAL 定期经过检查点，因此空闲线程最迟在一个间隔后加入或停用。
+    从不经过检查点的线程（如 accept 循环）不在采集范围内。
+    """
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.profiles = []
+        self.lock = threading.Lock()
+
+    def join(self):
+        """为当前线程创建并启用Profile
+
+        Returns:
+            cProfile.Profile: 当前线程的Profile
+        """
+        profile = cProfile.Profile()
+        with self.lock:
+            self.profiles.append((threading.current_thread().name, profile))
+        profile.enable()
+        return profile
+
+
+class _ProfileSnapshot:
+    """不停用Profile的统计快照（供pstats.Stats加载）"""
+
+    def __init__(self, profile):
+        profile.snapshot_stats()
+        self.stats = profile.stats
+
+    def create_stats(self):
+        pass
+
+
+# 当前进行中的采集会话、会话代数（会话开始和结束时各递增一次），以及各线程已加入的 (会话代数, Profile)
+_active_session = None
+_session_generation = 0
+_thread_state = threading.local()
+
+# 仍处于启用状态的线程Profile数
+_enabled_lock = threading.Lock()
+_enabled_profiles = 0
+
+
+def profile_checkpoint():
+    """工作线程的剖析检查点
+
+    在LAS/LIS连接处理、结果生成等线程的循环中调用：有采集会话时加入，
+    会话结束（代数变化）后停用本线程的Profile。没有会话时只有两次属性读取的开销。
+    """
+    global _enabled_profiles
+
+    joined = getattr(_thread_state, 'joined', None)
+    if joined is not None and joined[0] != _session_generation:
+        joined[1].disable()
+        _thread_state.joined = joined = None
+        with _enabled_lock:
+            _enabled_profiles -= 1
+    session = _active_session
+    if session is not None and joined is None:
+        _thread_state.joined = (session.generation, session.join())
+        with _enabled_lock:
+            _enabled_profiles += 1
+
+
+def enabled_thread_profiles():
+    """仍在采集的线程Profile数（会话结束后应在 CHECKPOINT_INTERVAL 内降为 0）"""
+    with _enabled_lock:
+        return _enabled_profiles
+
+
+def run_cprofile(duration, stop_event=None):
+    """运行cProfile指定时长
+
+    Args:
+        duration: 剖析时长（秒）
+        stop_event: 可提前结束的threading.Event（可选）
+
+    Returns:
+        tuple: (pstats.Stats或None, 说明文字)
+    """
+    global _active_session, _session_generation
+
+    if CPROFILE_ALL_THREADS:
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            if stop_event is not None:
+                stop_event.wait(duration)
+            else:
+                time.sleep(duration)
+        finally:
+            profile.disable()
+        return pstats.Stats(profile), "cProfile covered all threads"
+
+    _session_generation += 1
+    session = _ProfileSession(_session_generation)
+    _active_session = session
+    try:
+        if stop_event is not None:
+            stop_event.wait(duration)
+        else:
+            time.sleep(duration)
+    finally:
+        # 先撤下会话再递增代数：之后到达检查点的线程不会再加入，已加入的线程发现代数变化后停用
+        _active_session = None
+        _session_generation += 1
+
+    with session.lock:
+        profiles = list(session.profiles)
+    if not profiles:
+        return None, "no worker thread reached a profiling checkpoint during the window"
+    stats = pstats.Stats(_ProfileSnapshot(profiles[0][1]))
+    for _, profile in profiles[1:]:
+        stats.add(_ProfileSnapshot(profile))
+    names = ', '.join(sorted({name for name, _ in profiles}))
+    return stats, f"cProfile covered {len(profiles)} worker threads: {names}"
+
+
+class RuntimeProfiler:
+    """运行时剖析服务
+
+    通过信号（默认SIGUSR1，执行一次完整采集）或本地控制端口触发，
+    剖析在后台线程中进行，LAS/LIS服务保持运行。同一时刻只允许一个采集任务。
+    """
+
+    def __init__(self, config_manager, logger):
+        """初始化剖析服务
+
+        Args:
+            config_manager: 配置管理器实例
+            logger: 日志管理器实例
+        """
+        self.config_manager = config_manager
+        self.logger = logger
+
+        # 配置信息
+        self.config = config_manager.get_profiling_config()
+        self.host = self.config.get('host', '127.0.0.1')
+        self.port = self.config.get('port', 9109)
+        self.output_dir = self.config.get('output_dir', 'logs/profiles')
+        self.signal_name = self.config.get('signal', 'SIGUSR1')
+        self.default_seconds = self.config.get('default_seconds', 10)
+        self.sample_interval = self.config.get('sample_interval', 0.005)
+
+        # 服务状态
+        self.control_server = None
+        self.server_thread = None
+        self.is_running = False
+        self.capture_lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def start(self):
+        """安装信号处理并启动控制端口"""
+        if self.is_running:
+            self.logger.warning("RuntimeProfiler is already running")
+            return
+
+        self.is_running = True
+        self.stop_event.clear()
+        self._install_signal_handler()
+
+        try:
+            self.control_server = socketserver.ThreadingTCPServer((self.host, self.port), self._make_handler(),
+                                                                  bind_and_activate=False)
+            self.control_server.allow_reuse_address = True
+            self.control_server.daemon_threads = True
+            self.control_server.server_bind()
+            self.control_server.server_activate()
+            self.server_thread = threading.Thread(target=self.control_server.serve_forever,
+                                                  name='ProfilerControl', daemon=True)
+            self.server_thread.start()
+            host, port = self.control_server.server_address[:2]
+            self.logger.info(f"RuntimeProfiler control socket listening on {host}:{port}")
+        except Exception as e:
+            self.logger.error(f"Failed to start RuntimeProfiler control socket: {str(e)}")
+            self.control_server = None
+
+    def stop(self):
+        """停止控制端口并中止进行中的采集"""
+        if not self.is_running:
+            return
+
+        self.is_running = False
+        self.stop_event.set()
+        try:
+            if self.control_server:
+                self.control_server.shutdown()
+                self.control_server.server_close()
+                self.control_server = None
+            self.logger.info("RuntimeProfiler stopped")
+        except Exception as e:
+            self.logger.error(f"Error stopping RuntimeProfiler: {str(e)}")
+
+    def _install_signal_handler(self):
+        """安装剖析触发信号（仅主线程、且平台支持该信号时）"""
+        signum = getattr(signal, self.signal_name or '', None)
+        if signum is None:
+            return
+        if threading.current_thread() is not threading.main_thread():
+            return
+        try:
+            signal.signal(signum, self._on_signal)
+            self.logger.info(f"RuntimeProfiler armed: send {self.signal_name} to pid {os.getpid()} to capture a profile")
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Failed to install {self.signal_name} handler: {str(e)}")
+
+    def _on_signal(self, signum, frame):
+        """信号处理：在后台线程中执行一次完整采集"""
+        threading.Thread(target=self.capture_all, args=(self.default_seconds,),
+                         name='ProfilerCapture', daemon=True).start()
+
+    def _output_path(self, kind, suffix):
+        """生成输出文件路径"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        return os.path.join(self.output_dir, f"{kind}-{stamp}-{os.getpid()}{suffix}")
+
+    def _clamp_seconds(self, seconds):
+        """限制剖析时长"""
+        if seconds is None:
+            seconds = self.default_seconds
+        return max(0.1, min(float(seconds), MAX_PROFILE_SECONDS))
+
+    def _run_exclusive(self, function, *args):
+        """在采集锁内执行，已有采集进行中时直接返回"""
+        if not self.capture_lock.acquire(blocking=False):
+            return "busy: another capture is in progress"
+        try:
+            return function(*args)
+        finally:
+            self.capture_lock.release()
+
+    def profile(self, seconds=None, top=25):
+        """运行cProfile并写出 .prof 与文本报告
+
+        Args:
+            seconds: 剖析时长（秒）
+            top: 报告中列出的函数数
+
+        Returns:
+            str: 结果说明
+        """
+        return self._run_exclusive(self._profile, self._clamp_seconds(seconds), top)
+
+    def sample(self, seconds=None, interval=None):
+        """采样所有线程调用栈并写出折叠栈文件
+
+        Args:
+            seconds: 采样时长（秒）
+            interval: 采样间隔（秒）
+
+        Returns:
+            str: 结果说明
+        """
+        interval = max(0.001, float(interval or self.sample_interval))
+        return self._run_exclusive(self._sample, self._clamp_seconds(seconds), interval)
+
+    def cpu(self):
+        """写出并返回每线程CPU时间
+
+        Returns:
+            str: 线程CPU时间表
+        """
+        text = format_thread_cpu(thread_cpu_times())
+        path = self._output_path('cpu', '.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        return f"{text}\nwrote {path}"
+
+    def capture_all(self, seconds=None):
+        """同时运行cProfile与栈采样，前后各记录一次线程CPU时间
+
+        Args:
+            seconds: 采集时长（秒）
+
+        Returns:
+            str: 结果说明
+        """
+        return self._run_exclusive(self._capture_all, self._clamp_seconds(seconds))
+
+    def _profile(self, seconds, top=25):
+        """运行cProfile（调用方持有采集锁）"""
+        self.logger.info(f"RuntimeProfiler running cProfile for {seconds}s")
+        stats, note = run_cprofile(seconds, self.stop_event)
+        if stats is None:
+            return note
+        prof_path = self._output_path('cprofile', '.prof')
+        stats.dump_stats(prof_path)
+        report = io.StringIO()
+        stats.stream = report
+        stats.sort_stats('cumulative').print_stats(top)
+        text_path = os.path.splitext(prof_path)[0] + '.txt'
+        with open(text_path, 'w', encoding='utf-8') as f:
+            f.write(report.getvalue())
+        self.logger.info(f"RuntimeProfiler wrote {prof_path}")
+        return f"{note}\nwrote {prof_path}\nwrote {text_path}\n{report.getvalue()}"
+
+    def _sample(self, seconds, interval):
+        """采样线程栈（调用方持有采集锁）"""
+        self.logger.info(f"RuntimeProfiler sampling stacks for {seconds}s every {interval}s")
+        counts, rounds = sample_stacks(seconds, interval, self.stop_event)
+        path = self._output_path('stacks', '.collapsed')
+        write_collapsed(counts, path)
+        self.logger.info(f"RuntimeProfiler wrote {path}")
+        return f"{rounds} samples, {len(counts)} unique stacks\nwrote {path}"
+
+    def _capture_all(self, seconds):
+        """并行运行cProfile与栈采样（调用方持有采集锁）"""
+        results = {}
+        before = self.cpu()
+        sampler = threading.Thread(
+            target=lambda: results.update(stacks=self._sample(seconds, self.sample_interval)),
+            name='ProfilerSampler', daemon=True)
+        sampler.start()
+        profile_result = self._profile(seconds)
+        sampler.join()
+        after = self.cpu()
+        return '\n\n'.join([before, results.get('stacks', ''), profile_result, after])
+
+    def handle_command(self, line):
+        """执行一条控制命令
+
+        Args:
+            line: 命令行文本，如 "profile 10"、"stacks 5 0.01"、"cpu"、"all 10"
+
+        Returns:
+            str: 命令输出
+        """
+        parts = line.strip().split()
+        if not parts:
+            return ''
+        command, args = parts[0].lower(), parts[1:]
+        try:
+            if command == 'profile':
+                return self.profile(*args[:1])
+            if command == 'stacks':
+                return self.sample(*args[:2])
+            if command == 'cpu':
+                return self.cpu()
+            if command == 'all':
+                return self.capture_all(*args[:1])
+            if command == 'help':
+                return "commands: profile [seconds] | stacks [seconds] [interval] | cpu | all [seconds]"
+            return f"unknown command: {command}"
+        except Exception as e:
+            self.logger.error(f"Error running profiler command '{line.strip()}': {str(e)}")
+            return f"error: {str(e)}"
+
+    def _make_handler(self):
+        """创建绑定本实例的控制连接处理类"""
+        profiler = self
+
+        class ProfilerControlHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for raw in self.rfile:
+                    line = raw.decode('utf-8', errors='replace')
+                    if line.strip().lower() in ('quit', 'exit'):
+                        return
+                    output = profiler.handle_command(line)
+                    self.wfile.write((output + '\n.\n').encode('utf-8'))
+                    self.wfile.flush()
+
+        return ProfilerControlHandler
+
+
+def main(argv=None):
+    """命令行入口：向运行中的模拟器发送剖析命令
+
+    Args:
+        argv: 命令行参数（None表示sys.argv）
+
+    Returns:
+        int: 退出码
+    """
+    parser = argparse.ArgumentParser(prog='python -m profiling',
+                                     description='Trigger a runtime profile in a running simulator')
+    parser.add_argument('command', nargs='+', help='profile [seconds] | stacks [seconds] [interval] | cpu | all [seconds]')
+    parser.add_argument('--host', type=str, default=None, help='Control socket host')
+    parser.add_argument('--port', type=int, default=None, help='Control socket port')
+    parser.add_argument('--config', type=str, default='config.json', help='Configuration file path')
+    args = parser.parse_args(argv)
+
+    host, port = args.host, args.port
+    if host is None or port is None:
+        from config import ConfigManager
+        config = ConfigManager(args.config).get_profiling_config()
+        host = host or config.get('host', '127.0.0.1')
+        port = port or config.get('port', 9109)
+
+    try:
+        with socket.create_connection((host, port), timeout=MAX_PROFILE_SECONDS + 30) as conn:
+            conn.sendall((' '.join(args.command) + '\n').encode('utf-8'))
+            reply = b''
+            while not reply.endswith(b'\n.\n'):
+                data = conn.recv(65536)
+                if not data:
+                    break
+                reply += data
+    except OSError as e:
+        print(f"Error connecting to profiler at {host}:{port}: {str(e)}")
+        return 1
+
+    print(reply.decode('utf-8', errors='replace').rstrip('\n').rstrip('.').rstrip('\n'))
+    return 0
@@ -0,0 +1 @@
+from .regression import diff_runs, record_run
\ No newline at end of file
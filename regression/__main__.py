@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+结果回归对比命令行入口：python -m regression record --seed 42 -o run.json / python -m regression diff a.json b.json
+"""
+
+import sys
+
+from .regression import main
+
+
+if __name__ == '__main__':
+    sys.exit(main())
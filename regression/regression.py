@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+结果回归对比：按固定种子为一组样本生成结果并保存，对比两次运行的结果差异
+
+同一种子下每个样本的结果只由样本ID决定（core.assays.sample_rng），
+因此修改检测项目目录或结果生成代码后，用同一种子重新生成即可逐项对比。
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from core.assays import AssayCatalog
+
+
+def workload(count, tests, prefix='REG'):
+    """构建回归样本集
+
+    Args:
+        count: 样本数
+        tests: 每个样本的测试项目列表
+        prefix: 样本ID前缀
+
+    Returns:
+        list: [(样本ID, 测试项目列表)]
+    """
+    return [(f"{prefix}{index:08d}", list(tests)) for index in range(count)]
+
+
+def _record_chunk(assay_config, seed, samples):
+    """在工作进程中生成一批样本的结果"""
+    catalog = AssayCatalog(assay_config, seed)
+    return {sample_id: catalog.generate_sample(sample_id, tests) for sample_id, tests in samples}
+
+
+def record_run(assay_config, seed, samples, workers=1):
+    """生成一组样本的结果
+
+    Args:
+        assay_config: 检测项目配置（assays 配置段）
+        seed: 结果种子
+        samples: [(样本ID, 测试项目列表)]
+        workers: 并行进程数（结果与进程数无关）
+
+    Returns:
+        dict: 样本ID -> {测试项目 -> 结果}
+    """
+    if workers <= 1 or len(samples) < 2:
+        return _record_chunk(assay_config, seed, samples)
+    size = (len(samples) + workers - 1) // workers
+    chunks = [samples[start:start + size] for start in range(0, len(samples), size)]
+    run = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for results in executor.map(_record_chunk, [assay_config] * len(chunks), [seed] * len(chunks), chunks):
+            run.update(results)
+    return run
+
+
+def save_run(path, seed, run):
+    """保存一次运行的结果
+
+    Args:
+        path: 输出文件
+        seed: 结果种子
+        run: record_run 的返回值
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'seed': seed, 'results': run}, f, ensure_ascii=False, sort_keys=True)
+
+
+def load_run(path):
+    """读取 save_run 保存的结果
+
+    Returns:
+        tuple: (种子, 样本ID -> {测试项目 -> 结果})
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return data.get('seed'), data['results']
+
+
+def _differs(expected, actual, tolerance):
+    """单个字段是否不同（数值按容差比较）"""
+    numbers = (int, float)
+    if isinstance(expected, numbers) and isinstance(actual, numbers) and not isinstance(expected, bool):
+        return abs(expected - actual) > tolerance
+    return expected != actual
+
+
+def diff_runs(baseline, candidate, tolerance=0.0):
+    """对比两次运行的结果
+
+    Args:
+        baseline: 基线结果（样本ID -> {测试项目 -> 结果}）
+        candidate: 待比较结果
+        tolerance: 数值允许的绝对误差
+
+    Returns:
+        list: 差异 [(样本ID, 测试项目, 字段, 基线值, 新值)]，缺失的样本或测试项目字段为 None
+    """
+    differences = []
+    for sample_id in sorted(baseline.keys() | candidate.keys()):
+        expected_tests = baseline.get(sample_id)
+        actual_tests = candidate.get(sample_id)
+        if expected_tests is None or actual_tests is None:
+            differences.append((sample_id, None, None, expected_tests, actual_tests))
+            continue
+        for test_code in sorted(expected_tests.keys() | actual_tests.keys()):
+            expected = expected_tests.get(test_code)
+            actual = actual_tests.get(test_code)
+            if expected is None or actual is None:
+                differences.append((sample_id, test_code, None, expected, actual))
+                continue
+            for field in sorted(expected.keys() | actual.keys()):
+                if _differs(expected.get(field), actual.get(field), tolerance):
+                    differences.append((sample_id, test_code, field, expected.get(field), actual.get(field)))
+    return differences
+
+
+def format_diff(differences, limit=20):
+    """格式化差异列表
+
+    Args:
+        differences: diff_runs 的返回值
+        limit: 最多列出的差异条数
+
+    Returns:
+        str: 文本报告
+    """
+    if not differences:
+        return "Results identical"
+    lines = [f"{len(differences)} differences"]
+    for sample_id, test_code, field, expected, actual in differences[:limit]:
+        location = '/'.join(str(part) for part in (sample_id, test_code, field) if part is not None)
+        lines.append(f"  {location}: {expected!r} -> {actual!r}")
+    if len(differences) > limit:
+        lines.append(f"  ... {len(differences) - limit} more")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """命令行入口
+
+    Args:
+        argv: 命令行参数（None表示sys.argv）
+
+    Returns:
+        int: 退出码（diff 有差异时为 1）
+    """
+    parser = argparse.ArgumentParser(prog='python -m regression',
+                                     description='Record seeded result runs and diff them')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', help='Generate results for a fixed sample set')
+    record.add_argument('-o', '--output', required=True, help='Output JSON file')
+    record.add_argument('--config', type=str, default='config.json', help='Configuration file path')
+    record.add_argument('--seed', type=str, default=None, help='Result seed (default core.result_seed)')
+    record.add_argument('--samples', type=int, default=1000, help='Number of samples')
+    record.add_argument('--tests', nargs='+', default=None, help='Tests per sample (default test inventory)')
+    record.add_argument('--workers', type=int, default=1, help='Worker processes')
+
+    diff = commands.add_parser('diff', help='Compare two recorded runs')
+    diff.add_argument('baseline', help='Baseline run')
+    diff.add_argument('candidate', help='Candidate run')
+    diff.add_argument('--tolerance', type=float, default=0.0, help='Allowed absolute difference for values')
+    diff.add_argument('--limit', type=int, default=20, help='Differences to list')
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        from config import ConfigManager
+        config_manager = ConfigManager(args.config)
+        seed = args.seed if args.seed is not None else config_manager.get_core_config().get('result_seed')
+        if seed is None:
+            print("A seed is required: pass --seed or set core.result_seed")
+            return 2
+        tests = args.tests or [test['name'] for test in config_manager.get_test_inventory_config().get('tests', [])]
+        run = record_run(config_manager.get_assay_config(), seed, workload(args.samples, tests), args.workers)
+        save_run(args.output, seed, run)
+        print(f"Recorded {len(run)} samples with seed {seed} to {args.output}")
+        return 0
+
+    try:
+        baseline_seed, baseline = load_run(args.baseline)
+        candidate_seed, candidate = load_run(args.candidate)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error reading run file: {str(e)}")
+        return 2
+    if baseline_seed != candidate_seed:
+        print(f"Warning: runs use different seeds ({baseline_seed} vs {candidate_seed})")
+    differences = diff_runs(baseline, candidate, args.tolerance)
+    print(format_diff(differences, args.limit))
+    return 1 if differences else 0
@@ -7,6 +7,8 @@ AtellicaSimulator 测试脚本
 import time
 import sys
 import os
+import logging
+import tempfile
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -15,13 +17,23 @@ from core import AtellicaCore
 from config import ConfigManager
 from logger import Logger
 
+# 测试日志写入临时目录，不修改仓库中的 logs/
+TEST_LOG_DIR = tempfile.mkdtemp(prefix='atellica-test-logs-')
+
+
+def make_test_config():
+    """加载 config.json，日志目录指向测试临时目录"""
+    config_manager = ConfigManager('config.json')
+    config_manager.config['logger']['log_dir'] = TEST_LOG_DIR
+    return config_manager
+
 
 def test_core_functionality():
     """测试核心功能"""
     print("=== 测试 AtellicaCore 功能 ===")
     
     # 初始化配置管理器
-    config_manager = ConfigManager('config.json')
+    config_manager = make_test_config()
     
     # 初始化日志管理器
     logger = Logger(config_manager)
@@ -111,5 +123,1739 @@ def test_core_functionality():
     logger.info("测试脚本完成")
 
 
+def test_log_index():
+    """测试轮转通信日志索引检索"""
+    print("=== 测试 LogIndexer 功能 ===")
+    
+    from logger.log_index import LogIndexer, IndexedRotatingFileHandler
+    
+    with tempfile.TemporaryDirectory() as log_dir:
+        log_file = os.path.join(log_dir, 'las_communication.log')
+        indexer = LogIndexer(bucket_seconds=60)
+        handler = IndexedRotatingFileHandler(log_file, indexer, maxBytes=2048, backupCount=3)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                                               datefmt='%Y-%m-%d %H:%M:%S'))
+        test_logger = logging.getLogger('LogIndexTest')
+        test_logger.propagate = False
+        test_logger.addHandler(handler)
+        
+        try:
+            for i in range(60):
+                test_logger.warning(f"Received message from 127.0.0.1:5000: Type=0x0201, SeqID=0x{i:04x}")
+                test_logger.warning(f"Sample received: S{i % 7}, Tests: ['TEST001']")
+        finally:
+            test_logger.removeHandler(handler)
+            handler.close()
+        
+        segments = indexer.segments(log_file)
+        print(f"   日志分段数量: {len(segments)}")
+        assert len(segments) > 1
+        assert all(os.path.exists(indexer.index_path(s)) for s in segments[:-1])
+        
+        # 只保留最近的分段，按序列ID检索
+        matches = indexer.query(log_file, sequence_id=59, message_type=0x0201)
+        print(f"   SeqID=0x003b 匹配行数: {len(matches)}")
+        assert len(matches) == 1 and 'SeqID=0x003b' in matches[0][1]
+        
+        matches = indexer.query(log_file, sample_id='S3')
+        assert matches and all('S3,' in line for _, line in matches)
+        
+        # 增量索引：追加内容后再次检索
+        with open(log_file, 'a', encoding='utf-8') as f:
+            f.write(time.strftime('%Y-%m-%d %H:%M:%S') + " - X - INFO - Sample received: NEW1, Tests: []\n")
+        assert len(indexer.query(log_file, sample_id='NEW1')) == 1
+    
+    print("=== LogIndexer 测试完成 ===")
+
+
+def test_log_archiver():
+    """测试轮转分段后台压缩、保留策略与压缩分段检索"""
+    print("=== 测试 SegmentArchiver 功能 ===")
+    
+    from logger.archiver import ArchivingRotatingFileHandler, SegmentArchiver
+    from logger.log_index import LogIndexer
+    from logger.segments import is_compressed, open_segment
+    
+    with tempfile.TemporaryDirectory() as log_dir:
+        log_file = os.path.join(log_dir, 'lis_communication.log')
+        indexer = LogIndexer(bucket_seconds=60)
+        archiver = SegmentArchiver(compression='gzip', max_bytes=64 * 1024)
+        handler = ArchivingRotatingFileHandler(log_file, archiver, indexer=indexer, maxBytes=4096)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                                               datefmt='%Y-%m-%d %H:%M:%S'))
+        test_logger = logging.getLogger('LogArchiverTest')
+        test_logger.propagate = False
+        test_logger.addHandler(handler)
+        
+        try:
+            for i in range(400):
+                test_logger.warning(f"Sample received: S{i}, Tests: ['TEST001']")
+        finally:
+            test_logger.removeHandler(handler)
+            handler.close()
+        archiver.flush()
+        
+        segments = indexer.segments(log_file)
+        archived = [s for s in segments if is_compressed(s)]
+        total = sum(os.path.getsize(s) for s in segments[:-1])
+        print(f"   分段数量: {len(segments)}, 压缩分段: {len(archived)}, 历史总大小: {total}")
+        assert archived and len(archived) == len(segments) - 1
+        assert total <= 64 * 1024
+        
+        # 压缩分段仍可通过索引检索
+        with open_segment(archived[0]) as f:
+            first_line = f.readline().decode('utf-8')
+        oldest_sample = first_line.split('Sample received: ')[1].split(',')[0]
+        matches = indexer.query(log_file, sample_id=oldest_sample)
+        assert len(matches) == 1 and matches[0][0] == archived[0]
+        archiver.stop()
+    
+    print("=== SegmentArchiver 测试完成 ===")
+
+
+def test_metrics():
+    """测试指标注册表与Prometheus文本导出"""
+    print("=== 测试 Metrics 功能 ===")
+    
+    import threading
+    import urllib.request
+    from metrics import MetricsRegistry, MetricsServer
+    
+    registry = MetricsRegistry()
+    counter = registry.counter('test_events_total', 'Test events', ['kind'])
+    histogram = registry.histogram('test_latency_seconds', 'Test latency', buckets=(0.1, 1.0))
+    
+    # 多线程并发累加，采集结果应与单线程一致
+    def worker():
+        for _ in range(1000):
+            counter.labels(kind='a').inc()
+            histogram.observe(0.5)
+    
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert counter.labels(kind='a').value() == 4000
+    assert registry.counter('test_events_total', 'Test events', ['kind']) is counter
+    
+    text = registry.render()
+    assert 'test_events_total{kind="a"} 4000' in text
+    assert 'test_latency_seconds_bucket{le="0.1"} 0' in text
+    assert 'test_latency_seconds_bucket{le="+Inf"} 4000' in text
+    assert 'test_latency_seconds_count 4000' in text
+    
+    # 核心模块指标与HTTP导出
+    config_manager = make_test_config()
+    config_manager.config['metrics'] = {'enabled': True, 'host': '127.0.0.1', 'port': 0}
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger, metrics=registry)
+    core.receive_sample(f"MET{int(time.time())}", ['TEST001'], {})
+    
+    server = MetricsServer(config_manager, logger, registry)
+    server.start()
+    try:
+        port = server.http_server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode('utf-8')
+    finally:
+        server.stop()
+    print(f"   导出指标行数: {len(body.splitlines())}")
+    assert 'atellica_samples_received_total 1' in body
+    assert '# TYPE atellica_pending_results gauge' in body
+    
+    # LAS请求得到ACK与响应，发送指标按消息类型计数
+    import socket
+    from las import LASServer
+    from las.client import LASClient
+    las_server = LASServer(config_manager, logger, core)
+    las_server.is_running = True
+    server_side, client_side = socket.socketpair()
+    client_side.settimeout(5)
+    handler = threading.Thread(target=las_server._handle_connection, args=(server_side, ('test', 0)), daemon=True)
+    handler.start()
+    client = LASClient(client_side)
+    try:
+        client.handshake()
+        return_code, (header, _) = client.request(las_server.MSG_TYPE_INSTRUMENT_HEALTH_REQUEST)
+    finally:
+        client.close()
+        handler.join(5)
+        las_server.stop()
+    assert return_code == 0x00 and header['message_type'] == 0x0202
+    las_text = registry.render()
+    assert 'las_messages_sent_total{type="0x0202"} 1' in las_text
+    assert 'las_acks_sent_total{return_code="0x00"} 2' in las_text
+    
+    print("=== Metrics 测试完成 ===")
+
+
+def test_tracing():
+    """测试样本生命周期追踪与Chrome trace导出"""
+    print("=== 测试 Tracer 功能 ===")
+    
+    from tracing import Tracer
+    from tracing.tracing import load_chrome_trace, stage_summary
+    
+    config_manager = make_test_config()
+    logger = Logger(config_manager)
+    tracer = Tracer(capacity=1000)
+    core = AtellicaCore(config_manager, logger, tracer=tracer)
+    
+    import socket
+    import threading
+    from collections import deque
+    from las import LASServer
+    from lis import LISServer
+    las_server = LASServer(config_manager, logger, core)
+    server_side, client = socket.socketpair()
+    
+    # 结果立即到期，直接触发生成；前后各上报一次LAS在线样本信息
+    sample_id = f"TRC{int(time.time())}"
+    assert core.receive_sample(sample_id, ['TEST001'], {})
+    las_server._handle_onboard_sample_info_request(server_side, {'sequence_id': 1})
+    core.sample_store.set_result_time(sample_id, time.time())
+    core._generate_sample_result(sample_id)
+    las_server._handle_onboard_sample_info_request(server_side, {'sequence_id': 2})
+    server_side.close()
+    client.close()
+    
+    stages = [event[1] for event in tracer.events(sample_id)]
+    print(f"   样本 {sample_id} 阶段: {stages}")
+    assert stages == ['receive_sample', 'las_load', 'las_onboard_reported', 'result_wait', 'result_backlog',
+                      'result_generation', 'las_unload']
+    
+    # LIS只把单独的ACK帧当作结果确认，报文内容中的0x06不算
+    lis_server = LISServer(config_manager, logger, core)
+    lis_server.is_running = True
+    server_side, client = socket.socketpair()
+    lis_server.awaiting_ack[server_side] = deque([('ACK1', time.time()), ('ACK2', time.time())])
+    handler = threading.Thread(target=lis_server._handle_connection, args=(server_side, ('test', 0)), daemon=True)
+    handler.start()
+    client.sendall(b'H|\\^&|||LIS\rP|1|\x06\rO|ACKORDER|TEST001\r')
+    client.sendall(b'L|1|N\r')
+    client.sendall(b'\x06')
+    deadline = time.time() + 5
+    while len(lis_server.awaiting_ack[server_side]) > 1 and time.time() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert [sample for sample, _ in lis_server.awaiting_ack[server_side]] == ['ACK2']
+    client.close()
+    handler.join(5)
+    assert [event[1] for event in tracer.events('ACK1')] == ['astm_ack_wait']
+    
+    # 环形缓冲区只保留最近的事件
+    small = Tracer(capacity=10)
+    for i in range(25):
+        small.mark(f"S{i}", 'test')
+    assert len(small.events()) == 10 and small.events()[0][0] == 'S15'
+    
+    with tempfile.TemporaryDirectory() as trace_dir:
+        trace_path = os.path.join(trace_dir, 'trace.json')
+        assert tracer.export_chrome_trace(trace_path) == len(tracer.events())
+        events = load_chrome_trace(trace_path)
+        summary = stage_summary(events)
+        assert summary['receive_sample']['count'] == 2
+        assert abs(summary['result_wait']['total'] - tracer.summary()['result_wait']['total']) < 1e-3
+    print(tracer.format_summary())
+    
+    print("=== Tracer 测试完成 ===")
+
+
+def test_runtime_profiler():
+    """测试运行时剖析：cProfile、栈采样、线程CPU时间与控制端口"""
+    print("=== 测试 RuntimeProfiler 功能 ===")
+    
+    import socket
+    import threading
+    from profiling import RuntimeProfiler
+    from profiling.profiler import (CHECKPOINT_INTERVAL, CPROFILE_ALL_THREADS, enabled_thread_profiles,
+                                    profile_checkpoint, run_cprofile)
+    
+    stop = threading.Event()
+    
+    def busy_worker():
+        while not stop.is_set():
+            profile_checkpoint()
+            sum(i * i for i in range(2000))
+            time.sleep(0.001)
+    
+    worker = threading.Thread(target=busy_worker, name='BusyWorker', daemon=True)
+    worker.start()
+    
+    config_manager = make_test_config()
+    logger = Logger(config_manager)
+    with tempfile.TemporaryDirectory() as output_dir:
+        config_manager.config['profiling'] = {'host': '127.0.0.1', 'port': 0, 'signal': None,
+                                              'default_seconds': 0.3, 'output_dir': output_dir}
+        profiler = RuntimeProfiler(config_manager, logger)
+        profiler.start()
+        try:
+            output = profiler.handle_command('profile 0.3')
+            print(f"   {output.splitlines()[0]}")
+            assert 'BusyWorker' in output or 'all threads' in output
+            assert any(name.endswith('.prof') for name in os.listdir(output_dir))
+            
+            output = profiler.handle_command('stacks 0.2 0.005')
+            collapsed = [name for name in os.listdir(output_dir) if name.endswith('.collapsed')]
+            with open(os.path.join(output_dir, collapsed[0]), 'r', encoding='utf-8') as f:
+                assert any(line.startswith('BusyWorker;') for line in f)
+            
+            # 通过控制端口查询线程CPU时间
+            port = profiler.control_server.server_address[1]
+            with socket.create_connection(('127.0.0.1', port), timeout=5) as conn:
+                conn.sendall(b'cpu\n')
+                reply = b''
+                while not reply.endswith(b'\n.\n'):
+                    reply += conn.recv(65536)
+            assert b'BusyWorker' in reply
+        finally:
+            profiler.stop()
+            stop.set()
+            worker.join()
+    
+    # 3.12 之前：阻塞在 recv 上的空闲LAS连接线程按检查点间隔加入采集，采集结束后在一个间隔内停用
+    if not CPROFILE_ALL_THREADS:
+        from las import LASServer
+        las_server = LASServer(config_manager, logger, AtellicaCore(config_manager, logger))
+        las_server.is_running = True
+        server_side, client = socket.socketpair()
+        handler = threading.Thread(target=las_server._handle_connection, args=(server_side, ('idle', 0)),
+                                   name='IdleLAS', daemon=True)
+        handler.start()
+        stats, note = run_cprofile(CHECKPOINT_INTERVAL * 1.5)
+        assert 'IdleLAS' in note, note
+        deadline = time.time() + CHECKPOINT_INTERVAL * 3
+        while enabled_thread_profiles() and time.time() < deadline:
+            time.sleep(0.05)
+        assert enabled_thread_profiles() == 0
+        client.close()
+        handler.join(5)
+    
+    print("=== RuntimeProfiler 测试完成 ===")
+
+
+def test_lock_instrumentation():
+    """测试核心锁竞争统计与加锁顺序检查"""
+    print("=== 测试 LockMonitor 功能 ===")
+    
+    import threading
+    from core.locks import LockMonitor
+    from metrics import MetricsRegistry
+    
+    config_manager = make_test_config()
+    config_manager.config['core']['lock_instrumentation'] = True
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    
+    # 多线程并发接收样本，制造核心锁竞争
+    def ingest(prefix):
+        for i in range(200):
+            core.receive_sample(f"{prefix}-{i}", ['TEST001'], {})
+            core.get_all_samples()
+    
+    threads = [threading.Thread(target=ingest, args=(f"LCK{n}",)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    report = core.get_lock_report()
+    print(report)
+    assert 'sample_lock[' in report and 'receive_sample:' in report
+    assert core.lock_monitor.order_checker.violations == []
+    
+    # 相反顺序嵌套加锁应被标记
+    monitor = LockMonitor(MetricsRegistry())
+    lock_a, lock_b = monitor.lock('a'), monitor.lock('b')
+    with lock_a:
+        with lock_b:
+            pass
+    with lock_b:
+        with lock_a:
+            pass
+    violations = monitor.order_checker.violations
+    assert len(violations) == 1 and violations[0]['kind'] == 'inversion'
+    assert violations[0]['held'] == 'b' and violations[0]['acquiring'] == 'a'
+    
+    print("=== LockMonitor 测试完成 ===")
+
+
+def test_sharded_sample_store():
+    """测试分片样本存储"""
+    print("=== 测试 ShardedSampleStore 功能 ===")
+    
+    import threading
+    from core.sample_store import ShardedSampleStore
+    
+    store = ShardedSampleStore(shard_count=8)
+    
+    # 多个线程同时登记同一批样本，每个样本只能成功一次
+    accepted = []
+    
+    def register():
+        count = 0
+        for i in range(500):
+            sample = {'sample_id': f"SH{i}", 'status': 'received', 'results': None, 'completed_time': None}
+            if store.add(sample, result_time=i):
+                count += 1
+        accepted.append(count)
+    
+    threads = [threading.Thread(target=register) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    print(f"   分片样本数: {store.shard_sizes()}")
+    assert sum(accepted) == 500 and store.sample_count() == 500 and store.received_count() == 500
+    assert all(size > 0 for size in store.shard_sizes())
+    
+    # 到期、取出、完成
+    due = store.due(now=99)
+    assert len(due) == 100
+    pending, sample = store.pop_pending('SH5')
+    assert pending['result_time'] == 5 and sample['sample_id'] == 'SH5'
+    assert store.pop_pending('SH5') == (None, None)
+    store.complete('SH5', {'TEST001': {'value': 1}}, completed_time=10)
+    assert store.get('SH5')['status'] == 'completed' and store.completed_count() == 1
+    assert store.pending_count() == 499 and len(store.all_samples()) == 500
+    
+    print("=== ShardedSampleStore 测试完成 ===")
+
+
+def test_core_snapshots():
+    """测试核心状态的不可变版本快照"""
+    print("=== 测试核心快照功能 ===")
+    
+    config_manager = make_test_config()
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    
+    # 快照只读，旧快照不受后续更新影响
+    inventory = core.get_test_inventory()
+    version = core.test_inventory_snapshot.version
+    first = inventory['tests'][0]
+    try:
+        first['count'] = 0
+        assert False, "snapshot should be read-only"
+    except TypeError:
+        pass
+    
+    core.update_test_inventory(first['name'], count=first['count'] + 1)
+    assert core.test_inventory_snapshot.version == version + 1
+    assert core.get_test_inventory()['tests'][0]['count'] == first['count'] + 1
+    assert inventory['tests'][0]['count'] == first['count']
+    assert config_manager.get_test_inventory_config()['tests'][0]['count'] == first['count']
+    
+    health = core.get_instrument_health()
+    core.update_automation_interface_status(3)
+    assert core.get_instrument_health()['automation_interface_status'] == 3
+    assert health['automation_interface_status'] != 3 or health is not core.get_instrument_health()
+    
+    # 样本视图引用已发布的分片表，不随后续接收变化
+    sample_id = f"SNP{int(time.time() * 1000)}"
+    view = core.get_all_samples()
+    assert core.receive_sample(sample_id, ['TEST001'], {})
+    assert sample_id not in view and sample_id in core.get_all_samples()
+    assert core.get_all_samples().version > view.version
+    
+    # 分片表原地修改，写入不复制整片；未变化的分片复用上次的视图副本
+    import gc
+    from core.sample_store import ShardedSampleStore
+    from core.snapshots import gc_paused
+    store = ShardedSampleStore(shard_count=1)
+    table = store.shards[0].table
+    for i in range(1000):
+        store.add({'sample_id': f"S{i}", 'status': 'received', 'received_time': 0}, 0)
+    store.complete('S0', {}, 1)
+    assert store.shards[0].table is table and len(table) == 1000
+    snapshot = store.all_samples()
+    assert store.all_samples()._parts[0] is snapshot._parts[0]
+    store.evict(['S0'])
+    assert 'S0' in snapshot and 'S0' not in store.all_samples()
+    
+    # 写者发布分片视图：只复制增量，视图总是包含最新写入，读取时不获取分片锁
+    view = store.shards[0].view
+    assert len(view.delta) < 32 and len(store.all_samples()) == 999
+    assert sorted(store.all_samples()) == sorted(table)
+    import threading
+    for shard in core.sample_store.shards:
+        shard.lock.acquire()
+    try:
+        read = []
+        reader = threading.Thread(target=lambda: read.append(core.get_all_samples()), daemon=True)
+        reader.start()
+        reader.join(2)
+        assert read and sample_id in read[0]
+    finally:
+        for shard in core.sample_store.shards:
+            shard.lock.release()
+    
+    frozen = gc.get_freeze_count()
+    with gc_paused():
+        assert not gc.isenabled()
+    assert gc.isenabled() and gc.get_freeze_count() == frozen
+    
+    print("=== 核心快照测试完成 ===")
+
+
+def test_event_bus():
+    """测试核心事件总线的多订阅者分发与背压"""
+    print("=== 测试事件总线功能 ===")
+    
+    import threading
+    from core.events import InventoryChanged, ResultReady, SampleReceived, StatusChanged
+    
+    config_manager = make_test_config()
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    
+    # 多个订阅者各自收到关心的事件，旧的回调接口仍可用
+    received, statuses, callbacks = [], [], []
+    core.subscribe(received.append, [SampleReceived, ResultReady], 'test_samples')
+    core.subscribe(statuses.append, [StatusChanged, InventoryChanged], 'test_status')
+    core.register_result_callback(lambda sample_id, results: callbacks.append((sample_id, results)))
+    
+    sample_id = f"EVT{int(time.time() * 1000)}"
+    assert core.receive_sample(sample_id, ['TEST001'], {})
+    core.sample_store.set_result_time(sample_id, 0)
+    core._generate_sample_result(sample_id)
+    core.update_instrument_process_status(2)
+    core.update_test_inventory('TEST002', count=5)
+    core.events.flush()
+    
+    assert [type(event) for event in received] == [SampleReceived, ResultReady]
+    assert received[1].sample['status'] == 'completed'
+    assert callbacks == [(sample_id, received[1].results)]
+    assert any(isinstance(event, StatusChanged) and event.field == 'instrument_process_status'
+               and event.health['instrument_process_status'] == 2 for event in statuses)
+    assert any(isinstance(event, InventoryChanged) and event.item == 'TEST002' for event in statuses)
+    
+    # 慢订阅者只积压自己的队列：drop_oldest 丢弃旧事件，不阻塞发布者
+    gate = threading.Event()
+    slow = []
+    core.subscribe(lambda event: (gate.wait(), slow.append(event)), [StatusChanged], 'test_slow',
+                   queue_size=2, overflow='drop_oldest')
+    start = time.time()
+    for status in (1, 2, 1, 2, 1):
+        core.update_automation_interface_status(status)
+    assert time.time() - start < 1.0
+    gate.set()
+    core.events.flush()
+    assert core.events.metric_dropped.labels(subscriber='test_slow').value() >= 2
+    assert slow[-1].value == 1
+    assert 'event_bus_queue_depth{subscriber="test_samples"}' in core.metrics.render()
+    
+    # 关闭核心时停止所有订阅者的分发线程
+    threads = [subscription.thread for subscription in core.events.subscriptions]
+    core.close()
+    assert threads and not any(thread.is_alive() for thread in threads)
+    assert core.events.subscriptions == ()
+    print("=== 事件总线测试完成 ===")
+
+
+def test_sample_changelog():
+    """测试样本变更日志的增量读取、续读与落后重新同步"""
+    print("=== 测试样本变更日志功能 ===")
+    
+    import asyncio
+    import threading
+    from core.changelog import CHANGE_COMPLETED, CHANGE_RECEIVED, ChangeLog, ChangeLogTruncated
+    
+    config_manager = make_test_config()
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    
+    # 接收与完成按序号记录，消费者从任意序号续读
+    start, _ = core.get_samples_snapshot()
+    prefix = f"CDC{int(time.time() * 1000)}"
+    for i in range(3):
+        assert core.receive_sample(f"{prefix}-{i}", ['TEST001'], {})
+    core._generate_sample_result(f"{prefix}-1")
+    changes = core.get_sample_changes(start)
+    assert [(change.sample_id, change.kind) for change in changes] == [
+        (f"{prefix}-0", CHANGE_RECEIVED), (f"{prefix}-1", CHANGE_RECEIVED),
+        (f"{prefix}-2", CHANGE_RECEIVED), (f"{prefix}-1", CHANGE_COMPLETED)]
+    assert [change.seq for change in changes] == list(range(start + 1, start + 5))
+    assert changes[-1].record['status'] == 'completed'
+    assert core.get_sample_changes(changes[1].seq) == changes[2:]
+    assert [change.seq for change in core.iter_sample_changes(start + 2, timeout=0.05)] == [start + 3, start + 4]
+    
+    # 有界缓冲区：落后过多时抛出 ChangeLogTruncated
+    changelog = ChangeLog(capacity=4)
+    for i in range(10):
+        changelog.append(f"S{i}", CHANGE_RECEIVED, None)
+    assert changelog.first_seq == 7 and [change.seq for change in changelog.read(6)] == [7, 8, 9, 10]
+    try:
+        changelog.read(5)
+        assert False, "expected ChangeLogTruncated"
+    except ChangeLogTruncated as e:
+        assert e.first_seq == 7
+    cursor = changelog.cursor(8)
+    assert [change.seq for change in cursor.poll()] == [9, 10] and cursor.poll() == []
+    
+    # 同步与 asyncio 迭代器都会等待新变化
+    def produce():
+        time.sleep(0.05)
+        for i in range(3):
+            changelog.append(f"N{i}", CHANGE_RECEIVED, None)
+    
+    threading.Thread(target=produce, daemon=True).start()
+    follower = changelog.follow(10, timeout=2)
+    assert [next(follower).seq for _ in range(3)] == [11, 12, 13]
+    
+    async def consume(since, count):
+        seqs = []
+        async for change in changelog.afollow(since):
+            seqs.append(change.seq)
+            if len(seqs) == count:
+                return seqs
+    
+    threading.Thread(target=produce, daemon=True).start()
+    assert asyncio.run(asyncio.wait_for(consume(12, 4), 2)) == [13, 14, 15, 16]
+    
+    # LAS在线样本只应用增量
+    from las import LASServer
+    las_server = LASServer(config_manager, logger, core)
+    with las_server.onboard_lock:
+        las_server._sync_onboard_samples()
+        assert f"{prefix}-0" in las_server.onboard_samples and f"{prefix}-1" not in las_server.onboard_samples
+    core._generate_sample_result(f"{prefix}-0")
+    with las_server.onboard_lock:
+        las_server._sync_onboard_samples()
+        assert f"{prefix}-0" not in las_server.onboard_samples and f"{prefix}-2" in las_server.onboard_samples
+    
+    print("=== 样本变更日志测试完成 ===")
+
+
+def test_state_persistence():
+    """测试预写日志、压缩快照与重启恢复"""
+    print("=== 测试状态持久化功能 ===")
+    
+    from core.journal import decode_entry, list_segments
+    
+    with tempfile.TemporaryDirectory() as data_dir:
+        config_manager = make_test_config()
+        config_manager.config['persistence'].update({'enabled': True, 'data_dir': data_dir, 'snapshot_every': 5})
+        logger = Logger(config_manager)
+        
+        # 第一次运行：接收样本、生成结果、修改状态与库存，不正常关闭（模拟崩溃）
+        core = AtellicaCore(config_manager, logger)
+        for i in range(4):
+            assert core.receive_sample(f"WAL{i}", ['TEST001', 'TEST002'], {'patient_id': f"P{i}"})
+        core._generate_sample_result('WAL1')
+        core.update_instrument_process_status(2)
+        core.update_test_inventory('TEST003', count=42)
+        core.update_consumable_inventory('MODULE001', 1, 3)
+        results = core.get_sample_info('WAL1')['results']
+        if core.journal.compaction_thread is not None:
+            core.journal.compaction_thread.join()
+        assert os.path.exists(os.path.join(data_dir, 'snapshot.json'))
+        
+        # 半条写入的日志尾部在恢复时被截断
+        last_segment = list_segments(data_dir)[-1][1]
+        with open(last_segment, 'ab') as f:
+            f.write(b'0000abcd {"torn')
+        
+        restarted = AtellicaCore(config_manager, logger)
+        assert restarted.journal.recovery['samples'] == 4
+        assert restarted.get_sample_info('WAL0')['status'] == 'received'
+        assert restarted.get_sample_info('WAL0')['patient_info']['patient_id'] == 'P0'
+        assert restarted.get_sample_info('WAL1')['status'] == 'completed'
+        assert restarted.get_sample_info('WAL1')['results']['TEST001']['value'] == results['TEST001']['value']
+        assert restarted.sample_store.pending_count() == 3
+        health = restarted.get_instrument_health()
+        assert health['instrument_process_status'] == 2
+        assert health['on_board_tube_count'] == core.get_instrument_health()['on_board_tube_count']
+        assert health['completed_tube_count'] == core.get_instrument_health()['completed_tube_count']
+        assert any(test['name'] == 'TEST003' and test['count'] == 42
+                   for test in restarted.get_test_inventory()['tests'])
+        assert restarted.get_consumable_inventory()['modules'][0]['consumables'][0]['status'] == 3
+        with open(last_segment, 'rb') as f:
+            assert all(decode_entry(line) is not None for line in f)
+        
+        # 正常关闭时写快照，下次启动无需重放日志
+        assert restarted.receive_sample('WAL9', ['TEST001'], {})
+        restarted.close()
+        third = AtellicaCore(config_manager, logger)
+        assert third.journal.recovery['snapshot'] and third.journal.recovery['entries'] == 0
+        assert 'WAL9' in third.get_all_samples() and len(third.get_all_samples()) == 5
+        third.close()
+        core.journal.close(compact=False)
+    
+    # 写入失败不推进落盘序号，等待该记录的 commit 抛出异常，之后的记录也不再视为落盘
+    from core.journal import OP_HEALTH, JournalWriteError, StateJournal
+    from metrics import MetricsRegistry
+    
+    class FailingFile:
+        def write(self, data):
+            raise OSError("disk full")
+        
+        def close(self):
+            pass
+    
+    with tempfile.TemporaryDirectory() as data_dir:
+        journal = StateJournal(data_dir, MetricsRegistry(), logger)
+        journal.start(None)
+        journal.append(OP_HEALTH, {'ok': 1})
+        journal.commit()
+        durable = journal.durable_seq
+        journal.file.close()
+        journal.file = FailingFile()
+        for value in (2, 3):
+            journal.append(OP_HEALTH, {'ok': value})
+            try:
+                journal.commit()
+                assert False, "expected JournalWriteError"
+            except JournalWriteError:
+                pass
+        assert journal.durable_seq == durable and journal.pending == []
+        journal.close()
+    
+    print("=== 状态持久化测试完成 ===")
+
+
+def test_sample_archive():
+    """测试已完成样本的内存映射归档"""
+    print("=== 测试样本归档功能 ===")
+    
+    from core import archive as archive_module
+    from core.archive import SampleArchive
+    
+    with tempfile.TemporaryDirectory() as archive_dir:
+        # 归档独立使用：索引与记录文件扩容、长样本ID、重新打开、顺序扫描
+        initial_slots, grow_records = archive_module.INITIAL_INDEX_SLOTS, archive_module.GROW_RECORDS
+        archive_module.INITIAL_INDEX_SLOTS, archive_module.GROW_RECORDS = 8, 16
+        try:
+            archive = SampleArchive(os.path.join(archive_dir, 'standalone'))
+            first_records, first_index = archive.records_map, archive.index_map
+            for i in range(50):
+                sample_id = f"ARC{i}" if i % 10 else f"ARC{i}-" + 'X' * 40
+                assert archive.add({'sample_id': sample_id, 'tests': ['TEST001'], 'patient_info': {'patient_id': i},
+                                    'received_time': 100.0 + i, 'status': 'completed',
+                                    'results': {'TEST001': {'value': i, 'unit': 'mg/dL', 'flags': ''}},
+                                    'completed_time': 200.0 + i})
+            assert archive.index_slots > 8 and archive.record_capacity > 16 and len(archive) == 50
+            assert first_records.closed and first_index.closed
+            assert not archive.add({'sample_id': 'ARC1', 'tests': [], 'patient_info': {}, 'received_time': 0,
+                                    'status': 'completed', 'results': {}, 'completed_time': 0})
+            archive.close()
+            assert archive.records_map.closed and archive.index_map.closed
+        finally:
+            archive_module.INITIAL_INDEX_SLOTS, archive_module.GROW_RECORDS = initial_slots, grow_records
+        
+        archive = SampleArchive(os.path.join(archive_dir, 'standalone'))
+        assert len(archive) == 50 and archive.get('missing') is None
+        sample = archive.get('ARC7')
+        assert sample['results']['TEST001']['value'] == 7 and sample['tests'] == ('TEST001',)
+        assert sample['completed_time'] == 207.0 and sample['status'] == 'completed'
+        long_id = 'ARC20-' + 'X' * 40
+        assert long_id in archive and archive.get(long_id)['patient_info']['patient_id'] == 20
+        assert [sample['sample_id'] for sample in archive.scan(48)] == ['ARC48', 'ARC49']
+        export_path = os.path.join(archive_dir, 'export.jsonl')
+        assert archive.export_jsonl(export_path) == 50
+        archive.close()
+        
+        # 核心：完成的样本转入归档后从内存移除，查询仍然可用
+        config_manager = make_test_config()
+        config_manager.config['core'].update({'archive_enabled': True, 'archive_dir': os.path.join(archive_dir, 'core'),
+                                              'archive_after': 0})
+        logger = Logger(config_manager)
+        core = AtellicaCore(config_manager, logger)
+        sample_id = f"ARCCORE{int(time.time() * 1000)}"
+        assert core.receive_sample(sample_id, ['TEST001'], {})
+        core._generate_sample_result(sample_id)
+        results = core.get_sample_info(sample_id)['results']
+        assert core._archive_completed(time.time()) == 1
+        assert sample_id not in core.get_all_samples()
+        assert core.get_sample_info(sample_id)['results'] == results
+        assert not core.receive_sample(sample_id, ['TEST001'], {})
+        core.close()
+    
+    print("=== 样本归档测试完成 ===")
+
+
+def test_capacity_model():
+    """测试处理能力模型推算的积压、获取延迟与就绪状态"""
+    print("=== 测试处理能力模型功能 ===")
+    
+    from core.capacity import PROCESS_GREEN, PROCESS_RED, PROCESS_YELLOW, CapacityModel
+    
+    # 两个模块各 360 测试/小时（每个测试占用10秒），M1 只做 TEST001，M2 只做 TEST002
+    model = CapacityModel({'modules': [{'id': 'M1', 'tests_per_hour': 360, 'assays': ['TEST001']},
+                                       {'id': 'M2', 'tests_per_hour': 360, 'assays': ['TEST002']}],
+                           'onboard_capacity': 5, 'default_run_time': 100, 'assay_run_times': {'TEST002': 300}})
+    now = 1000.0
+    assert model.health_fields(now) == {'processing_backlog': 0, 'sample_acquisition_delay': 0,
+                                        'on_board_tube_count': 0, 'load_process_status': PROCESS_GREEN}
+    # 模块空闲时立即吸样，结果时间 = 吸样完成 + 运行时间
+    assert model.admit('A', ['TEST001', 'TEST002'], now) == [('A', now + 10 + 300)]
+    assert model.admit('B', ['TEST002', 'TEST002'], now) == []
+    fields = model.health_fields(now)
+    assert fields['processing_backlog'] == 2 and fields['sample_acquisition_delay'] == 10
+    # 按事件时间推进，积压随时间减少
+    assert model.advance(now + 15) == [] and model.backlog() == 1
+    assert model.advance(now + 30) == [('B', now + 30 + 300)] and model.backlog() == 0
+    
+    # 单模块：获取延迟与在线试管数驱动 Yellow / Red
+    model = CapacityModel({'modules': [{'id': 'M1', 'tests_per_hour': 360}], 'onboard_capacity': 5,
+                           'yellow_onboard_ratio': 0.6, 'yellow_delay': 25, 'red_delay': 60})
+    model.admit('C', ['TEST001'] * 3, now)
+    assert model.acquisition_delay(now) == 30 and model.process_status(now) == PROCESS_YELLOW
+    model.admit('D', ['TEST001'] * 4, now)
+    assert model.acquisition_delay(now) == 70 and model.process_status(now) == PROCESS_RED
+    # 排程走完后只剩在线试管数的影响（2/5 未达 Yellow 比例）
+    model.advance(now + 3600)
+    assert model.process_status(now + 3600) == PROCESS_GREEN
+    for sample_id in ('E', 'F', 'G'):
+        model.admit(sample_id, [], now + 3600)
+    assert model.is_full() and model.process_status(now + 3600) == PROCESS_RED
+    model.release()
+    assert not model.is_full() and model.process_status(now + 3600) == PROCESS_YELLOW
+    
+    # 不推进模型，由聚合量推算的积压与获取延迟与推进后读取的结果相同
+    model = CapacityModel({'modules': [{'id': 'M1', 'tests_per_hour': 360}, {'id': 'M2', 'tests_per_hour': 180}]})
+    model.admit('P', ['TEST001'] * 7, now)
+    load = model.load()
+    for moment in (now, now + 5, now + 10, now + 25, now + 61, now + 500):
+        model.advance(moment)
+        assert load.project(moment) == (model.backlog(), model.acquisition_delay(moment))
+    
+    # 核心：健康状态字段随样本负载变化，在线试管满时拒收
+    config_manager = make_test_config()
+    config_manager.config['capacity'].update({'enabled': True, 'onboard_capacity': 3,
+                                              'modules': [{'id': 'MODULE001', 'tests_per_hour': 36}],
+                                              'yellow_delay': 150, 'red_delay': 100000})
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    prefix = f"CAP{int(time.time() * 1000)}"
+    health = core.get_instrument_health()
+    assert health['processing_backlog'] == 0 and health['on_board_tube_count'] == 0
+    assert core.receive_sample(f"{prefix}-0", ['TEST001', 'TEST002'], {})
+    health = core.get_instrument_health()
+    assert health['processing_backlog'] == 1 and 190 <= health['sample_acquisition_delay'] <= 200
+    assert health['on_board_tube_count'] == 1 and health['instrument_process_status'] == PROCESS_YELLOW
+    # 第二个测试尚未吸样，结果时间未定
+    assert core.sample_store.get_pending(f"{prefix}-0")['result_time'] == float('inf')
+    assert core.receive_sample(f"{prefix}-1", ['TEST001'], {})
+    assert core.receive_sample(f"{prefix}-2", ['TEST001'], {})
+    assert core.get_instrument_health()['instrument_process_status'] == PROCESS_RED
+    assert not core.receive_sample(f"{prefix}-3", ['TEST001'], {})
+    core._generate_sample_result(f"{prefix}-0")
+    health = core.get_instrument_health()
+    assert health['on_board_tube_count'] == 2 and health['processing_backlog'] == 3
+    assert core.receive_sample(f"{prefix}-3", ['TEST001'], {})
+    
+    # 读取健康状态不获取 status_lock、不推进模型也不发布新快照
+    import threading
+    version = core.health_snapshot.version
+    read = []
+    with core.status_lock:
+        reader = threading.Thread(target=lambda: read.append(core.get_instrument_health()), daemon=True)
+        reader.start()
+        reader.join(2)
+    assert read and read[0]['on_board_tube_count'] == 3
+    assert core.health_snapshot.version == version
+    
+    print("=== 处理能力模型测试完成 ===")
+
+
+def test_stat_priority():
+    """测试STAT优先调度与按优先级的周转时间统计"""
+    print("=== 测试STAT优先级功能 ===")
+    
+    from core.capacity import PRIORITY_ROUTINE, PRIORITY_STAT, CapacityModel
+    from lis import LISServer
+    
+    # 模型：排队中的STAT测试排在已排队的常规测试之前，已开始吸样的测试不被抢占
+    model = CapacityModel({'modules': [{'id': 'M1', 'tests_per_hour': 360}], 'default_run_time': 100})
+    now = 1000.0
+    assert model.admit('R0', ['TEST001'], now) == [('R0', now + 10 + 100)]
+    assert model.admit('R1', ['TEST001'], now) == []
+    assert model.admit('S0', ['TEST001'], now + 1, PRIORITY_STAT) == []
+    assert model.acquisition_delay(now + 1, PRIORITY_STAT) < model.acquisition_delay(now + 1)
+    assert model.advance(now + 10) == [('S0', now + 20 + 100)]
+    assert model.advance(now + 20) == [('R1', now + 30 + 100)]
+    
+    # 核心：STAT样本先得到结果时间，周转时间按优先级统计
+    config_manager = make_test_config()
+    config_manager.config['capacity'].update({'enabled': True, 'onboard_capacity': 100,
+                                              'modules': [{'id': 'MODULE001', 'tests_per_hour': 36}]})
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    prefix = f"STAT{int(time.time() * 1000)}"
+    for i in range(3):
+        assert core.receive_sample(f"{prefix}-R{i}", ['TEST001'], {})
+    assert core.receive_sample(f"{prefix}-S", ['TEST001'], {}, PRIORITY_STAT)
+    assert core.receive_sample(f"{prefix}-X", ['TEST001'], {}, 'urgent')
+    assert core.get_sample_info(f"{prefix}-S")['priority'] == PRIORITY_STAT
+    assert core.get_sample_info(f"{prefix}-X")['priority'] == PRIORITY_ROUTINE
+    with core.status_lock:
+        ready = core.capacity.advance(time.time() + 150)
+    core._schedule_results(ready)
+    assert [sample_id for sample_id, _ in ready] == [f"{prefix}-S"]
+    assert core.sample_store.get_pending(f"{prefix}-R1")['result_time'] == float('inf')
+    
+    assert core.get_turnaround_stats() == {}
+    core._generate_sample_result(f"{prefix}-R0")
+    core._generate_sample_result(f"{prefix}-S")
+    stats = core.get_turnaround_stats()
+    assert stats[PRIORITY_STAT]['count'] == 1 and stats[PRIORITY_ROUTINE]['count'] == 1
+    assert stats[PRIORITY_STAT]['p50'] <= stats[PRIORITY_STAT]['p99'] == stats[PRIORITY_STAT]['max']
+    assert core.get_turnaround_report().splitlines()[1].startswith(PRIORITY_STAT)
+    assert 'atellica_sample_turnaround_seconds_count{priority="stat"} 1' in core.metrics.render()
+    
+    # LIS：订单记录测试项目后的优先级字段
+    lis_server = LISServer(config_manager, logger, core)
+    assert lis_server._parse_order_record(['O', 'A1', 'TEST001', 'S'])['priority'] == PRIORITY_STAT
+    assert lis_server._parse_order_record(['O', 'A1', 'TEST001', 'R'])['priority'] == PRIORITY_ROUTINE
+    assert lis_server._parse_order_record(['O', 'A1', 'TEST001'])['priority'] == PRIORITY_ROUTINE
+    
+    print("=== STAT优先级测试完成 ===")
+
+
+def test_assay_catalog():
+    """测试检测项目目录：结果分布、单位与 H/L/危急值标志"""
+    print("=== 测试检测项目目录功能 ===")
+    
+    import random
+    from core.assays import AssayCatalog
+    from core.capacity import CapacityModel
+    from lis import LISServer
+    
+    catalog = AssayCatalog({
+        'GLU': {'unit': 'mmol/L', 'decimals': 1, 'distribution': {'type': 'normal', 'mean': 5.6, 'sd': 1.1},
+                'reference_range': [3.9, 6.1], 'critical_range': [2.2, 22.2], 'run_time': 600},
+        'TNI': {'unit': 'ng/L', 'decimals': 0, 'distribution': {'type': 'lognormal', 'median': 8, 'sigma': 1.2},
+                'reference_range': [None, 47], 'critical_range': [None, 1000]},
+    })
+    glucose = catalog.get('GLU')
+    assert [glucose.flag(value) for value in (2.1, 2.2, 3.8, 3.9, 6.1, 6.2, 22.2, 22.3)] == \
+        ['LL', 'L', 'L', '', '', 'H', 'H', 'HH']
+    assert glucose.reference_range == '3.9 to 6.1' and catalog.get('TNI').reference_range == '<47'
+    assert [catalog.get('TNI').flag(value) for value in (0, 47, 48, 1001)] == ['', '', 'H', 'HH']
+    
+    # 固定种子下的标志比例符合分布（正态分布约 1/3 偏高、6% 偏低）
+    rng = random.Random(42)
+    flags = [glucose.generate(rng)['flags'] for _ in range(20000)]
+    assert 0.25 < flags.count('H') / len(flags) < 0.40 and 0.03 < flags.count('L') / len(flags) < 0.10
+    assert flags.count('LL') + flags.count('HH') < 100
+    troponin = catalog.get('TNI').generate(rng)
+    assert isinstance(troponin['value'], int) and troponin['unit'] == 'ng/L'
+    
+    # 目录外的检测项目按默认定义生成
+    unknown = catalog.generate(['XYZ'], rng)['XYZ']
+    assert unknown['unit'] == 'U/L' and unknown['flags'] == '' and 0 <= unknown['value'] <= 100
+    assert catalog.get('XYZ') is catalog.default_assay and 'XYZ' not in catalog.assays
+    
+    # 运行时间供处理能力模型使用，capacity.assay_run_times 优先
+    model = CapacityModel({'assay_run_times': {'TNI': 1500}}, catalog.run_times())
+    assert model.run_time('GLU') == 600 and model.run_time('TNI') == 1500 and model.run_time('XYZ') == 600
+    
+    # 核心按目录生成结果，LIS结果报文带参考范围与标志
+    config_manager = make_test_config()
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    
+    # 默认目录的分布以参考范围为中心，只有少数结果被标记
+    for code in ('TEST001', 'TEST002', 'TEST003', 'TEST004'):
+        assay = core.assays.get(code)
+        flags = [assay.generate(rng)['flags'] for _ in range(5000)]
+        assert sum(1 for flag in flags if flag) / len(flags) < 0.08, code
+    sample_id = f"ASSAY{int(time.time() * 1000)}"
+    assert core.receive_sample(sample_id, ['TEST001', 'TEST004'], {})
+    core._generate_sample_result(sample_id)
+    sample = core.get_sample_info(sample_id)
+    assert sample['results']['TEST001']['unit'] == 'mmol/L' and sample['results']['TEST004']['unit'] == 'ng/L'
+    assert sample['results']['TEST001']['flags'] == core.assays.get('TEST001').flag(sample['results']['TEST001']['value'])
+    message = LISServer(config_manager, logger, core)._build_result_message(sample)
+    assert '|3.9 to 6.1|' in message and '|<47|' in message
+    
+    print("=== 检测项目目录测试完成 ===")
+
+
+def test_reagent_consumption():
+    """测试试剂与耗材消耗"""
+    print("\n=== 测试试剂与耗材消耗 ===")
+    
+    from core.events import InventoryChanged
+    from core.inventory import ReagentTracker
+    
+    # 只有跨越阈值时才改变状态；手动设置的状态在区间内保持不变
+    tests = {'threshold': 3, 'report_step': 100, 'tests': [{'name': 'A', 'count': 4, 'status': 1},
+                                                         {'name': 'B', 'count': 50, 'status': 2, 'threshold': 60}]}
+    consumables = {'threshold': 2, 'modules': [
+        {'id': 'M1', 'consumables': [{'id': 25, 'status': 1, 'count': 3, 'per_test': 1}, {'id': 1, 'status': 1}]},
+        {'id': 'M2', 'consumables': [{'id': 25, 'status': 1, 'count': 10, 'per_test': 1}]}]}
+    tracker = ReagentTracker(tests, consumables)
+    assert tracker.consume(['A']) == ([], []) and tests['tests'][0] == {'name': 'A', 'count': 3, 'status': 1}
+    assert tracker.tests_dirty and tracker.consumables_dirty
+    assert tracker.consume(['A', 'B']) == (['A'], [('M1', 25)])
+    assert tests['tests'][0]['status'] == 2 and tests['tests'][1]['status'] == 2
+    assert tracker.consume(['A', 'A']) == (['A'], [])
+    assert tests['tests'][0]['count'] == 0 and tests['tests'][0]['status'] == 3
+    # 检测项目用完后不再扣减，也不消耗耗材；第一个模块的耗材用完后改用下一个模块
+    assert tracker.consume(['A']) == ([], []) and tests['tests'][0]['count'] == 0
+    tracker.consume(['B'])
+    assert consumables['modules'][1]['consumables'][0]['count'] == 7
+    
+    # 核心每完成一个测试扣减一次，读取库存时发布最新余量，跨越阈值时发布库存事件
+    config_manager = make_test_config()
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    received = []
+    core.subscribe(received.append, [InventoryChanged], name='test-reagents')
+    core.update_test_inventory('TEST002', count=11)
+    version = core.test_inventory_snapshot.version
+    tips = core.get_consumable_inventory()['modules'][0]['consumables'][5]['count']
+    base = int(time.time() * 1000)
+    for index in range(2):
+        sample_id = f"REAGENT{base}{index}"
+        assert core.receive_sample(sample_id, ['TEST001', 'TEST002'], {})
+        core._generate_sample_result(sample_id)
+    # 第一次扣减到 10 跨越上报步长，第二次跨越黄色阈值，都立即发布
+    assert core.test_inventory_snapshot.version == version + 2
+    inventory = {test['name']: test for test in core.get_test_inventory()['tests']}
+    assert inventory['TEST002']['count'] == 9 and inventory['TEST002']['status'] == 2
+    assert core.get_consumable_inventory()['modules'][0]['consumables'][5]['count'] == tips - 4
+    deadline = time.time() + 5
+    while len([event for event in received if event.item == 'TEST002']) < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    assert [event.inventory is not None for event in received if event.item == 'TEST002'] == [True] * 3
+    
+    # 手动设置数量时按检测项目阈值判定状态
+    core.update_test_inventory('TEST002', count=0)
+    assert core.get_test_inventory()['tests'][1]['status'] == 3
+    
+    print("=== 试剂与耗材消耗测试完成 ===")
+
+
+def test_seeded_results():
+    """测试按样本派生的可复现结果"""
+    print("\n=== 测试可复现结果 ===")
+    
+    from core.assays import sample_rng
+    from regression import diff_runs, record_run
+    from regression.regression import workload
+    
+    # 同一种子和样本ID得到同一随机数流，不同样本或种子的流不同
+    assert sample_rng(42, 'S1').random() == sample_rng(42, 'S1').random()
+    assert sample_rng(42, 'S1').random() != sample_rng(42, 'S2').random()
+    assert sample_rng(42, 'S1').random() != sample_rng(43, 'S1').random()
+    
+    # 配置种子后，两个核心实例为同一样本生成相同结果，与生成顺序无关
+    config_manager = make_test_config()
+    config_manager.config['core']['result_seed'] = 7
+    logger = Logger(config_manager)
+    runs = []
+    for order in (['SEED1', 'SEED2'], ['SEED2', 'SEED1']):
+        core = AtellicaCore(config_manager, logger)
+        for sample_id in order:
+            assert core.receive_sample(sample_id, ['TEST001', 'TEST002', 'TEST003'], {})
+            core._generate_sample_result(sample_id)
+        runs.append({sample_id: core.get_sample_info(sample_id)['results'] for sample_id in order})
+    assert runs[0] == runs[1]
+    
+    # 回归模式：单进程与多进程生成的结果一致，修改后的结果逐项列出差异
+    assay_config = config_manager.get_assay_config()
+    samples = workload(40, ['TEST001', 'TEST003'])
+    baseline = record_run(assay_config, 7, samples)
+    assert record_run(assay_config, 7, samples, workers=2) == baseline
+    assert diff_runs(baseline, baseline) == []
+    changed = record_run({**assay_config, 'TEST003': {**assay_config['TEST003'], 'unit': 'uIU/mL'}}, 7, samples)
+    differences = diff_runs(baseline, changed)
+    assert len(differences) == 40 and {field for _, _, field, _, _ in differences} == {'unit'}
+    assert diff_runs(baseline, record_run(assay_config, 8, samples))
+    del changed['REG00000000']
+    assert ('REG00000000', None, None, baseline['REG00000000'], None) in diff_runs(baseline, changed)
+    
+    print("=== 可复现结果测试完成 ===")
+
+
+def test_carrier_queues():
+    """测试载架队列管理"""
+    print("\n=== 测试载架队列管理 ===")
+    
+    import socket
+    import struct
+    import threading
+    from las import LASServer
+    from las.client import LASClient
+    from core.carriers import OCCUPANCY_CAPPED, OCCUPANCY_EMPTY, Carrier, CarrierQueue
+    
+    # 先进先出；重复样本ID时跳过最早加入的一个；已锁定的载架不受跳过与清空影响
+    queue = CarrierQueue()
+    for sample_id in ('A', 'B', 'A', 'C'):
+        queue.add(Carrier(OCCUPANCY_CAPPED, sample_id))
+    queue.add(Carrier(OCCUPANCY_EMPTY, ''))
+    first_a = queue.entries[0]
+    assert queue.skip(OCCUPANCY_CAPPED, 'A') is first_a and len(queue) == 4
+    assert queue.skip(OCCUPANCY_EMPTY, 'A') is None and queue.skip(OCCUPANCY_CAPPED, 'X') is None
+    assert [carrier.sample_id for carrier in queue.carriers()] == ['B', 'A', 'C', '']
+    locked = queue.lock_head()
+    assert locked.sample_id == 'B' and queue.skip(OCCUPANCY_CAPPED, 'B') is None
+    assert queue.clear() == 3 and len(queue) == 0 and queue.head() is None and queue.locked == [locked]
+    assert queue.unlock(locked) and not queue.locked
+    
+    # 大量跳过后压缩，队列中不会堆积已跳过的载架
+    for index in range(1000):
+        queue.add(Carrier(OCCUPANCY_CAPPED, f"S{index}"))
+    for index in range(1, 1000):
+        assert queue.skip(OCCUPANCY_CAPPED, f"S{index}") is not None
+    assert len(queue) == 1 and len(queue.entries) <= 2 * CarrierQueue.COMPACT_MIN
+    
+    # LAS Add/Skip/Clear Queue：带盖试管（占用类型 0x03 与 ETX 相同）按长度分帧
+    config_manager = make_test_config()
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    las_server = LASServer(config_manager, logger, core)
+    las_server.is_running = True
+    server_side, client_side = socket.socketpair()
+    client_side.settimeout(5)
+    handler = threading.Thread(target=las_server._handle_connection, args=(server_side, ('test', 0)), daemon=True)
+    handler.start()
+    client = LASClient(client_side)
+    client.handshake()
+    
+    def request(message_type, body):
+        return_code, response = client.request(message_type, body)
+        assert return_code == 0x00
+        return response
+    
+    for sample_id in (b'TUBE1', b'TUBE2', b'TUBE1'):
+        response = request(0x0401, struct.pack(f'!BBB{len(sample_id)}sBBB', 0, OCCUPANCY_CAPPED, len(sample_id),
+                                                sample_id, 2, 100, 0x52))
+        assert response[0]['message_type'] == 0x0402
+        assert response[1] == bytes([0, len(sample_id)]) + sample_id + b'\x01'
+    request(0x0401, struct.pack('!BBBBBB', 1, OCCUPANCY_EMPTY, 0, 0, 0, 0))
+    queued = core.get_carrier_queue(0)['queued']
+    assert [carrier['sample_id'] for carrier in queued] == ['TUBE1', 'TUBE2', 'TUBE1']
+    assert queued[0]['priority'] == 2 and queued[0]['minicollect']
+    
+    response = request(0x0403, struct.pack('!BBB5sBBB', 0, OCCUPANCY_CAPPED, 5, b'TUBE1', 0, 0, 0))
+    assert response[0]['message_type'] == 0x0404 and response[1] == b'\x00\x05TUBE1\x01'
+    assert [carrier['sample_id'] for carrier in core.get_carrier_queue(0)['queued']] == ['TUBE2', 'TUBE1']
+    
+    with core.carrier_lock:
+        core.carrier_queues[0].lock_head()
+    response = request(0x0405, b'\x00')
+    assert response[0]['message_type'] == 0x0406 and response[1] == b'\x00\x01'
+    assert core.get_carrier_queue(0) == {'queued': [], 'locked': core.get_carrier_queue(0)['locked']}
+    assert [carrier['sample_id'] for carrier in core.get_carrier_queue(0)['locked']] == ['TUBE2']
+    assert core.add_carrier(5, OCCUPANCY_EMPTY) is False and core.clear_carrier_queue(5) is None
+    
+    # 断开连接后丢弃队列信息（已锁定的载架除外）
+    client.close()
+    handler.join(5)
+    assert core.get_carrier_queue(1)['queued'] == [] and len(core.get_carrier_queue(0)['locked']) == 1
+    
+    print("=== 载架队列管理测试完成 ===")
+
+
+def test_load_unload():
+    """测试 Load_Unload 取放与 Transfer Status"""
+    print("\n=== 测试 Load_Unload 取放 ===")
+    
+    import socket
+    import struct
+    import threading
+    from las import LASServer
+    from las.client import LASClient
+    from core.carriers import OCCUPANCY_CAPPED, OCCUPANCY_EMPTY
+    from core.transfer import (COMMAND_OFFLINE, COMMAND_QUEUE_MISMATCH, COMMAND_SKIPPED, COMMAND_SUCCESS,
+                               LOCKED_BY_INSTRUMENT, NOT_LOCKED_BY_INSTRUMENT, PROCESSING_NO_LIS_ORDERS,
+                               PROCESSING_SUCCESS, REMOTE_EXCHANGE, REMOTE_OFFLINE)
+    
+    config_manager = make_test_config()
+    config_manager.config['core']['transfer_time'] = 0
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    
+    # 交换模式：装载有工单的试管，腾空的载架装入已完成的试管
+    core.update_remote_control_status(0, REMOTE_EXCHANGE)
+    assert core.receive_sample('DONE1', ['TEST001'], {}) and core.receive_sample('NEW1', ['TEST001'], {})
+    core._generate_sample_result('DONE1')
+    assert core.get_transfer_status(0) == {'ready_to_load': True, 'return_ready_tube_count': 1}
+    core.add_carrier(0, OCCUPANCY_CAPPED, 'NEW1')
+    transfer = core.begin_load_unload(0, OCCUPANCY_CAPPED, 'NEW1')
+    assert transfer.load_status == COMMAND_SUCCESS and transfer.unload_status == COMMAND_SUCCESS
+    assert transfer.unload_sample_id == 'DONE1' and transfer.processing_status == PROCESSING_SUCCESS
+    assert core.get_instrument_health()['lock_ownership'][0] == LOCKED_BY_INSTRUMENT
+    assert core.get_transfer_status(0)['ready_to_load'] is False
+    
+    # 取放期间同一接口位置的请求返回 Queue Mismatch，不锁定载架
+    core.add_carrier(0, OCCUPANCY_EMPTY)
+    busy = core.begin_load_unload(0, OCCUPANCY_EMPTY)
+    assert busy.carrier is None and busy.load_status == COMMAND_QUEUE_MISMATCH
+    counts = core.finish_load_unload(transfer)
+    assert core.get_instrument_health()['lock_ownership'][0] == NOT_LOCKED_BY_INSTRUMENT
+    assert counts['ready_to_load'] and counts['return_ready_tube_count'] == 0
+    assert core.get_carrier_queue(0)['locked'] == []
+    
+    # 没有工单的试管不处理，直接排队返回（0x14）；队首不匹配时返回 Queue Mismatch
+    core.add_carrier(0, OCCUPANCY_CAPPED, 'NOORDER')
+    mismatch = core.begin_load_unload(0, OCCUPANCY_CAPPED, 'OTHER')
+    assert mismatch.carrier is None and mismatch.unload_status == COMMAND_QUEUE_MISMATCH
+    core.skip_carrier(0, OCCUPANCY_EMPTY)
+    transfer = core.begin_load_unload(0, OCCUPANCY_CAPPED, 'NOORDER')
+    assert transfer.loaded and transfer.loaded_without_orders and transfer.unload_status == COMMAND_SKIPPED
+    core.finish_load_unload(transfer)
+    assert list(core.transfer.return_queue) == [('NOORDER', PROCESSING_NO_LIS_ORDERS)]
+    
+    # 离线时不取放
+    core.update_remote_control_status(0, REMOTE_OFFLINE)
+    core.add_carrier(0, OCCUPANCY_EMPTY)
+    transfer = core.begin_load_unload(0, OCCUPANCY_EMPTY)
+    assert transfer.load_status == COMMAND_SKIPPED and transfer.unload_status == COMMAND_OFFLINE
+    core.finish_load_unload(transfer)
+    assert core.get_transfer_status(0)['ready_to_load'] is False and core.get_transfer_status(9) is None
+    
+    # LAS：空载架取回没有工单的试管；Transfer Status 请求与就绪状态变化时的主动推送
+    core.update_remote_control_status(0, REMOTE_EXCHANGE)
+    las_server = LASServer(config_manager, logger, core)
+    las_server.is_running = True
+    server_side, client_side = socket.socketpair()
+    client_side.settimeout(5)
+    with las_server.connection_lock:
+        las_server.connections.append(server_side)
+    handler = threading.Thread(target=las_server._handle_connection, args=(server_side, ('test', 0)), daemon=True)
+    handler.start()
+    client = LASClient(client_side)
+    client.handshake()
+    
+    # 初始化期间查询每个接口位置的 Transfer Status
+    responses = client.initialize()
+    assert responses[(0x0209, 0)] == struct.pack('!BBH', 0, 1, 1)
+    
+    core.add_carrier(0, OCCUPANCY_EMPTY)
+    return_code, (header, body) = client.request(0x0303, struct.pack('!BBBBBH', 0, OCCUPANCY_EMPTY, 0, 0, 0, 0xFFFF))
+    assert return_code == 0x00 and header['message_type'] == 0x0304
+    assert body == (b'\x00\x00' + bytes([COMMAND_SKIPPED]) + b'\x07NOORDER'
+                    + bytes([COMMAND_SUCCESS, PROCESSING_NO_LIS_ORDERS]) + body[-7:])
+    on_board, completed, ready, return_ready = struct.unpack('!HHBH', body[-7:])
+    health = core.get_instrument_health()
+    assert (on_board, completed, ready, return_ready) == (health['on_board_tube_count'],
+                                                          health['completed_tube_count'], 1, 0)
+    
+    # 推送在事件分发线程中按序发送，可能早于或晚于响应到达：先等到取放完成后 IP0 恢复就绪的推送
+    client.receive(0x020A, struct.pack('!BBH', 0, 1, 0))
+    client.unmatched.clear()
+    core.update_remote_control_status(0, REMOTE_OFFLINE)
+    header, body = client.receive(0x020A, struct.pack('!BBH', 0, 0, 0))
+    assert header['return_sequence_id'] == 0
+    
+    client.close()
+    handler.join(5)
+    core.close()
+    
+    print("=== Load_Unload 取放测试完成 ===")
+
+
+def test_ack_retransmission():
+    """测试 ACK/NACK 超时重发与连接重置"""
+    print("\n=== 测试 ACK/NACK 重发 ===")
+    
+    import socket
+    import struct
+    import threading
+    from las import LASServer
+    from las.client import LASClient
+    from las.timers import TimingWheel
+    
+    # 时间轮：超过一圈的任务按圈数等待，取消的任务不触发
+    wheel = TimingWheel(tick=0.01, slots=8)
+    fired = []
+    done = threading.Event()
+    wheel.schedule(0.02, fired.append, 'short')
+    wheel.schedule(0.2, fired.append, 'long')
+    wheel.schedule(0.05, fired.append, 'cancelled').cancel()
+    wheel.schedule(0.3, done.set)
+    assert done.wait(5)
+    wheel.stop()
+    assert fired == ['short', 'long']
+    
+    config_manager = make_test_config()
+    config_manager.config['las'].update({'ack_timeout': 0.1, 'max_retries': 2, 'max_nacks': 2})
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    las_server = LASServer(config_manager, logger, core)
+    las_server.is_running = True
+    
+    def connect(auto_ack=True):
+        server_side, client_side = socket.socketpair()
+        client_side.settimeout(5)
+        handler = threading.Thread(target=las_server._handle_connection, args=(server_side, ('test', 0)), daemon=True)
+        handler.start()
+        return LASClient(client_side, auto_ack), handler
+    
+    # 未确认的握手响应按原序列ID重发 max_retries 次后连接被重置
+    client, handler = connect(auto_ack=False)
+    client.send(0x0001, struct.pack('!HHHHBB3s', 0x0330, 0x0001, 0x0104, 0x0100, 0x01, 3, b'LAS'))
+    assert client.receive(0x0000, b'\x00') is not None
+    resent = [client.receive(0x0001)[0] for _ in range(3)]
+    assert len({header['sequence_id'] for header in resent}) == 1
+    assert client.receive() is None
+    client.close()
+    handler.join(5)
+    
+    # Message Not Understood 时立即重发，达到 max_nacks 后重置连接；不支持的消息类型以 0x03 拒绝
+    client, handler = connect()
+    client.handshake()
+    assert client.request(0x0777) == (0x03, None)
+    client.auto_ack = False
+    _, (health, _) = client.request(0x0201)
+    client.ack(health['sequence_id'], 0x01)
+    again, _ = client.receive(0x0202)
+    assert again['sequence_id'] == health['sequence_id']
+    client.ack(health['sequence_id'], 0x01)
+    assert client.receive() is None
+    client.close()
+    handler.join(5)
+    assert las_server.sessions == {}
+    
+    text = core.metrics.render()
+    assert 'las_retransmissions_total{type="0x0001",reason="timeout"} 2' in text
+    assert 'las_retransmissions_total{type="0x0202",reason="nack"} 1' in text
+    assert 'las_connection_resets_total{reason="ack_timeout"} 1' in text
+    assert 'las_connection_resets_total{reason="nack_limit"} 1' in text
+    assert 'las_ack_round_trip_seconds_count{type="0x0001"} 1' in text
+    las_server.stop()
+    core.close()
+    
+    print("=== ACK/NACK 重发测试完成 ===")
+
+
+def test_keep_alive():
+    """测试 Keep Alive 与空闲连接回收"""
+    print("\n=== 测试 Keep Alive 与空闲检测 ===")
+    
+    import socket
+    import threading
+    from las import LASServer
+    from las.client import LASClient
+    
+    config_manager = make_test_config()
+    config_manager.config['las'].update({'keep_alive_interval': 0.2, 'inactivity_timeout': 0.6, 'ack_timeout': 5})
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    las_server = LASServer(config_manager, logger, core)
+    las_server.is_running = True
+    
+    def connect():
+        server_side, client_side = socket.socketpair()
+        client_side.settimeout(5)
+        handler = threading.Thread(target=las_server._handle_connection, args=(server_side, ('test', 0)), daemon=True)
+        handler.start()
+        return LASClient(client_side), handler
+    
+    # 握手完成后，发送方向空闲时仪器发送 Keep Alive；LAS 确认 Keep Alive 也算接收方向的活动
+    client, handler = connect()
+    client.handshake()
+    started = time.time()
+    keep_alives = 0
+    while time.time() - started < 1.0:
+        assert client.receive(0x0005) is not None
+        keep_alives += 1
+    assert keep_alives >= 3
+    
+    # LAS 发来的 Keep Alive 只需确认
+    assert client.request(0x0005, response=False) == (0x00, None)
+    client.close()
+    handler.join(5)
+    
+    # 对方失联（不再发送任何数据）的连接在 inactivity_timeout 后被回收，连接线程随之退出
+    clients = [connect() for _ in range(50)]
+    for client, handler in clients:
+        handler.join(5)
+        assert not handler.is_alive()
+        assert client.receive() is None
+        client.close()
+    assert las_server.sessions == {}
+    assert 'las_connection_resets_total{reason="inactivity"} 50' in core.metrics.render()
+    las_server.stop()
+    core.close()
+    
+    print("=== Keep Alive 测试完成 ===")
+
+
+def test_session_state_machine():
+    """测试LAS连接会话：握手前拒绝、初始化完成条件、初始化超时与断开期间的取放"""
+    print("\n=== 测试LAS连接会话状态机 ===")
+    
+    import socket
+    import struct
+    import threading
+    from las import LASServer
+    from las.client import INITIALIZATION_REQUESTS, LASClient
+    from las.session import STATE_CLOSED, STATE_HANDSHAKE, STATE_LISTENING, InvalidTransition, LASSession
+    from core.carriers import OCCUPANCY_EMPTY
+    from core.transfer import LOCKED_BY_INSTRUMENT, NOT_LOCKED_BY_INSTRUMENT, REMOTE_EXCHANGE
+    
+    session = LASSession(None, ('test', 0))
+    session.transition(STATE_HANDSHAKE)
+    try:
+        session.transition(STATE_LISTENING)
+        assert False, 'handshake -> listening should be rejected'
+    except InvalidTransition:
+        pass
+    session.transition(STATE_CLOSED)
+    assert not session.connected
+    
+    config_manager = make_test_config()
+    config_manager.config['las'].update({'init_timeout': 0.5})
+    config_manager.config['core']['transfer_time'] = 0.2
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    las_server = LASServer(config_manager, logger, core)
+    las_server.is_running = True
+    
+    def connect():
+        server_side, client_side = socket.socketpair()
+        client_side.settimeout(5)
+        handler = threading.Thread(target=las_server._handle_connection, args=(server_side, ('test', 0)), daemon=True)
+        handler.start()
+        return LASClient(client_side), handler
+    
+    # 握手前的请求以 Message Type Not Supported 拒绝
+    client, handler = connect()
+    assert client.request(0x0201) == (0x03, None)
+    client.handshake()
+    
+    # 全部初始化请求完成后才发送 Initialization Sequence Complete
+    for message_type in INITIALIZATION_REQUESTS:
+        return_code, _ = client.request(message_type, b'\x00' if message_type == 0x0405 else b'')
+        assert return_code == 0x00
+    assert client.request(0x0209, b'\x00')[0] == 0x00
+    assert all(header['message_type'] != 0x020D for header, _ in client.unmatched)
+    assert client.request(0x0209, b'\x01')[0] == 0x00
+    assert client.receive(0x020D) is not None
+    
+    # 初始化完成后不再接受初始化请求，其它请求照常处理
+    assert client.request(0x0201) == (0x03, None)
+    return_code, (header, _) = client.request(0x0405, b'\x00')
+    assert return_code == 0x00 and header['message_type'] == 0x0406
+    client.close()
+    handler.join(5)
+    
+    # 握手后 init_timeout 内未完成初始化则重置连接
+    client, handler = connect()
+    client.handshake()
+    assert client.receive() is None
+    client.close()
+    handler.join(5)
+    
+    # 断开期间完成的取放保持接口位置锁定，新连接建立后主动发送响应，确认后才完成初始化
+    core.update_remote_control_status(0, REMOTE_EXCHANGE)
+    core.add_carrier(0, OCCUPANCY_EMPTY)
+    client, handler = connect()
+    client.handshake()
+    client.send(0x0303, struct.pack('!BBBBBH', 0, OCCUPANCY_EMPTY, 0, 0, 0, 0xFFFF))
+    assert client.receive(0x0000, b'\x00') is not None
+    client.close()
+    handler.join(5)
+    time.sleep(0.5)
+    assert core.get_instrument_health()['lock_ownership'][0] == LOCKED_BY_INSTRUMENT
+    assert len(las_server.undelivered_transfers) == 1
+    
+    client, handler = connect()
+    client.handshake()
+    client.initialize()
+    header, _ = client.receive(0x0304)
+    assert header['return_sequence_id'] == 0
+    assert core.get_instrument_health()['lock_ownership'][0] == NOT_LOCKED_BY_INSTRUMENT
+    client.close()
+    handler.join(5)
+    assert las_server.sessions == {}
+    
+    text = core.metrics.render()
+    assert 'las_connection_resets_total{reason="init_timeout"} 1' in text
+    assert 'las_initialization_seconds_count 2' in text
+    las_server.stop()
+    core.close()
+    
+    print("=== LAS连接会话状态机测试完成 ===")
+
+
+def test_health_push():
+    """测试状态变化时主动推送 Instrument Health 与窗口内合并"""
+    print("\n=== 测试 Instrument Health 主动推送 ===")
+    
+    import socket
+    import threading
+    from las import LASServer
+    from las.client import LASClient
+    
+    config_manager = make_test_config()
+    config_manager.config['las']['health_push_window'] = 0.2
+    config_manager.config['capacity']['enabled'] = True
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    las_server = LASServer(config_manager, logger, core)
+    las_server.is_running = True
+    
+    def connect():
+        server_side, client_side = socket.socketpair()
+        client_side.settimeout(5)
+        handler = threading.Thread(target=las_server._handle_connection, args=(server_side, ('test', 0)), daemon=True)
+        handler.start()
+        return LASClient(client_side), handler
+    
+    def pushed(client):
+        """等过推送窗口后用 Keep Alive 同步，取出期间收到的主动推送"""
+        time.sleep(0.5)
+        assert client.request(0x0005, response=False) == (0x00, None)
+        frames = [frame for frame in client.unmatched if frame[0]['message_type'] == 0x0202]
+        client.unmatched.clear()
+        return frames
+    
+    initialized, initialized_handler = connect()
+    initialized.handshake()
+    initialized.initialize()
+    connecting, connecting_handler = connect()
+    connecting.handshake()
+    
+    # 窗口内的多次变化合并为一条推送，内容为最新状态；未完成初始化的连接不推送
+    core.update_automation_interface_status(2)
+    core.update_instrument_process_status(2)
+    core.update_lis_connection_status(2)
+    (header, body), = pushed(initialized)
+    assert header['return_sequence_id'] == 0 and body[:3] == bytes([2, 2, 2])
+    assert pushed(connecting) == []
+    
+    # 窗口内变化后又恢复，与上次推送的内容相同时不推送
+    core.update_automation_interface_status(3)
+    core.update_automation_interface_status(2)
+    assert pushed(initialized) == []
+    
+    # 推送只读取已发布的健康状态快照，其他线程持有 status_lock 时照常推送
+    core.update_automation_interface_status(3)
+    with core.status_lock:
+        (header, body), = pushed(initialized)
+    assert body[0] == 3
+    
+    text = core.metrics.render()
+    assert 'las_health_pushes_total 2' in text
+    for client, handler in ((initialized, initialized_handler), (connecting, connecting_handler)):
+        client.close()
+        handler.join(5)
+    las_server.stop()
+    core.close()
+    
+    print("=== Instrument Health 主动推送测试完成 ===")
+
+
+def test_batched_writes():
+    """测试一次收到的请求产生的ACK与响应合并为一次写出，接受的连接关闭 Nagle"""
+    print("\n=== 测试LAS写缓冲合并 ===")
+    
+    import socket
+    from las import LASServer
+    from las.client import LASClient
+    
+    config_manager = make_test_config()
+    config_manager.config['las']['port'] = 0
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    las_server = LASServer(config_manager, logger, core)
+    las_server.start()
+    try:
+        conn = socket.create_connection(('127.0.0.1', las_server.server_socket.getsockname()[1]), timeout=5)
+        client = LASClient(conn)
+        client.handshake()
+        with las_server.connection_lock:
+            server_side, = las_server.connections
+        assert server_side.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        
+        # 一次写入三个请求：3 个ACK与 3 个响应由一次 sendmsg 写出
+        syscalls = las_server.metric_write_syscalls.value()
+        requests = [las_server._build_message(las_server.MSG_TYPE_INSTRUMENT_HEALTH_REQUEST, b'') for _ in range(3)]
+        conn.sendall(b''.join(message for message, _ in requests))
+        responses = [client.receive(0x0202)[0]['return_sequence_id'] for _ in requests]
+        assert responses == [sequence_id for _, sequence_id in requests]
+        assert [client.receive(0x0000, b'\x00')[0]['return_sequence_id'] for _ in requests] == responses
+        assert las_server.metric_write_syscalls.value() - syscalls == 1
+        client.close()
+    finally:
+        las_server.stop()
+        core.close()
+    # 握手（ACK与握手响应 2 帧）与三个请求（6 帧）各一次写出
+    text = core.metrics.render()
+    assert 'las_frames_per_flush_bucket{le="4"} 1' in text and 'las_frames_per_flush_bucket{le="8"} 2' in text
+    
+    print("=== LAS写缓冲合并测试完成 ===")
+
+
+def test_session_sequence_spaces():
+    """测试每个LAS连接独立的序列ID空间与会话中记录的握手信息"""
+    print("\n=== 测试LAS连接序列ID空间 ===")
+    
+    import itertools
+    import socket
+    import threading
+    from las import LASServer
+    from las.client import LASClient
+    from las.session import LASSession
+    
+    # 序列ID从 1 开始，0xFFFF 之后回到 1（0 不使用）
+    session = LASSession(None, ('test', 0))
+    assert [session.next_sequence_id() for _ in range(2)] == [1, 2]
+    session.sequence_ids = itertools.count(0xFFFF)
+    assert [session.next_sequence_id() for _ in range(2)] == [0xFFFF, 1]
+    
+    config_manager = make_test_config()
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    las_server = LASServer(config_manager, logger, core)
+    las_server.is_running = True
+    
+    connections = []
+    for serial in (b'LASA', b'LASB'):
+        server_side, client_side = socket.socketpair()
+        client_side.settimeout(5)
+        handler = threading.Thread(target=las_server._handle_connection, args=(server_side, ('test', 0)), daemon=True)
+        handler.start()
+        client = LASClient(client_side)
+        connections.append((server_side, client, handler))
+        # 每个连接独立编号：握手的ACK为 1，握手响应为 2
+        header, _ = client.handshake(serial)
+        assert header['sequence_id'] == 2
+        assert las_server.sessions[server_side].handshake['serial'] == serial.decode('ascii')
+    
+    # 一个连接上的请求不影响另一个连接的编号
+    _, (header, _) = connections[0][1].request(0x0201)
+    assert header['sequence_id'] == 4
+    _, (header, _) = connections[1][1].request(0x0201)
+    assert header['sequence_id'] == 4
+    
+    for server_side, client, handler in connections:
+        client.close()
+        handler.join(5)
+    assert las_server.sessions == {}
+    las_server.stop()
+    core.close()
+    
+    print("=== LAS连接序列ID空间测试完成 ===")
+
+
+def test_stalled_peer():
+    """测试对方停止读取：定时器帧只进入写缓冲，时间轮不被阻塞，写超时只重置该连接"""
+    print("\n=== 测试停止读取的LAS连接 ===")
+    
+    import socket
+    import threading
+    from las import LASServer
+    from las.client import LASClient
+    
+    config_manager = make_test_config()
+    config_manager.config['las'].update({'keep_alive_interval': 0.1, 'inactivity_timeout': 1.0,
+                                         'send_timeout': 0.3, 'ack_timeout': 5})
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    las_server = LASServer(config_manager, logger, core)
+    las_server.is_running = True
+    
+    def connect():
+        server_side, client_side = socket.socketpair()
+        client_side.settimeout(5)
+        handler = threading.Thread(target=las_server._handle_connection, args=(server_side, ('test', 0)), daemon=True)
+        handler.start()
+        return server_side, LASClient(client_side), handler
+    
+    stalled_side, stalled, stalled_handler = connect()
+    _, idle, idle_handler = connect()
+    stalled.handshake()
+    
+    # 对方停止读取：填满仪器一侧的发送缓冲，之后的 Keep Alive 都写不出去
+    stalled_side.setblocking(False)
+    try:
+        while True:
+            stalled_side.send(b'\x00' * 65536)
+    except BlockingIOError:
+        pass
+    stalled_side.setblocking(True)
+    
+    # 时间轮照常运行：另一个空闲连接按时被回收；停止读取的连接在写超时后被重置
+    started = time.time()
+    idle_handler.join(3)
+    assert not idle_handler.is_alive()
+    assert time.time() - started < 2.0
+    stalled_handler.join(3)
+    assert not stalled_handler.is_alive()
+    metrics = core.metrics.render()
+    assert 'las_connection_resets_total{reason="send_timeout"} 1' in metrics
+    assert 'las_connection_resets_total{reason="inactivity"} 1' in metrics
+    assert las_server.sessions == {}
+    stalled.close()
+    idle.close()
+    las_server.stop()
+    core.close()
+    
+    print("=== 停止读取的LAS连接测试完成 ===")
+
+
+def test_load_unload_completion():
+    """测试取放完成在完成线程中进行，慢的状态提交不阻塞时间轮"""
+    print("\n=== 测试取放完成线程 ===")
+    
+    import threading
+    from las import LASServer
+    
+    config_manager = make_test_config()
+    logger = Logger(config_manager)
+    core = AtellicaCore(config_manager, logger)
+    las_server = LASServer(config_manager, logger, core)
+    las_server.is_running = True
+    
+    # 取放完成被阻塞（例如等待状态持久化）期间，时间轮上的其他定时器照常触发
+    release = threading.Event()
+    completed = []
+    
+    def slow_completion(conn, return_sequence_id, transfer):
+        completed.append((threading.current_thread().name, transfer))
+        release.wait(5)
+    
+    las_server._send_load_unload_response = slow_completion
+    fired = threading.Event()
+    las_server.timers.schedule(0.05, las_server._submit_completion, None, 1, 'transfer')
+    las_server.timers.schedule(0.2, fired.set)
+    assert fired.wait(2)
+    assert completed == [('LASCompletions', 'transfer')]
+    release.set()
+    las_server.stop()
+    assert las_server.completion_thread is None
+    core.close()
+    
+    print("=== 取放完成线程测试完成 ===")
+
+
 if __name__ == "__main__":
     test_core_functionality()
+    test_log_index()
+    test_log_archiver()
+    test_metrics()
+    test_tracing()
+    test_runtime_profiler()
+    test_lock_instrumentation()
+    test_sharded_sample_store()
+    test_core_snapshots()
+    test_event_bus()
+    test_sample_changelog()
+    test_state_persistence()
+    test_sample_archive()
+    test_capacity_model()
+    test_stat_priority()
+    test_assay_catalog()
+    test_reagent_consumption()
+    test_seeded_results()
+    test_carrier_queues()
+    test_load_unload()
+    test_ack_retransmission()
+    test_keep_alive()
+    test_session_state_machine()
+    test_health_push()
+    test_batched_writes()
+    test_session_sequence_spaces()
+    test_stalled_peer()
+    test_load_unload_completion()
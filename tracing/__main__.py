@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+样本追踪耗时统计命令行入口：python -m tracing logs/sample_trace.json
+"""
+
+import sys
+
+from .tracing import main
+
+
+if __name__ == '__main__':
+    sys.exit(main())
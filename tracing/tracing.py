@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tracing模块 - 样本生命周期追踪、Chrome trace导出与分阶段耗时统计
+"""
+
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+
+# 样本生命周期阶段（按发生顺序）
+STAGE_LIS_ORDER = 'lis_order'                  # LIS订单报文处理（含receive_sample）
+STAGE_RECEIVE_SAMPLE = 'receive_sample'        # 核心登记样本
+STAGE_RESULT_WAIT = 'result_wait'              # 登记到结果到期（模拟检测时长）
+STAGE_RESULT_BACKLOG = 'result_backlog'        # 结果到期到开始生成（调度积压）
+STAGE_RESULT_GENERATION = 'result_generation'  # 生成结果并发布
+STAGE_ASTM_TRANSMIT = 'astm_transmit'          # ASTM结果报文发送
+STAGE_ASTM_ACK_WAIT = 'astm_ack_wait'          # 结果报文发送完成到收到ACK
+STAGE_LAS_LOAD = 'las_load'                    # 登记到首次通过LAS在线样本信息上报为在线
+STAGE_LAS_ONBOARD = 'las_onboard_reported'     # 通过LAS在线样本信息上报（瞬时事件）
+STAGE_LAS_UNLOAD = 'las_unload'                # 完成到LAS在线样本信息不再包含该样本
+
+STAGE_ORDER = (
+    STAGE_LIS_ORDER,
+    STAGE_RECEIVE_SAMPLE,
+    STAGE_RESULT_WAIT,
+    STAGE_RESULT_BACKLOG,
+    STAGE_RESULT_GENERATION,
+    STAGE_ASTM_TRANSMIT,
+    STAGE_ASTM_ACK_WAIT,
+    STAGE_LAS_LOAD,
+    STAGE_LAS_ONBOARD,
+    STAGE_LAS_UNLOAD,
+)
+
+
+class _Span:
+    """追踪区间上下文"""
+
+    __slots__ = ('tracer', 'sample_id', 'stage', 'args', 'start')
+
+    def __init__(self, tracer, sample_id, stage, args):
+        self.tracer = tracer
+        self.sample_id = sample_id
+        self.stage = stage
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.record(self.sample_id, self.stage, self.start, time.time(), **self.args)
+        return False
+
+
+class Tracer:
+    """样本生命周期追踪器
+
+    事件写入定长环形缓冲区（deque追加在GIL下是原子操作，写入路径无锁），
+    缓冲区满后自动丢弃最旧的事件。事件格式为
+    (sample_id, stage, start, duration, thread_name, args)，瞬时事件的duration为None。
+    """
+
+    def __init__(self, capacity=100000, enabled=True):
+        """初始化追踪器
+
+        Args:
+            capacity: 环形缓冲区容量（事件数）
+            enabled: 是否启用，关闭时所有记录调用直接返回
+        """
+        self.capacity = capacity
+        self.enabled = enabled
+        self.buffer = deque(maxlen=capacity)
+
+    def record(self, sample_id, stage, start, end=None, **args):
+        """记录一个区间或瞬时事件
+
+        Args:
+            sample_id: 样本ID
+            stage: 阶段名
+            start: 开始时间（time.time()）
+            end: 结束时间，None表示瞬时事件
+            **args: 附加信息（导出到Chrome trace的args）
+        """
+        if not self.enabled or not sample_id:
+            return
+        duration = None if end is None else max(0.0, end - start)
+        self.buffer.append((sample_id, stage, start, duration, threading.current_thread().name, args))
+
+    def mark(self, sample_id, stage, **args):
+        """记录当前时刻的瞬时事件
+
+        Args:
+            sample_id: 样本ID
+            stage: 阶段名
+        """
+        if self.enabled:
+            self.record(sample_id, stage, time.time(), None, **args)
+
+    def span(self, sample_id, stage, **args):
+        """返回区间上下文，退出时记录耗时
+
+        Args:
+            sample_id: 样本ID
+            stage: 阶段名
+
+        Returns:
+            上下文管理器
+        """
+        return _Span(self, sample_id, stage, args)
+
+    def events(self, sample_id=None):
+        """获取缓冲区中的事件快照
+
+        Args:
+            sample_id: 只返回该样本的事件（None表示全部）
+
+        Returns:
+            list: 事件列表（按记录顺序）
+        """
+        events = list(self.buffer)
+        if sample_id is not None:
+            events = [event for event in events if event[0] == sample_id]
+        return events
+
+    def clear(self):
+        """清空缓冲区"""
+        self.buffer.clear()
+
+    def export_chrome_trace(self, path):
+        """导出为Chrome trace JSON（可在 chrome://tracing 或 Perfetto 中打开）
+
+        Args:
+            path: 输出文件路径
+
+        Returns:
+            int: 导出的事件数
+        """
+        events = self.events()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(chrome_trace(events), f)
+        os.replace(tmp_path, path)
+        return len(events)
+
+    def summary(self):
+        """按阶段统计耗时
+
+        Returns:
+            dict: 阶段名 -> 统计信息
+        """
+        return stage_summary(self.events())
+
+    def format_summary(self):
+        """生成分阶段耗时文本报告
+
+        Returns:
+            str: 报告文本
+        """
+        return format_summary(self.summary())
+
+
+def chrome_trace(events):
+    """把追踪事件转换为Chrome trace格式
+
+    每个样本占一条轨道（tid），轨道名为样本ID，便于在Perfetto中逐管查看。
+
+    Args:
+        events: Tracer事件列表
+
+    Returns:
+        dict: Chrome trace JSON对象
+    """
+    origin = min((event[2] for event in events), default=0.0)
+    tracks = {}
+    trace_events = [{
+        'name': 'process_name', 'ph': 'M', 'pid': 1, 'tid': 0,
+        'args': {'name': 'AtellicaSimulator'}
+    }]
+
+    for sample_id, stage, start, duration, thread_name, args in events:
+        tid = tracks.get(sample_id)
+        if tid is None:
+            tid = tracks[sample_id] = len(tracks) + 1
+            trace_events.append({
+                'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid,
+                'args': {'name': f"sample {sample_id}"}
+            })
+        event = {
+            'name': stage,
+            'cat': 'sample',
+            'pid': 1,
+            'tid': tid,
+            'ts': round((start - origin) * 1e6, 3),
+            'args': dict(args, sample_id=sample_id, thread=thread_name)
+        }
+        if duration is None:
+            event['ph'] = 'i'
+            event['s'] = 't'
+        else:
+            event['ph'] = 'X'
+            event['dur'] = round(duration * 1e6, 3)
+        trace_events.append(event)
+
+    return {'traceEvents': trace_events, 'displayTimeUnit': 'ms', 'otherData': {'origin': origin}}
+
+
+def load_chrome_trace(path):
+    """从导出的Chrome trace文件还原追踪事件
+
+    Args:
+        path: Chrome trace文件路径
+
+    Returns:
+        list: Tracer事件列表
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    origin = data.get('otherData', {}).get('origin', 0.0)
+
+    events = []
+    for event in data.get('traceEvents', []):
+        if event.get('ph') not in ('X', 'i'):
+            continue
+        args = dict(event.get('args', {}))
+        sample_id = args.pop('sample_id', None)
+        thread_name = args.pop('thread', '')
+        start = origin + event['ts'] / 1e6
+        duration = event['dur'] / 1e6 if event['ph'] == 'X' else None
+        events.append((sample_id, event['name'], start, duration, thread_name, args))
+    return events
+
+
+def _percentile(sorted_values, percent):
+    """最近秩法计算百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(percent / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def stage_summary(events):
+    """按阶段统计耗时分布
+
+    Args:
+        events: Tracer事件列表
+
+    Returns:
+        dict: 阶段名 -> {'count', 'samples', 'total', 'mean', 'p50', 'p95', 'p99', 'max'}（秒）
+    """
+    durations = {}
+    samples = {}
+    for sample_id, stage, _, duration, _, _ in events:
+        samples.setdefault(stage, set()).add(sample_id)
+        durations.setdefault(stage, [])
+        if duration is not None:
+            durations[stage].append(duration)
+
+    summary = {}
+    for stage, values in durations.items():
+        values.sort()
+        total = sum(values)
+        summary[stage] = {
+            'count': len(values),
+            'samples': len(samples[stage]),
+            'total': total,
+            'mean': total / len(values) if values else 0.0,
+            'p50': _percentile(values, 50),
+            'p95': _percentile(values, 95),
+            'p99': _percentile(values, 99),
+            'max': values[-1] if values else 0.0,
+        }
+    return summary
+
+
+def format_summary(summary):
+    """把阶段统计格式化为文本表格
+
+    Args:
+        summary: stage_summary 的返回值
+
+    Returns:
+        str: 报告文本
+    """
+    order = {stage: i for i, stage in enumerate(STAGE_ORDER)}
+    stages = sorted(summary, key=lambda stage: (order.get(stage, len(order)), stage))
+
+    lines = [f"{'stage':<22}{'samples':>9}{'spans':>9}{'mean(ms)':>12}{'p50(ms)':>12}"
+             f"{'p95(ms)':>12}{'p99(ms)':>12}{'max(ms)':>12}"]
+    for stage in stages:
+        stats = summary[stage]
+        lines.append(
+            f"{stage:<22}{stats['samples']:>9}{stats['count']:>9}"
+            f"{stats['mean'] * 1e3:>12.3f}{stats['p50'] * 1e3:>12.3f}{stats['p95'] * 1e3:>12.3f}"
+            f"{stats['p99'] * 1e3:>12.3f}{stats['max'] * 1e3:>12.3f}"
+        )
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """命令行入口：读取导出的Chrome trace并打印分阶段耗时
+
+    Args:
+        argv: 命令行参数（None表示sys.argv）
+
+    Returns:
+        int: 退出码
+    """
+    parser = argparse.ArgumentParser(prog='python -m tracing',
+                                     description='Print per-stage sample latency from an exported trace')
+    parser.add_argument('trace', nargs='?', default=os.path.join('logs', 'sample_trace.json'),
+                        help='Chrome trace JSON exported by the simulator')
+    parser.add_argument('--sample', type=str, help='Only include this sample ID')
+    args = parser.parse_args(argv)
+
+    try:
+        events = load_chrome_trace(args.trace)
+    except (OSError, ValueError) as e:
+        print(f"Error reading trace file: {str(e)}")
+        return 1
+
+    if args.sample:
+        events = [event for event in events if event[0] == args.sample]
+    print(format_summary(stage_summary(events)))
+    return 0